@@ -5,6 +5,19 @@ from flask_migrate import Migrate
 import os
 # 从 models.py 导入初始化好的 SQLAlchemy 实例 db
 from .models import db
+from .utils.view_counter import view_counter
+from .services.search_engine import search_engine
+from .utils.count_cache import count_cache
+from .utils.order_number import order_number_generator
+from .utils.favorite_cache import favorite_cache
+from .utils.cache import response_cache
+from .services.featured_ranking import featured_ranking
+from .services.trending_engine import trending_engine
+from .services.recommender import recommender
+from .utils.password_helper import password_pool, default_pool_workers, DEFAULT_START_METHOD
+from .utils.jwt_helper import token_cache
+from .utils.token_revocation import token_revocations
+from .utils.rate_limiter import rate_limiter
 # 导入路由注册函数（若你有单独的路由管理文件，如 app/routes.py）
 # 若暂未创建路由文件，可先注释，后续补充
 migrate = Migrate()
@@ -32,6 +45,8 @@ def create_app():
     # 2.1 基础配置：支持中文、保留 JSON 键顺序
     app.config['JSON_AS_ASCII'] = False  # 关闭 ASCII 编码，确保 JSON 响应中中文正常显示
     app.config['JSON_SORT_KEYS'] = False  # 禁止 Flask 自动排序 JSON 响应的键，保持自定义顺序
+    # Session 签名密钥（未登录用户的购物车暂存在 Session 中），生产环境务必通过 .env 配置
+    app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'dev-secret-key')
 
     # 2.2 数据库配置（从 .env 文件读取，避免硬编码）
     # 数据库连接字符串格式：mysql+pymysql://用户名:密码@主机:端口/数据库名?charset=utf8mb4
@@ -46,12 +61,83 @@ def create_app():
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False  # 关闭对象修改跟踪，消除警告、提升性能
     # 文件上传大小限制：5MB
     app.config['MAX_CONTENT_LENGTH'] = 5 * 1024 * 1024
+    # 图片上传：请求体分块读取大小（单次上传的内存占用上限）、保存目录（需由 /static/uploads 对外提供访问）
+    app.config['UPLOAD_CHUNK_SIZE'] = int(os.getenv('UPLOAD_CHUNK_SIZE', 64 * 1024))
+    app.config['UPLOAD_FOLDER'] = os.getenv('UPLOAD_FOLDER', os.path.join(app.root_path, 'static', 'uploads'))
+    # 商品浏览量写回缓冲：每隔 VIEW_FLUSH_INTERVAL 秒批量写回，缓冲量达到 VIEW_FLUSH_MAX_PENDING 时提前写回
+    app.config['VIEW_FLUSH_INTERVAL'] = float(os.getenv('VIEW_FLUSH_INTERVAL', 5))
+    app.config['VIEW_FLUSH_MAX_PENDING'] = int(os.getenv('VIEW_FLUSH_MAX_PENDING', 1000))
+    # 商品搜索索引：持久化文件路径（为空则不持久化）、从数据库补齐变更的间隔（秒）
+    app.config['SEARCH_INDEX_PATH'] = os.getenv('SEARCH_INDEX_PATH', os.path.join(app.instance_path, 'search_index.json'))
+    app.config['SEARCH_REFRESH_INTERVAL'] = float(os.getenv('SEARCH_REFRESH_INTERVAL', 30))
+    # 列表总数缓存：有效期（秒，即其他进程写入后的最大陈旧时间）、精确统计上限（超出返回估算值）
+    app.config['COUNT_CACHE_TTL'] = float(os.getenv('COUNT_CACHE_TTL', 30))
+    app.config['COUNT_EXACT_LIMIT'] = int(os.getenv('COUNT_EXACT_LIMIT', 10000))
+    # 下单库存预留方式：locking（SELECT FOR UPDATE）/ conditional（条件 UPDATE，不持有读锁）
+    app.config['ORDER_RESERVATION_ENGINE'] = os.getenv('ORDER_RESERVATION_ENGINE', 'locking')
+    # 订单事务遇到死锁/锁等待超时时的重试：最多执行次数、退避基数与上限（秒）
+    app.config['DB_RETRY_MAX_ATTEMPTS'] = int(os.getenv('DB_RETRY_MAX_ATTEMPTS', 3))
+    app.config['DB_RETRY_BASE_DELAY'] = float(os.getenv('DB_RETRY_BASE_DELAY', 0.05))
+    app.config['DB_RETRY_MAX_DELAY'] = float(os.getenv('DB_RETRY_MAX_DELAY', 1.0))
+    # 订单号生成器工作进程ID（0~1023）：不配置时从数据库租用空闲ID；配置后每个进程必须不同，冲突时报错
+    app.config['ORDER_WORKER_ID'] = os.getenv('ORDER_WORKER_ID')
+    # 工作进程ID租约有效期（秒），进程异常退出后其ID到期才可被其他进程租用
+    app.config['ORDER_WORKER_LEASE_TTL'] = int(os.getenv('ORDER_WORKER_LEASE_TTL', 600))
+    # 用户收藏集合缓存有效期（秒），0 表示关闭；多进程部署时为其他进程写入后的最大陈旧时间
+    app.config['FAVORITE_CACHE_TTL'] = float(os.getenv('FAVORITE_CACHE_TTL', 0))
+    # 接口响应缓存：memory（进程内）| sqlite（同主机多进程共享文件）| none
+    app.config['RESPONSE_CACHE_BACKEND'] = os.getenv('RESPONSE_CACHE_BACKEND', 'memory')
+    app.config['RESPONSE_CACHE_MAX_BYTES'] = int(os.getenv('RESPONSE_CACHE_MAX_BYTES', 32 * 1024 * 1024))
+    if os.getenv('RESPONSE_CACHE_PATH'):
+        app.config['RESPONSE_CACHE_PATH'] = os.getenv('RESPONSE_CACHE_PATH')
+    # 首页推荐排行快照：后台刷新间隔（秒）、时间衰减半衰期（天）
+    app.config['FEATURED_REFRESH_INTERVAL'] = float(os.getenv('FEATURED_REFRESH_INTERVAL', 300))
+    app.config['FEATURED_HALF_LIFE_DAYS'] = float(os.getenv('FEATURED_HALF_LIFE_DAYS', 14))
+    # 商品热度：半衰期（小时）、检查点文件路径（为空则不持久化）与写入间隔（秒）
+    app.config['TRENDING_HALF_LIFE_HOURS'] = float(os.getenv('TRENDING_HALF_LIFE_HOURS', 24))
+    app.config['TRENDING_CHECKPOINT_PATH'] = os.getenv('TRENDING_CHECKPOINT_PATH', os.path.join(app.instance_path, 'trending.bin'))
+    app.config['TRENDING_CHECKPOINT_INTERVAL'] = float(os.getenv('TRENDING_CHECKPOINT_INTERVAL', 60))
+    # “经常一起购买”近邻文件路径（由 flask build-recommendations 离线构建）
+    app.config['RECOMMEND_PATH'] = os.getenv('RECOMMEND_PATH', os.path.join(app.instance_path, 'copurchase.json'))
+    # 密码加密：bcrypt 工作因子（修改后用户下次登录时自动重新加密）、每个 Web 工作进程的计算进程池大小
+    # （0 表示在请求线程中计算，默认 CPU 核数 / WEB_CONCURRENCY）、最大排队数与工作进程启动方式（forkserver / spawn）
+    app.config['BCRYPT_ROUNDS'] = int(os.getenv('BCRYPT_ROUNDS', 12))
+    app.config['PASSWORD_POOL_WORKERS'] = int(os.getenv('PASSWORD_POOL_WORKERS', default_pool_workers()))
+    app.config['PASSWORD_POOL_MAX_PENDING'] = int(os.getenv('PASSWORD_POOL_MAX_PENDING', app.config['PASSWORD_POOL_WORKERS'] * 4))
+    app.config['PASSWORD_POOL_START_METHOD'] = os.getenv('PASSWORD_POOL_START_METHOD', DEFAULT_START_METHOD)
+    # 已验证 JWT Token 缓存容量（0 表示每次请求都重新验签）
+    app.config['TOKEN_CACHE_SIZE'] = int(os.getenv('TOKEN_CACHE_SIZE', 10000))
+    # Token 注销列表：从数据库增量同步的间隔（秒，即其他进程登出后的最大生效延迟）
+    app.config['TOKEN_REVOCATION_REFRESH_INTERVAL'] = float(os.getenv('TOKEN_REVOCATION_REFRESH_INTERVAL', 5))
+    # 增量同步重读的时间窗口（秒），覆盖注销事务的提交延迟与主机间时钟偏差
+    app.config['TOKEN_REVOCATION_CATCH_UP_OVERLAP'] = float(os.getenv('TOKEN_REVOCATION_CATCH_UP_OVERLAP', 60))
+    # 登录/注册/下单限流：memory（进程内）| sqlite（同主机多进程共享文件）| none
+    app.config['RATE_LIMIT_BACKEND'] = os.getenv('RATE_LIMIT_BACKEND', 'memory')
+    if os.getenv('RATE_LIMIT_PATH'):
+        app.config['RATE_LIMIT_PATH'] = os.getenv('RATE_LIMIT_PATH')
+    # 管理员用户ID（逗号分隔），可调用 /api/admin 下的运维接口
+    app.config['ADMIN_USER_IDS'] = {
+        int(user_id) for user_id in os.getenv('ADMIN_USER_IDS', '').split(',') if user_id.strip().isdigit()
+    }
     # 可选：开启数据库查询日志（开发环境调试用）
     # app.config['SQLALCHEMY_ECHO'] = True
 
     # 3. 注册 SQLAlchemy 实例（将 db 与 Flask 应用绑定）
     db.init_app(app)
     migrate.init_app(app, db)  # 初始化 Flask-Migrate，支持数据库迁移
+    view_counter.init_app(app)  # 浏览量写回缓冲（退出时自动写回）
+    search_engine.init_app(app)  # 商品全文搜索索引（SEARCH_INDEX_PATH 持久化）
+    count_cache.init_app(app)  # 分页列表总数缓存
+    order_number_generator.init_app(app)  # Snowflake 订单号生成器
+    favorite_cache.init_app(app)  # 用户收藏集合缓存（列表页内联收藏状态）
+    response_cache.init_app(app)  # 接口响应缓存（LRU + TTL + 标签失效）
+    featured_ranking.init_app(app)  # 首页推荐排行快照（后台定期刷新）
+    trending_engine.init_app(app)  # 商品热度（时间衰减计数器 + 分类榜单，定期写检查点）
+    recommender.init_app(app)  # “经常一起购买”推荐（读取离线构建的近邻文件）
+    password_pool.init_app(app)  # bcrypt 密码计算进程池（有界排队）
+    token_cache.init_app(app)  # 已验证 JWT Token 缓存（LRU，按 exp 过期）
+    token_revocations.init_app(app)  # Token 注销列表（布隆过滤器 + 精确集合，增量同步）
+    rate_limiter.init_app(app)  # 接口限流（令牌桶，按IP/账号/用户）
     
     # 4. 注册所有API蓝图
     from app.api.auth import auth_bp
@@ -62,6 +148,7 @@ def create_app():
     from app.api.favorites import favorites_bp  # 添加收藏蓝图导入
     from app.api.upload import upload_bp        # 文件上传蓝图
     from app.api.addresses import addresses_bp  # 地址蓝图
+    from app.api.admin import admin_bp          # 管理/运维蓝图
 
     app.register_blueprint(items_bp)
     app.register_blueprint(auth_bp)
@@ -71,13 +158,18 @@ def create_app():
     app.register_blueprint(favorites_bp)  # 注册收藏蓝图
     app.register_blueprint(upload_bp)      # 注册上传蓝图
     app.register_blueprint(addresses_bp)   # 注册地址蓝图
+    app.register_blueprint(admin_bp)       # 注册管理蓝图
+
+    print("API蓝图注册完成: auth, users, items, orders, cart, favorites, upload, addresses, admin")  # 添加日志
 
-    print("API蓝图注册完成: auth, users, items, orders, cart, favorites, upload, addresses")  # 添加日志
+    # 5. 注册命令行命令（flask rebuild-ratings 等）
+    from app.commands import register_commands
+    register_commands(app)
 
-    # 5. 注册路由（若存在路由注册函数）
+    # 6. 注册路由（若存在路由注册函数）
     if register_routes is not None:
         register_routes(app)
         print("页面路由注册成功！")
 
-    # 6. 返回配置完整的应用实例
+    # 7. 返回配置完整的应用实例
     return app
\ No newline at end of file
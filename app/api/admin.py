@@ -0,0 +1,61 @@
+"""
+管理/运维路由层
+仅管理员（配置 ADMIN_USER_IDS）可访问
+"""
+from flask import Blueprint
+from app.utils.response import APIResponse
+from app.utils.decorators import require_auth, require_admin
+from app.services.featured_ranking import featured_ranking
+from app.utils.password_helper import password_pool
+from app.utils.db_retry import retry_metrics
+
+admin_bp = Blueprint('admin', __name__, url_prefix='/api/admin')
+
+# -------------------------- 1. 首页推荐快照状态 --------------------------
+@admin_bp.route('/featured/status', methods=['GET'])
+@require_auth
+@require_admin
+def featured_status():
+    """查看首页推荐排行快照的构建时间、年龄、大小"""
+    return APIResponse.success(
+        message='获取成功',
+        data=featured_ranking.status()
+    )
+
+# -------------------------- 2. 强制刷新首页推荐快照 --------------------------
+@admin_bp.route('/featured/refresh', methods=['POST'])
+@require_auth
+@require_admin
+def featured_refresh():
+    """立即重新计算首页推荐排行"""
+    try:
+        featured_ranking.refresh()
+    except Exception as e:
+        return APIResponse.server_error(message=f"刷新失败: {str(e)}")
+
+    return APIResponse.success(
+        message='刷新成功',
+        data=featured_ranking.status()
+    )
+
+# -------------------------- 3. 密码计算进程池状态 --------------------------
+@admin_bp.route('/password-pool/status', methods=['GET'])
+@require_auth
+@require_admin
+def password_pool_status():
+    """查看密码计算进程池的排队数、拒绝次数与各操作耗时分位数"""
+    return APIResponse.success(
+        message='获取成功',
+        data=password_pool.stats()
+    )
+
+# -------------------------- 4. 数据库死锁重试统计 --------------------------
+@admin_bp.route('/db-retry/status', methods=['GET'])
+@require_auth
+@require_admin
+def db_retry_status():
+    """查看各事务函数的调用、死锁重试、重试后成功与重试耗尽次数"""
+    return APIResponse.success(
+        message='获取成功',
+        data=retry_metrics.snapshot()
+    )
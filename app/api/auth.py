@@ -3,16 +3,21 @@
 用户认证路由层
 对应 API.user.register / login / logout 接口
 """
-from flask import Blueprint, request
+from flask import Blueprint, request, session, g
 from app.utils.response import APIResponse
 from app.services.user_service import UserService
-from app.middleware.auth_middleware import auth_required
+from app.services.cart_service import CartService
+from app.middleware.auth_middleware import auth_required, get_request_token
+from app.utils.jwt_helper import token_cache
+from app.utils.token_revocation import token_revocations
+from app.utils.rate_limiter import rate_limiter, json_field_key, combined_key, remote_addr_key
 import re
 
 auth_bp = Blueprint('auth', __name__, url_prefix='/api/user')
 
 # -------------------------- 1. 用户注册 --------------------------
 @auth_bp.route('/register', methods=['POST'])
+@rate_limiter.limit('register_ip', message='注册过于频繁，请稍后重试')
 def register():
     """
     API.user.register 接口实现
@@ -52,6 +57,8 @@ def register():
 
     # 调用服务层处理注册
     result = UserService.register_user(username, email, password)
+    if result.get('retry_after'):
+        return APIResponse.too_many_requests(message=result['message'], retry_after=result['retry_after'])
     if not result['success']:
         return APIResponse.error(message=result['message'], code=400)
 
@@ -63,11 +70,17 @@ def register():
 
 # -------------------------- 2. 用户登录 --------------------------
 @auth_bp.route('/login', methods=['POST'])
+@rate_limiter.limit('login_ip', message='登录尝试过于频繁，请稍后重试')
+@rate_limiter.limit_failures('login_account_global', key=json_field_key('username'),
+                             message='该账号登录失败次数过多，请稍后重试')
+@rate_limiter.limit_failures('login_account', key=combined_key(json_field_key('username'), remote_addr_key),
+                             message='该账号登录失败次数过多，请稍后重试')
 def login():
     """
     API.user.login 接口实现
     请求参数：username/password（username可为用户名或邮箱）
     响应：token + 用户信息
+    按IP限流；账号按 (账号, IP) 与账号两条规则只统计登录失败，超出时在查库与密码校验之前返回429
     """
     data = request.json or {}
     username = data.get('username', '').strip()
@@ -81,9 +94,18 @@ def login():
 
     # 调用服务层处理登录
     result = UserService.login_user(username, password)
+    if result.get('retry_after'):
+        return APIResponse.too_many_requests(message=result['message'], retry_after=result['retry_after'])
     if not result['success']:
         return APIResponse.auth_error(message=result['message'])
 
+    # 合并未登录时加入 Session 的购物车（合并成功后才清除，失败时保留以便下次登录重试）
+    session_cart = session.get('cart')
+    if session_cart:
+        merged, _, _ = CartService.merge_session_cart(result['data']['user']['id'], session_cart)
+        if merged:
+            session.pop('cart', None)
+
     # 返回成功响应
     return APIResponse.success(
         message='登录成功',
@@ -96,9 +118,13 @@ def login():
 def logout():
     """
     API.user.logout 接口实现
-    注：前端可自行清除Token，后端无需额外处理，仅返回成功响应
+    将当前 Token 的 jti 写入注销列表，Token 在过期前立即失效（升级前签发的不含 jti 的 Token 仍需等待过期）
     """
-    # 若需后端实现Token黑名单，可在此处添加逻辑
+    payload = token_cache.verify(get_request_token())
+    if payload and payload.get('jti'):
+        if not token_revocations.revoke(payload['jti'], payload.get('exp'), g.user_id):
+            return APIResponse.server_error(message='登出失败，请稍后重试')
+
     return APIResponse.success(
         message='登出成功',
         data={}
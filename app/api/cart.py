@@ -1,134 +1,152 @@
 """
 购物车API接口
-处理基于Session的购物车操作
-注意：购物车数据存储在Session中，不存储在数据库
+已登录用户的购物车存储在 cart_items 表；未登录用户暂存在 Session 中（仅商品ID与数量），登录时自动合并
+写操作只返回被修改的购物车行，完整内容通过 GET /api/cart 获取
 """
-from flask import Blueprint, request, session
+from flask import Blueprint, request, session, g
 from app.utils.response import APIResponse
+from app.services.cart_service import CartService
+from app.middleware.auth_middleware import optional_auth
+
+cart_bp = Blueprint('cart_api', __name__, url_prefix='/api/cart')
+
+
+def _parse_quantity(value):
+    """校验数量：必须为正整数，返回 None 表示非法"""
+    if isinstance(value, bool) or not isinstance(value, int) or value <= 0:
+        return None
+    return value
+
+
+def _session_cart():
+    """读取未登录用户的 Session 购物车 {item_id: quantity}"""
+    return CartService.normalize_session_cart(session.get('cart'))
+
+
+def _save_session_cart(quantities):
+    """写回 Session 购物车（JSON 键必须为字符串）"""
+    session['cart'] = {str(item_id): quantity for item_id, quantity in quantities.items()}
 
-cart_bp = Blueprint('cart_api', __name__, url_prefix='/cart')
 
 # -------------------------- 1. 获取购物车 --------------------------
-@cart_bp.route('/', methods=['GET'])
+@cart_bp.route('', methods=['GET'])
+@optional_auth
 def get_cart():
-    """获取购物车内容"""
-    cart = session.get('cart', [])
+    """获取购物车内容（每行按商品当前价格/库存重新校验，含 flags 与 purchasable）"""
+    if g.user_id:
+        cart = CartService.get_cart(g.user_id)
+    else:
+        cart = CartService.price_lines(_session_cart())
     return APIResponse.success(
         message='获取成功',
-        data={'items': cart, 'total': len(cart)}
+        data={'items': cart, 'total': len(cart), 'summary': CartService.summarize(cart)}
     )
 
 # -------------------------- 2. 添加商品到购物车 --------------------------
 @cart_bp.route('/add', methods=['POST'])
+@optional_auth
 def add_to_cart():
-    """添加商品到购物车"""
-    data = request.json or {}
+    """添加商品到购物车（只需 itemId 与 quantity，商品信息以数据库为准）"""
+    data = request.get_json(silent=True) or {}
     item_id = data.get('itemId')
-    title = data.get('title', '')
-    price = data.get('price', 0)
-    quantity = data.get('quantity', 1)
-    image = data.get('image', '')
+    quantity = _parse_quantity(data.get('quantity', 1))
 
-    if not item_id:
+    if not isinstance(item_id, int) or isinstance(item_id, bool):
         return APIResponse.validation_error(errors={'itemId': '商品ID不能为空'})
-
-    if quantity <= 0:
-        return APIResponse.validation_error(errors={'quantity': '数量必须大于0'})
-
-    # 获取当前购物车
-    cart = session.get('cart', [])
-
-    # 检查商品是否已在购物车中
-    for item in cart:
-        if item['itemId'] == item_id:
-            item['quantity'] += quantity
-            session['cart'] = cart
-            return APIResponse.success(
-                message='已更新购物车数量',
-                data={'cart': cart}
-            )
-
-    # 添加新商品到购物车
-    cart.append({
-        'itemId': item_id,
-        'title': title,
-        'price': price,
-        'quantity': quantity,
-        'image': image
-    })
-
-    session['cart'] = cart
+    if quantity is None:
+        return APIResponse.validation_error(errors={'quantity': '数量必须为正整数'})
+
+    if g.user_id:
+        success, message, line = CartService.add_to_cart(g.user_id, item_id, quantity)
+        if not success:
+            return APIResponse.error(message=message)
+        return APIResponse.success(message=message, data=line)
+
+    error, _ = CartService.check_item(item_id)
+    if error:
+        return APIResponse.error(message=error)
+    cart = _session_cart()
+    cart[item_id] = cart.get(item_id, 0) + quantity
+    _save_session_cart(cart)
     return APIResponse.success(
         message='已添加到购物车',
-        data={'cart': cart}
+        data={'itemId': item_id, 'quantity': cart[item_id]}
     )
 
 # -------------------------- 3. 更新购物车商品数量 --------------------------
 @cart_bp.route('/update/<int:item_id>', methods=['POST'])
+@optional_auth
 def update_cart_item(item_id):
     """更新购物车中商品的数量"""
-    data = request.json or {}
-    quantity = data.get('quantity', 1)
+    data = request.get_json(silent=True) or {}
+    quantity = _parse_quantity(data.get('quantity', 1))
 
-    if quantity <= 0:
-        return APIResponse.validation_error(errors={'quantity': '数量必须大于0'})
+    if quantity is None:
+        return APIResponse.validation_error(errors={'quantity': '数量必须为正整数'})
 
-    cart = session.get('cart', [])
+    if g.user_id:
+        success, message, line = CartService.update_cart_item(g.user_id, item_id, quantity)
+        if not success:
+            return APIResponse.not_found(message=message)
+        return APIResponse.success(message=message, data=line)
 
-    for item in cart:
-        if item['itemId'] == item_id:
-            item['quantity'] = quantity
-            session['cart'] = cart
-            return APIResponse.success(
-                message='已更新数量',
-                data={'cart': cart}
-            )
-
-    return APIResponse.not_found(message='商品不在购物车中')
+    cart = _session_cart()
+    if item_id not in cart:
+        return APIResponse.not_found(message='商品不在购物车中')
+    cart[item_id] = quantity
+    _save_session_cart(cart)
+    return APIResponse.success(
+        message='已更新数量',
+        data={'itemId': item_id, 'quantity': quantity}
+    )
 
 # -------------------------- 4. 从购物车移除商品 --------------------------
 @cart_bp.route('/remove/<int:item_id>', methods=['POST'])
+@optional_auth
 def remove_from_cart(item_id):
     """从购物车中移除商品"""
-    cart = session.get('cart', [])
-
-    # 过滤掉要删除的商品
-    new_cart = [item for item in cart if item['itemId'] != item_id]
-
-    if len(new_cart) == len(cart):
+    if g.user_id:
+        success, message = CartService.remove_from_cart(g.user_id, item_id)
+        if not success:
+            return APIResponse.not_found(message=message)
+        return APIResponse.success(message=message, data={'itemId': item_id})
+
+    cart = _session_cart()
+    if cart.pop(item_id, None) is None:
         return APIResponse.not_found(message='商品不在购物车中')
-
-    session['cart'] = new_cart
+    _save_session_cart(cart)
     return APIResponse.success(
         message='已从购物车移除',
-        data={'cart': new_cart}
+        data={'itemId': item_id}
     )
 
 # -------------------------- 5. 清空购物车 --------------------------
 @cart_bp.route('/clear', methods=['POST'])
+@optional_auth
 def clear_cart():
     """清空购物车"""
-    session['cart'] = []
+    if g.user_id:
+        success, message = CartService.clear_cart(g.user_id)
+        if not success:
+            return APIResponse.server_error(message=message)
+    else:
+        session.pop('cart', None)
     return APIResponse.success(
         message='购物车已清空',
-        data={'cart': []}
+        data={}
     )
 
 # -------------------------- 6. 获取购物车统计信息 --------------------------
 @cart_bp.route('/stats', methods=['GET'])
+@optional_auth
 def get_cart_stats():
-    """获取购物车统计信息"""
-    cart = session.get('cart', [])
-
-    total_items = sum(item['quantity'] for item in cart)
-    total_price = sum(item['price'] * item['quantity'] for item in cart)
-    total_kinds = len(cart)
+    """获取购物车统计信息（金额按商品当前价格计算，仅统计可结算的行）"""
+    if g.user_id:
+        stats = CartService.get_cart_stats(g.user_id)
+    else:
+        stats = CartService.summarize(CartService.price_lines(_session_cart()))
 
     return APIResponse.success(
         message='获取成功',
-        data={
-            'count': total_items,
-            'items': total_kinds,
-            'total': round(total_price, 2)
-        }
+        data=stats
     )
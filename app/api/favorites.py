@@ -9,6 +9,9 @@ from app.services.favorite_service import FavoriteService
 
 favorites_bp = Blueprint('favorites_api', __name__, url_prefix='/api/favorites')
 
+# 批量检查收藏状态单次最多商品数
+MAX_BATCH_CHECK = 200
+
 
 # -------------------------- 1. 添加收藏 --------------------------
 @favorites_bp.route('/add/<int:item_id>', methods=['POST'])
@@ -84,6 +87,37 @@ def check_favorite(item_id):
         return APIResponse.server_error(message=f"检查失败: {str(e)}")
 
 
+# -------------------------- 4.1 批量检查是否已收藏 --------------------------
+@favorites_bp.route('/check', methods=['POST'])
+@auth_required
+def check_favorites_batch():
+    """
+    批量检查商品收藏状态（商品列表页一次请求获取所有卡片的收藏状态）
+    请求体：{"item_ids": [1, 2, 3]}
+    响应 data：{"favorites": {"1": true, "2": false, "3": false}}
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        item_ids = data.get('item_ids')
+
+        if not isinstance(item_ids, list):
+            return APIResponse.validation_error(errors={'item_ids': '必须为商品ID列表'})
+        if len(item_ids) > MAX_BATCH_CHECK:
+            return APIResponse.validation_error(errors={'item_ids': f'一次最多检查{MAX_BATCH_CHECK}个商品'})
+        if not all(isinstance(item_id, int) and not isinstance(item_id, bool) for item_id in item_ids):
+            return APIResponse.validation_error(errors={'item_ids': '商品ID必须为整数'})
+
+        favorited = FavoriteService.get_favorited_ids(g.user_id, item_ids)
+
+        return APIResponse.success(
+            message='获取成功',
+            data={'favorites': {str(item_id): item_id in favorited for item_id in item_ids}}
+        )
+
+    except Exception as e:
+        return APIResponse.server_error(message=f"检查失败: {str(e)}")
+
+
 # -------------------------- 5. 获取用户收藏列表 --------------------------
 @favorites_bp.route('/list', methods=['GET'])
 @auth_required
@@ -101,13 +135,14 @@ def get_favorite_list():
             limit = 20
 
         # 获取收藏列表
-        items, total = FavoriteService.get_favorite_items(g.user_id, page, limit)
+        items, total, total_exact = FavoriteService.get_favorite_items(g.user_id, page, limit)
 
         return APIResponse.success(
             message='获取成功',
             data={
                 'items': items,
                 'total': total,
+                'total_exact': total_exact,
                 'page': page,
                 'limit': limit
             }
@@ -5,12 +5,31 @@
 from flask import Blueprint, request, g
 from app.utils.response import APIResponse
 from app.services.item_service import ItemService
-from app.middleware.auth_middleware import auth_required
+from app.middleware.auth_middleware import auth_required, optional_auth
+from app.services.favorite_service import FavoriteService
+from app.utils.decorators import cache_response
+from app.utils.view_counter import view_counter
+from app.services.review_service import ReviewService
+from app.services.trending_engine import trending_engine
 
 items_bp = Blueprint('items', __name__, url_prefix='/api/item')
 
+# 商品列表支持的排序方式与总数统计方式
+VALID_SORTS = ['latest', 'popular', 'price-asc', 'price-desc', 'relevance']
+VALID_COUNT_MODES = ['exact', 'none']
+# 批量库存检查单次最多商品数
+MAX_STOCK_CHECK_ITEMS = 5000
+
+
+def _record_cached_view(item_id):
+    """商品详情命中响应缓存时仍计入浏览量与热度"""
+    view_counter.record(item_id)
+    trending_engine.record(item_id, 'view')
+
 # -------------------------- 1. 获取首页推荐商品 --------------------------
 @items_bp.route('/getFeatured', methods=['POST', 'GET'])
+@optional_auth
+@cache_response(ttl=60, tags=['featured', 'favorites:{current_user}'], scope='user')
 def get_featured():
     """API.item.getFeatured 接口实现"""
     # 兼容 GET/POST，两种方式都支持 limit 参数
@@ -29,6 +48,10 @@ def get_featured():
     if not result['success']:
         return APIResponse.error(message=result['message'])
 
+    # 已登录用户：内联标注收藏状态
+    if g.user_id:
+        FavoriteService.mark_favorited(g.user_id, result['data'])
+
     # 返回成功响应
     return APIResponse.success(
         message='获取成功',
@@ -37,6 +60,7 @@ def get_featured():
 
 # -------------------------- 2. 搜索商品 --------------------------
 @items_bp.route('/search', methods=['POST'])
+@optional_auth
 def search():
     """API.item.search 接口实现"""
     data = request.json or {}
@@ -49,19 +73,26 @@ def search():
     max_price = data.get('maxPrice', None)
     sort = data.get('sort', 'latest').strip()
     seller_id = data.get('seller_id', None)
+    # 游标分页：请求中带 cursor 字段即启用（第一页传 null 或空串），后续页传上次返回的 next_cursor
+    use_cursor = 'cursor' in data
+    cursor = data.get('cursor') or None
+    count_mode = data.get('count', 'exact')
 
     # 验证分页参数
     if not isinstance(page, int) or page <= 0:
         page = 1
     if not isinstance(limit, int) or limit <= 0:
         limit = 12
+    if cursor is not None and not isinstance(cursor, str):
+        return APIResponse.validation_error(errors={'cursor': '无效的分页游标'})
+    if count_mode not in VALID_COUNT_MODES:
+        count_mode = 'exact'
 
     # 验证搜索类型和排序方式
     valid_search_types = ['title', 'seller', 'category']
-    valid_sorts = ['latest', 'popular', 'price-asc', 'price-desc']
     if search_type not in valid_search_types:
         search_type = 'title'
-    if sort not in valid_sorts:
+    if sort not in VALID_SORTS:
         sort = 'latest'
 
     # 调用服务层
@@ -74,11 +105,18 @@ def search():
         min_price=min_price,
         max_price=max_price,
         sort=sort,
-        seller_id=seller_id
+        seller_id=seller_id,
+        cursor=cursor,
+        use_cursor=use_cursor,
+        count_mode=count_mode
     )
     if not result['success']:
         return APIResponse.error(message=result['message'])
 
+    # 已登录用户：内联标注收藏状态
+    if g.user_id:
+        FavoriteService.mark_favorited(g.user_id, result['data']['items'])
+
     # 返回成功响应
     return APIResponse.success(
         message='搜索成功',
@@ -87,23 +125,45 @@ def search():
 
 # -------------------------- 3. 按分类获取商品 --------------------------
 @items_bp.route('/getByCategory/<category>', methods=['POST'])
+@optional_auth
+@cache_response(ttl=30, tags=['category:{category}', 'favorites:{current_user}'], scope='user')
 def get_by_category(category):
     """API.item.getByCategory 接口实现"""
     data = request.json or {}
     page = data.get('page', 1)
     limit = data.get('limit', 12)
+    sort = data.get('sort', 'latest')
+    use_cursor = 'cursor' in data
+    cursor = data.get('cursor') or None
+    count_mode = data.get('count', 'exact')
 
     # 验证分页参数
     if not isinstance(page, int) or page <= 0:
         page = 1
     if not isinstance(limit, int) or limit <= 0:
         limit = 12
+    if sort not in VALID_SORTS:
+        sort = 'latest'
+    if cursor is not None and not isinstance(cursor, str):
+        return APIResponse.validation_error(errors={'cursor': '无效的分页游标'})
+    if count_mode not in VALID_COUNT_MODES:
+        count_mode = 'exact'
 
     # 调用服务层
-    result = ItemService.get_items_by_category(category, page, limit)
+    result = ItemService.get_items_by_category(
+        category, page, limit,
+        sort=sort,
+        cursor=cursor,
+        use_cursor=use_cursor,
+        count_mode=count_mode
+    )
     if not result['success']:
         return APIResponse.error(message=result['message'])
 
+    # 已登录用户：内联标注收藏状态
+    if g.user_id:
+        FavoriteService.mark_favorited(g.user_id, result['data']['items'])
+
     # 返回成功响应
     return APIResponse.success(
         message='获取成功',
@@ -112,6 +172,7 @@ def get_by_category(category):
 
 # -------------------------- 4. 获取商品详情 --------------------------
 @items_bp.route('/getDetail/<int:item_id>', methods=['GET'])
+@cache_response(ttl=30, tags=['item:{item_id}'], on_hit=_record_cached_view)
 def get_detail(item_id):
     """API.item.getDetail 接口实现"""
     # 调用服务层
@@ -119,6 +180,9 @@ def get_detail(item_id):
     if not result['success']:
         return APIResponse.error(message=result['message'])
 
+    # 经常一起购买的商品（离线构建的近邻文件）
+    result['data']['bought_together'] = ReviewService.get_bought_together(item_id)['data']
+
     # 返回成功响应
     return APIResponse.success(
         message='获取成功',
@@ -184,8 +248,18 @@ def delete(item_id):
 # -------------------------- 8. 检查商品库存 --------------------------
 @items_bp.route('/checkStock', methods=['POST'])
 def check_stock():
-    """API.item.checkStock 接口实现"""
-    item_list = request.json or []
+    """
+    API.item.checkStock 接口实现
+    请求体：[{"itemId": 1, "quantity": 2}, ...] 或 {"items": [...]}，单次最多 MAX_STOCK_CHECK_ITEMS 条
+    """
+    item_list = request.get_json(silent=True) or []
+    if isinstance(item_list, dict):
+        item_list = item_list.get('items') or []
+
+    if not isinstance(item_list, list) or not all(isinstance(entry, dict) for entry in item_list):
+        return APIResponse.validation_error(errors={'items': '必须为商品列表'})
+    if len(item_list) > MAX_STOCK_CHECK_ITEMS:
+        return APIResponse.validation_error(errors={'items': f'一次最多检查{MAX_STOCK_CHECK_ITEMS}个商品'})
 
     # 调用服务层
     result = ItemService.check_stock(item_list)
@@ -196,4 +270,33 @@ def check_stock():
     return APIResponse.success(
         message='检查成功',
         data=result['data']
-    )
\ No newline at end of file
+    )
+
+# -------------------------- 9. 获取热门商品 --------------------------
+@items_bp.route('/getTrending', methods=['GET'])
+@optional_auth
+@cache_response(ttl=30, tags=['trending', 'favorites:{current_user}'], scope='user')
+def get_trending():
+    """
+    热门商品（按浏览/收藏/下单的时间衰减热度排序）
+    查询参数：limit（默认12），category（可选，为空表示全站）
+    """
+    limit = request.args.get('limit', default=12, type=int)
+    if not isinstance(limit, int) or limit <= 0:
+        limit = 12
+    category = request.args.get('category', '').strip() or None
+
+    # 调用服务层
+    result = ReviewService.get_popular_items(limit, category)
+    if not result['success']:
+        return APIResponse.error(message=result['message'])
+
+    # 已登录用户：内联标注收藏状态
+    if g.user_id:
+        FavoriteService.mark_favorited(g.user_id, result['data'])
+
+    # 返回成功响应
+    return APIResponse.success(
+        message='获取成功',
+        data=result['data']
+    )
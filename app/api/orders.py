@@ -3,17 +3,20 @@
 处理订单创建、查询、取消等操作（最复杂，涉及事务处理）
 """
 
+from datetime import datetime
 from flask import Blueprint, request, g
 from app.services.order_service import OrderService
 from app.middleware.auth_middleware import auth_required
+from app.utils.rate_limiter import rate_limiter, current_user_key
 from app.utils.decorators import validate_request
-from app.utils.response import APIResponse
+from app.utils.response import APIResponse, success_response, error_response, not_found_response
 
 orders_bp = Blueprint('orders_api', __name__, url_prefix='/api/orders')
 
 
 @orders_bp.route('/', methods=['POST'])
 @auth_required
+@rate_limiter.limit('create_order_user', key=current_user_key, message='下单过于频繁，请稍后重试')
 @validate_request({
     'items': {
         'type': 'list',
@@ -598,6 +601,62 @@ def get_order_statistics():
         )
 
 
+@orders_bp.route('/seller/statistics', methods=['GET'])
+@auth_required
+def get_seller_statistics():
+    """
+    获取当前用户作为卖家的销售统计
+    GET /orders/seller/statistics?start_date=2024-01-01&end_date=2024-01-31
+
+    查询参数（均可选，格式 YYYY-MM-DD，包含首尾两天）：
+    - start_date: 起始日期
+    - end_date: 截止日期
+
+    响应：
+    {
+        "code": 0,
+        "message": "获取销售统计成功",
+        "data": {
+            "start_date": "2024-01-01",
+            "end_date": "2024-01-31",
+            "total_orders": 12,
+            "paid_orders": 9,
+            "gmv": 3580.00,
+            "average_order_value": 397.78,
+            "orders_by_status": {"pending": 2, "paid": 1, "shipped": 3, "completed": 5, "cancelled": 1}
+        },
+        "timestamp": 1705300200
+    }
+    """
+    try:
+        dates = {}
+        for field in ('start_date', 'end_date'):
+            value = request.args.get(field, '').strip()
+            if not value:
+                dates[field] = None
+                continue
+            try:
+                dates[field] = datetime.strptime(value, '%Y-%m-%d').date()
+            except ValueError:
+                return APIResponse.validation_error(errors={field: '日期格式应为YYYY-MM-DD'})
+
+        if dates['start_date'] and dates['end_date'] and dates['start_date'] > dates['end_date']:
+            return APIResponse.validation_error(errors={'start_date': '起始日期不能晚于截止日期'})
+
+        success, result = OrderService.get_seller_statistics(
+            seller_id=g.user_id,
+            start_date=dates['start_date'],
+            end_date=dates['end_date']
+        )
+
+        if success:
+            return APIResponse.success(data=result, message="获取销售统计成功")
+        return APIResponse.error(message=result)
+
+    except Exception as e:
+        return APIResponse.server_error(message=f"获取销售统计失败: {str(e)}")
+
+
 # ==================== 错误处理器 ====================
 @orders_bp.errorhandler(400)
 def handle_bad_request(error):
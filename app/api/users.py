@@ -6,6 +6,7 @@ from flask import Blueprint, request, g
 from app.utils.response import APIResponse
 from app.services.user_service import UserService
 from app.middleware.auth_middleware import auth_required
+from app.utils.decorators import cache_response
 
 users_bp = Blueprint('users', __name__, url_prefix='/api/user')
 
@@ -30,6 +31,7 @@ def get_current_user():
 
 # -------------------------- 5. 获取用户资料 --------------------------
 @users_bp.route('/getUserProfile/<int:user_id>', methods=['GET'])
+@cache_response(ttl=60, tags=['user:{user_id}'])
 def get_user_profile(user_id):
     """API.user.getUserProfile 接口实现"""
     # 调用服务层获取用户公开资料
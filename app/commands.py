@@ -0,0 +1,90 @@
+"""
+Flask 命令行命令
+用于数据回填、统计修复等运维操作，执行方式：flask <命令名>
+"""
+import time
+
+import click
+
+
+def register_commands(app):
+    """注册所有自定义命令行命令"""
+
+    @app.cli.command('rebuild-ratings')
+    def rebuild_ratings():
+        """根据 reviews 表批量重建用户评分聚合（user_ratings）"""
+        from app.services.user_service import UserService
+        count = UserService.rebuild_rating_aggregates()
+        click.echo(f'评分聚合重建完成，共 {count} 个用户')
+
+    @app.cli.command('rebuild-search-index')
+    def rebuild_search_index():
+        """从 items 表全量重建商品搜索索引并保存到 SEARCH_INDEX_PATH"""
+        from app.services.search_engine import search_engine
+        count = search_engine.rebuild()
+        click.echo(f'搜索索引重建完成，共 {count} 件商品')
+
+    @app.cli.command('reconcile-favorites')
+    @click.option('--interval', type=float, default=0,
+                  help='每隔多少秒重复执行一次（作为常驻任务运行），默认只执行一次')
+    def reconcile_favorites(interval):
+        """以 favorites 表为准校正 items.favorites 收藏计数"""
+        from app.services.favorite_service import FavoriteService
+        while True:
+            count = FavoriteService.reconcile_favorite_counts()
+            click.echo(f'收藏计数校正完成，修复 {count} 件商品')
+            if interval <= 0:
+                break
+            time.sleep(interval)
+
+    @app.cli.command('build-recommendations')
+    @click.option('--full', is_flag=True, help='忽略上次构建状态，从全部订单重新构建')
+    @click.option('--interval', type=float, default=0,
+                  help='每隔多少秒增量构建一次（作为常驻任务运行），默认只执行一次')
+    def build_recommendations(full, interval):
+        """从 order_items 构建“经常一起购买”近邻文件（默认只处理上次构建之后的新订单）"""
+        from app.models import db
+        from app.services.recommender import recommender
+        while True:
+            try:
+                stats = recommender.build(full=full)
+            finally:
+                # 每轮结束释放会话，下一轮在新事务（新快照）中读取订单
+                db.session.remove()
+            click.echo(
+                f"推荐构建完成：处理 {stats['orders']} 个订单，更新 {stats['updated']} 件商品，"
+                f"共 {stats['items']} 件商品有推荐"
+            )
+            if interval <= 0:
+                break
+            full = False
+            time.sleep(interval)
+
+    @app.cli.command('benchmark-auth')
+    @click.option('--requests', 'count', type=int, default=20000, help='模拟的认证请求次数')
+    def benchmark_auth(count):
+        """对比开启/关闭已验证 Token 缓存时，每个请求的认证耗时"""
+        from flask import request
+        from app.middleware.auth_middleware import AUTH_ENVIRON_KEY, authenticate_request
+        from app.utils.jwt_helper import generate_token, token_cache
+
+        headers = {'Authorization': f'Bearer {generate_token(user_id=1)}'}
+        original_size = app.config['TOKEN_CACHE_SIZE']
+        results = {}
+        try:
+            for label, size in (('无缓存', 0), ('有缓存', max(original_size, 1))):
+                app.config['TOKEN_CACHE_SIZE'] = size
+                token_cache.clear()
+                with app.test_request_context(headers=headers):
+                    started = time.perf_counter()
+                    for _ in range(count):
+                        request.environ.pop(AUTH_ENVIRON_KEY, None)
+                        authenticate_request()
+                    results[label] = (time.perf_counter() - started) / count * 1e6
+        finally:
+            app.config['TOKEN_CACHE_SIZE'] = original_size
+            token_cache.clear()
+
+        for label, micros in results.items():
+            click.echo(f'{label}: 每请求认证耗时 {micros:.2f} µs')
+        click.echo(f"加速比: {results['无缓存'] / results['有缓存']:.1f}x")
@@ -1,56 +1,86 @@
 """
 认证中间件
 处理JWT Token验证和用户认证
+所有认证入口（login_required / auth_required / optional_auth / register_auth_middleware / decorators.require_auth）
+统一经 authenticate_request 验证 Token：读取已验证 Token 缓存并检查是否已注销，同一请求内只验证一次
 """
 
 
 
 from flask import request, g
 from functools import wraps
-from app.utils.jwt_helper import verify_token
+from app.utils.jwt_helper import token_cache
+from app.utils.token_revocation import token_revocations
 from app.utils.response import APIResponse
 
+AUTH_ENVIRON_KEY = 'seu.auth_user_id'
+
+
+def get_request_token():
+    """从 Authorization 头取出 Token（'Bearer <token>'，兼容直接传 Token）"""
+    header = request.headers.get('Authorization', '').strip()
+    if header.startswith('Bearer '):
+        header = header[7:].strip()
+    return header or None
+
+
+def authenticate_request():
+    """
+    验证当前请求携带的 Token
+    :return: 用户ID；未携带或无效时为 None
+    """
+    # 结果保存在本次请求的 environ 中（g 属于应用上下文，测试中可能被多个请求共用）
+    if AUTH_ENVIRON_KEY in request.environ:
+        return request.environ[AUTH_ENVIRON_KEY]
+    user_id = None
+    token = get_request_token()
+    if token:
+        payload = token_cache.verify(token)
+        if payload and not token_revocations.is_revoked(payload.get('jti')):
+            user_id = payload.get('user_id')
+    request.environ[AUTH_ENVIRON_KEY] = user_id
+    return user_id
+
+
 def login_required(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
-        auth_header = request.headers.get('Authorization', '')
-        token = None
-        if auth_header.startswith('Bearer '):
-            token = auth_header[7:]
-        if not token:
+        if not get_request_token():
             return {'success': False, 'message': '未登录或Token缺失'}, 401
-        payload = verify_token(token)
-        if not payload or 'user_id' not in payload:
+        user_id = authenticate_request()
+        if not user_id:
             return {'success': False, 'message': 'Token无效或已过期'}, 401
-        g.user_id = payload['user_id']
+        g.user_id = user_id
         return f(*args, **kwargs)
     return decorated_function
 
 def register_auth_middleware(app):
     @app.before_request
     def inject_user():
-        auth_header = request.headers.get('Authorization', '')
-        token = None
-        if auth_header.startswith('Bearer '):
-            token = auth_header[7:]
-        if token:
-            payload = verify_token(token)
-            if payload and 'user_id' in payload:
-                g.user_id = payload['user_id']
+        user_id = authenticate_request()
+        if user_id:
+            g.user_id = user_id
 
 def auth_required(func):
     """登录认证装饰器"""
-    from functools import wraps
     @wraps(func)
     def wrapper(*args, **kwargs):
-        token = request.headers.get('Authorization', '').replace('Bearer ', '')
-        if not token:
+        if not get_request_token():
             return APIResponse.auth_error(message='请先登录')
         
-        payload = verify_token(token)
-        if not payload:
+        user_id = authenticate_request()
+        if not user_id:
             return APIResponse.auth_error(message='Token无效或已过期')
         
-        g.user_id = payload.get('user_id')
+        g.user_id = user_id
+        return func(*args, **kwargs)
+    return wrapper
+
+
+def optional_auth(func):
+    """可选登录装饰器：携带有效Token时设置 g.user_id，否则按未登录处理"""
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        g.user_id = authenticate_request()
         return func(*args, **kwargs)
-    return wrapper
\ No newline at end of file
+    return wrapper
@@ -2,6 +2,8 @@
 from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime
 from sqlalchemy.orm import validates
+from sqlalchemy import event, inspect
+from sqlalchemy.dialects import mysql, postgresql, sqlite
 
 # 初始化SQLAlchemy实例（后续在Flask应用中注册）
 db = SQLAlchemy()
@@ -88,7 +90,7 @@ class Item(db.Model):
         db.Index('idx_stock', 'stock'),
         db.Index('idx_created_at', 'created_at'),
         db.Index('idx_is_active', 'is_active'),
-        # 全文索引在SQLAlchemy中通常通过数据库直接创建，此处仅做标记
+        # 标题/描述全文检索由 app/services/search_engine.py 的倒排索引提供，不依赖数据库全文索引
         # db.Index('idx_title_description', 'title', 'description', postgresql_using='gin')
     )
 
@@ -214,11 +216,8 @@ class Order(db.Model):
     def generate_order_number(self):
         """生成订单号（如果需要）"""
         if not self.order_number:
-            import time
-            import random
-            timestamp = int(time.time())
-            random_num = random.randint(1000, 9999)
-            self.order_number = f'ORD{timestamp}{random_num}'
+            from app.utils.order_number import generate_order_number
+            self.order_number = generate_order_number()
 
 # -------------------------- 5. 订单明细表（Order_Items）- 关联表 --------------------------
 class OrderItem(db.Model):
@@ -292,3 +291,164 @@ class Review(db.Model):
 
     def __repr__(self):
         return f"<Review(id={self.id}, item_id={self.item_id}, reviewer_id={self.reviewer_id}, reviewee_id={self.reviewee_id}, rating={self.rating})>"
+
+# -------------------------- 8. 用户评分聚合表（User_Ratings）- 统计冗余表 --------------------------
+class UserRating(db.Model):
+    __tablename__ = 'user_ratings'
+
+    # 核心字段：评分总和、评价数量及1-5星分布，随评价写入在同一事务内增量维护
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True, comment='用户ID（被评价者）')
+    rating_sum = db.Column(db.Integer, nullable=False, default=0, comment='评分总和')
+    rating_count = db.Column(db.Integer, nullable=False, default=0, comment='评价数量')
+    star_1 = db.Column(db.Integer, nullable=False, default=0, comment='1星评价数')
+    star_2 = db.Column(db.Integer, nullable=False, default=0, comment='2星评价数')
+    star_3 = db.Column(db.Integer, nullable=False, default=0, comment='3星评价数')
+    star_4 = db.Column(db.Integer, nullable=False, default=0, comment='4星评价数')
+    star_5 = db.Column(db.Integer, nullable=False, default=0, comment='5星评价数')
+    updated_at = db.Column(db.DateTime, default=datetime.now, onupdate=datetime.now, nullable=False, comment='更新时间')
+
+    # 无评价时的默认评分
+    DEFAULT_RATING = 5.0
+
+    @property
+    def average(self) -> float:
+        """平均评分（保留1位小数）"""
+        if not self.rating_count:
+            return self.DEFAULT_RATING
+        return round(self.rating_sum / self.rating_count, 1)
+
+    @property
+    def histogram(self) -> dict:
+        """星级分布 {1: n, ..., 5: n}"""
+        return {star: getattr(self, f'star_{star}') or 0 for star in range(1, 6)}
+
+    def __repr__(self):
+        return f"<UserRating(user_id={self.user_id}, rating_sum={self.rating_sum}, rating_count={self.rating_count})>"
+
+
+# -------------------------- 9. 购物车表（Cart_Items）- 服务端持久化购物车 --------------------------
+class CartItem(db.Model):
+    __tablename__ = 'cart_items'
+
+    # 核心字段：每行只保存商品ID与数量，标题/价格/图片读取时从 items 表关联获取
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True, comment='购物车项ID')
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False, comment='用户ID')
+    item_id = db.Column(db.Integer, db.ForeignKey('items.id', ondelete='CASCADE'), nullable=False, comment='商品ID')
+    quantity = db.Column(db.Integer, nullable=False, default=1, comment='数量')
+    added_price = db.Column(db.Numeric(10, 2), nullable=True, comment='加入时单价（用于提示价格变动）')
+    created_at = db.Column(db.DateTime, default=datetime.now, nullable=False, comment='加入时间')
+    updated_at = db.Column(db.DateTime, default=datetime.now, onupdate=datetime.now, nullable=False, comment='更新时间')
+
+    # 索引定义：(user_id, item_id) 唯一，单行增删改均走该索引
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'item_id', name='uk_cart_user_item'),
+        db.Index('idx_item_id', 'item_id'),
+        db.CheckConstraint('quantity > 0', name='chk_cart_quantity_positive'),
+    )
+
+    def __repr__(self):
+        return f"<CartItem(id={self.id}, user_id={self.user_id}, item_id={self.item_id}, quantity={self.quantity})>"
+
+# -------------------------- 10. 已注销Token表（Revoked_Tokens）- 认证辅助表 --------------------------
+class RevokedToken(db.Model):
+    __tablename__ = 'revoked_tokens'
+
+    # 核心字段：只保存 Token 的 jti 与过期时间，过期后的记录定期清理
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True, comment='记录ID')
+    jti = db.Column(db.String(64), nullable=False, comment='Token唯一标识')
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=True, comment='用户ID')
+    expires_at = db.Column(db.DateTime, nullable=False, comment='Token过期时间（之后可删除该记录）')
+    revoked_at = db.Column(db.DateTime, default=datetime.now, nullable=False, comment='注销时间（增量同步水位）')
+
+    # 索引定义
+    __table_args__ = (
+        db.UniqueConstraint('jti', name='uk_revoked_jti'),
+        db.Index('idx_revoked_expires_at', 'expires_at'),
+        db.Index('idx_revoked_revoked_at', 'revoked_at'),
+    )
+
+    def __repr__(self):
+        return f"<RevokedToken(id={self.id}, jti={self.jti}, user_id={self.user_id}, expires_at={self.expires_at})>"
+
+
+# -------------------------- 11. 订单号工作进程租约表（Order_Worker_Leases）- 订单号辅助表 --------------------------
+class OrderWorkerLease(db.Model):
+    __tablename__ = 'order_worker_leases'
+
+    # 核心字段：每个 Snowflake 工作进程ID（0~1023）同一时刻只租给一个进程，进程运行期间定期续约
+    worker_id = db.Column(db.Integer, primary_key=True, autoincrement=False, comment='工作进程ID（0~1023）')
+    owner = db.Column(db.String(100), nullable=False, comment='持有者（主机名:进程号:随机串）')
+    expires_at = db.Column(db.DateTime, nullable=False, comment='租约到期时间（到期后可被其他进程接管）')
+    acquired_at = db.Column(db.DateTime, default=datetime.now, nullable=False, comment='租用时间')
+
+    # 索引定义
+    __table_args__ = (
+        db.Index('idx_worker_lease_expires_at', 'expires_at'),
+    )
+
+    def __repr__(self):
+        return f"<OrderWorkerLease(worker_id={self.worker_id}, owner={self.owner}, expires_at={self.expires_at})>"
+
+
+def _apply_review_rating(connection, reviewee_id, rating, sign):
+    """
+    在评价所在的事务中增量更新被评价者的评分聚合
+    :param connection: 当前 flush 使用的数据库连接
+    :param reviewee_id: 被评价者ID
+    :param rating: 评分（1-5）
+    :param sign: +1 表示新增评价，-1 表示移除评价
+    """
+    if reviewee_id is None or rating is None:
+        return
+    table = UserRating.__table__
+    values = {
+        'rating_sum': table.c.rating_sum + sign * rating,
+        'rating_count': table.c.rating_count + sign,
+        'updated_at': datetime.now()
+    }
+    star_column = f'star_{rating}'
+    if star_column in table.c:
+        values[star_column] = table.c[star_column] + sign
+
+    if sign < 0:
+        connection.execute(table.update().where(table.c.user_id == reviewee_id).values(**values))
+        return
+
+    # 新增评价：单条 upsert，避免同一用户的两条首个评价并发插入时主键冲突
+    row = {'user_id': reviewee_id, 'rating_sum': rating, 'rating_count': 1, 'updated_at': datetime.now()}
+    row.update({f'star_{star}': int(star == rating) for star in range(1, 6)})
+    dialect = connection.dialect.name
+    if dialect == 'mysql':
+        connection.execute(mysql.insert(table).values(**row).on_duplicate_key_update(**values))
+    elif dialect in ('sqlite', 'postgresql'):
+        dialect_insert = sqlite.insert if dialect == 'sqlite' else postgresql.insert
+        connection.execute(
+            dialect_insert(table).values(**row).on_conflict_do_update(index_elements=['user_id'], set_=values)
+        )
+    else:
+        result = connection.execute(table.update().where(table.c.user_id == reviewee_id).values(**values))
+        if result.rowcount == 0:
+            connection.execute(table.insert().values(**row))
+
+
+@event.listens_for(Review, 'after_insert')
+def _review_after_insert(mapper, connection, target):
+    _apply_review_rating(connection, target.reviewee_id, target.rating, 1)
+
+
+@event.listens_for(Review, 'after_delete')
+def _review_after_delete(mapper, connection, target):
+    _apply_review_rating(connection, target.reviewee_id, target.rating, -1)
+
+
+@event.listens_for(Review, 'after_update')
+def _review_after_update(mapper, connection, target):
+    state = inspect(target)
+    rating_history = state.attrs.rating.history
+    reviewee_history = state.attrs.reviewee_id.history
+    if not rating_history.has_changes() and not reviewee_history.has_changes():
+        return
+    old_rating = rating_history.deleted[0] if rating_history.deleted else target.rating
+    old_reviewee = reviewee_history.deleted[0] if reviewee_history.deleted else target.reviewee_id
+    _apply_review_rating(connection, old_reviewee, old_rating, -1)
+    _apply_review_rating(connection, target.reviewee_id, target.rating, 1)
@@ -1,63 +1,318 @@
 """
 购物车业务逻辑服务
-处理基于Session的购物车操作
-注意：购物车数据存储在Session中，不存储在数据库！
+已登录用户的购物车持久化在 cart_items 表（按 user_id + item_id 唯一），每次增删改只操作一行；
+未登录用户的购物车暂存在 Session 中（仅保存 {商品ID: 数量}），登录时合并到 cart_items。
+标题、价格、库存均在读取时用一条 IN 查询从 items 表重新校验，不信任客户端提交的值。
 """
+from app.models import db, CartItem, Item
+from app.services.item_service import ItemService
+from sqlalchemy import update, delete
+from sqlalchemy.exc import IntegrityError
 
 
 class CartService:
     """购物车服务类"""
-    
+
+    # 购物车行标记：存在以下任一标记（价格变动除外）时该行不可结算
+    FLAG_UNAVAILABLE = 'unavailable'                # 商品不存在或已下架
+    FLAG_INSUFFICIENT_STOCK = 'insufficient_stock'  # 库存不足
+    FLAG_OWN_ITEM = 'own_item'                      # 自己发布的商品
+    FLAG_PRICE_CHANGED = 'price_changed'            # 加入购物车后价格有变动（仅提示）
+
+    @staticmethod
+    def check_item(item_id):
+        """
+        检查商品是否可加入购物车
+        :param item_id: 商品ID
+        :return: (错误信息, 当前单价)；可加入时错误信息为 None
+        """
+        row = db.session.query(Item.is_active, Item.price).filter(Item.id == item_id).first()
+        if row is None:
+            return "商品不存在", None
+        if not row.is_active:
+            return "商品已下架", None
+        return None, row.price
+
+    @staticmethod
+    def normalize_session_cart(session_cart):
+        """
+        将 Session 中的购物车统一为 {商品ID: 数量}
+        兼容旧格式（[{itemId, title, price, quantity, image}, ...]），非法行直接丢弃
+        :param session_cart: Session 中保存的购物车
+        :return: {item_id: quantity}
+        """
+        if isinstance(session_cart, dict):
+            entries = session_cart.items()
+        elif isinstance(session_cart, list):
+            entries = [
+                (entry.get('itemId'), entry.get('quantity', 1))
+                for entry in session_cart if isinstance(entry, dict)
+            ]
+        else:
+            return {}
+
+        quantities = {}
+        for item_id, quantity in entries:
+            try:
+                item_id, quantity = int(item_id), int(quantity)
+            except (TypeError, ValueError):
+                continue
+            if quantity > 0:
+                quantities[item_id] = quantities.get(item_id, 0) + quantity
+        return quantities
+
+    # ---- 1. 读取与计价 ----
+    @staticmethod
+    def price_lines(quantities, added_prices=None, buyer_id=None):
+        """
+        购物车计价：一条 IN 查询按商品当前价格、库存、上架状态重新校验每一行
+        :param quantities: {item_id: quantity}（保持购物车顺序）
+        :param added_prices: {item_id: 加入时单价}，Session 购物车为 None
+        :param buyer_id: 买家ID，用于标记自己发布的商品
+        :return: 购物车行列表，每行含当前价格、可用库存、标记列表与是否可结算
+        """
+        if not quantities:
+            return []
+        added_prices = added_prices or {}
+
+        info = ItemService.load_item_rows(
+            quantities.keys(), Item.seller_id, Item.title, Item.price, Item.stock, Item.is_active, Item.image_url
+        )
+
+        lines = []
+        for item_id, quantity in quantities.items():
+            row = info.get(item_id)
+            added_price = added_prices.get(item_id)
+            line = {
+                'itemId': item_id,
+                'title': row.title if row else '',
+                'price': float(row.price) if row else None,
+                'addedPrice': float(added_price) if added_price is not None else None,
+                'quantity': quantity,
+                'stock': row.stock if row else 0,
+                'image': (row.image_url or '') if row else '',
+                'flags': []
+            }
+            if row is None or not row.is_active:
+                line['flags'].append(CartService.FLAG_UNAVAILABLE)
+            else:
+                if row.stock < quantity:
+                    line['flags'].append(CartService.FLAG_INSUFFICIENT_STOCK)
+                if buyer_id is not None and row.seller_id == buyer_id:
+                    line['flags'].append(CartService.FLAG_OWN_ITEM)
+                if added_price is not None and added_price != row.price:
+                    line['flags'].append(CartService.FLAG_PRICE_CHANGED)
+            line['purchasable'] = all(flag == CartService.FLAG_PRICE_CHANGED for flag in line['flags'])
+            lines.append(line)
+        return lines
+
+    @staticmethod
+    def get_cart(user_id):
+        """
+        获取用户购物车（读取购物车行 + 一条商品 IN 查询计价）
+        :param user_id: 用户ID
+        :return: 购物车行列表（按加入顺序）
+        """
+        rows = db.session.query(CartItem.item_id, CartItem.quantity, CartItem.added_price).filter(
+            CartItem.user_id == user_id
+        ).order_by(CartItem.id).all()
+        return CartService.price_lines(
+            {row.item_id: row.quantity for row in rows},
+            {row.item_id: row.added_price for row in rows},
+            buyer_id=user_id
+        )
+
     @staticmethod
-    def get_cart(session):
+    def get_cart_stats(user_id):
         """
-        获取购物车
-        TODO: 从Session中读取购物车数据
-        - 检查库存是否仍充足
-        - 计算购物车统计（总件数、总金额）
+        获取购物车统计（金额按商品当前价格计算）
+        :param user_id: 用户ID
+        :return: 见 summarize
         """
-        pass
-    
+        return CartService.summarize(CartService.get_cart(user_id))
+
+    @staticmethod
+    def summarize(lines):
+        """
+        由计价后的购物车行计算统计
+        :param lines: price_lines 返回的购物车行
+        :return: {'count': 总件数, 'items': 商品种数, 'total': 可结算商品总金额,
+                  'invalid': 不可结算的行数, 'valid': 是否全部可结算}
+        """
+        purchasable = [line for line in lines if line['purchasable']]
+        return {
+            'count': sum(line['quantity'] for line in lines),
+            'items': len(lines),
+            'total': round(sum(line['price'] * line['quantity'] for line in purchasable), 2),
+            'invalid': len(lines) - len(purchasable),
+            'valid': len(purchasable) == len(lines)
+        }
+
+    # ---- 2. 写入 ----
     @staticmethod
-    def add_to_cart(session, item_id, quantity):
+    def add_to_cart(user_id, item_id, quantity):
         """
-        添加到购物车
-        TODO: 将商品添加到Session中的购物车
-        - 检查商品是否存在
-        - 检查库存是否充足
+        添加到购物车：已存在则原子累加数量，否则插入新行
+        :param user_id: 用户ID
+        :param item_id: 商品ID
+        :param quantity: 增加的数量
+        :return: (success, message, {'itemId', 'quantity'})
         """
-        pass
-    
+        error, price = CartService.check_item(item_id)
+        if error:
+            return False, error, None
+
+        try:
+            # 再次加入时以当前价格作为新的加入时单价
+            if not CartService._increase(user_id, item_id, quantity, price):
+                db.session.add(CartItem(user_id=user_id, item_id=item_id, quantity=quantity, added_price=price))
+                try:
+                    db.session.flush()
+                except IntegrityError:
+                    # 并发请求已插入同一行，改为累加
+                    db.session.rollback()
+                    CartService._increase(user_id, item_id, quantity, price)
+
+            new_quantity = db.session.query(CartItem.quantity).filter(
+                CartItem.user_id == user_id, CartItem.item_id == item_id
+            ).scalar()
+            db.session.commit()
+            return True, "已添加到购物车", {'itemId': item_id, 'quantity': new_quantity}
+
+        except Exception as e:
+            db.session.rollback()
+            return False, f"添加购物车失败: {str(e)}", None
+
+    @staticmethod
+    def _increase(user_id, item_id, quantity, price):
+        """UPDATE cart_items SET quantity = quantity + :q, added_price = :price，返回是否命中已有行"""
+        result = db.session.execute(
+            update(CartItem)
+            .where(CartItem.user_id == user_id, CartItem.item_id == item_id)
+            .values(quantity=CartItem.quantity + quantity, added_price=price)
+            .execution_options(synchronize_session=False)
+        )
+        return result.rowcount > 0
+
     @staticmethod
-    def update_cart_item(session, item_id, quantity):
+    def update_cart_item(user_id, item_id, quantity):
         """
         修改购物车项数量
-        TODO: 更新Session中的购物车项
+        :param user_id: 用户ID
+        :param item_id: 商品ID
+        :param quantity: 新数量
+        :return: (success, message, {'itemId', 'quantity'})
         """
-        pass
-    
+        try:
+            result = db.session.execute(
+                update(CartItem)
+                .where(CartItem.user_id == user_id, CartItem.item_id == item_id)
+                .values(quantity=quantity)
+                .execution_options(synchronize_session=False)
+            )
+            if result.rowcount == 0:
+                db.session.rollback()
+                return False, "商品不在购物车中", None
+            db.session.commit()
+            return True, "已更新数量", {'itemId': item_id, 'quantity': quantity}
+
+        except Exception as e:
+            db.session.rollback()
+            return False, f"更新购物车失败: {str(e)}", None
+
     @staticmethod
-    def remove_from_cart(session, item_id):
+    def remove_from_cart(user_id, item_id):
         """
         删除购物车项
-        TODO: 从Session中删除特定商品
+        :param user_id: 用户ID
+        :param item_id: 商品ID
+        :return: (success, message)
         """
-        pass
-    
+        try:
+            result = db.session.execute(
+                delete(CartItem)
+                .where(CartItem.user_id == user_id, CartItem.item_id == item_id)
+                .execution_options(synchronize_session=False)
+            )
+            if result.rowcount == 0:
+                db.session.rollback()
+                return False, "商品不在购物车中"
+            db.session.commit()
+            return True, "已从购物车移除"
+
+        except Exception as e:
+            db.session.rollback()
+            return False, f"移除购物车商品失败: {str(e)}"
+
     @staticmethod
-    def clear_cart(session):
+    def clear_cart(user_id):
         """
         清空购物车
-        TODO: 清空Session中的所有购物车数据
+        :param user_id: 用户ID
+        :return: (success, message)
         """
-        pass
-    
+        try:
+            db.session.execute(
+                delete(CartItem).where(CartItem.user_id == user_id)
+                .execution_options(synchronize_session=False)
+            )
+            db.session.commit()
+            return True, "购物车已清空"
+
+        except Exception as e:
+            db.session.rollback()
+            return False, f"清空购物车失败: {str(e)}"
+
+    # ---- 3. 登录合并 ----
     @staticmethod
-    def get_cart_stats(session):
+    def merge_session_cart(user_id, session_cart):
         """
-        获取购物车统计
-        - 总件数
-        - 总金额
-        - 商品数量
+        将未登录时的 Session 购物车合并到用户购物车（数量累加）
+        商品校验与已有行读取各一条 IN 查询，已下架/不存在的商品被丢弃；
+        并发请求已插入同一行时回滚后重新合并一次，已存在的行改为累加（与 add_to_cart 相同）
+        :param user_id: 用户ID
+        :param session_cart: Session 中保存的购物车
+        :return: (success, message, 合并的商品种数)；失败时调用方应保留 Session 购物车
         """
-        pass
+        quantities = CartService.normalize_session_cart(session_cart)
+        if not quantities:
+            return True, "购物车为空", 0
+
+        for _ in range(2):
+            try:
+                merged = CartService._merge_quantities(user_id, quantities)
+                db.session.commit()
+                return True, "购物车已合并", merged
+            except IntegrityError:
+                # 并发请求已插入同一行：整体回滚后重新合并，该行改为累加
+                db.session.rollback()
+            except Exception as e:
+                db.session.rollback()
+                return False, f"合并购物车失败: {str(e)}", 0
+        return False, "合并购物车失败: 购物车并发修改冲突", 0
+
+    @staticmethod
+    def _merge_quantities(user_id, quantities):
+        """在当前事务中累加已有行、插入新行（不提交），返回合并的商品种数"""
+        prices = {
+            row.id: row.price for row in db.session.query(Item.id, Item.price).filter(
+                Item.id.in_(quantities.keys()), Item.is_active.is_(True)
+            )
+        }
+        if not prices:
+            return 0
+
+        existing = {
+            row[0] for row in db.session.query(CartItem.item_id).filter(
+                CartItem.user_id == user_id, CartItem.item_id.in_(prices.keys())
+            )
+        }
+        for item_id in sorted(prices):
+            if item_id in existing:
+                CartService._increase(user_id, item_id, quantities[item_id], prices[item_id])
+            else:
+                db.session.add(CartItem(
+                    user_id=user_id, item_id=item_id, quantity=quantities[item_id], added_price=prices[item_id]
+                ))
+        db.session.flush()
+        return len(prices)
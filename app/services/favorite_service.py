@@ -3,6 +3,11 @@
 处理用户收藏商品的业务逻辑
 """
 from app.models import db, Favorite, Item
+from app.utils.count_cache import count_cache, make_count_key
+from app.utils.favorite_cache import favorite_cache
+from app.utils.cache import response_cache
+from app.services.trending_engine import trending_engine
+from sqlalchemy import update, func, select
 from sqlalchemy.exc import IntegrityError
 
 
@@ -13,33 +18,37 @@ class FavoriteService:
     def add_favorite(user_id, item_id):
         """
         添加收藏
+        依赖唯一约束 uk_user_item 判重（不再先查后插），商品收藏数在同一事务内原子 +1
         :param user_id: 用户ID
         :param item_id: 商品ID
         :return: (success, message, favorite)
         """
         try:
             # 检查商品是否存在
-            item = Item.query.get(item_id)
-            if not item:
+            if db.session.query(Item.id).filter(Item.id == item_id).first() is None:
                 return False, "商品不存在", None
 
-            # 检查是否已收藏
-            existing = Favorite.query.filter_by(
-                user_id=user_id,
-                item_id=item_id
-            ).first()
-
-            if existing:
-                return False, "已经收藏过该商品", None
-
-            # 创建收藏记录
+            # 创建收藏记录（重复收藏由唯一约束拦截）
             favorite = Favorite(user_id=user_id, item_id=item_id)
             db.session.add(favorite)
+            try:
+                db.session.flush()
+            except IntegrityError:
+                db.session.rollback()
+                return False, "已经收藏过该商品", None
 
-            # 更新商品收藏计数（触发器应该自动更新，但这里手动更新）
-            item.favorites = Favorite.query.filter_by(item_id=item_id).count() + 1
+            # 原子更新商品收藏计数：UPDATE items SET favorites = favorites + 1
+            db.session.execute(
+                update(Item).where(Item.id == item_id)
+                .values(favorites=Item.favorites + 1)
+                .execution_options(synchronize_session=False)
+            )
 
             db.session.commit()
+            count_cache.invalidate(f'favorites:{user_id}')
+            favorite_cache.invalidate(user_id)
+            response_cache.invalidate(f'favorites:{user_id}', f'item:{item_id}')
+            trending_engine.record(item_id, 'favorite')
 
             return True, "收藏成功", favorite
 
@@ -51,32 +60,33 @@ class FavoriteService:
     def remove_favorite(user_id, item_id):
         """
         取消收藏
+        按影响行数判断是否收藏过，商品收藏数在同一事务内原子 -1
         :param user_id: 用户ID
         :param item_id: 商品ID
         :return: (success, message)
         """
         try:
-            # 查找收藏记录
-            favorite = Favorite.query.filter_by(
+            # 删除收藏记录
+            deleted = Favorite.query.filter_by(
                 user_id=user_id,
                 item_id=item_id
-            ).first()
+            ).delete(synchronize_session=False)
 
-            if not favorite:
+            if not deleted:
+                db.session.rollback()
                 return False, "未收藏该商品"
 
-            # 获取商品ID（用于更新计数）
-            item_id = favorite.item_id
-
-            # 删除收藏记录
-            db.session.delete(favorite)
-
-            # 更新商品收藏计数
-            item = Item.query.get(item_id)
-            if item:
-                item.favorites = Favorite.query.filter_by(item_id=item_id).count()
+            # 原子更新商品收藏计数：UPDATE items SET favorites = favorites - 1（不减到负数）
+            db.session.execute(
+                update(Item).where(Item.id == item_id, Item.favorites > 0)
+                .values(favorites=Item.favorites - 1)
+                .execution_options(synchronize_session=False)
+            )
 
             db.session.commit()
+            count_cache.invalidate(f'favorites:{user_id}')
+            favorite_cache.invalidate(user_id)
+            response_cache.invalidate(f'favorites:{user_id}', f'item:{item_id}')
 
             return True, "取消收藏成功"
 
@@ -92,11 +102,46 @@ class FavoriteService:
         :param item_id: 商品ID
         :return: 是否已收藏
         """
-        favorite = Favorite.query.filter_by(
-            user_id=user_id,
-            item_id=item_id
-        ).first()
-        return favorite is not None
+        return item_id in FavoriteService.get_favorited_ids(user_id, [item_id])
+
+    @staticmethod
+    def get_favorited_ids(user_id, item_ids):
+        """
+        批量检查收藏状态
+        开启收藏集合缓存时在内存中求交集，否则一条 IN 查询
+        :param user_id: 用户ID
+        :param item_ids: 商品ID列表
+        :return: 其中已收藏的商品ID集合
+        """
+        item_ids = set(item_ids)
+        if not item_ids:
+            return set()
+
+        cached = favorite_cache.get_or_load(
+            user_id,
+            lambda: [row[0] for row in db.session.query(Favorite.item_id).filter(Favorite.user_id == user_id)]
+        )
+        if cached is not None:
+            return item_ids & cached
+
+        rows = db.session.query(Favorite.item_id).filter(
+            Favorite.user_id == user_id,
+            Favorite.item_id.in_(item_ids)
+        ).all()
+        return {row[0] for row in rows}
+
+    @staticmethod
+    def mark_favorited(user_id, items):
+        """
+        为商品列表标注 is_favorited 字段（原地修改）
+        :param user_id: 用户ID
+        :param items: 商品字典列表（含 id 字段）
+        :return: items
+        """
+        favorited = FavoriteService.get_favorited_ids(user_id, [item['id'] for item in items])
+        for item in items:
+            item['is_favorited'] = item['id'] in favorited
+        return items
 
     @staticmethod
     def get_user_favorites(user_id, page=1, limit=20):
@@ -125,7 +170,7 @@ class FavoriteService:
         :param user_id: 用户ID
         :param page: 页码（从1开始）
         :param limit: 每页数量
-        :return: (items, total)
+        :return: (items, total, total_exact)
         """
         try:
             # 使用JOIN查询收藏的商品
@@ -143,8 +188,10 @@ class FavoriteService:
                 Favorite.created_at.desc()
             )
 
-            # 分页
-            total = query.count()
+            # 分页（总数读缓存，收藏/取消收藏后失效）
+            total, total_exact = count_cache.count(
+                f'favorites:{user_id}', make_count_key(user_id=user_id), query
+            )
             items = query.limit(limit).offset((page - 1) * limit).all()
 
             # 格式化结果
@@ -154,10 +201,10 @@ class FavoriteService:
                 item_dict['favorited_at'] = favorited_at.isoformat() if favorited_at else None
                 result.append(item_dict)
 
-            return result, total
+            return result, total, total_exact
 
         except Exception as e:
-            return [], 0
+            return [], 0, True
 
     @staticmethod
     def toggle_favorite(user_id, item_id):
@@ -179,6 +226,24 @@ class FavoriteService:
             success, message, favorite = FavoriteService.add_favorite(user_id, item_id)
             return success, message, True
 
+    @staticmethod
+    def reconcile_favorite_counts():
+        """
+        校正商品收藏计数：以 favorites 表为准修复 items.favorites 的偏差
+        （计数在增删收藏时原子增减，异常中断或手工改数据可能导致偏差，需定期执行）
+        :return: 被修复的商品数量
+        """
+        actual_count = select(func.count(Favorite.id)).where(
+            Favorite.item_id == Item.id
+        ).scalar_subquery()
+        result = db.session.execute(
+            update(Item).where(Item.favorites != actual_count)
+            .values(favorites=actual_count)
+            .execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+        return result.rowcount
+
     @staticmethod
     def get_user_favorite_count(user_id):
         """
@@ -0,0 +1,234 @@
+"""
+首页推荐排行快照
+后台线程每隔 FEATURED_REFRESH_INTERVAL 秒重新计算推荐排行，结果保存为不可变快照，
+首页请求直接读取快照（不查询数据库），卖家名称与评分在构建快照时一并补全；
+商品更新、删除与下单/取消后由写路径调用 refresh_items 修补快照中的对应商品（已下架或售罄的立即移出），
+不必等到下次整体刷新
+
+评分：(w_views·ln(1+浏览量) + w_favorites·ln(1+收藏数) + w_seller_rating·卖家评分) × 时间衰减
+时间衰减：0.5 ^ (上架天数 / FEATURED_HALF_LIFE_DAYS)
+
+配置项（app.config）：
+- FEATURED_REFRESH_INTERVAL: 后台刷新间隔（秒），<=0 表示不启动后台线程（仅首次读取与手动刷新时构建）
+- FEATURED_SIZE: 快照中保留的商品数（首页 limit 超过该值时只返回快照中的商品）
+- FEATURED_CANDIDATES: 按浏览量/收藏数/上架时间各取前 N 件作为候选
+- FEATURED_WEIGHTS: 评分权重 {'views', 'favorites', 'seller_rating'}
+- FEATURED_HALF_LIFE_DAYS: 时间衰减半衰期（天）
+"""
+import atexit
+import logging
+import math
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_REFRESH_INTERVAL = 300
+DEFAULT_SIZE = 100
+DEFAULT_CANDIDATES = 1000
+DEFAULT_WEIGHTS = {'views': 1.0, 'favorites': 2.0, 'seller_rating': 0.5}
+DEFAULT_HALF_LIFE_DAYS = 14.0
+
+# 推荐快照：商品字典元组（已按评分降序）、构建时间（time.time()）、构建耗时（秒）、候选商品数
+FeaturedSnapshot = namedtuple('FeaturedSnapshot', ['items', 'built_at', 'build_seconds', 'candidates'])
+
+
+def featured_score(views, favorites, seller_rating, created_at, now, weights, half_life_days):
+    """
+    计算商品推荐评分
+    :param views: 浏览量
+    :param favorites: 收藏数
+    :param seller_rating: 卖家平均评分
+    :param created_at: 上架时间
+    :param now: 当前时间
+    :param weights: 权重字典
+    :param half_life_days: 时间衰减半衰期（天）
+    :return: 评分
+    """
+    base = (
+        weights.get('views', 0) * math.log1p(max(views or 0, 0))
+        + weights.get('favorites', 0) * math.log1p(max(favorites or 0, 0))
+        + weights.get('seller_rating', 0) * (seller_rating or 0)
+    )
+    if half_life_days and half_life_days > 0 and created_at is not None:
+        age_days = max((now - created_at).total_seconds(), 0) / 86400
+        base *= 0.5 ** (age_days / half_life_days)
+    return base
+
+
+class FeaturedRanking:
+    """首页推荐排行（快照整体替换，读取无需加锁）"""
+
+    def __init__(self, app=None):
+        self._app = None
+        self._snapshot = None
+        self._build_lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('FEATURED_REFRESH_INTERVAL', DEFAULT_REFRESH_INTERVAL)
+        app.config.setdefault('FEATURED_SIZE', DEFAULT_SIZE)
+        app.config.setdefault('FEATURED_CANDIDATES', DEFAULT_CANDIDATES)
+        app.config.setdefault('FEATURED_WEIGHTS', dict(DEFAULT_WEIGHTS))
+        app.config.setdefault('FEATURED_HALF_LIFE_DAYS', DEFAULT_HALF_LIFE_DAYS)
+        app.extensions['featured_ranking'] = self
+        self._app = app
+        atexit.register(self.shutdown)
+
+    # -------------------------- 读取 --------------------------
+    def get_items(self, limit: int) -> list:
+        """
+        获取推荐商品（读取快照，快照存在时不查询数据库）
+        :param limit: 返回数量
+        :return: 商品字典列表（副本，调用方可修改）
+        """
+        snapshot = self._snapshot
+        if snapshot is None:
+            snapshot = self.refresh(only_if_missing=True)
+        self._ensure_worker()
+        return [dict(item) for item in snapshot.items[:limit]]
+
+    def status(self) -> dict:
+        """快照状态（管理接口使用）"""
+        snapshot = self._snapshot
+        if snapshot is None:
+            return {'built': False, 'refresh_interval': self._config('FEATURED_REFRESH_INTERVAL', DEFAULT_REFRESH_INTERVAL)}
+        return {
+            'built': True,
+            'built_at': datetime.fromtimestamp(snapshot.built_at).isoformat(),
+            'age_seconds': round(time.time() - snapshot.built_at, 3),
+            'build_ms': round(snapshot.build_seconds * 1000, 2),
+            'size': len(snapshot.items),
+            'candidates': snapshot.candidates,
+            'refresh_interval': self._config('FEATURED_REFRESH_INTERVAL', DEFAULT_REFRESH_INTERVAL)
+        }
+
+    # -------------------------- 构建 --------------------------
+    def refresh(self, only_if_missing: bool = False) -> FeaturedSnapshot:
+        """
+        重新计算推荐排行并替换快照
+        :param only_if_missing: 仅在尚无快照时构建（并发首次读取只构建一次）
+        :return: 新快照
+        """
+        with self._build_lock:
+            if only_if_missing and self._snapshot is not None:
+                return self._snapshot
+            started = time.perf_counter()
+            items, candidates = self._compute()
+            self._snapshot = FeaturedSnapshot(
+                items=tuple(items),
+                built_at=time.time(),
+                build_seconds=time.perf_counter() - started,
+                candidates=candidates
+            )
+
+        from app.utils.cache import response_cache
+        response_cache.invalidate('featured')
+        return self._snapshot
+
+    def refresh_items(self, item_ids):
+        """
+        按数据库最新状态修补快照中的商品（写路径提交后调用）：已下架或无库存的移出快照，其余更新为最新内容；
+        不在快照中的商品忽略，其排名变化在下次整体刷新时生效
+        :param item_ids: 商品ID列表
+        """
+        snapshot = self._snapshot
+        if snapshot is None:
+            return
+        ids = {entry['id'] for entry in snapshot.items} & set(item_ids)
+        if not ids:
+            return
+
+        from app.models import Item
+        from app.services.item_service import ItemService
+        live = Item.query.filter(Item.id.in_(ids), Item.is_active == True, Item.stock > 0).all()
+        rebuilt = {entry['id']: entry for entry in ItemService._build_item_list(live)}
+
+        with self._build_lock:
+            # 期间可能已整体刷新：修补当前快照
+            snapshot = self._snapshot
+            if snapshot is None:
+                return
+            self._snapshot = snapshot._replace(items=tuple(
+                rebuilt[entry['id']] if entry['id'] in ids else entry
+                for entry in snapshot.items
+                if entry['id'] not in ids or entry['id'] in rebuilt
+            ))
+
+    def _compute(self):
+        """
+        按浏览量、收藏数、上架时间各取前 FEATURED_CANDIDATES 件作为候选，计算评分后取前 FEATURED_SIZE 件
+        :return: (商品字典列表, 候选商品数)
+        """
+        from app.models import Item
+        from app.services.item_service import ItemService
+        from app.services.user_service import UserService
+
+        limit = self._config('FEATURED_CANDIDATES', DEFAULT_CANDIDATES)
+        base = Item.query.filter(Item.is_active == True, Item.stock > 0)
+        candidates = {}
+        for column in (Item.views, Item.favorites, Item.created_at):
+            for item in base.order_by(column.desc(), Item.id.desc()).limit(limit):
+                candidates[item.id] = item
+
+        ratings = UserService._get_user_ratings(list({item.seller_id for item in candidates.values()}))
+        weights = self._config('FEATURED_WEIGHTS', DEFAULT_WEIGHTS)
+        half_life = self._config('FEATURED_HALF_LIFE_DAYS', DEFAULT_HALF_LIFE_DAYS)
+        now = datetime.now()
+
+        ranked = sorted(
+            candidates.values(),
+            key=lambda item: (
+                featured_score(item.views, item.favorites, ratings.get(item.seller_id), item.created_at,
+                               now, weights, half_life),
+                item.id
+            ),
+            reverse=True
+        )
+        top = ranked[:self._config('FEATURED_SIZE', DEFAULT_SIZE)]
+        return ItemService._build_item_list(top), len(candidates)
+
+    def reset(self):
+        """丢弃快照，下次读取时重新构建"""
+        with self._build_lock:
+            self._snapshot = None
+
+    # -------------------------- 后台线程 --------------------------
+    def shutdown(self):
+        self._stopped.set()
+
+    def _ensure_worker(self):
+        if self._config('FEATURED_REFRESH_INTERVAL', DEFAULT_REFRESH_INTERVAL) <= 0:
+            return
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._build_lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stopped.clear()
+            self._thread = threading.Thread(target=self._run, name='featured-ranking-refresh', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            interval = self._config('FEATURED_REFRESH_INTERVAL', DEFAULT_REFRESH_INTERVAL)
+            if interval <= 0 or self._stopped.wait(interval):
+                return
+            try:
+                with self._app.app_context():
+                    self.refresh()
+            except Exception as e:
+                logger.error(f"刷新首页推荐排行失败: {str(e)}")
+
+    def _config(self, key, default=None):
+        if self._app is None:
+            return default
+        return self._app.config.get(key, default)
+
+
+featured_ranking = FeaturedRanking()
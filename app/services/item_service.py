@@ -4,49 +4,45 @@
 """
 from app.models import Item, User, OrderItem, db
 from datetime import datetime
-from sqlalchemy import or_, and_
+from sqlalchemy import or_, and_, case
+from app.utils.view_counter import view_counter
+from app.services.search_engine import search_engine
+from app.services.featured_ranking import featured_ranking
+from app.services.trending_engine import trending_engine
+from app.utils.pagination import encode_cursor, decode_cursor, keyset_condition
+from app.utils.count_cache import count_cache, make_count_key
+from app.utils.cache import response_cache
 
 class ItemService:
     """商品服务类"""
 
+    # 按ID批量读取商品时每条 IN 语句的最大ID数（避免超长 SQL 与数据库参数个数上限）
+    ID_CHUNK_SIZE = 500
+
+    # 排序方式 -> (排序列, 是否降序)
+    SORT_KEYS = {
+        'latest': (Item.created_at, True),
+        'popular': (Item.views, True),
+        'price-asc': (Item.price, False),
+        'price-desc': (Item.price, True)
+    }
+
     # -------------------------- 1. 获取首页推荐商品 --------------------------
     @staticmethod
     def get_featured_items(limit: int = 12):
         """
-        获取首页推荐商品
+        获取首页推荐商品（读取后台定期计算的推荐排行快照，不查询数据库）
         :param limit: 返回商品数量
         :return: 业务处理结果
         """
-        # 查询推荐商品（按浏览量倒序排序，取前limit条）
-        items = Item.query.filter(Item.is_active == True, Item.stock > 0).order_by(Item.views.desc()).limit(limit).all()
-
-        # 组装商品数据
-        item_list = []
-        for item in items:
-            seller = User.query.get(item.seller_id)
-            item_data = {
-                'id': item.id,
-                'title': item.title,
-                'description': item.description,
-                'price': float(item.price) if item.price else 0.0,
-                'stock': item.stock,
-                'image': item.image_url or '',
-                'category': item.category,
-                'seller_id': item.seller_id,
-                'seller_name': seller.username if seller else '未知卖家',
-                'seller_rating': UserService._get_user_rating(item.seller_id) if seller else 0.0,
-                'views': item.views,
-                'created_at': item.created_at.isoformat() if item.created_at else None
-            }
-            item_list.append(item_data)
-
-        return {'success': True, 'data': item_list}
+        return {'success': True, 'data': featured_ranking.get_items(limit)}
 
     # -------------------------- 2. 搜索商品 --------------------------
     @staticmethod
     def search_items(query: str, search_type: str, page: int = 1, limit: int = 12,
                      category: str = None, min_price: float = None, max_price: float = None,
-                     sort: str = 'latest', seller_id: int = None):
+                     sort: str = 'latest', seller_id: int = None,
+                     cursor: str = None, use_cursor: bool = False, count_mode: str = 'exact'):
         """
         搜索商品
         :param query: 搜索关键词
@@ -56,16 +52,37 @@ class ItemService:
         :param category: 分类过滤
         :param min_price: 最小价格
         :param max_price: 最大价格
-        :param sort: 排序方式（latest/popular/price-asc/price-desc）
+        :param sort: 排序方式（latest/popular/price-asc/price-desc/relevance）
+        :param cursor: 游标分页时上一页返回的 next_cursor（为空表示第一页）
+        :param use_cursor: 是否使用游标分页（忽略 page）
+        :param count_mode: 总数统计方式（exact 精确统计 / none 不统计）
         :return: 业务处理结果
         """
         # 基础查询条件
         query_filter = [Item.is_active == True, Item.stock > 0]
+        rank_map = None
+        truncated = False
 
         # 搜索关键词过滤
         if query.strip():
             if search_type == 'title':
-                query_filter.append(Item.title.like(f'%{query.strip()}%'))
+                # 倒排索引检索（标题+描述）：筛选条件与排序作用于全部命中商品；
+                # 命中数超过 SEARCH_MAX_MATCHES 时只保留相关度最高的部分（总数标记为非精确），避免 IN 列表过长；
+                # 按相关度排序时只有前 SEARCH_MAX_CANDIDATES 个参与排名，其余命中商品按ID排在其后
+                max_matches = search_engine.max_matches
+                if sort == 'relevance':
+                    ranked_ids = search_engine.search_ids(query.strip())
+                    truncated = len(ranked_ids) > max_matches
+                    matched_ids = ranked_ids[:max_matches]
+                    rank_map = {
+                        item_id: rank for rank, item_id in enumerate(matched_ids[:search_engine.max_candidates])
+                    }
+                else:
+                    matched_ids = search_engine.match_ids(query.strip())
+                    if len(matched_ids) > max_matches:
+                        truncated = True
+                        matched_ids = search_engine.search_ids(query.strip(), limit=max_matches)
+                query_filter.append(Item.id.in_(matched_ids))
             elif search_type == 'seller':
                 # 关联用户表，按卖家名称搜索
                 seller_subquery = User.query.filter(User.username.like(f'%{query.strip()}%')).with_entities(User.id)
@@ -87,51 +104,74 @@ class ItemService:
         if max_price is not None and max_price > 0:
             query_filter.append(Item.price <= max_price)
 
-        # 排序方式
-        sort_map = {
-            'latest': Item.created_at.desc(),
-            'popular': Item.views.desc(),
-            'price-asc': Item.price.asc(),
-            'price-desc': Item.price.desc()
-        }
-        order_by = sort_map.get(sort, Item.created_at.desc())
-
-        # 分页查询
-        offset = (page - 1) * limit
-        items_query = Item.query.filter(and_(*query_filter)).order_by(order_by)
-        total_items = items_query.count()
-        items = items_query.offset(offset).limit(limit).all()
-
-        # 计算总页数
-        total_pages = (total_items + limit - 1) // limit if limit > 0 else 0
-
-        # 组装商品列表
-        item_list = []
-        for item in items:
-            seller = User.query.get(item.seller_id)
-            item_data = {
-                'id': item.id,
-                'title': item.title,
-                'description': item.description,
-                'price': float(item.price) if item.price else 0.0,
-                'stock': item.stock,
-                'image': item.image_url or '',
-                'category': item.category,
-                'seller_id': item.seller_id,
-                'seller_name': seller.username if seller else '未知卖家',
-                'seller_rating': UserService._get_user_rating(item.seller_id) if seller else 0.0,
-                'views': item.views,
-                'created_at': item.created_at.isoformat() if item.created_at else None
-            }
-            item_list.append(item_data)
+        # 排序方式（均以商品ID为次级排序键，保证顺序稳定，可用于游标分页）
+        if rank_map:
+            # 按搜索引擎返回的相关度顺序排序
+            sort_key, descending = case(rank_map, value=Item.id, else_=len(rank_map)), False
+        else:
+            sort_key, descending = ItemService.SORT_KEYS.get(sort, ItemService.SORT_KEYS['latest'])
+        if descending:
+            order_by = [sort_key.desc(), Item.id.desc()]
+        else:
+            order_by = [sort_key.asc(), Item.id.asc()]
+
+        items_query = Item.query.filter(and_(*query_filter))
+
+        # 总数统计（count_mode=none 时跳过；否则读总数缓存，超大结果集返回估算值）
+        total_items, total_exact = None, False
+        if count_mode == 'exact':
+            count_key = make_count_key(
+                query=query, search_type=search_type if query.strip() else None,
+                category=category, seller_id=seller_id, min_price=min_price, max_price=max_price
+            )
+            total_items, total_exact = count_cache.count('items', count_key, items_query)
+            total_exact = total_exact and not truncated
+        total_pages = (total_items + limit - 1) // limit if total_items is not None and limit > 0 else None
+
+        if use_cursor:
+            # 游标分页：WHERE (排序键, id) 在游标之后，无 OFFSET
+            if cursor:
+                try:
+                    value, last_id = decode_cursor(cursor, sort)
+                except ValueError as e:
+                    return {'success': False, 'message': str(e)}
+                items_query = items_query.filter(keyset_condition(sort_key, Item.id, descending, value, last_id))
+            rows = items_query.order_by(*order_by).limit(limit + 1).all()
+        else:
+            offset = (page - 1) * limit
+            rows = items_query.order_by(*order_by).offset(offset).limit(limit + 1).all()
+
+        # 多取一条用于判断是否还有下一页
+        has_more = len(rows) > limit
+        items = rows[:limit]
+
+        # 组装商品列表（批量补全卖家信息）
+        item_list = ItemService._build_item_list(items)
 
         # 组装分页信息
-        pagination = {
-            'current_page': page,
-            'total_pages': total_pages,
-            'total_items': total_items,
-            'page_size': limit
-        }
+        if use_cursor:
+            next_cursor = None
+            if has_more and items:
+                last = items[-1]
+                last_value = rank_map.get(last.id, len(rank_map)) if rank_map else getattr(last, sort_key.key)
+                next_cursor = encode_cursor(sort, last_value, last.id)
+            pagination = {
+                'next_cursor': next_cursor,
+                'has_more': has_more,
+                'total_pages': total_pages,
+                'total_items': total_items,
+                'total_exact': total_exact,
+                'page_size': limit
+            }
+        else:
+            pagination = {
+                'current_page': page,
+                'total_pages': total_pages,
+                'total_items': total_items,
+                'total_exact': total_exact,
+                'page_size': limit,
+                'has_more': has_more
+            }
 
         return {
             'success': True,
@@ -143,12 +183,18 @@ class ItemService:
 
     # -------------------------- 3. 按分类获取商品 --------------------------
     @staticmethod
-    def get_items_by_category(category: str, page: int = 1, limit: int = 12):
+    def get_items_by_category(category: str, page: int = 1, limit: int = 12,
+                              sort: str = 'latest', cursor: str = None, use_cursor: bool = False,
+                              count_mode: str = 'exact'):
         """
         按分类获取商品
         :param category: 商品分类
         :param page: 当前页码
         :param limit: 每页数量
+        :param sort: 排序方式
+        :param cursor: 游标分页时上一页返回的 next_cursor
+        :param use_cursor: 是否使用游标分页
+        :param count_mode: 总数统计方式
         :return: 业务处理结果
         """
         # 复用搜索接口逻辑，仅按分类过滤
@@ -158,15 +204,19 @@ class ItemService:
             page=page,
             limit=limit,
             category=category,
-            sort='latest'
+            sort=sort,
+            cursor=cursor,
+            use_cursor=use_cursor,
+            count_mode=count_mode
         )
 
     # -------------------------- 4. 获取商品详情 --------------------------
     @staticmethod
-    def get_item_detail(item_id: int):
+    def get_item_detail(item_id: int, count_view: bool = True):
         """
-        获取商品详情
+        获取商品详情（纯读操作，浏览量写入缓冲后异步批量落库）
         :param item_id: 商品ID
+        :param count_view: 是否计入一次浏览
         :return: 业务处理结果
         """
         item = Item.query.get(item_id)
@@ -192,15 +242,16 @@ class ItemService:
             'seller_email': seller.email,
             'seller_rating': UserService._get_user_rating(seller.id),
             'seller_verified': seller.is_active,  # 假设is_active代表是否验证
-            'views': item.views,
+            'views': item.views + view_counter.pending(item.id),
             'favorites': item.favorites,
             'created_at': item.created_at.isoformat() if item.created_at else None,
             'images': [item.image_url or '']  # 若有多张图片，可扩展为关联表查询
         }
 
-        # 增加商品浏览量
-        item.views += 1
-        db.session.commit()
+        # 增加商品浏览量（写入缓冲，不在请求中写库）
+        if count_view:
+            view_counter.record(item.id)
+            trending_engine.record(item.id, 'view', category=item.category)
 
         return {'success': True, 'data': item_detail}
 
@@ -252,9 +303,12 @@ class ItemService:
             )
             db.session.add(item)
             db.session.commit()
+            search_engine.index_item(item)
+            count_cache.invalidate('items')
+            response_cache.invalidate(f'category:{item.category}', f'user:{user_id}')
 
             # 返回商品详情
-            return {'success': True, 'data': ItemService.get_item_detail(item.id)['data']}
+            return {'success': True, 'data': ItemService.get_item_detail(item.id, count_view=False)['data']}
         except Exception as e:
             db.session.rollback()
             return {'success': False, 'message': f'发布失败：{str(e)}'}
@@ -278,6 +332,8 @@ class ItemService:
         if item.seller_id != user_id:
             return {'success': False, 'message': '无权限更新该商品'}
 
+        old_category = item.category
+
         # 更新字段（仅更新传入的非空/有效字段）
         if 'title' in item_data and item_data['title'].strip():
             item.title = item_data['title'].strip()
@@ -299,8 +355,13 @@ class ItemService:
 
         try:
             db.session.commit()
+            search_engine.index_item(item)
+            trending_engine.update_item(item)
+            featured_ranking.refresh_items([item.id])
+            count_cache.invalidate('items')
+            response_cache.invalidate(f'item:{item.id}', f'category:{old_category}', f'category:{item.category}', 'featured', 'trending')
             # 返回更新后的商品详情
-            return {'success': True, 'data': ItemService.get_item_detail(item.id)['data']}
+            return {'success': True, 'data': ItemService.get_item_detail(item.id, count_view=False)['data']}
         except Exception as e:
             db.session.rollback()
             return {'success': False, 'message': f'更新失败：{str(e)}'}
@@ -328,6 +389,11 @@ class ItemService:
 
         try:
             db.session.commit()
+            search_engine.remove_item(item_id)
+            trending_engine.discard(item_id)
+            featured_ranking.refresh_items([item_id])
+            count_cache.invalidate('items')
+            response_cache.invalidate(f'item:{item_id}', f'category:{item.category}', 'featured', 'trending', f'user:{user_id}')
             return {'success': True, 'message': '删除成功'}
         except Exception as e:
             db.session.rollback()
@@ -338,9 +404,16 @@ class ItemService:
     def check_stock(item_list: list):
         """
         检查商品库存
+        所有商品ID一次集合查询（超过 ID_CHUNK_SIZE 时分块），不再逐条按主键查询
         :param item_list: 商品列表 [{'itemId': 1, 'quantity': 2}, ...]
         :return: 业务处理结果
         """
+        item_ids = {
+            item_info.get('itemId') for item_info in item_list
+            if isinstance(item_info.get('itemId'), int) and item_info.get('itemId') > 0
+        }
+        rows = ItemService.load_item_rows(item_ids, Item.stock, Item.is_active)
+
         stock_check_result = []
         is_valid = True
 
@@ -358,17 +431,16 @@ class ItemService:
                 is_valid = False
                 continue
 
+            item = rows.get(item_id)
             if not isinstance(quantity, int) or quantity <= 0:
                 stock_check_result.append({
                     'itemId': item_id,
                     'available': False,
-                    'stock': 0 if not Item.query.get(item_id) else Item.query.get(item_id).stock
+                    'stock': item.stock if item else 0
                 })
                 is_valid = False
                 continue
 
-            # 查询商品
-            item = Item.query.get(item_id)
             if not item or not item.is_active:
                 stock_check_result.append({
                     'itemId': item_id,
@@ -394,5 +466,56 @@ class ItemService:
             }
         }
 
+    @staticmethod
+    def load_item_rows(item_ids, *columns) -> dict:
+        """
+        按ID批量读取商品的指定列（分块 IN 查询），供库存检查、购物车计价等复用
+        :param item_ids: 商品ID集合
+        :param columns: 需要读取的 Item 列（Item.id 自动包含）
+        :return: {item_id: row}
+        """
+        item_ids = sorted(set(item_ids))
+        rows = {}
+        for start in range(0, len(item_ids), ItemService.ID_CHUNK_SIZE):
+            chunk = item_ids[start:start + ItemService.ID_CHUNK_SIZE]
+            for row in db.session.query(Item.id, *columns).filter(Item.id.in_(chunk)):
+                rows[row.id] = row
+        return rows
+
+    # -------------------------- 内部辅助方法 --------------------------
+    @staticmethod
+    def _build_item_list(items: list) -> list:
+        """
+        批量组装商品列表数据
+        卖家信息与卖家评分各用一次集合查询获取，避免逐条查询（N+1）
+        :param items: Item 对象列表
+        :return: 商品字典列表
+        """
+        if not items:
+            return []
+
+        seller_ids = {item.seller_id for item in items}
+        sellers = {user.id: user for user in User.query.filter(User.id.in_(seller_ids)).all()}
+        ratings = UserService._get_user_ratings(list(sellers.keys()))
+
+        item_list = []
+        for item in items:
+            seller = sellers.get(item.seller_id)
+            item_list.append({
+                'id': item.id,
+                'title': item.title,
+                'description': item.description,
+                'price': float(item.price) if item.price else 0.0,
+                'stock': item.stock,
+                'image': item.image_url or '',
+                'category': item.category,
+                'seller_id': item.seller_id,
+                'seller_name': seller.username if seller else '未知卖家',
+                'seller_rating': ratings.get(item.seller_id, 5.0) if seller else 0.0,
+                'views': item.views,
+                'created_at': item.created_at.isoformat() if item.created_at else None
+            })
+        return item_list
+
 # 导入用户服务的内部方法（解决循环导入问题）
 from app.services.user_service import UserService
\ No newline at end of file
@@ -7,26 +7,43 @@
 - 数据库事务处理 (BEGIN/COMMIT/ROLLBACK)
 - 行级锁 (SELECT FOR UPDATE) 防止库存冲突
 - 原子性操作保证
+
+库存预留方式由 ORDER_RESERVATION_ENGINE 配置：
+- locking（默认）：SELECT ... FOR UPDATE 锁定商品行，在 Python 中检查并扣减库存
+- conditional：读取商品时不加锁，提交前逐个执行
+  UPDATE items SET stock = stock - :q WHERE id = :id AND stock >= :q AND is_active
+  并检查影响行数，热门商品上的买家不再整个事务串行等待行锁
+
+死锁预防：所有路径都按商品ID升序锁定商品行；遇到死锁/锁等待超时时回滚并整体重试（retry_on_deadlock）
 """
 
+from flask import current_app
 from app.models import db, Order, OrderItem, Item, Address, User
 from app.utils.response import error_response, success_response
-from sqlalchemy import select, update
+from app.utils.count_cache import count_cache, make_count_key
+from app.utils.cache import response_cache
+from app.services.trending_engine import trending_engine
+from app.services.featured_ranking import featured_ranking
+from app.utils.db_retry import retry_on_deadlock, is_retryable_error
+from app.utils.order_number import generate_order_number, order_number_generator
+from sqlalchemy import select, update, case, func
 from sqlalchemy.orm import joinedload, selectinload
 from decimal import Decimal
-from datetime import datetime
+from datetime import datetime, timedelta
 import traceback
 import logging
-import time
-import random
 
 logger = logging.getLogger(__name__)
 
 
 class OrderService:
     """订单服务类"""
+
+    # 计入消费额/成交额的订单状态
+    PAID_STATUSES = ('paid', 'shipped', 'completed')
     
     @staticmethod
+    @retry_on_deadlock(fallback=(False, "系统繁忙，请稍后重试"))
     def create_order(buyer_id, items_data, address_id):
         """
         创建订单 - 最复杂的操作！
@@ -80,6 +97,9 @@ class OrderService:
         # 后续逻辑统一使用规范化后的列表
         items_data = normalized_items
         
+        # 订单号工作进程ID的租约在独立事务中写库，须在订单事务开始前取得（取不到时直接报错，不生成可能重复的订单号）
+        order_number_generator.ensure_worker_id()
+        
         # 开启事务
         try:
             # 使用SQLAlchemy的会话进行事务管理
@@ -94,10 +114,9 @@ class OrderService:
                 return False, "无权使用该配送地址"
             
             # ==================== 步骤2: 获取所有商品并锁定库存 ====================
-            # 为了性能，先查询所有商品
-            stmt = select(Item).where(Item.id.in_(item_ids)).with_for_update()
-            items_result = session.execute(stmt)
-            all_items = {item.id: item for item in items_result.scalars().all()}
+            # 为了性能，先查询所有商品（conditional 模式不加锁，库存在步骤5中条件扣减）
+            conditional = OrderService._reservation_engine() == 'conditional'
+            all_items = OrderService._lock_items(session, item_ids, lock=not conditional)
             
             # 检查商品是否存在且可用
             missing_items = []
@@ -117,7 +136,7 @@ class OrderService:
                     inactive_items.append(item_id)
                     continue
                 
-                # 检查库存是否充足（此时item已被锁定）
+                # 检查库存是否充足（locking 模式下此时item已被锁定；conditional 模式下为预检查）
                 if item.stock < quantity:
                     return False, f"商品 {item.title} 库存不足，剩余 {item.stock} 件"
                 
@@ -166,10 +185,8 @@ class OrderService:
             if address.city:
                 shipping_address = f"{address.city}{address.district or ''}{address.detail}"
 
-            # 生成订单号：ORD + 时间戳 + 随机数
-            timestamp = int(time.time())
-            random_num = random.randint(1000, 9999)
-            order_number = f"ORD{timestamp}{random_num}"
+            # 生成订单号：Snowflake（时间 + 工作进程ID + 序列号），不访问数据库、不会冲突
+            order_number = generate_order_number()
 
             # 获取卖家ID（从第一个商品）
             first_item = all_items[items_data[0]['item_id']]
@@ -206,6 +223,9 @@ class OrderService:
                     created_at=datetime.now()
                 )
                 session.add(order_item)
+
+                if conditional:
+                    continue  # 库存在下方统一条件扣减
                 
                 # 扣减库存
                 item.stock -= quantity
@@ -219,8 +239,29 @@ class OrderService:
                 # 记录库存变化日志
                 logger.info(f"订单 {order.id}: 商品 {item.id} 扣减库存 {quantity}, 剩余 {item.stock}")
             
+            if conditional:
+                # 按商品ID顺序扣减，多商品订单之间不会互相死锁
+                for item_data in sorted(order_items_data, key=lambda d: d['item'].id):
+                    item = item_data['item']
+                    quantity = item_data['quantity']
+                    if not OrderService._reserve_stock(session, item.id, quantity):
+                        session.rollback()
+                        return False, f"商品 {item.title} 库存不足，请刷新页面后重试"
+                    logger.info(f"订单 {order.id}: 商品 {item.id} 条件扣减库存 {quantity}")
+            
             # ==================== 步骤6: 提交事务 ====================
+            # 提交后商品对象过期，热度事件所需字段在提交前取出
+            trending_events = [
+                (item_data['item'].id, item_data['quantity'], item_data['item'].category)
+                for item_data in order_items_data
+            ]
             session.commit()
+            count_cache.invalidate('items', f'orders:{buyer_id}')
+            OrderService._sync_item_caches(
+                [item_id for item_id, _, _ in trending_events], {category for _, _, category in trending_events}
+            )
+            for item_id, quantity, category in trending_events:
+                trending_engine.record(item_id, 'order', count=quantity, category=category)
             
             logger.info(f"订单创建成功: 订单ID={order.id}, 买家ID={buyer_id}, 总金额={total_amount}")
             
@@ -239,6 +280,8 @@ class OrderService:
         except Exception as e:
             # 发生异常时回滚事务
             db.session.rollback()
+            if is_retryable_error(e):
+                raise  # 死锁/锁等待超时：交给 retry_on_deadlock 重试
             logger.error(f"创建订单失败: {str(e)}\n{traceback.format_exc()}")
             
             # 返回具体的错误信息
@@ -250,6 +293,65 @@ class OrderService:
             else:
                 return False, f"创建订单失败: {error_msg}"
     
+    @staticmethod
+    def _lock_items(session, item_ids, lock=True):
+        """
+        查询并锁定商品行（SELECT ... ORDER BY id FOR UPDATE）
+        所有订单路径按商品ID升序加锁，避免多商品订单之间交叉等待导致死锁
+        :param session: 数据库会话
+        :param item_ids: 商品ID列表
+        :param lock: 是否加行锁
+        :return: {item_id: Item}
+        """
+        if not item_ids:
+            return {}
+        stmt = select(Item).where(Item.id.in_(item_ids)).order_by(Item.id)
+        if lock:
+            stmt = stmt.with_for_update()
+        return {item.id: item for item in session.execute(stmt).scalars().all()}
+
+    @staticmethod
+    def _reservation_engine():
+        """当前库存预留方式（locking / conditional）"""
+        return current_app.config.get('ORDER_RESERVATION_ENGINE', 'locking')
+
+    @staticmethod
+    def _reserve_stock(session, item_id, quantity):
+        """
+        条件扣减库存：库存充足且商品在售时才扣减，扣到0时自动下架
+        :param session: 数据库会话
+        :param item_id: 商品ID
+        :param quantity: 扣减数量
+        :return: 是否扣减成功（影响行数为1）
+        """
+        items = Item.__table__
+        stmt = update(items).where(
+            items.c.id == item_id,
+            items.c.stock >= quantity,
+            items.c.is_active == True
+        ).ordered_values(
+            # is_active 必须在 stock 之前赋值：MySQL 按 SET 顺序计算，后面的表达式会读到已更新的值
+            (items.c.is_active, case((items.c.stock - quantity <= 0, False), else_=items.c.is_active)),
+            (items.c.stock, items.c.stock - quantity),
+            (items.c.updated_at, datetime.now())
+        )
+        return session.execute(stmt).rowcount == 1
+
+    @staticmethod
+    def _sync_item_caches(item_ids, categories):
+        """
+        下单/取消改变了商品库存与在售状态：修补推荐快照（售罄的商品移出），
+        并失效商品详情、所在分类列表、推荐与热门榜单的接口缓存
+        :param item_ids: 商品ID列表
+        :param categories: 商品分类集合
+        """
+        featured_ranking.refresh_items(item_ids)
+        response_cache.invalidate(
+            *(f'item:{item_id}' for item_id in item_ids),
+            *(f'category:{category}' for category in categories),
+            'featured', 'trending'
+        )
+
     @staticmethod
     def get_orders(buyer_id, page=1, limit=10):
         """获取用户订单列表"""
@@ -259,31 +361,29 @@ class OrderService:
             # 计算偏移量
             offset = (page - 1) * limit
             
-            # 查询订单总数
-            total = session.query(Order).filter(
-                Order.buyer_id == buyer_id
-            ).count()
+            # 查询订单总数（读总数缓存，下单后失效）
+            total, total_exact = count_cache.count(
+                f'orders:{buyer_id}',
+                make_count_key(buyer_id=buyer_id),
+                session.query(Order).filter(Order.buyer_id == buyer_id)
+            )
             
             # 查询订单列表（按创建时间倒序）
+            # 订单明细及商品通过 selectinload 一次 IN 查询批量加载，整页共 2~3 条SQL
             orders = session.query(Order).filter(
                 Order.buyer_id == buyer_id
+            ).options(
+                selectinload(Order.order_items).joinedload(OrderItem.item)
             ).order_by(
-                Order.created_at.desc()
+                Order.created_at.desc(), Order.id.desc()
             ).offset(offset).limit(limit).all()
             
             # 转换为字典格式
             orders_list = []
             for order in orders:
-                # 查询订单对应的商品信息
-                order_items = session.query(OrderItem).filter(
-                    OrderItem.order_id == order.id
-                ).options(
-                    joinedload(OrderItem.item)
-                ).all()
-                
                 # 获取商品缩略信息
                 items_info = []
-                for oi in order_items:
+                for oi in sorted(order.order_items, key=lambda oi: oi.id):
                     if oi.item:
                         items_info.append({
                             'item_id': oi.item_id,
@@ -312,6 +412,7 @@ class OrderService:
                     'page': page,
                     'limit': limit,
                     'total': total,
+                    'total_exact': total_exact,
                     'total_pages': (total + limit - 1) // limit if limit > 0 else 0
                 }
             }
@@ -326,8 +427,13 @@ class OrderService:
         try:
             session = db.session
             
-            # 查询订单
-            order = session.get(Order, order_id)
+            # 查询订单，同时预加载买家、订单明细、商品及卖家（共2条SQL）
+            order = session.query(Order).filter(
+                Order.id == order_id
+            ).options(
+                joinedload(Order.buyer),
+                selectinload(Order.order_items).joinedload(OrderItem.item).joinedload(Item.seller)
+            ).first()
             if not order:
                 return False, "订单不存在"
             
@@ -335,16 +441,9 @@ class OrderService:
             if order.buyer_id != buyer_id:
                 return False, "无权查看此订单"
             
-            # 查询订单明细及商品信息
-            order_items = session.query(OrderItem).filter(
-                OrderItem.order_id == order_id
-            ).options(
-                joinedload(OrderItem.item).joinedload(Item.seller)
-            ).all()
-            
             # 构建详细的订单信息
             items_detail = []
-            for oi in order_items:
+            for oi in sorted(order.order_items, key=lambda oi: oi.id):
                 item_info = {
                     'order_item_id': oi.id,
                     'item_id': oi.item_id,
@@ -362,8 +461,8 @@ class OrderService:
                 }
                 items_detail.append(item_info)
             
-            # 获取买家信息
-            buyer = session.get(User, buyer_id)
+            # 买家信息（已随订单预加载）
+            buyer = order.buyer
             buyer_info = {
                 'id': buyer.id,
                 'username': buyer.username,
@@ -390,6 +489,7 @@ class OrderService:
             return False, f"获取订单详情失败: {str(e)}"
     
     @staticmethod
+    @retry_on_deadlock(fallback=(False, "系统繁忙，请稍后重试"))
     def update_order_status(order_id, buyer_id, status):
         """更新订单状态"""
         try:
@@ -437,10 +537,13 @@ class OrderService:
             
         except Exception as e:
             session.rollback()
+            if is_retryable_error(e):
+                raise
             logger.error(f"更新订单状态失败: {str(e)}")
             return False, f"更新订单状态失败: {str(e)}"
     
     @staticmethod
+    @retry_on_deadlock(fallback=(False, "系统繁忙，请稍后重试"))
     def cancel_order(order_id, buyer_id):
         """
         取消订单并恢复库存
@@ -475,11 +578,8 @@ class OrderService:
             # 获取所有商品ID
             item_ids = [oi.item_id for oi in order_items]
             
-            # 锁定所有相关商品
-            if item_ids:
-                items_stmt = select(Item).where(Item.id.in_(item_ids)).with_for_update()
-                items_result = session.execute(items_stmt)
-                items_dict = {item.id: item for item in items_result.scalars().all()}
+            # 锁定所有相关商品（按商品ID升序）
+            items_dict = OrderService._lock_items(session, item_ids)
             
             # ==================== 步骤3: 恢复库存 ====================
             for oi in order_items:
@@ -494,13 +594,19 @@ class OrderService:
             order.updated_at = datetime.now()
             
             # ==================== 步骤5: 提交事务 ====================
+            # 提交后商品对象过期，分类在提交前取出
+            categories = {item.category for item in items_dict.values()}
             session.commit()
+            count_cache.invalidate('items')
+            OrderService._sync_item_caches(item_ids, categories)
             
             logger.info(f"订单取消成功: 订单ID={order_id}, 买家ID={buyer_id}")
             return True, "订单取消成功，库存已恢复"
             
         except Exception as e:
             session.rollback()
+            if is_retryable_error(e):
+                raise
             logger.error(f"取消订单失败: {str(e)}\n{traceback.format_exc()}")
             return False, f"取消订单失败: {str(e)}"
     
@@ -651,41 +757,84 @@ class OrderService:
             logger.error(f"删除地址失败: {str(e)}")
             return False, f"删除地址失败: {str(e)}"
     
+    @staticmethod
+    def _aggregate_by_status(*filters):
+        """
+        按订单状态聚合（一条 GROUP BY 查询，不加载订单对象）
+        :param filters: 订单过滤条件
+        :return: {status: (订单数, 金额合计)}
+        """
+        rows = db.session.query(
+            Order.status,
+            func.count(Order.id),
+            func.sum(Order.total_amount)
+        ).filter(*filters).group_by(Order.status).all()
+        return {status: (count, Decimal(str(amount or 0))) for status, count, amount in rows}
+
     @staticmethod
     def get_statistics(user_id):
         """获取用户的订单统计信息"""
         try:
-            session = db.session
-            
+            by_status = OrderService._aggregate_by_status(Order.buyer_id == user_id)
+
+            total_spent = sum(
+                (amount for status, (_, amount) in by_status.items() if status in OrderService.PAID_STATUSES),
+                Decimal('0.00')
+            )
             stats = {
-                'total_orders': 0,
-                'pending_orders': 0,
-                'completed_orders': 0,
-                'total_spent': 0.0
+                'total_orders': sum(count for count, _ in by_status.values()),
+                'pending_orders': by_status.get('pending', (0, None))[0],
+                'completed_orders': by_status.get('completed', (0, None))[0],
+                'total_spent': float(total_spent),
+                'orders_by_status': {
+                    status: by_status.get(status, (0, None))[0] for status, _ in Order.STATUS_CHOICES
+                }
             }
             
-            # 获取所有订单
-            orders = session.query(Order).filter(
-                Order.buyer_id == user_id
-            ).all()
-            
-            stats['total_orders'] = len(orders)
-            
-            # 统计各状态订单数量
-            status_counts = {}
-            total_spent = Decimal('0.00')
-            
-            for order in orders:
-                status_counts[order.status] = status_counts.get(order.status, 0) + 1
-                if order.status in ['paid', 'shipped', 'completed']:
-                    total_spent += order.total_amount
-            
-            stats['pending_orders'] = status_counts.get('pending', 0)
-            stats['completed_orders'] = status_counts.get('completed', 0)
-            stats['total_spent'] = float(total_spent)
-            
             return True, stats
             
         except Exception as e:
             logger.error(f"获取订单统计失败: {str(e)}")
-            return False, f"获取订单统计失败: {str(e)}"
\ No newline at end of file
+            return False, f"获取订单统计失败: {str(e)}"
+
+    @staticmethod
+    def get_seller_statistics(seller_id, start_date=None, end_date=None):
+        """
+        获取卖家的销售统计：成交额（GMV）、各状态订单数、客单价
+        :param seller_id: 卖家ID
+        :param start_date: 起始日期（含），date 对象，为空则不限
+        :param end_date: 截止日期（含），date 对象，为空则不限
+        :return: (success, stats_or_error_message)
+        """
+        try:
+            filters = [Order.seller_id == seller_id]
+            if start_date:
+                filters.append(Order.created_at >= datetime.combine(start_date, datetime.min.time()))
+            if end_date:
+                filters.append(Order.created_at < datetime.combine(end_date + timedelta(days=1), datetime.min.time()))
+            by_status = OrderService._aggregate_by_status(*filters)
+
+            paid_orders = 0
+            gmv = Decimal('0.00')
+            for status in OrderService.PAID_STATUSES:
+                count, amount = by_status.get(status, (0, Decimal('0.00')))
+                paid_orders += count
+                gmv += amount
+            average_order_value = (gmv / paid_orders).quantize(Decimal('0.01')) if paid_orders else Decimal('0.00')
+
+            stats = {
+                'start_date': start_date.isoformat() if start_date else None,
+                'end_date': end_date.isoformat() if end_date else None,
+                'total_orders': sum(count for count, _ in by_status.values()),
+                'paid_orders': paid_orders,
+                'gmv': float(gmv),
+                'average_order_value': float(average_order_value),
+                'orders_by_status': {
+                    status: by_status.get(status, (0, None))[0] for status, _ in Order.STATUS_CHOICES
+                }
+            }
+            return True, stats
+
+        except Exception as e:
+            logger.error(f"获取卖家统计失败: {str(e)}")
+            return False, f"获取卖家统计失败: {str(e)}"
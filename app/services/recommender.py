@@ -0,0 +1,290 @@
+"""
+“经常一起购买”推荐
+离线构建：按订单分块流式读取 order_items，累加商品两两共现次数（稀疏对称矩阵），
+按余弦相似度 共现次数 / sqrt(含A的订单数 × 含B的订单数) 归一化，为每件商品保留前 N 个相似商品，写入近邻文件；
+在线读取：进程内加载近邻文件，按商品ID直接取出（O(1)），文件更新后自动重新加载
+- 共现计数与已处理到的订单ID保存在状态文件中，增量构建只读取上次构建之后新建的订单，
+  只重新计算受影响商品（新订单中的商品及与其共现过的商品）的近邻
+- 订单ID在插入时分配、提交可能更晚，较小ID的订单可能在 watermark 推进之后才可见，
+  因此增量构建回看 watermark 之前 RECOMMEND_CATCH_UP_OVERLAP 个订单ID，并按状态文件中记录的
+  已处理订单ID去重
+- 增量构建不会回退之后被取消的订单，需要时执行全量构建（flask build-recommendations --full）
+
+配置项（app.config）：
+- RECOMMEND_PATH: 近邻文件路径（状态文件为 <RECOMMEND_PATH>.state）
+- RECOMMEND_TOP_N: 每件商品保留的近邻数
+- RECOMMEND_CHUNK_SIZE: 构建时每批读取的订单明细行数
+- RECOMMEND_MAX_BASKET: 单个订单参与统计的最多商品数（避免超大订单产生平方级组合）
+- RECOMMEND_CATCH_UP_OVERLAP: 增量构建时回看 watermark 之前的订单ID数量
+"""
+import heapq
+import json
+import logging
+import math
+import os
+import tempfile
+import threading
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+FORMAT_VERSION = 1
+
+DEFAULT_TOP_N = 10
+DEFAULT_CHUNK_SIZE = 5000
+DEFAULT_MAX_BASKET = 50
+DEFAULT_CATCH_UP_OVERLAP = 1000
+
+
+class CoOccurrenceMatrix:
+    """稀疏共现矩阵：按行保存 {商品A: {商品B: 共现次数}}（对称存储），以及每件商品所在的订单数"""
+
+    def __init__(self):
+        self.rows = {}
+        self.item_counts = {}
+
+    def add_basket(self, item_ids) -> set:
+        """
+        累加一个订单中的商品
+        :param item_ids: 订单中的商品ID（去重后）
+        :return: 计数发生变化的商品ID
+        """
+        item_ids = sorted(set(item_ids))
+        for item_id in item_ids:
+            self.item_counts[item_id] = self.item_counts.get(item_id, 0) + 1
+        for i, a in enumerate(item_ids):
+            row_a = self.rows.setdefault(a, {})
+            for b in item_ids[i + 1:]:
+                row_a[b] = row_a.get(b, 0) + 1
+                row_b = self.rows.setdefault(b, {})
+                row_b[a] = row_b.get(a, 0) + 1
+        return set(item_ids)
+
+    def neighbours(self, item_id: int, top_n: int) -> list:
+        """
+        按余弦相似度计算商品的前 N 个近邻
+        :return: [(item_id, score), ...]，按得分降序
+        """
+        row = self.rows.get(item_id)
+        if not row:
+            return []
+        count_a = self.item_counts.get(item_id, 0)
+        scored = (
+            (co_count / math.sqrt(count_a * self.item_counts[other]), other)
+            for other, co_count in row.items()
+        )
+        return [(other, round(score, 6)) for score, other in heapq.nlargest(top_n, scored, key=lambda s: (s[0], -s[1]))]
+
+    def dump(self) -> dict:
+        """序列化（只保存上三角 a < b）"""
+        return {
+            'item_counts': {str(item_id): count for item_id, count in self.item_counts.items()},
+            'pairs': {
+                str(a): {str(b): count for b, count in row.items() if b > a}
+                for a, row in self.rows.items() if any(b > a for b in row)
+            }
+        }
+
+    @classmethod
+    def load(cls, payload: dict):
+        matrix = cls()
+        matrix.item_counts = {int(item_id): count for item_id, count in payload['item_counts'].items()}
+        for a, row in payload['pairs'].items():
+            a = int(a)
+            for b, count in row.items():
+                b = int(b)
+                matrix.rows.setdefault(a, {})[b] = count
+                matrix.rows.setdefault(b, {})[a] = count
+        return matrix
+
+
+class CoPurchaseRecommender:
+    """经常一起购买推荐：离线构建近邻文件，在线按商品ID读取"""
+
+    def __init__(self, app=None):
+        self._app = None
+        self._lock = threading.Lock()
+        self._neighbours = {}     # {item_id: [(item_id, score), ...]}
+        self._loaded_mtime = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('RECOMMEND_PATH', os.path.join(app.instance_path, 'copurchase.json'))
+        app.config.setdefault('RECOMMEND_TOP_N', DEFAULT_TOP_N)
+        app.config.setdefault('RECOMMEND_CHUNK_SIZE', DEFAULT_CHUNK_SIZE)
+        app.config.setdefault('RECOMMEND_MAX_BASKET', DEFAULT_MAX_BASKET)
+        app.config.setdefault('RECOMMEND_CATCH_UP_OVERLAP', DEFAULT_CATCH_UP_OVERLAP)
+        app.extensions['recommender'] = self
+        self._app = app
+
+    # -------------------------- 在线读取 --------------------------
+    def related(self, item_id: int, limit: int = None) -> list:
+        """
+        获取经常与该商品一起购买的商品
+        :param item_id: 商品ID
+        :param limit: 返回数量
+        :return: [(item_id, score), ...]
+        """
+        self._ensure_loaded()
+        return self._neighbours.get(item_id, [])[:limit]
+
+    def reset(self):
+        """丢弃已加载的近邻，下次读取时重新加载文件"""
+        with self._lock:
+            self._neighbours = {}
+            self._loaded_mtime = None
+
+    def _ensure_loaded(self):
+        """近邻文件修改时间变化时重新加载（构建可能在其他进程中执行）"""
+        path = self._config('RECOMMEND_PATH')
+        try:
+            mtime = os.stat(path).st_mtime_ns if path else None
+        except OSError:
+            mtime = None
+        if mtime == self._loaded_mtime:
+            return
+        with self._lock:
+            if mtime == self._loaded_mtime:
+                return
+            neighbours = {}
+            if mtime is not None:
+                try:
+                    with open(path, encoding='utf-8') as f:
+                        payload = json.load(f)
+                    if payload.get('version') == FORMAT_VERSION:
+                        neighbours = {
+                            int(item_id): [tuple(pair) for pair in pairs]
+                            for item_id, pairs in payload['neighbours'].items()
+                        }
+                except (OSError, ValueError, KeyError) as e:
+                    logger.warning(f"加载推荐近邻文件失败: {str(e)}")
+            self._neighbours = neighbours
+            self._loaded_mtime = mtime
+
+    # -------------------------- 离线构建 --------------------------
+    def build(self, full: bool = False) -> dict:
+        """
+        构建/增量更新共现矩阵并重写近邻文件
+        :param full: 是否忽略状态文件全量构建
+        :return: 构建统计 {'orders', 'updated', 'items', 'watermark'}
+        """
+        path = self._config('RECOMMEND_PATH')
+        state = None if full else self._load_state(path)
+        if state is None:
+            matrix, watermark, recent, neighbours = CoOccurrenceMatrix(), 0, set(), {}
+        else:
+            matrix, watermark, recent, neighbours = state
+
+        orders, touched, watermark = self._scan_orders(matrix, watermark, recent)
+
+        # 受影响的行：新订单中的商品及与其共现过的商品（归一化分母变化）
+        affected = set(touched)
+        for item_id in touched:
+            affected.update(matrix.rows.get(item_id, ()))
+        top_n = self._config('RECOMMEND_TOP_N', DEFAULT_TOP_N)
+        for item_id in affected:
+            row = matrix.neighbours(item_id, top_n)
+            if row:
+                neighbours[item_id] = row
+            else:
+                neighbours.pop(item_id, None)
+
+        if path:
+            self._write(path, matrix, watermark, recent, neighbours)
+        return {'orders': orders, 'updated': len(affected), 'items': len(neighbours), 'watermark': watermark}
+
+    def _scan_orders(self, matrix, watermark, recent):
+        """
+        按订单ID顺序分块流式读取 watermark 之后的订单明细（已取消的订单不计入）
+        回看 watermark 之前 RECOMMEND_CATCH_UP_OVERLAP 个订单ID，跳过 recent 中已处理过的订单
+        :param recent: 回看窗口内已处理的订单ID（原地更新）
+        :return: (处理的订单数, 受影响的商品ID集合, 新的 watermark)
+        """
+        from app.models import db, Order, OrderItem
+
+        chunk_size = self._config('RECOMMEND_CHUNK_SIZE', DEFAULT_CHUNK_SIZE)
+        max_basket = self._config('RECOMMEND_MAX_BASKET', DEFAULT_MAX_BASKET)
+        overlap = self._config('RECOMMEND_CATCH_UP_OVERLAP', DEFAULT_CATCH_UP_OVERLAP)
+        query = db.session.query(OrderItem.order_id, OrderItem.item_id).join(
+            Order, Order.id == OrderItem.order_id
+        ).filter(
+            OrderItem.order_id > watermark - overlap, Order.status != 'cancelled'
+        ).order_by(OrderItem.order_id).execution_options(yield_per=chunk_size)
+
+        orders, touched = 0, set()
+        current_order, basket = None, set()
+
+        def flush():
+            nonlocal orders, touched
+            if basket and current_order not in recent:
+                touched |= matrix.add_basket(sorted(basket)[:max_basket])
+                recent.add(current_order)
+                orders += 1
+
+        for order_id, item_id in query:
+            if order_id != current_order:
+                flush()
+                current_order, basket = order_id, set()
+            basket.add(item_id)
+        flush()
+
+        if current_order is not None:
+            watermark = max(watermark, current_order)
+        recent.difference_update({order_id for order_id in recent if order_id <= watermark - overlap})
+        return orders, touched, watermark
+
+    def _load_state(self, path):
+        """读取状态文件与近邻文件，任一缺失或版本不符时返回 None（改为全量构建）"""
+        if not path:
+            return None
+        try:
+            with open(f'{path}.state', encoding='utf-8') as f:
+                state = json.load(f)
+            with open(path, encoding='utf-8') as f:
+                payload = json.load(f)
+            if state.get('version') != FORMAT_VERSION or payload.get('version') != FORMAT_VERSION:
+                return None
+            neighbours = {
+                int(item_id): [tuple(pair) for pair in pairs]
+                for item_id, pairs in payload['neighbours'].items()
+            }
+            return CoOccurrenceMatrix.load(state['matrix']), state['watermark'], set(state['recent']), neighbours
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"读取推荐构建状态失败，将全量构建: {str(e)}")
+            return None
+
+    def _write(self, path, matrix, watermark, recent, neighbours):
+        """写入状态文件与近邻文件（先写唯一命名的临时文件再原子替换，近邻文件最后替换）"""
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        state = {
+            'version': FORMAT_VERSION,
+            'watermark': watermark,
+            'recent': sorted(recent),
+            'matrix': matrix.dump()
+        }
+        payload = {
+            'version': FORMAT_VERSION,
+            'built_at': datetime.now().isoformat(),
+            'watermark': watermark,
+            'neighbours': {str(item_id): row for item_id, row in neighbours.items()}
+        }
+        for target, content in ((f'{path}.state', state), (path, payload)):
+            fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f'{os.path.basename(target)}.', suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                    json.dump(content, f, separators=(',', ':'))
+                os.replace(tmp_path, target)
+            except BaseException:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
+
+    def _config(self, key, default=None):
+        if self._app is None:
+            return default
+        return self._app.config.get(key, default)
+
+
+recommender = CoPurchaseRecommender()
@@ -2,6 +2,10 @@
 评价与推荐业务逻辑服务
 处理用户评价、商品推荐等
 """
+from app.models import Item
+from app.services.item_service import ItemService
+from app.services.trending_engine import trending_engine
+from app.services.recommender import recommender
 
 
 class ReviewService:
@@ -23,10 +27,72 @@ class ReviewService:
         pass
     
     @staticmethod
-    def get_popular_items(limit=12):
-        """获取热销商品（基于销售量）"""
-        pass
+    def get_popular_items(limit=12, category=None):
+        """
+        获取热门商品（基于浏览/收藏/下单的时间衰减热度，见 trending_engine）
+        热度榜单读取为 O(K)，商品信息用一条 IN 查询补全；榜单不足时用最新上架的商品补齐
+        :param limit: 返回商品数量
+        :param category: 商品分类，None 表示全站
+        :return: 业务处理结果
+        """
+        ranked = trending_engine.top(category)
+        scores = dict(ranked)
+
+        items = []
+        if ranked:
+            rows = Item.query.filter(
+                Item.id.in_(scores.keys()), Item.is_active == True, Item.stock > 0
+            ).all()
+            by_id = {item.id: item for item in rows}
+            items = [by_id[item_id] for item_id, _ in ranked if item_id in by_id][:limit]
+
+        if len(items) < limit:
+            latest = Item.query.filter(Item.is_active == True, Item.stock > 0)
+            if category:
+                latest = latest.filter(Item.category == category)
+            if items:
+                latest = latest.filter(Item.id.notin_([item.id for item in items]))
+            items.extend(latest.order_by(Item.created_at.desc(), Item.id.desc()).limit(limit - len(items)).all())
+
+        item_list = ItemService._build_item_list(items)
+        for entry in item_list:
+            entry['trending_score'] = round(scores.get(entry['id'], 0.0), 4)
+        return {'success': True, 'data': item_list}
     
+    @staticmethod
+    def get_bought_together(item_id, limit=6):
+        """
+        获取经常与该商品一起购买的商品（读取离线构建的近邻文件，见 recommender）
+        近邻查找为 O(1)，商品信息用一条 IN 查询补全，已下架/售罄的商品被跳过
+        :param item_id: 商品ID
+        :param limit: 返回商品数量
+        :return: 业务处理结果
+        """
+        neighbours = recommender.related(item_id)
+        if not neighbours:
+            return {'success': True, 'data': []}
+
+        rows = ItemService.load_item_rows(
+            [other for other, _ in neighbours],
+            Item.title, Item.price, Item.image_url, Item.category, Item.stock, Item.is_active
+        )
+        related = []
+        for other, score in neighbours:
+            row = rows.get(other)
+            if row is None or not row.is_active or row.stock <= 0:
+                continue
+            related.append({
+                'id': other,
+                'title': row.title,
+                'price': float(row.price) if row.price else 0.0,
+                'image': row.image_url or '',
+                'category': row.category,
+                'score': score
+            })
+            if len(related) >= limit:
+                break
+        return {'success': True, 'data': related}
+
     @staticmethod
     def get_latest_items(limit=12):
         """获取最新商品（基于发布时间）"""
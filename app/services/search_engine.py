@@ -0,0 +1,374 @@
+"""
+商品全文搜索引擎
+基于内存倒排索引（标题 + 描述），中文按单字/二元组（bigram）切分、英文数字按单词切分，BM25 排序
+- 商品发布/更新/下架时增量更新索引
+- 索引可持久化到本地文件，重启时直接加载并只补齐期间变更的商品
+- 多进程部署时每个进程按 SEARCH_REFRESH_INTERVAL 定期从数据库补齐其他进程的变更
+
+配置项（app.config）：
+- SEARCH_INDEX_PATH: 索引文件路径，为空则不持久化
+- SEARCH_REFRESH_INTERVAL: 从数据库补齐变更的最小间隔（秒）
+- SEARCH_MAX_CANDIDATES: 按相关度排序时参与 BM25 排名的最大商品数（其余命中商品排在其后，不会被丢弃）
+- SEARCH_MAX_MATCHES: 单次搜索交给数据库过滤/排序的最大命中数（超出时只保留相关度最高的部分，
+  避免 IN 列表过长超出数据库绑定参数上限）
+- SEARCH_CATCH_UP_OVERLAP: 补齐变更时回看 watermark 之前的秒数（覆盖 updated_at 较早但提交较晚的事务）
+"""
+import atexit
+import json
+import logging
+import math
+import os
+import re
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+logger = logging.getLogger(__name__)
+
+INDEX_FORMAT_VERSION = 1
+
+DEFAULT_MAX_CANDIDATES = 1000
+DEFAULT_MAX_MATCHES = 5000
+DEFAULT_CATCH_UP_OVERLAP = 300
+
+# 中文字符（含扩展A区）连续片段 / 英文数字单词
+_TOKEN_PATTERN = re.compile(r'[\u3400-\u4dbf\u4e00-\u9fff]+|[a-z0-9]+')
+_CJK_PATTERN = re.compile(r'[\u3400-\u4dbf\u4e00-\u9fff]')
+
+
+def tokenize(text: str, for_query: bool = False) -> list:
+    """
+    分词：中文输出二元组，英文数字输出小写单词
+    建索引时中文额外输出单字，使单字查询也能命中；查询时长度>=2的中文片段只用二元组
+    :param text: 待切分文本
+    :param for_query: 是否为查询切分
+    :return: 词项列表
+    """
+    if not text:
+        return []
+    tokens = []
+    for run in _TOKEN_PATTERN.findall(text.lower()):
+        if not _CJK_PATTERN.match(run):
+            tokens.append(run)
+            continue
+        if len(run) == 1:
+            tokens.append(run)
+            continue
+        tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+        if not for_query:
+            tokens.extend(run)
+    return tokens
+
+
+class SearchIndex:
+    """倒排索引 + BM25 打分（线程安全）"""
+
+    K1 = 1.2
+    B = 0.75
+    TITLE_WEIGHT = 3  # 标题词频权重
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._doc_terms = {}   # {doc_id: {term: tf}}
+        self._doc_len = {}     # {doc_id: 文档长度}
+        self._postings = {}    # {term: {doc_id: tf}}
+        self._total_len = 0
+
+    def __len__(self):
+        return len(self._doc_terms)
+
+    def __contains__(self, doc_id):
+        return doc_id in self._doc_terms
+
+    def add_document(self, doc_id: int, title: str, description: str = ''):
+        """新增或替换文档"""
+        term_freqs = {}
+        for term in tokenize(title):
+            term_freqs[term] = term_freqs.get(term, 0) + self.TITLE_WEIGHT
+        for term in tokenize(description):
+            term_freqs[term] = term_freqs.get(term, 0) + 1
+        with self._lock:
+            self._remove_locked(doc_id)
+            self._add_terms_locked(doc_id, term_freqs)
+
+    def remove_document(self, doc_id: int):
+        """删除文档"""
+        with self._lock:
+            self._remove_locked(doc_id)
+
+    def match(self, query: str) -> set:
+        """
+        所有查询词项都命中的文档ID（不打分，供按其他字段排序的搜索使用）
+        :param query: 查询字符串
+        """
+        with self._lock:
+            return self._match_locked(query)[1]
+
+    def search(self, query: str, limit: int = None) -> list:
+        """
+        搜索：所有查询词项都命中的文档按 BM25 得分降序返回
+        :param query: 查询字符串
+        :param limit: 返回数量上限
+        :return: [(doc_id, score), ...]
+        """
+        with self._lock:
+            postings, candidates = self._match_locked(query)
+            if not candidates:
+                return []
+            doc_count = len(self._doc_terms)
+            avg_len = self._total_len / doc_count if doc_count else 0.0
+
+            scores = {}
+            for posting in postings:
+                idf = math.log(1 + (doc_count - len(posting) + 0.5) / (len(posting) + 0.5))
+                for doc_id in candidates:
+                    tf = posting[doc_id]
+                    norm = self.K1 * (1 - self.B + self.B * self._doc_len[doc_id] / avg_len) if avg_len else self.K1
+                    scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (self.K1 + 1) / (tf + norm)
+
+        ranked = sorted(scores.items(), key=lambda pair: (-pair[1], -pair[0]))
+        return ranked[:limit] if limit else ranked
+
+    def clear(self):
+        with self._lock:
+            self._doc_terms.clear()
+            self._doc_len.clear()
+            self._postings.clear()
+            self._total_len = 0
+
+    # -------------------------- 持久化 --------------------------
+    def dump(self) -> dict:
+        """导出为可 JSON 序列化的字典（倒排链可由文档词频重建，无需保存）"""
+        with self._lock:
+            return {str(doc_id): terms for doc_id, terms in self._doc_terms.items()}
+
+    def load(self, docs: dict):
+        """从 dump() 的结果恢复"""
+        with self._lock:
+            self.clear()
+            for doc_id, term_freqs in docs.items():
+                self._add_terms_locked(int(doc_id), term_freqs)
+
+    # -------------------------- 内部方法 --------------------------
+    def _match_locked(self, query):
+        """调用方需持有 self._lock：返回 (查询词项的倒排链, 命中文档ID集合)"""
+        terms = list(dict.fromkeys(tokenize(query, for_query=True)))
+        postings = [self._postings.get(term) for term in terms]
+        if not terms or not all(postings):
+            return [], set()
+        # 从最短的倒排链开始求交集
+        postings.sort(key=len)
+        candidates = set(postings[0])
+        for posting in postings[1:]:
+            candidates.intersection_update(posting)
+            if not candidates:
+                break
+        return postings, candidates
+
+    def _add_terms_locked(self, doc_id, term_freqs):
+        if not term_freqs:
+            return
+        self._doc_terms[doc_id] = term_freqs
+        length = sum(term_freqs.values())
+        self._doc_len[doc_id] = length
+        self._total_len += length
+        for term, tf in term_freqs.items():
+            self._postings.setdefault(term, {})[doc_id] = tf
+
+    def _remove_locked(self, doc_id):
+        term_freqs = self._doc_terms.pop(doc_id, None)
+        if term_freqs is None:
+            return
+        self._total_len -= self._doc_len.pop(doc_id, 0)
+        for term in term_freqs:
+            posting = self._postings.get(term)
+            if posting is None:
+                continue
+            posting.pop(doc_id, None)
+            if not posting:
+                del self._postings[term]
+
+
+class SearchEngine:
+    """商品搜索引擎：维护 SearchIndex 与数据库的同步、持久化"""
+
+    def __init__(self, app=None):
+        self._app = None
+        self.index = SearchIndex()
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._watermark = None       # 已同步到的 items.updated_at
+        self._last_refresh = 0.0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('SEARCH_INDEX_PATH', os.path.join(app.instance_path, 'search_index.json'))
+        app.config.setdefault('SEARCH_REFRESH_INTERVAL', 30)
+        app.config.setdefault('SEARCH_MAX_CANDIDATES', DEFAULT_MAX_CANDIDATES)
+        app.config.setdefault('SEARCH_MAX_MATCHES', DEFAULT_MAX_MATCHES)
+        app.config.setdefault('SEARCH_CATCH_UP_OVERLAP', DEFAULT_CATCH_UP_OVERLAP)
+        app.extensions['search_engine'] = self
+        self._app = app
+        atexit.register(self.save)
+
+    # -------------------------- 查询 --------------------------
+    def search_ids(self, query: str, limit: int = None) -> list:
+        """
+        搜索商品，返回按相关度排序的商品ID列表
+        :param query: 查询关键词
+        :param limit: 返回数量上限，默认返回全部命中商品
+        :return: [item_id, ...]
+        """
+        self._ensure_fresh()
+        return [doc_id for doc_id, _ in self.index.search(query, limit=limit)]
+
+    def match_ids(self, query: str) -> set:
+        """
+        搜索商品，返回全部命中的商品ID（不计算相关度，供按时间/价格等排序的搜索使用）
+        :param query: 查询关键词
+        """
+        self._ensure_fresh()
+        return self.index.match(query)
+
+    @property
+    def max_candidates(self) -> int:
+        """按相关度排序时参与排名的最大商品数"""
+        return self._config('SEARCH_MAX_CANDIDATES', DEFAULT_MAX_CANDIDATES)
+
+    @property
+    def max_matches(self) -> int:
+        """单次搜索交给数据库过滤/排序的最大命中数"""
+        return self._config('SEARCH_MAX_MATCHES', DEFAULT_MAX_MATCHES)
+
+    # -------------------------- 增量更新 --------------------------
+    def index_item(self, item):
+        """商品发布/更新后调用；已下架商品会从索引中移除"""
+        if not self._loaded:
+            return  # 尚未加载，首次搜索时会整体构建
+        if item.is_active:
+            self.index.add_document(item.id, item.title, item.description)
+        else:
+            self.index.remove_document(item.id)
+
+    def remove_item(self, item_id: int):
+        """商品删除/下架后调用"""
+        if self._loaded:
+            self.index.remove_document(item_id)
+
+    # -------------------------- 构建与持久化 --------------------------
+    def rebuild(self) -> int:
+        """从数据库全量重建索引并保存到文件"""
+        from app.models import Item
+        with self._lock:
+            self.index.clear()
+            watermark = None
+            query = Item.query.filter(Item.is_active == True).with_entities(
+                Item.id, Item.title, Item.description, Item.updated_at
+            ).order_by(Item.id)
+            for item_id, title, description, updated_at in query.yield_per(1000):
+                self.index.add_document(item_id, title, description)
+                if updated_at and (watermark is None or updated_at > watermark):
+                    watermark = updated_at
+            self._watermark = watermark
+            self._loaded = True
+            self._last_refresh = time.monotonic()
+        self.save()
+        return len(self.index)
+
+    def save(self):
+        """保存索引到 SEARCH_INDEX_PATH（先写本次调用独占的临时文件再原子替换，多进程同时保存互不干扰）"""
+        path = self._config('SEARCH_INDEX_PATH')
+        if not path or not self._loaded:
+            return
+        payload = {
+            'version': INDEX_FORMAT_VERSION,
+            'watermark': self._watermark.isoformat() if self._watermark else None,
+            'docs': self.index.dump()
+        }
+        tmp_path = None
+        try:
+            directory = os.path.dirname(os.path.abspath(path))
+            os.makedirs(directory, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f'{os.path.basename(path)}.', suffix='.tmp')
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(payload, f, ensure_ascii=False, separators=(',', ':'))
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.error(f"保存搜索索引失败: {str(e)}")
+            if tmp_path and os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def reset(self):
+        """丢弃内存索引，下次搜索时重新加载/构建"""
+        with self._lock:
+            self.index.clear()
+            self._loaded = False
+            self._watermark = None
+            self._last_refresh = 0.0
+
+    def _ensure_fresh(self):
+        if not self._loaded:
+            with self._lock:
+                loaded = self._loaded or self._load_file()
+            if not loaded:
+                self.rebuild()
+                return
+        interval = self._config('SEARCH_REFRESH_INTERVAL', 30)
+        if time.monotonic() - self._last_refresh >= interval:
+            # 加锁后再次检查，避免并发请求同时补齐、交错推进 watermark
+            with self._lock:
+                if time.monotonic() - self._last_refresh >= interval:
+                    self._catch_up()
+
+    def _load_file(self) -> bool:
+        path = self._config('SEARCH_INDEX_PATH')
+        if not path or not os.path.exists(path):
+            return False
+        try:
+            with open(path, encoding='utf-8') as f:
+                payload = json.load(f)
+            if payload.get('version') != INDEX_FORMAT_VERSION:
+                return False
+            self.index.load(payload['docs'])
+            watermark = payload.get('watermark')
+            self._watermark = datetime.fromisoformat(watermark) if watermark else None
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"加载搜索索引失败，将重新构建: {str(e)}")
+            self.index.clear()
+            return False
+        self._loaded = True
+        self._catch_up()
+        return True
+
+    def _catch_up(self):
+        """
+        补齐 watermark 之后数据库中变更的商品（其他进程写入或停机期间的变更）
+        updated_at 在写入时取值、提交可能更晚，较早时间戳的行可能在 watermark 推进之后才可见，
+        因此回看 SEARCH_CATCH_UP_OVERLAP 秒（重复处理同一商品是幂等的）
+        调用方需持有 self._lock
+        """
+        from app.models import Item
+        self._last_refresh = time.monotonic()
+        query = Item.query.with_entities(
+            Item.id, Item.title, Item.description, Item.is_active, Item.updated_at
+        )
+        if self._watermark is not None:
+            overlap = timedelta(seconds=self._config('SEARCH_CATCH_UP_OVERLAP', DEFAULT_CATCH_UP_OVERLAP))
+            query = query.filter(Item.updated_at >= self._watermark - overlap)
+        for item_id, title, description, is_active, updated_at in query.yield_per(1000):
+            if is_active:
+                self.index.add_document(item_id, title, description)
+            else:
+                self.index.remove_document(item_id)
+            if updated_at and (self._watermark is None or updated_at > self._watermark):
+                self._watermark = updated_at
+
+    def _config(self, key, default=None):
+        if self._app is None:
+            return default
+        return self._app.config.get(key, default)
+
+
+search_engine = SearchEngine()
@@ -0,0 +1,558 @@
+"""
+商品热度（趋势）引擎
+浏览、收藏、下单事件写入每个商品的指数衰减计数器，热度随时间按半衰期衰减，
+老商品不会因为累计浏览量高而长期占据“热门”
+- 计数器保存在紧凑数组中（商品ID / 热度 / 分类各一个 array），不为每个商品创建对象
+- 前向衰减：新事件按 e^{λ(t - epoch)} 放大后累加，所有商品共用同一衰减因子，
+  排序时无需逐个衰减；放大倍数过大时整体换算到新的 epoch（顺序不变）
+- 每个分类（及全站）维护前 TRENDING_TOP_K 名，事件只会使热度上升，增量维护为 O(K)，读取为 O(K)；
+  分类未知的商品ID单独记录在集合中，读取分类榜单时一次查询补齐后清空，不扫描全部计数器
+- 定期将计数器检查点写入本地文件，重启时加载；多个进程共用同一检查点文件时，
+  每个进程只把上次检查点以来自己记录的增量（事件、下架、分类变更）在文件锁内合并进文件，
+  不会相互覆盖，合并结果同时作为本进程新的计数器（可看到其他进程的事件）
+
+配置项（app.config）：
+- TRENDING_HALF_LIFE_HOURS: 热度半衰期（小时）
+- TRENDING_TOP_K: 每个分类维护的榜单长度
+- TRENDING_WEIGHTS: 事件权重 {'view', 'favorite', 'order'}
+- TRENDING_CHECKPOINT_PATH: 检查点文件路径，为空则不持久化
+- TRENDING_CHECKPOINT_INTERVAL: 检查点写入间隔（秒），<=0 表示不启动后台线程（仅退出时写入）
+"""
+import atexit
+import json
+import logging
+import math
+import os
+import sys
+import tempfile
+import threading
+import time
+from array import array
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_FORMAT_VERSION = 1
+
+DEFAULT_HALF_LIFE_HOURS = 24.0
+DEFAULT_TOP_K = 100
+DEFAULT_WEIGHTS = {'view': 1.0, 'favorite': 3.0, 'order': 5.0}
+DEFAULT_CHECKPOINT_INTERVAL = 60
+
+UNKNOWN_CATEGORY = -1   # 分类未知（尚未从数据库补齐）
+ALL_CATEGORIES = None   # 全站榜单的键
+
+# 放大倍数 e^{λ(t - epoch)} 的指数超过该值时换算到新的 epoch，避免浮点溢出
+MAX_EXPONENT = 50.0
+# 衰减到该值以下的计数器在整理时回收
+PRUNE_BELOW = 1e-3
+
+
+class DecayedCounters:
+    """数组存储的指数衰减计数器 + 分类榜单（非线程安全，由 TrendingEngine 加锁）"""
+
+    def __init__(self, half_life_seconds: float, top_k: int, epoch: float = None):
+        self.decay = math.log(2) / half_life_seconds
+        self.top_k = top_k
+        self.epoch = time.time() if epoch is None else epoch
+        self._slots = {}                # {item_id: 数组下标}
+        self._ids = array('q')          # 下标 -> 商品ID（0 表示空闲）
+        self._scores = array('d')       # 下标 -> 以 epoch 为基准放大后的热度
+        self._categories = array('i')   # 下标 -> 分类编号
+        self._category_names = []       # 分类编号 -> 分类名
+        self._category_index = {}       # {分类名: 分类编号}
+        self._free = []                 # 空闲下标
+        self._unresolved = set()        # 分类未知的商品ID
+        self._tops = {ALL_CATEGORIES: []}  # {分类编号/ALL_CATEGORIES: [下标, ...]（按热度降序）}
+
+    def __len__(self):
+        return len(self._slots)
+
+    def __contains__(self, item_id):
+        return item_id in self._slots
+
+    # -------------------------- 写入 --------------------------
+    def add(self, item_id: int, weight: float, now: float, category: str = None):
+        """
+        记录一次事件
+        :param item_id: 商品ID
+        :param weight: 事件权重
+        :param now: 事件时间（time.time()）
+        :param category: 商品分类，未知时为 None
+        """
+        exponent = self.decay * (now - self.epoch)
+        if exponent > MAX_EXPONENT:
+            self.rebase(now)
+            exponent = 0.0
+
+        slot = self._slots.get(item_id)
+        if slot is None:
+            slot = self._allocate(item_id)
+        self._scores[slot] += weight * math.exp(exponent)
+
+        if self._categories[slot] == UNKNOWN_CATEGORY:
+            if category is not None:
+                self._categories[slot] = self._category_id(category)
+                self._unresolved.discard(item_id)
+            else:
+                self._unresolved.add(item_id)
+        self._promote(ALL_CATEGORIES, slot)
+        if self._categories[slot] != UNKNOWN_CATEGORY:
+            self._promote(self._categories[slot], slot)
+
+    def set_category(self, item_id: int, category: str):
+        """设置/修改商品分类（分类变更时从原分类榜单移出）"""
+        slot = self._slots.get(item_id)
+        if slot is None:
+            return
+        self._unresolved.discard(item_id)
+        if not category:
+            return
+        new_id = self._category_id(category)
+        old_id = self._categories[slot]
+        if old_id == new_id:
+            return
+        self._categories[slot] = new_id
+        if old_id != UNKNOWN_CATEGORY and slot in self._tops.get(old_id, ()):
+            self._rebuild_top(old_id)
+        self._promote(new_id, slot)
+
+    def discard(self, item_id: int):
+        """移除商品（下架/删除），所在榜单从剩余计数器中补齐"""
+        slot = self._slots.pop(item_id, None)
+        if slot is None:
+            return
+        self._unresolved.discard(item_id)
+        category_id = self._categories[slot]
+        self._ids[slot] = 0
+        self._scores[slot] = 0.0
+        self._categories[slot] = UNKNOWN_CATEGORY
+        self._free.append(slot)
+        for key in (ALL_CATEGORIES, category_id):
+            if slot in self._tops.get(key, ()):
+                self._rebuild_top(key)
+
+    # -------------------------- 读取 --------------------------
+    def top(self, category: str = None, limit: int = None, now: float = None) -> list:
+        """
+        获取热度榜单
+        :param category: 分类，None 表示全站
+        :param limit: 返回数量（不超过 top_k）
+        :param now: 当前时间，用于换算实际热度
+        :return: [(item_id, 当前热度), ...]
+        """
+        if category is None:
+            key = ALL_CATEGORIES
+        else:
+            key = self._category_index.get(category)
+            if key is None:
+                return []
+        slots = self._tops.get(key, [])[:limit]
+        factor = math.exp(-self.decay * ((time.time() if now is None else now) - self.epoch))
+        return [(self._ids[slot], self._scores[slot] * factor) for slot in slots]
+
+    def score(self, item_id: int, now: float = None) -> float:
+        """获取商品当前热度"""
+        slot = self._slots.get(item_id)
+        if slot is None:
+            return 0.0
+        return self._scores[slot] * math.exp(-self.decay * ((time.time() if now is None else now) - self.epoch))
+
+    def unresolved(self) -> list:
+        """分类未知（尚未补齐）的商品ID"""
+        return list(self._unresolved)
+
+    def merge(self, other):
+        """
+        累加另一组计数器（如本进程自上次检查点以来的增量），分类未知时沿用 other 中的分类
+        :param other: DecayedCounters（会被换算到本计数器的 epoch）
+        """
+        other.rebase(self.epoch)
+        for item_id, slot in other._slots.items():
+            category_id = other._categories[slot]
+            category = other._category_names[category_id] if category_id != UNKNOWN_CATEGORY else None
+            # 以本计数器的 epoch 为事件时间，热度按原值累加
+            self.add(item_id, other._scores[slot], self.epoch, category)
+
+    # -------------------------- 整理与持久化 --------------------------
+    def rebase(self, now: float, prune: bool = False):
+        """
+        将所有热度换算到以 now 为基准（整体乘同一因子，榜单顺序不变）
+        :param now: 新的 epoch
+        :param prune: 是否回收已衰减到 PRUNE_BELOW 以下的计数器
+        """
+        factor = math.exp(-self.decay * (now - self.epoch))
+        scores = self._scores
+        for slot in range(len(scores)):
+            scores[slot] *= factor
+        self.epoch = now
+        if prune:
+            stale = [item_id for item_id, slot in self._slots.items() if scores[slot] < PRUNE_BELOW]
+            for item_id in stale:
+                slot = self._slots.pop(item_id)
+                self._unresolved.discard(item_id)
+                self._ids[slot] = 0
+                scores[slot] = 0.0
+                self._categories[slot] = UNKNOWN_CATEGORY
+                self._free.append(slot)
+            if stale:
+                for key in list(self._tops):
+                    self._rebuild_top(key)
+
+    def dump(self) -> bytes:
+        """序列化为检查点：一行 JSON 头 + 商品ID/热度/分类三个数组的原始字节（只保存在用的下标）"""
+        live = sorted(self._slots.values())
+        ids = array('q', (self._ids[slot] for slot in live))
+        scores = array('d', (self._scores[slot] for slot in live))
+        categories = array('i', (self._categories[slot] for slot in live))
+        header = {
+            'version': CHECKPOINT_FORMAT_VERSION,
+            'byteorder': sys.byteorder,
+            'epoch': self.epoch,
+            'decay': self.decay,
+            'count': len(live),
+            'categories': self._category_names
+        }
+        return json.dumps(header, ensure_ascii=False).encode('utf-8') + b'\n' + \
+            ids.tobytes() + scores.tobytes() + categories.tobytes()
+
+    @classmethod
+    def load(cls, data: bytes, half_life_seconds: float, top_k: int, now: float = None):
+        """
+        从检查点恢复（按检查点中的衰减系数换算到当前时间，之后按新的半衰期衰减）
+        :raises ValueError: 检查点格式不正确
+        """
+        newline = data.index(b'\n')
+        header = json.loads(data[:newline].decode('utf-8'))
+        if header.get('version') != CHECKPOINT_FORMAT_VERSION:
+            raise ValueError('检查点版本不匹配')
+
+        count = header['count']
+        ids, scores, categories = array('q'), array('d'), array('i')
+        offset = newline + 1
+        for arr in (ids, scores, categories):
+            size = count * arr.itemsize
+            arr.frombytes(data[offset:offset + size])
+            offset += size
+            if header['byteorder'] != sys.byteorder:
+                arr.byteswap()
+        if not len(ids) == len(scores) == len(categories) == count:
+            raise ValueError('检查点数据不完整')
+
+        now = time.time() if now is None else now
+        factor = math.exp(-header['decay'] * (now - header['epoch']))
+        counters = cls(half_life_seconds, top_k, epoch=now)
+        counters._category_names = list(header['categories'])
+        counters._category_index = {name: index for index, name in enumerate(counters._category_names)}
+        counters._ids = ids
+        counters._scores = array('d', (score * factor for score in scores))
+        counters._categories = categories
+        counters._slots = {item_id: slot for slot, item_id in enumerate(ids)}
+        counters._unresolved = {item_id for slot, item_id in enumerate(ids) if categories[slot] == UNKNOWN_CATEGORY}
+        counters._tops = {ALL_CATEGORIES: []}
+        for key in [ALL_CATEGORIES] + list(range(len(counters._category_names))):
+            counters._rebuild_top(key)
+        return counters
+
+    # -------------------------- 内部方法 --------------------------
+    def _allocate(self, item_id):
+        if self._free:
+            slot = self._free.pop()
+            self._ids[slot] = item_id
+            self._scores[slot] = 0.0
+            self._categories[slot] = UNKNOWN_CATEGORY
+        else:
+            slot = len(self._ids)
+            self._ids.append(item_id)
+            self._scores.append(0.0)
+            self._categories.append(UNKNOWN_CATEGORY)
+        self._slots[item_id] = slot
+        return slot
+
+    def _category_id(self, category):
+        category_id = self._category_index.get(category)
+        if category_id is None:
+            category_id = len(self._category_names)
+            self._category_names.append(category)
+            self._category_index[category] = category_id
+        return category_id
+
+    def _promote(self, key, slot):
+        """热度上升后调整榜单位置：已在榜单中则上移，否则超过末位时插入并截断，O(K)"""
+        top = self._tops.setdefault(key, [])
+        scores = self._scores
+        if slot in top:
+            top.remove(slot)
+        elif len(top) >= self.top_k and scores[slot] <= scores[top[-1]]:
+            return
+        position = len(top)
+        while position > 0 and scores[top[position - 1]] < scores[slot]:
+            position -= 1
+        top.insert(position, slot)
+        del top[self.top_k:]
+
+    def _rebuild_top(self, key):
+        """全量扫描重建榜单（仅在商品移出榜单时需要）"""
+        slots = self._slots.values() if key is ALL_CATEGORIES else \
+            [slot for slot in self._slots.values() if self._categories[slot] == key]
+        self._tops[key] = sorted(slots, key=self._scores.__getitem__, reverse=True)[:self.top_k]
+
+
+@contextmanager
+def _file_lock(path):
+    """进程间互斥锁（flock）；不支持 fcntl 的平台上不加锁"""
+    if fcntl is None:
+        yield
+        return
+    with open(path, 'a+b') as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+class TrendingEngine:
+    """商品热度引擎（线程安全）"""
+
+    def __init__(self, app=None):
+        self._app = None
+        self._lock = threading.Lock()
+        self._counters = None
+        self._dirty = False
+        # 自上次检查点以来本进程的增量（仅配置了检查点文件时记录）：事件计数器、下架的商品、分类变更
+        self._delta = None
+        self._discarded = set()
+        self._recategorized = {}
+        self._stopped = threading.Event()
+        self._thread = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('TRENDING_HALF_LIFE_HOURS', DEFAULT_HALF_LIFE_HOURS)
+        app.config.setdefault('TRENDING_TOP_K', DEFAULT_TOP_K)
+        app.config.setdefault('TRENDING_WEIGHTS', dict(DEFAULT_WEIGHTS))
+        app.config.setdefault('TRENDING_CHECKPOINT_PATH', os.path.join(app.instance_path, 'trending.bin'))
+        app.config.setdefault('TRENDING_CHECKPOINT_INTERVAL', DEFAULT_CHECKPOINT_INTERVAL)
+        app.extensions['trending_engine'] = self
+        self._app = app
+        atexit.register(self.shutdown)
+
+    # -------------------------- 事件 --------------------------
+    def record(self, item_id: int, event: str, count: int = 1, category: str = None):
+        """
+        记录商品事件
+        :param item_id: 商品ID
+        :param event: 事件类型（view/favorite/order）
+        :param count: 事件次数（下单时为购买数量）
+        :param category: 商品分类（已知时传入，未知时读取榜单前一次性补齐）
+        """
+        weight = self._config('TRENDING_WEIGHTS', DEFAULT_WEIGHTS).get(event, 0) * count
+        if weight <= 0:
+            return
+        now = time.time()
+        with self._lock:
+            self._ensure_loaded().add(item_id, weight, now, category)
+            if self._tracking():
+                self._delta.add(item_id, weight, now, category)
+            self._dirty = True
+        self._ensure_worker()
+
+    def update_item(self, item):
+        """商品更新后调用：已下架则移出榜单，分类变更则移动到新分类榜单"""
+        if not item.is_active:
+            self.discard(item.id)
+            return
+        with self._lock:
+            counters = self._ensure_loaded()
+            if self._tracking():
+                self._recategorized[item.id] = item.category
+            if item.id not in counters:
+                return
+            counters.set_category(item.id, item.category)
+            self._dirty = True
+
+    def discard(self, item_id: int):
+        """商品删除/下架后调用"""
+        with self._lock:
+            self._ensure_loaded().discard(item_id)
+            if self._tracking():
+                self._delta.discard(item_id)
+                self._discarded.add(item_id)
+                self._recategorized.pop(item_id, None)
+            self._dirty = True
+
+    # -------------------------- 读取 --------------------------
+    def top(self, category: str = None, limit: int = None) -> list:
+        """
+        获取热度榜单
+        :param category: 分类，None 表示全站
+        :param limit: 返回数量，None 表示整个榜单
+        :return: [(item_id, 当前热度), ...]
+        """
+        with self._lock:
+            counters = self._ensure_loaded()
+            unresolved = counters.unresolved() if category is not None else []
+        if unresolved:
+            self._resolve_categories(unresolved)
+        with self._lock:
+            return self._ensure_loaded().top(category, limit)
+
+    def score(self, item_id: int) -> float:
+        with self._lock:
+            return self._ensure_loaded().score(item_id)
+
+    # -------------------------- 检查点 --------------------------
+    def checkpoint(self) -> bool:
+        """
+        整理计数器（换算 epoch、回收已衰减的计数器）并写入检查点文件
+        在文件锁内读取文件中的计数器、合并本进程的增量后写回（先写临时文件再原子替换），
+        合并结果（叠加期间新记录的事件）替换本进程的计数器
+        """
+        path = self._config('TRENDING_CHECKPOINT_PATH')
+        with self._lock:
+            if self._counters is None or not self._dirty:
+                return False
+            now = time.time()
+            self._dirty = False
+            if not path or self._delta is None:
+                self._counters.rebase(now, prune=True)
+                return False
+            pending = (self._delta, self._discarded, self._recategorized)
+            self._delta, self._discarded, self._recategorized = None, set(), {}
+
+        try:
+            directory = os.path.dirname(os.path.abspath(path))
+            os.makedirs(directory, exist_ok=True)
+            with _file_lock(f'{path}.lock'):
+                merged = self._load_checkpoint(path) or self._new_counters(now)
+                self._apply_changes(merged, *pending)
+                merged.rebase(now, prune=True)
+                fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=os.path.basename(path) + '.', suffix='.tmp')
+                try:
+                    with os.fdopen(fd, 'wb') as f:
+                        f.write(merged.dump())
+                    os.replace(tmp_path, path)
+                except BaseException:
+                    if os.path.exists(tmp_path):
+                        os.remove(tmp_path)
+                    raise
+        except OSError as e:
+            logger.error(f"保存热度检查点失败: {str(e)}")
+            # 增量放回，下次检查点重试
+            with self._lock:
+                delta, discarded, recategorized = pending
+                if self._delta is not None:
+                    delta.merge(self._delta)
+                self._delta = delta
+                self._discarded = discarded | self._discarded
+                self._recategorized = {**recategorized, **self._recategorized}
+                self._dirty = True
+            return False
+
+        with self._lock:
+            self._apply_changes(merged, self._delta, self._discarded, self._recategorized)
+            self._counters = merged
+        return True
+
+    def reset(self):
+        """丢弃内存中的计数器与未写入的增量，下次使用时重新加载检查点"""
+        with self._lock:
+            self._counters = None
+            self._dirty = False
+            self._delta = None
+            self._discarded = set()
+            self._recategorized = {}
+
+    def shutdown(self):
+        """停止后台线程并写入最后一次检查点"""
+        self._stopped.set()
+        self.checkpoint()
+
+    # -------------------------- 内部方法 --------------------------
+    def _ensure_loaded(self):
+        """调用方需持有 self._lock"""
+        if self._counters is None:
+            self._counters = self._load_checkpoint(self._config('TRENDING_CHECKPOINT_PATH')) or self._new_counters()
+        return self._counters
+
+    def _tracking(self) -> bool:
+        """配置了检查点文件时记录本进程的增量（调用方需持有 self._lock）"""
+        if not self._config('TRENDING_CHECKPOINT_PATH'):
+            return False
+        if self._delta is None:
+            self._delta = self._new_counters()
+        return True
+
+    def _new_counters(self, epoch: float = None):
+        half_life = self._config('TRENDING_HALF_LIFE_HOURS', DEFAULT_HALF_LIFE_HOURS) * 3600
+        return DecayedCounters(half_life, self._config('TRENDING_TOP_K', DEFAULT_TOP_K), epoch=epoch)
+
+    @staticmethod
+    def _apply_changes(counters, delta, discarded, recategorized):
+        """将增量应用到计数器：先移除下架的商品，再累加事件、修改分类"""
+        for item_id in discarded:
+            counters.discard(item_id)
+        if delta is not None:
+            counters.merge(delta)
+        for item_id, category in recategorized.items():
+            counters.set_category(item_id, category)
+
+    def _load_checkpoint(self, path):
+        if not path or not os.path.exists(path):
+            return None
+        half_life = self._config('TRENDING_HALF_LIFE_HOURS', DEFAULT_HALF_LIFE_HOURS) * 3600
+        try:
+            with open(path, 'rb') as f:
+                return DecayedCounters.load(f.read(), half_life, self._config('TRENDING_TOP_K', DEFAULT_TOP_K))
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"加载热度检查点失败，将从空计数器开始: {str(e)}")
+            return None
+
+    def _resolve_categories(self, item_ids):
+        """一次 IN 查询补齐分类未知的商品（仅由浏览事件首次写入、且无分类信息时出现）"""
+        from app.models import Item
+        from app.services.item_service import ItemService
+        rows = ItemService.load_item_rows(item_ids, Item.category, Item.is_active)
+        with self._lock:
+            counters = self._ensure_loaded()
+            for item_id in item_ids:
+                row = rows.get(item_id)
+                if row is None or not row.is_active:
+                    counters.discard(item_id)
+                else:
+                    counters.set_category(item_id, row.category)
+            self._dirty = True
+
+    def _ensure_worker(self):
+        if self._config('TRENDING_CHECKPOINT_INTERVAL', DEFAULT_CHECKPOINT_INTERVAL) <= 0:
+            return
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stopped.clear()
+            self._thread = threading.Thread(target=self._run, name='trending-checkpoint', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            interval = self._config('TRENDING_CHECKPOINT_INTERVAL', DEFAULT_CHECKPOINT_INTERVAL)
+            if interval <= 0 or self._stopped.wait(interval):
+                return
+            self.checkpoint()
+
+    def _config(self, key, default=None):
+        if self._app is None:
+            return default
+        return self._app.config.get(key, default)
+
+
+trending_engine = TrendingEngine()
@@ -2,9 +2,10 @@
 用户业务逻辑服务层
 负责处理用户注册、登录、资料查询/更新等核心业务逻辑
 """
-from app.models import User, Item, Order, OrderItem, Review, db 
-from app.utils.password_helper import PasswordHelper
+from app.models import User, Item, Order, OrderItem, Review, UserRating, db
+from app.utils.password_helper import PasswordHelper, PasswordHasherBusy
 from app.utils.jwt_helper import generate_token
+from app.utils.cache import response_cache
 from datetime import datetime
 
 class UserService:
@@ -28,8 +29,11 @@ class UserService:
         if User.query.filter_by(email=email).first():
             return {'success': False, 'message': '邮箱已注册'}
         
-        # 密码加密
-        password_hash = PasswordHelper.hash_password(password)
+        # 密码加密（密码计算进程池排队已满时返回重试建议）
+        try:
+            password_hash = PasswordHelper.hash_password(password)
+        except PasswordHasherBusy as e:
+            return {'success': False, 'message': str(e), 'retry_after': e.retry_after}
         
         # 创建用户
         try:
@@ -75,13 +79,20 @@ class UserService:
         if not user:
             return {'success': False, 'message': '用户名或密码错误'}
         
-        # 验证密码
-        if not PasswordHelper.verify_password(password, user.password_hash):
-            return {'success': False, 'message': '用户名或密码错误'}
+        # 验证密码（密码计算进程池排队已满时返回重试建议）
+        try:
+            if not PasswordHelper.verify_password(password, user.password_hash):
+                return {'success': False, 'message': '用户名或密码错误'}
+        except PasswordHasherBusy as e:
+            return {'success': False, 'message': str(e), 'retry_after': e.retry_after}
         
         # 验证账户是否激活
         if not user.is_active:
             return {'success': False, 'message': '账户已被禁用，请联系管理员'}
+
+        # 工作因子配置变更后，登录时用明文密码重新加密
+        if PasswordHelper.needs_rehash(user.password_hash):
+            UserService._rehash_password(user, password)
         
         # 生成Token
         token = generate_token(user.id)
@@ -103,6 +114,17 @@ class UserService:
             }
         }
 
+    @staticmethod
+    def _rehash_password(user, password: str):
+        """按当前 BCRYPT_ROUNDS 重新加密并保存（失败或繁忙时跳过，下次登录再试）"""
+        try:
+            user.password_hash = PasswordHelper.hash_password(password)
+            db.session.commit()
+        except PasswordHasherBusy:
+            pass
+        except Exception:
+            db.session.rollback()
+
     # -------------------------- 3. 获取当前用户信息 --------------------------
     @staticmethod
     def get_current_user(user_id: int):
@@ -187,6 +209,7 @@ class UserService:
         
         try:
             db.session.commit()
+            response_cache.invalidate(f'user:{user_id}')
             # 返回更新后的用户信息
             return {'success': True, 'data': UserService.get_current_user(user_id)['data']}
         except Exception as e:
@@ -228,15 +251,61 @@ class UserService:
     def _get_user_rating(user_id: int) -> float:
         """
         获取用户评分（1-5分）
+        直接读取 user_ratings 聚合表，O(1)
         :param user_id: 用户ID
         :return: 平均评分
         """
-        reviews = Review.query.filter_by(reviewee_id=user_id).all()
-        if not reviews:
-            return 5.0  # 无评价时默认5分
-        
-        total_rating = sum(review.rating for review in reviews)
-        return round(total_rating / len(reviews), 1)
+        aggregate = db.session.get(UserRating, user_id)
+        if not aggregate:
+            return UserRating.DEFAULT_RATING  # 无评价时默认5分
+        return aggregate.average
+
+    @staticmethod
+    def _get_user_ratings(user_ids: list) -> dict:
+        """
+        批量获取多个用户的评分（一次主键 IN 查询聚合表）
+        :param user_ids: 用户ID列表
+        :return: {用户ID: 平均评分}，无评价的用户默认5分
+        """
+        if not user_ids:
+            return {}
+
+        ratings = {user_id: UserRating.DEFAULT_RATING for user_id in user_ids}
+        for aggregate in UserRating.query.filter(UserRating.user_id.in_(user_ids)).all():
+            ratings[aggregate.user_id] = aggregate.average
+        return ratings
+
+    @staticmethod
+    def rebuild_rating_aggregates() -> int:
+        """
+        根据 reviews 表批量重建评分聚合（用于首次回填或修复漂移）
+        :return: 重建的用户数量
+        """
+        columns = [
+            Review.reviewee_id,
+            db.func.sum(Review.rating),
+            db.func.count(Review.id)
+        ] + [
+            db.func.sum(db.case((Review.rating == star, 1), else_=0)) for star in range(1, 6)
+        ] + [
+            db.literal(datetime.now())
+        ]
+        aggregate_query = db.select(*columns).group_by(Review.reviewee_id)
+
+        try:
+            db.session.execute(db.delete(UserRating))
+            db.session.execute(
+                db.insert(UserRating).from_select(
+                    ['user_id', 'rating_sum', 'rating_count',
+                     'star_1', 'star_2', 'star_3', 'star_4', 'star_5', 'updated_at'],
+                    aggregate_query
+                )
+            )
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        return UserRating.query.count()
 
     @staticmethod
     def _get_user_stats(user_id: int) -> dict:
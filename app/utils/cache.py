@@ -0,0 +1,361 @@
+"""
+接口响应缓存
+缓存 GET/POST 查询接口的完整响应体（状态码 + 类型 + 字节），命中时直接返回，不再进入服务层
+- 有界：按条目数与总字节数做 LRU 淘汰，单个响应超过上限时不缓存
+- TTL：每个接口单独指定有效期
+- 标签失效：缓存时为响应打上标签（如 item:42、category:books），服务层写路径按标签失效
+- 作用域：public 所有用户共享；user 按当前登录用户（g.user_id）区分，未登录用户共享一份
+
+后端（RESPONSE_CACHE_BACKEND）：
+- memory: 进程内 LRU（默认）。标签失效只作用于本进程，多进程部署时其他进程最多陈旧一个 TTL
+- sqlite: 共享文件（RESPONSE_CACHE_PATH），同一主机上的多个进程共享缓存与标签失效；
+  命中时的最近访问时间先记录在进程内，累计一批或下次写入缓存（淘汰之前）时批量更新，读命中不写库
+- none: 关闭缓存
+
+配置项（app.config）：
+- RESPONSE_CACHE_BACKEND: memory | sqlite | none
+- RESPONSE_CACHE_DEFAULT_TTL: 未指定 ttl 时的默认有效期（秒）
+- RESPONSE_CACHE_MAX_ENTRIES: 最多缓存的响应数
+- RESPONSE_CACHE_MAX_BYTES: 缓存响应体总字节数上限
+- RESPONSE_CACHE_MAX_ENTRY_BYTES: 单个响应体字节数上限
+- RESPONSE_CACHE_PATH: sqlite 后端的缓存文件路径
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from functools import wraps
+
+from flask import Response, current_app, g, request
+
+DEFAULT_TTL = 60
+DEFAULT_MAX_ENTRIES = 2048
+DEFAULT_MAX_BYTES = 32 * 1024 * 1024
+DEFAULT_MAX_ENTRY_BYTES = 1024 * 1024
+
+VALID_BACKENDS = ('memory', 'sqlite', 'none')
+
+# 缓存的响应：状态码、MIME 类型、响应体字节、过期时间（time.time()）
+CacheEntry = namedtuple('CacheEntry', ['status', 'mimetype', 'body', 'expires_at'])
+
+
+class MemoryCacheBackend:
+    """进程内 LRU 缓存（线程安全），按条目数与总字节数淘汰"""
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()   # {key: (CacheEntry, size, tags)}
+        self._tags = {}                 # {tag: set(keys)}
+        self._bytes = 0
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            record = self._entries.get(key)
+            if record is None:
+                return None
+            if record[0].expires_at <= now:
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return record[0]
+
+    def set(self, key, entry, tags=()):
+        size = len(key) + len(entry.body)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (entry, size, tuple(tags))
+            self._bytes += size
+            for tag in tags:
+                self._tags.setdefault(tag, set()).add(key)
+            while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+                self._remove(next(iter(self._entries)))
+
+    def invalidate_tags(self, tags):
+        with self._lock:
+            keys = set()
+            for tag in tags:
+                keys |= self._tags.get(tag, set())
+            for key in keys:
+                self._remove(key)
+            return len(keys)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._tags.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._entries), 'bytes': self._bytes}
+
+    def _remove(self, key):
+        """删除条目并维护标签索引（调用方持有锁）"""
+        entry, size, tags = self._entries.pop(key)
+        self._bytes -= size
+        for tag in tags:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+
+class SQLiteCacheBackend:
+    """基于共享 SQLite 文件的缓存，同一主机的多个进程共享条目与标签失效"""
+
+    # 命中后的最近访问时间累计多少个键批量写库一次
+    TOUCH_BATCH = 100
+
+    def __init__(self, path, max_entries=DEFAULT_MAX_ENTRIES, max_bytes=DEFAULT_MAX_BYTES):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+        self._touch_lock = threading.Lock()
+        self._touched = {}   # {key: 最近访问时间}，尚未写库
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = self._conn()
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS cache_entries ('
+            ' key TEXT PRIMARY KEY, status INTEGER NOT NULL, mimetype TEXT NOT NULL, body BLOB NOT NULL,'
+            ' size INTEGER NOT NULL, expires_at REAL NOT NULL, accessed_at REAL NOT NULL)'
+        )
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_cache_accessed ON cache_entries (accessed_at)')
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS cache_tags (tag TEXT NOT NULL, key TEXT NOT NULL, PRIMARY KEY (tag, key))'
+        )
+
+    def _conn(self):
+        """每个线程一个连接（sqlite3 连接不可跨线程共享）"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        now = time.time()
+        conn = self._conn()
+        row = conn.execute(
+            'SELECT status, mimetype, body, expires_at FROM cache_entries WHERE key = ?', (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        if row[3] <= now:
+            self._delete_keys(conn, [key])
+            return None
+        with self._touch_lock:
+            self._touched[key] = now
+            flush = len(self._touched) >= self.TOUCH_BATCH
+        if flush:
+            with conn:
+                conn.execute('BEGIN IMMEDIATE')
+                self._flush_touches(conn)
+        return CacheEntry(row[0], row[1], bytes(row[2]), row[3])
+
+    def _flush_touches(self, conn):
+        """批量写入进程内记录的最近访问时间（调用方持有事务）"""
+        with self._touch_lock:
+            touched, self._touched = self._touched, {}
+        if touched:
+            conn.executemany(
+                'UPDATE cache_entries SET accessed_at = ? WHERE key = ?',
+                [(accessed_at, key) for key, accessed_at in touched.items()]
+            )
+
+    def set(self, key, entry, tags=()):
+        size = len(key) + len(entry.body)
+        conn = self._conn()
+        with conn:
+            conn.execute('BEGIN IMMEDIATE')
+            # 淘汰按最近访问时间排序，先写入本进程尚未写库的访问记录
+            self._flush_touches(conn)
+            conn.execute('DELETE FROM cache_tags WHERE key = ?', (key,))
+            conn.execute(
+                'INSERT OR REPLACE INTO cache_entries (key, status, mimetype, body, size, expires_at, accessed_at)'
+                ' VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (key, entry.status, entry.mimetype, entry.body, size, entry.expires_at, time.time())
+            )
+            conn.executemany('INSERT OR IGNORE INTO cache_tags (tag, key) VALUES (?, ?)', [(tag, key) for tag in tags])
+            self._evict(conn)
+
+    def _evict(self, conn):
+        """超出条目数或字节数上限时按最近访问时间淘汰（调用方持有事务）"""
+        count, total = conn.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM cache_entries').fetchone()
+        if count <= self.max_entries and total <= self.max_bytes:
+            return
+        victims = []
+        for key, size in conn.execute('SELECT key, size FROM cache_entries ORDER BY accessed_at'):
+            if count <= self.max_entries and total <= self.max_bytes:
+                break
+            victims.append(key)
+            count -= 1
+            total -= size
+        self._delete_keys(conn, victims)
+
+    @staticmethod
+    def _delete_keys(conn, keys):
+        for key in keys:
+            conn.execute('DELETE FROM cache_entries WHERE key = ?', (key,))
+            conn.execute('DELETE FROM cache_tags WHERE key = ?', (key,))
+
+    def invalidate_tags(self, tags):
+        tags = list(tags)
+        if not tags:
+            return 0
+        conn = self._conn()
+        placeholders = ', '.join('?' * len(tags))
+        with conn:
+            conn.execute('BEGIN IMMEDIATE')
+            keys = [row[0] for row in conn.execute(
+                f'SELECT DISTINCT key FROM cache_tags WHERE tag IN ({placeholders})', tags
+            )]
+            self._delete_keys(conn, keys)
+        return len(keys)
+
+    def clear(self):
+        conn = self._conn()
+        with conn:
+            conn.execute('BEGIN IMMEDIATE')
+            conn.execute('DELETE FROM cache_entries')
+            conn.execute('DELETE FROM cache_tags')
+
+    def stats(self):
+        count, total = self._conn().execute(
+            'SELECT COUNT(*), COALESCE(SUM(size), 0) FROM cache_entries'
+        ).fetchone()
+        return {'entries': count, 'bytes': total}
+
+
+class ResponseCache:
+    """接口响应缓存（后端按配置懒加载）"""
+
+    def __init__(self, app=None):
+        self._app = None
+        self._lock = threading.Lock()
+        self._backend = None
+        self._backend_config = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('RESPONSE_CACHE_BACKEND', 'memory')
+        app.config.setdefault('RESPONSE_CACHE_DEFAULT_TTL', DEFAULT_TTL)
+        app.config.setdefault('RESPONSE_CACHE_MAX_ENTRIES', DEFAULT_MAX_ENTRIES)
+        app.config.setdefault('RESPONSE_CACHE_MAX_BYTES', DEFAULT_MAX_BYTES)
+        app.config.setdefault('RESPONSE_CACHE_MAX_ENTRY_BYTES', DEFAULT_MAX_ENTRY_BYTES)
+        app.config.setdefault('RESPONSE_CACHE_PATH', os.path.join(app.instance_path, 'response_cache.sqlite3'))
+        app.extensions['response_cache'] = self
+        self._app = app
+
+    @property
+    def backend(self):
+        """当前后端；关闭或未绑定应用时返回 None（配置变化时重建）"""
+        if self._app is None:
+            return None
+        config = self._app.config
+        name = config.get('RESPONSE_CACHE_BACKEND', 'memory')
+        if name not in VALID_BACKENDS:
+            raise ValueError(f'未知的响应缓存后端: {name}')
+        if name == 'none':
+            return None
+        backend_config = (
+            name, config.get('RESPONSE_CACHE_PATH'),
+            config.get('RESPONSE_CACHE_MAX_ENTRIES', DEFAULT_MAX_ENTRIES),
+            config.get('RESPONSE_CACHE_MAX_BYTES', DEFAULT_MAX_BYTES)
+        )
+        with self._lock:
+            if self._backend_config != backend_config:
+                if name == 'sqlite':
+                    self._backend = SQLiteCacheBackend(backend_config[1], backend_config[2], backend_config[3])
+                else:
+                    self._backend = MemoryCacheBackend(backend_config[2], backend_config[3])
+                self._backend_config = backend_config
+            return self._backend
+
+    # -------------------------- 装饰器 --------------------------
+    def cached(self, ttl=None, tags=(), scope='public', on_hit=None):
+        """
+        缓存接口响应（仅缓存 200 响应）
+        :param ttl: 有效期（秒），None 使用 RESPONSE_CACHE_DEFAULT_TTL
+        :param tags: 标签模板列表，可引用路由参数与当前用户 current_user，如 'item:{item_id}'
+        :param scope: public 所有用户共享；user 按 g.user_id 区分（需放在登录装饰器之后）
+        :param on_hit: 命中缓存时以路由参数调用（如记录浏览量）
+        """
+        if scope not in ('public', 'user'):
+            raise ValueError(f'未知的缓存作用域: {scope}')
+
+        def decorator(f):
+            @wraps(f)
+            def wrapper(*args, **kwargs):
+                backend = self.backend
+                if backend is None:
+                    return f(*args, **kwargs)
+
+                user_id = getattr(g, 'user_id', None) if scope == 'user' else None
+                key = self._make_key(f, scope, user_id, kwargs)
+                entry = backend.get(key)
+                if entry is not None:
+                    if on_hit is not None:
+                        on_hit(**kwargs)
+                    response = Response(entry.body, status=entry.status, mimetype=entry.mimetype)
+                    response.headers['X-Cache'] = 'HIT'
+                    return response
+
+                # 视图可能返回 (响应, 状态码) 元组，统一转换为 Response
+                response = current_app.make_response(f(*args, **kwargs))
+                if response.status_code == 200 and not response.direct_passthrough:
+                    body = response.get_data()
+                    if len(body) <= self._app.config.get('RESPONSE_CACHE_MAX_ENTRY_BYTES', DEFAULT_MAX_ENTRY_BYTES):
+                        expires_at = time.time() + (ttl if ttl is not None else
+                                                    self._app.config.get('RESPONSE_CACHE_DEFAULT_TTL', DEFAULT_TTL))
+                        resolved_tags = [tag.format(current_user=user_id, **kwargs) for tag in tags]
+                        backend.set(key, CacheEntry(response.status_code, response.mimetype, body, expires_at),
+                                    resolved_tags)
+                        response.headers['X-Cache'] = 'MISS'
+                return response
+            return wrapper
+        return decorator
+
+    @staticmethod
+    def _make_key(f, scope, user_id, view_kwargs):
+        """缓存键：接口 + 作用域用户 + 路由参数 + 排序后的查询参数 + 请求体摘要"""
+        args = '&'.join(f'{k}={v}' for k, v in sorted(request.args.items(multi=True)))
+        params = ','.join(f'{k}={view_kwargs[k]}' for k in sorted(view_kwargs))
+        body = hashlib.sha1(request.get_data()).hexdigest() if request.content_length else ''
+        user = user_id if user_id is not None else '-'
+        return f'{f.__module__}.{f.__name__}|{scope}:{user}|{request.method}|{params}|{args}|{body}'
+
+    # -------------------------- 失效 --------------------------
+    def invalidate(self, *tags):
+        """
+        按标签失效缓存（服务层写路径调用）
+        :param tags: 标签，如 'item:42'、'category:books'
+        :return: 失效的条目数
+        """
+        backend = self.backend
+        if backend is None or not tags:
+            return 0
+        return backend.invalidate_tags(tags)
+
+    def clear(self):
+        backend = self.backend
+        if backend is not None:
+            backend.clear()
+
+    def stats(self):
+        backend = self.backend
+        return backend.stats() if backend is not None else {'entries': 0, 'bytes': 0}
+
+
+response_cache = ResponseCache()
@@ -0,0 +1,154 @@
+"""
+分页列表总数缓存
+商品搜索/分类、收藏列表、订单列表每次翻页都要 COUNT(*)，这里按规范化后的过滤条件缓存总数：
+- 缓存按命名空间（items / favorites:<用户ID> / orders:<用户ID>）组织，写操作提交后使对应命名空间失效
+- 每个命名空间的缓存键集合与失效代数只在有缓存条目/统计进行中时保留，用户级命名空间不会无限累积
+- 其他进程的写入无法通知到本进程，因此缓存值最多陈旧 COUNT_CACHE_TTL 秒
+- 超大结果集只统计到 COUNT_EXACT_LIMIT 为止，超出时以该值作为估算总数（total_exact=False）
+
+配置项（app.config）：
+- COUNT_CACHE_TTL: 缓存有效期（秒），<=0 表示不缓存
+- COUNT_CACHE_MAX_ENTRIES: 最多缓存的条目数（超出时淘汰最久未使用的）
+- COUNT_EXACT_LIMIT: 精确统计的上限，<=0 表示不设上限
+"""
+import threading
+import time
+from collections import OrderedDict
+
+DEFAULT_TTL = 30.0
+DEFAULT_MAX_ENTRIES = 10000
+DEFAULT_EXACT_LIMIT = 10000
+
+
+def make_count_key(**filters) -> tuple:
+    """
+    规范化过滤条件作为缓存键：忽略空值，字符串去首尾空格，按字段名排序
+    :param filters: 过滤条件
+    :return: 可哈希的缓存键
+    """
+    normalized = []
+    for name in sorted(filters):
+        value = filters[name]
+        if isinstance(value, str):
+            value = value.strip()
+        if value is None or value == '':
+            continue
+        normalized.append((name, value))
+    return tuple(normalized)
+
+
+class CountCache:
+    """列表总数缓存（线程安全）"""
+
+    def __init__(self, app=None):
+        self._app = None
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()   # {(namespace, key): (total, exact, expires_at)}
+        self._keys = {}                 # {namespace: 已缓存的 key 集合}，无条目时删除
+        self._loading = {}              # {namespace: [失效代数, 进行中的统计数]}，统计结束后删除
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('COUNT_CACHE_TTL', DEFAULT_TTL)
+        app.config.setdefault('COUNT_CACHE_MAX_ENTRIES', DEFAULT_MAX_ENTRIES)
+        app.config.setdefault('COUNT_EXACT_LIMIT', DEFAULT_EXACT_LIMIT)
+        app.extensions['count_cache'] = self
+        self._app = app
+
+    # -------------------------- 查询 --------------------------
+    def count(self, namespace: str, key: tuple, query):
+        """
+        获取查询的总数（优先读缓存）
+        :param namespace: 命名空间（用于失效）
+        :param key: make_count_key 生成的过滤条件键
+        :param query: 未排序、未分页的 SQLAlchemy Query
+        :return: (total, exact)
+        """
+        ttl = self._config('COUNT_CACHE_TTL', 0)
+        limit = self._config('COUNT_EXACT_LIMIT', 0)
+        if ttl <= 0:
+            return self.bounded_count(query, limit)
+
+        cache_key = (namespace, key)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(cache_key)
+            if entry is not None and entry[2] > now:
+                self._entries.move_to_end(cache_key)
+                return entry[0], entry[1]
+            loading = self._loading.setdefault(namespace, [0, 0])
+            loading[1] += 1
+            generation = loading[0]
+
+        stale = True
+        try:
+            total, exact = self.bounded_count(query, limit)
+            stale = False
+        finally:
+            with self._lock:
+                loading = self._loading.get(namespace)
+                # 统计期间命名空间已失效（或缓存被清空）则不写入，避免缓存旧值
+                if loading is None or loading[0] != generation:
+                    stale = True
+                if loading is not None:
+                    loading[1] -= 1
+                    if loading[1] <= 0:
+                        del self._loading[namespace]
+                if not stale:
+                    self._entries[cache_key] = (total, exact, now + ttl)
+                    self._entries.move_to_end(cache_key)
+                    self._keys.setdefault(namespace, set()).add(key)
+                    max_entries = self._config('COUNT_CACHE_MAX_ENTRIES', DEFAULT_MAX_ENTRIES)
+                    while len(self._entries) > max_entries:
+                        (evicted_namespace, evicted_key), _ = self._entries.popitem(last=False)
+                        self._discard_key_locked(evicted_namespace, evicted_key)
+        return total, exact
+
+    @staticmethod
+    def bounded_count(query, limit: int):
+        """
+        有上限的计数：SELECT COUNT(*) FROM (... LIMIT limit+1)，扫描行数不超过 limit+1
+        :param query: SQLAlchemy Query
+        :param limit: 精确统计上限，<=0 表示不设上限
+        :return: (total, exact)，超出上限时 total=limit、exact=False
+        """
+        query = query.order_by(None)
+        if not limit or limit <= 0:
+            return query.count(), True
+        total = query.limit(limit + 1).count()
+        if total > limit:
+            return limit, False
+        return total, True
+
+    # -------------------------- 失效 --------------------------
+    def invalidate(self, *namespaces):
+        """使命名空间下的所有缓存失效（写操作提交后调用）"""
+        with self._lock:
+            for namespace in namespaces:
+                for key in self._keys.pop(namespace, ()):
+                    self._entries.pop((namespace, key), None)
+                loading = self._loading.get(namespace)
+                if loading is not None:
+                    loading[0] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._keys.clear()
+            self._loading.clear()
+
+    def _discard_key_locked(self, namespace, key):
+        keys = self._keys.get(namespace)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._keys[namespace]
+
+    def _config(self, key, default=None):
+        if self._app is None:
+            return default
+        return self._app.config.get(key, default)
+
+
+count_cache = CountCache()
@@ -0,0 +1,120 @@
+"""
+数据库事务重试工具
+并发下单/取消时可能出现死锁（MySQL 1213）或锁等待超时（MySQL 1205），
+这类错误在回滚后重新执行整个事务通常即可成功，因此由装饰器统一按指数退避 + 随机抖动重试
+
+配置项（app.config）：
+- DB_RETRY_MAX_ATTEMPTS: 最多执行次数（含第一次）
+- DB_RETRY_BASE_DELAY: 退避基数（秒），第 n 次重试前等待 [0, min(MAX_DELAY, BASE_DELAY * 2^n)) 的随机时间
+- DB_RETRY_MAX_DELAY: 单次等待上限（秒）
+"""
+import functools
+import logging
+import random
+import threading
+import time
+
+from flask import current_app, has_app_context
+from sqlalchemy.exc import DBAPIError
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_ATTEMPTS = 3
+DEFAULT_BASE_DELAY = 0.05
+DEFAULT_MAX_DELAY = 1.0
+
+# MySQL 错误码：1213 死锁，1205 锁等待超时
+RETRYABLE_MYSQL_ERRORS = (1213, 1205)
+# SQLite 锁冲突
+RETRYABLE_MESSAGES = ('database is locked', 'deadlock')
+
+
+def is_retryable_error(exc) -> bool:
+    """判断数据库异常是否为可重试的死锁/锁等待超时"""
+    if not isinstance(exc, DBAPIError):
+        return False
+    orig = exc.orig
+    args = getattr(orig, 'args', ())
+    if args and args[0] in RETRYABLE_MYSQL_ERRORS:
+        return True
+    message = str(orig).lower()
+    return any(text in message for text in RETRYABLE_MESSAGES)
+
+
+class RetryMetrics:
+    """重试统计（线程安全），按函数名记录调用、重试、重试后成功、重试耗尽次数"""
+
+    FIELDS = ('calls', 'retries', 'recovered', 'exhausted')
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+
+    def record(self, name: str, field: str, count: int = 1):
+        with self._lock:
+            counters = self._counters.setdefault(name, dict.fromkeys(self.FIELDS, 0))
+            counters[field] += count
+
+    def snapshot(self) -> dict:
+        """获取统计快照 {函数名: {calls, retries, recovered, exhausted}}"""
+        with self._lock:
+            return {name: dict(counters) for name, counters in self._counters.items()}
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+
+
+retry_metrics = RetryMetrics()
+
+
+def _config(key, default):
+    if not has_app_context():
+        return default
+    return current_app.config.get(key, default)
+
+
+def retry_on_deadlock(fallback=None):
+    """
+    死锁/锁等待超时自动重试装饰器
+    被装饰的函数需在捕获异常回滚后把可重试的异常重新抛出（见 is_retryable_error）
+    :param fallback: 重试耗尽后的返回值；为 None 时重新抛出最后一次异常
+    """
+    def decorator(func):
+        name = func.__qualname__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            from app.models import db
+
+            max_attempts = max(1, int(_config('DB_RETRY_MAX_ATTEMPTS', DEFAULT_MAX_ATTEMPTS)))
+            base_delay = _config('DB_RETRY_BASE_DELAY', DEFAULT_BASE_DELAY)
+            max_delay = _config('DB_RETRY_MAX_DELAY', DEFAULT_MAX_DELAY)
+            retry_metrics.record(name, 'calls')
+
+            attempt = 0
+            while True:
+                try:
+                    result = func(*args, **kwargs)
+                except DBAPIError as e:
+                    if not is_retryable_error(e):
+                        raise
+                    db.session.rollback()
+                    attempt += 1
+                    if attempt >= max_attempts:
+                        retry_metrics.record(name, 'exhausted')
+                        logger.error(f"{name} 重试 {attempt - 1} 次后仍失败: {str(e.orig)}")
+                        if fallback is None:
+                            raise
+                        return fallback
+                    retry_metrics.record(name, 'retries')
+                    delay = random.uniform(0, min(max_delay, base_delay * (2 ** attempt)))
+                    logger.warning(f"{name} 遇到锁冲突，{delay:.3f}s 后第 {attempt} 次重试: {str(e.orig)}")
+                    time.sleep(delay)
+                    continue
+                if attempt:
+                    retry_metrics.record(name, 'recovered')
+                return result
+
+        return wrapper
+    return decorator
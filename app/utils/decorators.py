@@ -19,25 +19,27 @@ def require_auth(f):
             user_id = g.current_user_id
             # ...
     """
-    from app.utils.jwt_helper import verify_token
+    from app.middleware.auth_middleware import get_request_token, authenticate_request
     
     @wraps(f)
     def decorated_function(*args, **kwargs):
-        auth_header = request.headers.get('Authorization', None)
-        if not auth_header or not auth_header.startswith('Bearer '):
+        if not get_request_token():
             return jsonify({'code': 401, 'message': '未认证，无效Token'}), 401
-        token = auth_header.split(' ')[1]
-        payload = verify_token(token)
-        if not payload or 'user_id' not in payload:
+        user_id = authenticate_request()
+        if not user_id:
             return jsonify({'code': 401, 'message': 'Token无效或过期'}), 401
-        g.current_user_id = payload['user_id']
+        g.current_user_id = user_id
         return f(*args, **kwargs)
     
     return decorated_function
 
 
 def require_admin(f):
-    """管理员权限检查装饰器（可选）"""
+    """
+    管理员权限检查装饰器（需放在 require_auth 之后）
+    用户模型有 is_admin 字段时以其为准，否则以配置 ADMIN_USER_IDS 中的用户ID为管理员
+    """
+    from flask import current_app
     from app.models import User
     from app.utils.response import APIResponse
     
@@ -47,7 +49,10 @@ def require_admin(f):
         if not user_id:
             return APIResponse.auth_error(message='未认证，无法校验管理员权限')
         user = User.query.get(user_id)
-        if not user or not getattr(user, 'is_admin', False):
+        is_admin = user is not None and (
+            getattr(user, 'is_admin', False) or user.id in current_app.config.get('ADMIN_USER_IDS', ())
+        )
+        if not is_admin:
             return APIResponse.permission_error(message='无管理员权限')
         return f(*args, **kwargs)
     
@@ -410,43 +415,14 @@ def log_request(f):
 
 # ==================== 缓存装饰器 ====================
 
-def cache_response(ttl=300):
+def cache_response(ttl=300, tags=(), scope='public', on_hit=None):
     """
-    缓存响应装饰器
+    缓存响应装饰器（基于 app/utils/cache.py 的 response_cache，有界 LRU + TTL + 标签失效）
     Args:
         ttl: 缓存时间（秒），默认5分钟
+        tags: 标签模板列表，可引用路由参数与当前用户 current_user，如 'item:{item_id}'
+        scope: public 所有用户共享；user 按当前登录用户区分（需放在登录装饰器之后）
+        on_hit: 命中缓存时以路由参数调用的回调
     """
-    # 这里使用简单的内存缓存，实际项目中可以使用Redis等
-    import time
-    _cache = {}
-    
-    def decorator(f):
-        @wraps(f)
-        def decorated_function(*args, **kwargs):
-            # 生成缓存键：函数名 + 参数 + 查询参数
-            cache_key = f"{f.__name__}:{str(args)}:{str(kwargs)}:{str(request.args)}"
-            
-            # 检查缓存
-            if cache_key in _cache:
-                cache_entry = _cache[cache_key]
-                if time.time() - cache_entry['timestamp'] < ttl:
-                    return cache_entry['response']
-                else:
-                    # 缓存过期
-                    del _cache[cache_key]
-            
-            # 执行函数
-            response = f(*args, **kwargs)
-            
-            # 缓存响应
-            if response and hasattr(response, 'status_code') and response.status_code == 200:
-                _cache[cache_key] = {
-                    'response': response,
-                    'timestamp': time.time()
-                }
-            
-            return response
-        
-        return decorated_function
-    
-    return decorator
\ No newline at end of file
+    from app.utils.cache import response_cache
+    return response_cache.cached(ttl=ttl, tags=tags, scope=scope, on_hit=on_hit)
@@ -0,0 +1,100 @@
+"""
+用户收藏集合缓存
+商品列表需要为每张卡片标注“是否已收藏”，缓存每个用户收藏的商品ID集合，列表页直接在内存中求交集
+- 用户收藏/取消收藏后使该用户的缓存失效（失效代数只在加载进行中时保留，不随用户数累积）
+- 其他进程的写入无法通知到本进程，多进程部署时缓存最多陈旧 FAVORITE_CACHE_TTL 秒，默认关闭
+
+配置项（app.config）：
+- FAVORITE_CACHE_TTL: 缓存有效期（秒），<=0 表示不缓存（每次一条 IN 查询）
+- FAVORITE_CACHE_MAX_USERS: 最多缓存的用户数（超出时淘汰最久未使用的）
+"""
+import threading
+import time
+from collections import OrderedDict
+
+DEFAULT_MAX_USERS = 10000
+
+
+class FavoriteSetCache:
+    """用户收藏集合缓存（线程安全）"""
+
+    def __init__(self, app=None):
+        self._app = None
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()   # {user_id: (frozenset(item_ids), expires_at)}
+        self._loading = {}              # {user_id: [失效代数, 进行中的加载数]}，加载结束后删除
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('FAVORITE_CACHE_TTL', 0)
+        app.config.setdefault('FAVORITE_CACHE_MAX_USERS', DEFAULT_MAX_USERS)
+        app.extensions['favorite_cache'] = self
+        self._app = app
+
+    @property
+    def enabled(self) -> bool:
+        return self._config('FAVORITE_CACHE_TTL', 0) > 0
+
+    def get_or_load(self, user_id: int, loader):
+        """
+        获取用户收藏的商品ID集合
+        :param user_id: 用户ID
+        :param loader: 未命中时调用，返回该用户收藏的全部商品ID
+        :return: frozenset；缓存未开启时返回 None
+        """
+        ttl = self._config('FAVORITE_CACHE_TTL', 0)
+        if ttl <= 0:
+            return None
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and entry[1] > now:
+                self._entries.move_to_end(user_id)
+                return entry[0]
+            loading = self._loading.setdefault(user_id, [0, 0])
+            loading[1] += 1
+            generation = loading[0]
+
+        stale = True
+        try:
+            item_ids = frozenset(loader())
+            stale = False
+        finally:
+            with self._lock:
+                loading = self._loading.get(user_id)
+                # 加载期间该用户的收藏已变化（或缓存被清空）则不写入
+                if loading is None or loading[0] != generation:
+                    stale = True
+                if loading is not None:
+                    loading[1] -= 1
+                    if loading[1] <= 0:
+                        del self._loading[user_id]
+                if not stale:
+                    self._entries[user_id] = (item_ids, now + ttl)
+                    self._entries.move_to_end(user_id)
+                    max_users = self._config('FAVORITE_CACHE_MAX_USERS', DEFAULT_MAX_USERS)
+                    while len(self._entries) > max_users:
+                        self._entries.popitem(last=False)
+        return item_ids
+
+    def invalidate(self, user_id: int):
+        """用户收藏/取消收藏后调用"""
+        with self._lock:
+            self._entries.pop(user_id, None)
+            loading = self._loading.get(user_id)
+            if loading is not None:
+                loading[0] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._loading.clear()
+
+    def _config(self, key, default=None):
+        if self._app is None:
+            return default
+        return self._app.config.get(key, default)
+
+
+favorite_cache = FavoriteSetCache()
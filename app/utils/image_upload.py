@@ -0,0 +1,181 @@
+"""
+图片流式上传
+直接解析请求体（multipart/form-data），按固定大小分块写入上传目录下的临时文件，
+而不是先由 Werkzeug 把整个文件缓冲到内存/临时文件再校验：
+- 文件名扩展名在第一个字节到达前校验，文件头（魔数）在第一块数据到达时校验，
+  不是 jpg/png/webp 的上传立即中止，不再读取剩余请求体
+- 以文件头识别的真实格式为准（不信任客户端声明的 MIME 类型），保存时使用对应的扩展名
+- 单次上传的内存占用以分块大小为上限，与文件大小无关
+- 校验通过后原子重命名到目标路径，失败时删除临时文件，目标目录中不会出现写了一半的文件
+
+配置项（app.config）：
+- UPLOAD_CHUNK_SIZE: 读取请求体的分块大小（字节）
+- UPLOAD_FOLDER: 上传文件保存目录（临时文件位于其下的 .tmp，与目标路径在同一文件系统，可原子重命名）
+- MAX_CONTENT_LENGTH: 请求体大小上限（超出时中止读取）
+"""
+import os
+import tempfile
+
+from werkzeug.exceptions import RequestEntityTooLarge
+from werkzeug.formparser import MultiPartParser
+
+DEFAULT_CHUNK_SIZE = 64 * 1024
+# 表单普通字段（如 type）的总大小与表单项数上限
+MAX_FORM_MEMORY_SIZE = 64 * 1024
+MAX_FORM_PARTS = 10
+
+ALLOWED_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.webp'}
+# 识别格式所需的文件头字节数
+SNIFF_BYTES = 12
+
+
+class ImageUploadRejected(Exception):
+    """上传的文件不合法（中止上传）"""
+
+    def __init__(self, field, message):
+        super().__init__(message)
+        self.field = field
+        self.message = message
+
+
+def sniff_image_format(header: bytes):
+    """
+    按文件头识别图片格式
+    :param header: 文件开头的字节（至少 SNIFF_BYTES 字节才能识别 webp）
+    :return: 扩展名（.jpg/.png/.webp），无法识别时返回 None
+    """
+    if header.startswith(b'\xff\xd8\xff'):
+        return '.jpg'
+    if header.startswith(b'\x89PNG\r\n\x1a\n'):
+        return '.png'
+    if header[:4] == b'RIFF' and header[8:12] == b'WEBP':
+        return '.webp'
+    return None
+
+
+class _ImageSink:
+    """上传文件的写入目标：边写入临时文件边在文件头到齐时校验格式"""
+
+    def __init__(self, directory):
+        fd, self.path = tempfile.mkstemp(dir=directory, prefix='upload-', suffix='.part')
+        self._file = os.fdopen(fd, 'w+b')
+        self._header = b''
+        self.format = None
+        self.size = 0
+
+    def write(self, data):
+        if self.format is None:
+            self._header += data[:SNIFF_BYTES - len(self._header)]
+            if len(self._header) >= SNIFF_BYTES:
+                self._sniff()
+        self._file.write(data)
+        self.size += len(data)
+        return len(data)
+
+    def finish(self):
+        """文件写完：不足 SNIFF_BYTES 字节的小文件在此校验，并落盘"""
+        if self.format is None:
+            self._sniff()
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+
+    def _sniff(self):
+        self.format = sniff_image_format(self._header)
+        if self.format is None:
+            raise ImageUploadRejected('file', '文件内容不是 jpg/png/webp 图片')
+
+    def seek(self, offset, whence=0):
+        return self._file.seek(offset, whence)
+
+    def discard(self):
+        self._file.close()
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+
+class StreamingImageUpload:
+    """
+    解析一次图片上传请求（只接受一个文件）
+    用法：
+        upload = StreamingImageUpload(tmp_dir)
+        try:
+            form = upload.receive(request)
+            ...
+            upload.commit(target_path)
+        finally:
+            upload.cleanup()
+    """
+
+    def __init__(self, tmp_dir, chunk_size=DEFAULT_CHUNK_SIZE):
+        self.tmp_dir = tmp_dir
+        self.chunk_size = chunk_size
+        self.sink = None
+        self.field = None
+        os.makedirs(tmp_dir, exist_ok=True)
+
+    def receive(self, request):
+        """
+        分块读取请求体，文件写入临时文件
+        :return: 表单普通字段（MultiDict）
+        :raises ImageUploadRejected: 缺少文件、扩展名或文件内容不合法、请求体超出大小上限
+        """
+        if request.mimetype != 'multipart/form-data' or not request.mimetype_params.get('boundary'):
+            raise ImageUploadRejected('file', '缺少文件')
+
+        parser = MultiPartParser(
+            stream_factory=self._stream_factory,
+            max_form_memory_size=MAX_FORM_MEMORY_SIZE,
+            max_form_parts=MAX_FORM_PARTS,
+            buffer_size=self.chunk_size
+        )
+        try:
+            form, files = parser.parse(
+                request.stream, request.mimetype_params['boundary'].encode('ascii'), request.content_length
+            )
+        except RequestEntityTooLarge:
+            limit = request.max_content_length
+            raise ImageUploadRejected('file', f'文件大小不能超过{limit // (1024 * 1024)}MB' if limit else '文件过大')
+        except ValueError:
+            raise ImageUploadRejected('file', '请求体格式错误')
+
+        if self.sink is None:
+            raise ImageUploadRejected('file', '缺少文件')
+        self.field = next(iter(files.keys()), None)
+        if self.field != 'file':
+            raise ImageUploadRejected('file', '缺少文件')
+        self.sink.finish()
+        return form
+
+    @property
+    def extension(self):
+        """按文件头识别出的扩展名"""
+        return self.sink.format if self.sink is not None else None
+
+    def commit(self, target_path):
+        """
+        将临时文件原子重命名为目标文件（需与临时目录位于同一文件系统）
+        :param target_path: 目标路径
+        """
+        os.makedirs(os.path.dirname(target_path), exist_ok=True)
+        os.replace(self.sink.path, target_path)
+        self.sink = None
+
+    def cleanup(self):
+        """删除未提交的临时文件"""
+        if self.sink is not None:
+            self.sink.discard()
+            self.sink = None
+
+    def _stream_factory(self, total_content_length=None, content_type=None, filename=None, content_length=None):
+        """每个文件项开始时调用：在接收文件内容之前校验文件名"""
+        if self.sink is not None:
+            raise ImageUploadRejected('file', '一次只能上传一个文件')
+        if not filename:
+            raise ImageUploadRejected('file', '缺少文件')
+        if os.path.splitext(filename.lower())[1] not in ALLOWED_EXTENSIONS:
+            raise ImageUploadRejected('file', '仅支持 jpg/jpeg/png/webp 图片')
+        self.sink = _ImageSink(self.tmp_dir)
+        return self.sink
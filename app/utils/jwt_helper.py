@@ -1,10 +1,21 @@
 """
 JWT Token 管理
 用于用户认证和会话管理
+同一个 Token 在 7 天有效期内会被反复提交，已验证的 Token 缓存在进程内 LRU 中（键为 Token 的 SHA-256 摘要），
+命中时跳过解析与 HMAC 验签，缓存项在 Token 的 exp 时刻过期
+
+配置项（app.config）：
+- TOKEN_CACHE_SIZE: 最多缓存的 Token 数，<=0 表示不缓存
 """
 
 
 
+import hashlib
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
 import jwt
 from datetime import datetime, timedelta
 from flask import current_app
@@ -21,6 +32,7 @@ def generate_token(user_id):
     """
     payload = {
         'user_id': user_id,
+        'jti': uuid.uuid4().hex,  # Token唯一标识，登出时据此注销
         'exp': datetime.utcnow() + timedelta(days=EXPIRES_DAYS),
         'iat': datetime.utcnow()
     }
@@ -54,3 +66,72 @@ def refresh_token(token):
         return None
     return generate_token(payload['user_id'])
 
+
+
+class VerifiedTokenCache:
+    """已验证 Token 的 LRU 缓存（线程安全）"""
+
+    DEFAULT_SIZE = 10000
+
+    def __init__(self, app=None):
+        self._app = None
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()   # {sha256(token): (payload, exp)}
+        self.hits = 0
+        self.misses = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('TOKEN_CACHE_SIZE', self.DEFAULT_SIZE)
+        app.extensions['token_cache'] = self
+        self._app = app
+
+    def verify(self, token):
+        """
+        验证Token（优先读取缓存）
+        :param token: str
+        :return: payload字典 或 None
+        """
+        size = self._app.config.get('TOKEN_CACHE_SIZE', 0) if self._app else 0
+        if size <= 0:
+            return verify_token(token)
+
+        key = hashlib.sha256(token.encode('utf-8')).digest()
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[1] > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[0]
+                del self._entries[key]
+            self.misses += 1
+
+        payload = verify_token(token)
+        if payload is None or not isinstance(payload.get('exp'), (int, float)):
+            return payload
+
+        with self._lock:
+            self._entries[key] = (payload, payload['exp'])
+            self._entries.move_to_end(key)
+            while len(self._entries) > size:
+                self._entries.popitem(last=False)
+        return payload
+
+    def discard(self, token):
+        """从缓存中移除Token"""
+        with self._lock:
+            self._entries.pop(hashlib.sha256(token.encode('utf-8')).digest(), None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+
+token_cache = VerifiedTokenCache()
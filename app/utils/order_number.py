@@ -0,0 +1,265 @@
+"""
+订单号生成器（Snowflake）
+订单号 = 'ORD' + 64位整数的十进制表示，整数由三部分组成：
+- 41位：自 EPOCH 起的毫秒数（约可用69年）
+- 10位：工作进程ID（0~1023），不同进程互不相同即可保证全局唯一
+- 12位：同一毫秒内的序列号（每毫秒每进程最多4096个）
+
+生成过程只在进程内加锁，同一工作进程生成的订单号严格递增。
+同一毫秒内序列号用尽或系统时钟回拨时，沿用上次的逻辑时间继续递增，不等待也不会重复。
+
+工作进程ID的唯一性：
+- 绑定应用的全局生成器从数据库租用工作进程ID（order_worker_leases 表），每个ID同一时刻只租给一个进程；
+  租约每过半个有效期续约一次，续约失败（已被其他进程接管）时改租新的ID，进程退出时释放
+- 配置了 ORDER_WORKER_ID 时只租用该ID，已被其他存活进程持有时抛出 RuntimeError，不猜测、不复用
+- fork 出的子进程不继承父进程的工作进程ID，重新租用；未绑定应用的生成器在子进程中生成ID会抛出 RuntimeError
+- SnowflakeGenerator(worker_id) / set_worker_id(worker_id) 直接指定ID，不经过租约，由调用方保证唯一
+  （如 gunicorn post_fork 钩子中按 基数 + 工作进程序号 设置）
+
+配置项（app.config）：
+- ORDER_WORKER_ID: 固定租用的工作进程ID；不配置时租用任一空闲ID
+- ORDER_WORKER_LEASE_TTL: 租约有效期（秒），进程异常退出后其ID在到期后才可被其他进程租用
+"""
+import atexit
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.exc import IntegrityError
+
+logger = logging.getLogger(__name__)
+
+EPOCH_MS = 1704067200000  # 2024-01-01 00:00:00 UTC
+
+WORKER_ID_BITS = 10
+SEQUENCE_BITS = 12
+MAX_WORKER_ID = (1 << WORKER_ID_BITS) - 1
+MAX_SEQUENCE = (1 << SEQUENCE_BITS) - 1
+WORKER_ID_SHIFT = SEQUENCE_BITS
+TIMESTAMP_SHIFT = SEQUENCE_BITS + WORKER_ID_BITS
+
+DEFAULT_LEASE_TTL = 600
+
+ORDER_NUMBER_PREFIX = 'ORD'
+
+
+class SnowflakeGenerator:
+    """Snowflake ID 生成器（线程安全）"""
+
+    def __init__(self, worker_id: int = None):
+        self._lock = threading.Lock()
+        self._lease_lock = threading.Lock()
+        self._app = None
+        self._configured_worker_id = None
+        self._worker_id = None
+        self._owner = self._new_owner()
+        # 租约续约时间（time.monotonic()）；为 None 表示当前ID不是租来的
+        self._lease_renew_at = None
+        self._last_timestamp = -1
+        self._sequence = 0
+        self.set_worker_id(worker_id)
+        if hasattr(os, 'register_at_fork'):
+            # fork 出的子进程丢弃父进程的工作进程ID，避免与父进程生成相同的ID
+            os.register_at_fork(after_in_child=self._reset_after_fork)
+
+    def init_app(self, app):
+        app.config.setdefault('ORDER_WORKER_LEASE_TTL', DEFAULT_LEASE_TTL)
+        worker_id = app.config.get('ORDER_WORKER_ID')
+        if worker_id not in (None, ''):
+            worker_id = int(worker_id)
+            if not 0 <= worker_id <= MAX_WORKER_ID:
+                raise ValueError(f'ORDER_WORKER_ID 必须在 0~{MAX_WORKER_ID} 之间')
+            self._configured_worker_id = worker_id
+        if self._app is None:
+            atexit.register(self.release)
+        self._app = app
+        app.extensions['order_number'] = self
+
+    def set_worker_id(self, worker_id: int = None):
+        """
+        直接指定工作进程ID（不经过租约，由调用方保证各进程互不相同）
+        :param worker_id: 0~1023；为 None 时改为从数据库租用
+        """
+        if worker_id is not None and not 0 <= worker_id <= MAX_WORKER_ID:
+            raise ValueError(f'worker_id 必须在 0~{MAX_WORKER_ID} 之间')
+        self.release()
+        with self._lease_lock:
+            self._worker_id = worker_id
+
+    def ensure_worker_id(self) -> int:
+        """
+        确保已持有工作进程ID（未持有或租约需续约时访问数据库）
+        租约在独立的数据库事务中写入，调用方应在开启自己的事务之前调用
+        :return: 工作进程ID
+        :raises RuntimeError: 未绑定应用、配置的ID已被其他进程持有或ID已全部租出
+        """
+        worker_id = self._worker_id
+        renew_at = self._lease_renew_at
+        if worker_id is not None and (renew_at is None or time.monotonic() < renew_at):
+            return worker_id
+        with self._lease_lock:
+            if self._worker_id is not None and self._lease_renew_at is not None \
+                    and time.monotonic() >= self._lease_renew_at and not self._renew_lease():
+                logger.warning(f"订单号工作进程ID {self._worker_id} 的租约已被其他进程接管，改租新的ID")
+                self._worker_id = None
+                self._lease_renew_at = None
+            if self._worker_id is None:
+                self._worker_id = self._acquire_lease()
+            return self._worker_id
+
+    def release(self):
+        """释放租用的工作进程ID（进程退出时自动调用）"""
+        with self._lease_lock:
+            if self._lease_renew_at is None:
+                return
+            worker_id, self._worker_id, self._lease_renew_at = self._worker_id, None, None
+            try:
+                table = self._lease_table()
+                with self._app.app_context():
+                    with self._engine().begin() as conn:
+                        conn.execute(delete(table).where(table.c.worker_id == worker_id, table.c.owner == self._owner))
+            except Exception as e:
+                logger.warning(f"释放订单号工作进程ID {worker_id} 失败: {str(e)}")
+
+    @property
+    def worker_id(self) -> int:
+        return self._worker_id
+
+    def next_id(self) -> int:
+        """生成下一个ID（同一生成器内严格递增）"""
+        worker_id = self.ensure_worker_id()
+        now = self._current_millis()
+        with self._lock:
+            if now > self._last_timestamp:
+                self._last_timestamp = now
+                self._sequence = 0
+            else:
+                self._sequence = (self._sequence + 1) & MAX_SEQUENCE
+                if self._sequence == 0:
+                    # 本毫秒序列号用尽：借用下一毫秒
+                    self._last_timestamp += 1
+            return (
+                (self._last_timestamp << TIMESTAMP_SHIFT)
+                | (worker_id << WORKER_ID_SHIFT)
+                | self._sequence
+            )
+
+    def next_order_number(self) -> str:
+        """生成订单号"""
+        return f'{ORDER_NUMBER_PREFIX}{self.next_id()}'
+
+    @staticmethod
+    def parse(snowflake_id: int) -> dict:
+        """
+        解析ID的组成部分（排查问题用）
+        :return: {'timestamp_ms', 'worker_id', 'sequence'}
+        """
+        return {
+            'timestamp_ms': (snowflake_id >> TIMESTAMP_SHIFT) + EPOCH_MS,
+            'worker_id': (snowflake_id >> WORKER_ID_SHIFT) & MAX_WORKER_ID,
+            'sequence': snowflake_id & MAX_SEQUENCE
+        }
+
+    def _current_millis(self) -> int:
+        return time.time_ns() // 1_000_000 - EPOCH_MS
+
+    # -------------------------- 租约 --------------------------
+    def _acquire_lease(self) -> int:
+        """租用工作进程ID：配置了 ORDER_WORKER_ID 时只租该ID，否则优先接管已过期的ID，再租未使用的ID"""
+        if self._app is None:
+            raise RuntimeError('订单号生成器未设置工作进程ID：请调用 init_app 绑定应用（从数据库租用）或 set_worker_id 指定')
+        table = self._lease_table()
+        ttl = self._app.config.get('ORDER_WORKER_LEASE_TTL', DEFAULT_LEASE_TTL)
+        with self._app.app_context():
+            engine = self._engine()
+            if self._configured_worker_id is not None:
+                candidates = [self._configured_worker_id]
+            else:
+                with engine.connect() as conn:
+                    leases = dict(conn.execute(select(table.c.worker_id, table.c.expires_at)).all())
+                now = datetime.now()
+                expired = sorted(worker_id for worker_id, expires_at in leases.items() if expires_at <= now)
+                candidates = expired + [worker_id for worker_id in range(MAX_WORKER_ID + 1) if worker_id not in leases]
+
+            for worker_id in candidates:
+                now = datetime.now()
+                values = {'owner': self._owner, 'expires_at': now + timedelta(seconds=ttl), 'acquired_at': now}
+                try:
+                    with engine.begin() as conn:
+                        # 先接管已过期（或本进程持有）的租约，没有记录时再插入；并发插入同一ID时只有一个成功
+                        taken = conn.execute(
+                            update(table)
+                            .where(table.c.worker_id == worker_id)
+                            .where((table.c.expires_at <= now) | (table.c.owner == self._owner))
+                            .values(**values)
+                        ).rowcount == 1
+                        if not taken and conn.execute(
+                            select(table.c.worker_id).where(table.c.worker_id == worker_id)
+                        ).first() is None:
+                            conn.execute(insert(table).values(worker_id=worker_id, **values))
+                            taken = True
+                except IntegrityError:
+                    taken = False
+                if taken:
+                    self._lease_renew_at = time.monotonic() + ttl / 2
+                    logger.info(f"订单号生成器租用工作进程ID {worker_id}（{self._owner}）")
+                    return worker_id
+
+        if self._configured_worker_id is not None:
+            raise RuntimeError(
+                f'ORDER_WORKER_ID={self._configured_worker_id} 已被其他存活进程持有，'
+                f'每个进程必须配置不同的工作进程ID（或不配置，自动租用空闲ID）'
+            )
+        raise RuntimeError(f'订单号工作进程ID（0~{MAX_WORKER_ID}）已全部被租用')
+
+    def _renew_lease(self) -> bool:
+        """续约当前租约，租约已被其他进程接管时返回 False"""
+        table = self._lease_table()
+        ttl = self._app.config.get('ORDER_WORKER_LEASE_TTL', DEFAULT_LEASE_TTL)
+        with self._app.app_context():
+            with self._engine().begin() as conn:
+                renewed = conn.execute(
+                    update(table)
+                    .where(table.c.worker_id == self._worker_id, table.c.owner == self._owner)
+                    .values(expires_at=datetime.now() + timedelta(seconds=ttl))
+                ).rowcount == 1
+        if renewed:
+            self._lease_renew_at = time.monotonic() + ttl / 2
+        return renewed
+
+    @staticmethod
+    def _lease_table():
+        from app.models import OrderWorkerLease
+        return OrderWorkerLease.__table__
+
+    @staticmethod
+    def _engine():
+        from app.models import db
+        return db.engine
+
+    @staticmethod
+    def _new_owner() -> str:
+        return f'{socket.gethostname()[:60]}:{os.getpid()}:{uuid.uuid4().hex[:8]}'
+
+    def _reset_after_fork(self):
+        self._lock = threading.Lock()
+        self._lease_lock = threading.Lock()
+        self._last_timestamp = -1
+        self._sequence = 0
+        # 父进程的工作进程ID（无论租用还是指定）都不能在子进程中继续使用
+        self._worker_id = None
+        self._lease_renew_at = None
+        self._owner = self._new_owner()
+
+
+order_number_generator = SnowflakeGenerator()
+
+
+def generate_order_number() -> str:
+    """生成全局唯一的订单号"""
+    return order_number_generator.next_order_number()
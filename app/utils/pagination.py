@@ -0,0 +1,68 @@
+"""
+游标（Keyset）分页工具
+游标对客户端不透明，编码了上一页最后一条记录的排序键和ID，
+下一页通过 WHERE (排序键, id) 在其之后 + LIMIT 获取，翻到第N页与第1页成本相同
+"""
+import base64
+import json
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+
+from sqlalchemy import and_, or_
+
+
+def encode_cursor(sort: str, value, last_id: int) -> str:
+    """
+    编码游标
+    :param sort: 排序方式（解码时校验，防止换排序后继续使用旧游标）
+    :param value: 最后一条记录的排序键值
+    :param last_id: 最后一条记录的ID
+    :return: URL安全的base64字符串
+    """
+    if isinstance(value, datetime):
+        kind, raw = 'dt', value.isoformat()
+    elif isinstance(value, Decimal):
+        kind, raw = 'dec', str(value)
+    else:
+        kind, raw = 'num', value
+    payload = json.dumps([sort, kind, raw, last_id], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor: str, sort: str):
+    """
+    解码游标
+    :param cursor: encode_cursor 生成的字符串
+    :param sort: 当前请求的排序方式
+    :return: (排序键值, 最后一条记录ID)
+    :raises ValueError: 游标格式无效或与排序方式不匹配
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        cursor_sort, kind, raw, last_id = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        if kind == 'dt':
+            value = datetime.fromisoformat(raw)
+        elif kind == 'dec':
+            value = Decimal(raw)
+            if not value.is_finite():
+                raise ValueError('invalid cursor value')
+        elif isinstance(raw, (int, float)):
+            value = raw
+        else:
+            raise ValueError('invalid cursor value')
+        last_id = int(last_id)
+    except (TypeError, ValueError, UnicodeError, InvalidOperation) as e:
+        raise ValueError('无效的分页游标') from e
+    if cursor_sort != sort:
+        raise ValueError('分页游标与排序方式不匹配')
+    return value, last_id
+
+
+def keyset_condition(sort_key, id_column, descending: bool, value, last_id: int):
+    """
+    构造“位于游标之后”的过滤条件：(key, id) 严格在 (value, last_id) 之后
+    展开为 key < v OR (key = v AND id < last_id)，便于各数据库走 (key) 索引范围扫描
+    """
+    if descending:
+        return or_(sort_key < value, and_(sort_key == value, id_column < last_id))
+    return or_(sort_key > value, and_(sort_key == value, id_column > last_id))
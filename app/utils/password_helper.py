@@ -1,32 +1,239 @@
 """
 密码加密与验证工具
 使用bcrypt进行安全加密
+bcrypt 为纯 CPU 计算（rounds=12 约 250ms），在独立的进程池中执行，不占用请求线程的 GIL：
+- 排队中的任务数达到 PASSWORD_POOL_MAX_PENDING 时立即拒绝（PasswordHasherBusy，带重试建议秒数），
+  避免登录高峰拖垮其他接口
+- 记录每次调用的耗时（含排队），供管理接口查看
+- 工作因子由 BCRYPT_ROUNDS 配置，登录成功时若哈希的工作因子与配置不同则自动重新加密
+- 工作进程以 forkserver（不支持时 spawn）方式启动，不从多线程的请求进程 fork（避免继承其他线程持有的锁、
+  数据库连接等状态）；每个 Web 工作进程各有一个进程池，默认大小为 CPU 核数 / Web 工作进程数
+
+配置项（app.config）：
+- BCRYPT_ROUNDS: bcrypt 工作因子
+- PASSWORD_POOL_WORKERS: 每个 Web 工作进程的进程池大小，<=0 表示在请求线程中直接计算
+- PASSWORD_POOL_START_METHOD: 进程池工作进程的启动方式（forkserver / spawn）
+- PASSWORD_POOL_MAX_PENDING: 同时提交（排队 + 执行中）的最大任务数
+- PASSWORD_POOL_RETRY_AFTER: 拒绝时建议客户端等待的秒数
 """
+import atexit
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_ROUNDS = 12
+DEFAULT_RETRY_AFTER = 1
+LATENCY_SAMPLES = 1024
+DEFAULT_START_METHOD = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+
+
+def default_pool_workers() -> int:
+    """
+    默认进程池大小：CPU 核数按 Web 工作进程数（WEB_CONCURRENCY，gunicorn 的约定）均分，至少为1，
+    避免每个 Web 工作进程都按 CPU 核数启动进程池导致 bcrypt 进程数远超核数
+    """
+    try:
+        web_workers = max(int(os.getenv('WEB_CONCURRENCY', 1)), 1)
+    except ValueError:
+        web_workers = 1
+    return max((os.cpu_count() or 2) // web_workers, 1)
+
+
+class PasswordHasherBusy(Exception):
+    """密码计算任务排队已满"""
+
+    def __init__(self, retry_after):
+        super().__init__('密码服务繁忙，请稍后重试')
+        self.retry_after = retry_after
+
+
+def _hash_password(password: bytes, rounds: int) -> str:
+    """在工作进程中执行：生成 bcrypt 哈希"""
+    import bcrypt
+    return bcrypt.hashpw(password, bcrypt.gensalt(rounds=rounds)).decode('utf-8')
+
+
+def _check_password(password: bytes, hashed: bytes) -> bool:
+    """在工作进程中执行：校验 bcrypt 哈希"""
+    import bcrypt
+    return bcrypt.checkpw(password, hashed)
+
+
+class LatencyStats:
+    """调用耗时统计：累计次数/总耗时/最大值 + 最近 LATENCY_SAMPLES 次样本（计算分位数）"""
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.samples = deque(maxlen=LATENCY_SAMPLES)
+
+    def record(self, seconds: float):
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        self.samples.append(seconds)
+
+    def summary(self) -> dict:
+        ordered = sorted(self.samples)
+
+        def percentile(p):
+            return round(ordered[min(int(len(ordered) * p), len(ordered) - 1)] * 1000, 2) if ordered else 0.0
+
+        return {
+            'count': self.count,
+            'avg_ms': round(self.total / self.count * 1000, 2) if self.count else 0.0,
+            'p50_ms': percentile(0.5),
+            'p95_ms': percentile(0.95),
+            'max_ms': round(self.max * 1000, 2)
+        }
+
+
+class PasswordHasherPool:
+    """有界的密码计算进程池（线程安全）"""
+
+    def __init__(self, app=None):
+        self._app = None
+        self._lock = threading.Lock()
+        self._executor = None
+        self._executor_pid = None
+        self._pending = 0
+        self._rejected = 0
+        self._latency = {'hash': LatencyStats(), 'verify': LatencyStats()}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        workers = default_pool_workers()
+        app.config.setdefault('BCRYPT_ROUNDS', DEFAULT_ROUNDS)
+        app.config.setdefault('PASSWORD_POOL_WORKERS', workers)
+        app.config.setdefault('PASSWORD_POOL_MAX_PENDING', workers * 4)
+        app.config.setdefault('PASSWORD_POOL_START_METHOD', DEFAULT_START_METHOD)
+        app.config.setdefault('PASSWORD_POOL_RETRY_AFTER', DEFAULT_RETRY_AFTER)
+        app.extensions['password_pool'] = self
+        self._app = app
+        atexit.register(self.shutdown)
+
+    @property
+    def rounds(self) -> int:
+        return self._config('BCRYPT_ROUNDS', DEFAULT_ROUNDS)
+
+    def run(self, operation: str, func, *args):
+        """
+        在进程池中执行密码计算并等待结果
+        :param operation: 统计名称（hash/verify）
+        :param func: 模块级函数（需可被 pickle）
+        :raises PasswordHasherBusy: 排队已满
+        """
+        workers = self._config('PASSWORD_POOL_WORKERS', 0)
+        started = time.perf_counter()
+        if workers <= 0:
+            try:
+                return func(*args)
+            finally:
+                self._record(operation, time.perf_counter() - started)
+
+        with self._lock:
+            if self._pending >= self._config('PASSWORD_POOL_MAX_PENDING', workers * 4):
+                self._rejected += 1
+                raise PasswordHasherBusy(self._config('PASSWORD_POOL_RETRY_AFTER', DEFAULT_RETRY_AFTER))
+            self._pending += 1
+            executor = self._get_executor(workers)
+
+        try:
+            return executor.submit(func, *args).result()
+        except BrokenProcessPool:
+            # 工作进程异常退出：丢弃进程池（下次重建），本次在当前线程中计算
+            logger.error("密码计算进程池已损坏，将重建")
+            with self._lock:
+                if self._executor is executor:
+                    self._executor = None
+            return func(*args)
+        finally:
+            with self._lock:
+                self._pending -= 1
+            self._record(operation, time.perf_counter() - started)
+
+    def stats(self) -> dict:
+        """进程池状态与耗时统计（管理接口使用）"""
+        with self._lock:
+            return {
+                'workers': self._config('PASSWORD_POOL_WORKERS', 0),
+                'start_method': self._config('PASSWORD_POOL_START_METHOD', DEFAULT_START_METHOD),
+                'rounds': self.rounds,
+                'pending': self._pending,
+                'max_pending': self._config('PASSWORD_POOL_MAX_PENDING', 0),
+                'rejected': self._rejected,
+                'latency': {operation: stats.summary() for operation, stats in self._latency.items()}
+            }
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def _get_executor(self, workers):
+        """调用方需持有 self._lock；fork 出的子进程（如 gunicorn worker）中重新创建进程池"""
+        if self._executor is None or self._executor_pid != os.getpid():
+            # 不使用 fork：请求进程是多线程的，fork 出的工作进程会继承其他线程持有的锁
+            context = multiprocessing.get_context(self._config('PASSWORD_POOL_START_METHOD', DEFAULT_START_METHOD))
+            self._executor = ProcessPoolExecutor(max_workers=workers, mp_context=context)
+            self._executor_pid = os.getpid()
+        return self._executor
+
+    def _record(self, operation, seconds):
+        with self._lock:
+            self._latency[operation].record(seconds)
+
+    def _config(self, key, default=None):
+        if self._app is None:
+            return default
+        return self._app.config.get(key, default)
+
+
+password_pool = PasswordHasherPool()
 
 
 class PasswordHelper:
     """密码加密与验证"""
-    
+
     @staticmethod
-    def hash_password(password):
+    def hash_password(password, rounds=None):
         """
-        加密密码，返回bcrypt哈希
+        加密密码，返回bcrypt哈希（在密码计算进程池中执行）
+        :param rounds: 工作因子，默认取 BCRYPT_ROUNDS
+        :raises PasswordHasherBusy: 排队已满
         """
-        import bcrypt
         if isinstance(password, str):
             password = password.encode('utf-8')
-        salt = bcrypt.gensalt(rounds=12)
-        hashed = bcrypt.hashpw(password, salt)
-        return hashed.decode('utf-8')
-    
+        return password_pool.run('hash', _hash_password, password, rounds or password_pool.rounds)
+
     @staticmethod
     def verify_password(password, hashed):
         """
-        验证密码是否匹配bcrypt哈希
+        验证密码是否匹配bcrypt哈希（在密码计算进程池中执行）
+        :raises PasswordHasherBusy: 排队已满
         """
-        import bcrypt
         if isinstance(password, str):
             password = password.encode('utf-8')
         if isinstance(hashed, str):
             hashed = hashed.encode('utf-8')
-        return bcrypt.checkpw(password, hashed)
+        return password_pool.run('verify', _check_password, password, hashed)
+
+    @staticmethod
+    def needs_rehash(hashed):
+        """
+        哈希的工作因子是否与当前配置不同（格式：$2b$<rounds>$<salt+hash>）
+        """
+        try:
+            return int(hashed.split('$')[2]) != password_pool.rounds
+        except (AttributeError, IndexError, ValueError):
+            return False
@@ -0,0 +1,380 @@
+"""
+接口限流（令牌桶）
+登录、注册、下单等接口每次请求都会查库，登录/注册还要做一次 bcrypt 计算，
+撞库等异常流量可以轻易占满所有 CPU。限流装饰器在视图执行前（查库与 bcrypt 之前）按规则扣减令牌，
+令牌不足时直接返回 429 与 Retry-After
+- 令牌桶：容量 capacity，每 period 秒匀速补充 capacity 个令牌；允许短时突发，长期速率受限
+- 同一接口可叠加多条规则（如登录同时按 IP 与账号限流），任一规则令牌不足即拒绝
+- 失败计数规则（limit_failures）：执行前原子地预扣一个令牌（并发请求不会同时越过检查），
+  请求未失败（如登录成功）时退还，只有失败（如密码错误返回 401）真正消耗令牌；登录按 (账号, IP) 计数失败，另有一条更宽松的按账号计数规则限制分布式撞库，
+  他人从其他 IP 猜错密码不会很快锁住该账号
+- 规则的容量与周期由 RATE_LIMITS 配置，代码中只引用规则名
+
+后端（RATE_LIMIT_BACKEND）：
+- memory: 进程内令牌桶（默认），按最近使用淘汰，多进程部署时每个进程各自限流
+- sqlite: 共享文件（RATE_LIMIT_PATH），同一主机上的多个进程共享令牌桶
+- none: 关闭限流
+
+配置项（app.config）：
+- RATE_LIMIT_BACKEND: memory | sqlite | none
+- RATE_LIMITS: {规则名: (容量, 周期秒数)}，覆盖默认规则
+- RATE_LIMIT_MAX_KEYS: memory 后端最多保存的令牌桶数
+- RATE_LIMIT_PATH: sqlite 后端的文件路径
+"""
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import current_app, g, request
+
+from app.utils.response import APIResponse
+
+DEFAULT_MAX_KEYS = 100000
+
+VALID_BACKENDS = ('memory', 'sqlite', 'none')
+
+# 默认规则：{规则名: (容量, 周期秒数)}
+DEFAULT_LIMITS = {
+    'login_ip': (20, 60),
+    'login_account': (5, 60),            # 同一账号 + 同一IP 的失败次数
+    'login_account_global': (100, 3600),  # 同一账号在所有IP上的失败次数
+    'register_ip': (10, 3600),
+    'create_order_user': (10, 60),
+}
+
+
+def _refill(tokens, updated_at, capacity, rate, now):
+    """按经过的时间补充令牌（不超过容量）"""
+    return min(capacity, tokens + max(now - updated_at, 0) * rate)
+
+
+def _retry_after(tokens, cost, rate):
+    """令牌补足到 cost 还需等待的秒数"""
+    return (cost - tokens) / rate if rate > 0 else float('inf')
+
+
+class MemoryBucketBackend:
+    """进程内令牌桶（线程安全），超过 max_keys 时淘汰最久未使用的桶"""
+
+    def __init__(self, max_keys=DEFAULT_MAX_KEYS):
+        self.max_keys = max_keys
+        self._lock = threading.Lock()
+        self._buckets = OrderedDict()   # {key: [令牌数, 更新时间]}
+
+    def consume(self, key, capacity, rate, now, cost=1):
+        """
+        扣减令牌
+        :return: (是否放行, 需等待的秒数)
+        """
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = [float(capacity), now]
+                while len(self._buckets) > self.max_keys:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(key)
+            tokens = _refill(bucket[0], bucket[1], capacity, rate, now)
+            bucket[1] = now
+            if tokens >= cost:
+                bucket[0] = tokens - cost
+                return True, 0.0
+            bucket[0] = tokens
+            return False, _retry_after(tokens, cost, rate)
+
+    def refund(self, key, capacity, rate, now, cost=1):
+        """退还预扣的令牌（不超过容量；桶已被淘汰时等价于满桶，无需退还）"""
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is not None:
+                bucket[0] = min(capacity, _refill(bucket[0], bucket[1], capacity, rate, now) + cost)
+                bucket[1] = now
+
+    def peek(self, key, capacity, rate, now, cost=1):
+        """
+        只检查令牌是否足够，不扣减
+        :return: (是否放行, 需等待的秒数)
+        """
+        with self._lock:
+            bucket = self._buckets.get(key)
+            tokens = float(capacity) if bucket is None else _refill(bucket[0], bucket[1], capacity, rate, now)
+        return tokens >= cost, 0.0 if tokens >= cost else _retry_after(tokens, cost, rate)
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+
+    def stats(self):
+        with self._lock:
+            return {'keys': len(self._buckets)}
+
+
+class SQLiteBucketBackend:
+    """基于共享 SQLite 文件的令牌桶，同一主机的多个进程共享限流状态"""
+
+    # 每扣减多少次清理一次已补满的桶（补满的桶与不存在等价）
+    PRUNE_EVERY = 1000
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._calls = 0
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = self._conn()
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS rate_buckets ('
+            ' key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated_at REAL NOT NULL, full_at REAL NOT NULL)'
+        )
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_rate_full_at ON rate_buckets (full_at)')
+
+    def _conn(self):
+        """每个线程一个连接（sqlite3 连接不可跨线程共享）"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            self._local.conn = conn
+        return conn
+
+    def consume(self, key, capacity, rate, now, cost=1):
+        conn = self._conn()
+        with conn:
+            conn.execute('BEGIN IMMEDIATE')
+            row = conn.execute('SELECT tokens, updated_at FROM rate_buckets WHERE key = ?', (key,)).fetchone()
+            tokens = float(capacity) if row is None else _refill(row[0], row[1], capacity, rate, now)
+            allowed = tokens >= cost
+            if allowed:
+                tokens -= cost
+            full_at = now + (capacity - tokens) / rate if rate > 0 else float('inf')
+            conn.execute(
+                'INSERT OR REPLACE INTO rate_buckets (key, tokens, updated_at, full_at) VALUES (?, ?, ?, ?)',
+                (key, tokens, now, full_at)
+            )
+            self._calls += 1
+            if self._calls % self.PRUNE_EVERY == 0:
+                conn.execute('DELETE FROM rate_buckets WHERE full_at <= ?', (now,))
+        return allowed, 0.0 if allowed else _retry_after(tokens, cost, rate)
+
+    def refund(self, key, capacity, rate, now, cost=1):
+        conn = self._conn()
+        with conn:
+            conn.execute('BEGIN IMMEDIATE')
+            row = conn.execute('SELECT tokens, updated_at FROM rate_buckets WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                return
+            tokens = min(capacity, _refill(row[0], row[1], capacity, rate, now) + cost)
+            full_at = now + (capacity - tokens) / rate if rate > 0 else float('inf')
+            conn.execute(
+                'UPDATE rate_buckets SET tokens = ?, updated_at = ?, full_at = ? WHERE key = ?',
+                (tokens, now, full_at, key)
+            )
+
+    def peek(self, key, capacity, rate, now, cost=1):
+        row = self._conn().execute('SELECT tokens, updated_at FROM rate_buckets WHERE key = ?', (key,)).fetchone()
+        tokens = float(capacity) if row is None else _refill(row[0], row[1], capacity, rate, now)
+        return tokens >= cost, 0.0 if tokens >= cost else _retry_after(tokens, cost, rate)
+
+    def clear(self):
+        conn = self._conn()
+        with conn:
+            conn.execute('BEGIN IMMEDIATE')
+            conn.execute('DELETE FROM rate_buckets')
+
+    def stats(self):
+        return {'keys': self._conn().execute('SELECT COUNT(*) FROM rate_buckets').fetchone()[0]}
+
+
+# -------------------------- 限流键 --------------------------
+def remote_addr_key():
+    """按客户端IP限流（部署在反向代理之后时需配置 ProxyFix，否则取到的是代理地址）"""
+    return request.remote_addr or '-'
+
+
+def current_user_key():
+    """按当前登录用户限流（需放在登录装饰器之后）"""
+    user_id = getattr(g, 'user_id', None)
+    return str(user_id) if user_id else None
+
+
+def json_field_key(field):
+    """按请求体中的字段限流（如登录用户名，忽略大小写与首尾空白）；字段为空时不限流（交给参数校验）"""
+    def key_func():
+        data = request.get_json(silent=True) or {}
+        value = data.get(field)
+        if not isinstance(value, str) or not value.strip():
+            return None
+        return value.strip().lower()
+    return key_func
+
+
+def combined_key(*key_funcs):
+    """组合多个限流键（如 账号 + IP）；任一键为 None 时本条规则不生效"""
+    def key_func():
+        values = [func() for func in key_funcs]
+        if any(value is None for value in values):
+            return None
+        return '|'.join(values)
+    return key_func
+
+
+class RateLimiter:
+    """令牌桶限流器（后端按配置懒加载）"""
+
+    def __init__(self, app=None):
+        self._app = None
+        self._lock = threading.Lock()
+        self._backend = None
+        self._backend_config = None
+        self._rejected = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('RATE_LIMIT_BACKEND', 'memory')
+        app.config.setdefault('RATE_LIMITS', {})
+        app.config.setdefault('RATE_LIMIT_MAX_KEYS', DEFAULT_MAX_KEYS)
+        app.config.setdefault('RATE_LIMIT_PATH', os.path.join(app.instance_path, 'rate_limit.sqlite3'))
+        app.extensions['rate_limiter'] = self
+        self._app = app
+
+    @property
+    def backend(self):
+        """当前后端；关闭或未绑定应用时返回 None（配置变化时重建）"""
+        if self._app is None:
+            return None
+        config = self._app.config
+        name = config.get('RATE_LIMIT_BACKEND', 'memory')
+        if name not in VALID_BACKENDS:
+            raise ValueError(f'未知的限流后端: {name}')
+        if name == 'none':
+            return None
+        backend_config = (name, config.get('RATE_LIMIT_PATH'), config.get('RATE_LIMIT_MAX_KEYS', DEFAULT_MAX_KEYS))
+        with self._lock:
+            if self._backend_config != backend_config:
+                if name == 'sqlite':
+                    self._backend = SQLiteBucketBackend(backend_config[1])
+                else:
+                    self._backend = MemoryBucketBackend(backend_config[2])
+                self._backend_config = backend_config
+            return self._backend
+
+    def rule(self, name):
+        """
+        规则的 (容量, 周期秒数)，RATE_LIMITS 中的配置优先于默认规则
+        :raises KeyError: 未定义的规则
+        """
+        limits = self._config('RATE_LIMITS') or {}
+        capacity, period = limits.get(name) or DEFAULT_LIMITS[name]
+        return capacity, period
+
+    # -------------------------- 扣减 --------------------------
+    def hit(self, name, key, cost=1):
+        """
+        按规则扣减令牌
+        :param name: 规则名
+        :param key: 限流键（如IP、用户名）
+        :return: (是否放行, 需等待的秒数（不超过规则周期；容量为0时令牌永不补充））
+        """
+        backend = self.backend
+        if backend is None:
+            return True, 0.0
+        capacity, period = self.rule(name)
+        allowed, retry_after = backend.consume(f'{name}:{key}', capacity, capacity / period, time.time(), cost)
+        if not allowed:
+            self._count_rejected(name)
+        return allowed, min(retry_after, period)
+
+    def refund(self, name, key, cost=1):
+        """
+        退还 hit 预扣的令牌（用于仅在失败后扣减的规则）
+        :param name: 规则名
+        :param key: 限流键
+        """
+        backend = self.backend
+        if backend is None:
+            return
+        capacity, period = self.rule(name)
+        backend.refund(f'{name}:{key}', capacity, capacity / period, time.time(), cost)
+
+    def limit(self, name, key=remote_addr_key, message='请求过于频繁，请稍后重试'):
+        """
+        限流装饰器，令牌不足时返回 429（可叠加多个，按从外到内的顺序扣减）
+        :param name: 规则名（见 DEFAULT_LIMITS / RATE_LIMITS）
+        :param key: 返回限流键的函数，返回 None 时本条规则不生效
+        :param message: 拒绝时的提示
+        """
+        def decorator(f):
+            @wraps(f)
+            def wrapper(*args, **kwargs):
+                if self.backend is not None:
+                    value = key()
+                    if value is not None:
+                        allowed, retry_after = self.hit(name, value)
+                        if not allowed:
+                            return APIResponse.too_many_requests(message=message, retry_after=retry_after)
+                return f(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def limit_failures(self, name, key=remote_addr_key, message='请求过于频繁，请稍后重试', failure_statuses=(401,)):
+        """
+        失败计数限流装饰器：执行前预扣令牌，令牌不足时返回 429；响应状态码不属于 failure_statuses 时退还
+        （如登录只统计密码错误，正常登录不消耗令牌；预扣保证并发的失败请求不会同时越过限制）
+        :param name: 规则名（见 DEFAULT_LIMITS / RATE_LIMITS）
+        :param key: 返回限流键的函数，返回 None 时本条规则不生效
+        :param message: 拒绝时的提示
+        :param failure_statuses: 视为失败、需要扣减令牌的响应状态码
+        """
+        def decorator(f):
+            @wraps(f)
+            def wrapper(*args, **kwargs):
+                value = key() if self.backend is not None else None
+                if value is None:
+                    return f(*args, **kwargs)
+                allowed, retry_after = self.hit(name, value)
+                if not allowed:
+                    return APIResponse.too_many_requests(message=message, retry_after=retry_after)
+                try:
+                    response = current_app.make_response(f(*args, **kwargs))
+                except Exception:
+                    self.refund(name, value)
+                    raise
+                if response.status_code not in failure_statuses:
+                    self.refund(name, value)
+                return response
+            return wrapper
+        return decorator
+
+    def clear(self):
+        backend = self.backend
+        if backend is not None:
+            backend.clear()
+        with self._lock:
+            self._rejected = {}
+
+    def stats(self):
+        backend = self.backend
+        with self._lock:
+            rejected = dict(self._rejected)
+        return {
+            'backend': self._config('RATE_LIMIT_BACKEND'),
+            'keys': backend.stats()['keys'] if backend is not None else 0,
+            'rejected': rejected
+        }
+
+    def _count_rejected(self, name):
+        with self._lock:
+            self._rejected[name] = self._rejected.get(name, 0) + 1
+
+    def _config(self, key, default=None):
+        if self._app is None:
+            return default
+        return self._app.config.get(key, default)
+
+
+rate_limiter = RateLimiter()
@@ -4,6 +4,7 @@
 严格遵循指定响应结构：code, message, data, timestamp
 """
 
+import math
 import time
 from typing import Any, Dict, Optional, List
 from flask import jsonify, Response
@@ -21,6 +22,7 @@ class APIResponse:
     PERMISSION_ERROR = 4
     NOT_FOUND = 5
     SERVER_ERROR = 6
+    TOO_MANY_REQUESTS = 7
     
     # HTTP状态码映射
     HTTP_STATUS_MAP = {
@@ -30,6 +32,7 @@ class APIResponse:
         PERMISSION_ERROR: 403,
         NOT_FOUND: 404,
         SERVER_ERROR: 500,
+        TOO_MANY_REQUESTS: 429,
         ERROR: 400  # 默认错误使用400
     }
     
@@ -41,7 +44,8 @@ class APIResponse:
         AUTH_ERROR: "认证失败",
         PERMISSION_ERROR: "权限不足",
         NOT_FOUND: "资源不存在",
-        SERVER_ERROR: "服务器内部错误"
+        SERVER_ERROR: "服务器内部错误",
+        TOO_MANY_REQUESTS: "请求过于频繁"
     }
     
     def __init__(self, 
@@ -207,6 +211,20 @@ class APIResponse:
             data=response_data
         )
     
+    @classmethod
+    def too_many_requests(cls,
+                          message: str = "",
+                          retry_after: float = 1) -> Response:
+        """请求过多/服务繁忙响应（429），重试建议写入 Retry-After 头与 data"""
+        retry_after = max(int(math.ceil(retry_after)), 1)
+        response, status = cls.error(
+            message=message or cls.MESSAGE_MAP[cls.TOO_MANY_REQUESTS],
+            code=cls.TOO_MANY_REQUESTS,
+            data={"retry_after": retry_after}
+        )
+        response.headers['Retry-After'] = str(retry_after)
+        return response, status
+    
     @classmethod
     def paginated(cls,
                   items: List,
@@ -0,0 +1,229 @@
+"""
+Token 注销列表
+登出时将 Token 的 jti 写入 revoked_tokens 表，使 Token 在过期前立即失效。
+每个认证请求都要判断 Token 是否已注销，为避免每次查库，进程内维护：
+- 布隆过滤器：绝大多数请求（未注销）只需计算几次哈希即可判定，无任何 I/O
+- 精确集合：布隆过滤器命中（可能误判）时再以精确集合为准
+两者在首次使用时从数据库全量构建，之后每隔 TOKEN_REVOCATION_REFRESH_INTERVAL 秒按注销时间增量同步
+（其他进程的注销最迟在一个同步间隔后生效）：每次重读上次同步时间之前 TOKEN_REVOCATION_CATCH_UP_OVERLAP 秒内的记录，
+事务提交晚于同步（或主机时钟略有偏差）的注销记录不会因水位已越过而漏掉；
+过期记录定期从数据库清理，清理后从数据库全量重建（兜底补齐任何遗漏）
+
+配置项（app.config）：
+- TOKEN_REVOCATION_REFRESH_INTERVAL: 增量同步间隔（秒），<=0 表示每次检查都同步
+- TOKEN_REVOCATION_CATCH_UP_OVERLAP: 增量同步重读的时间窗口（秒），应大于注销事务的最长提交延迟与主机间时钟偏差
+- TOKEN_REVOCATION_PURGE_INTERVAL: 清理过期记录（并全量重建）的间隔（秒）
+- TOKEN_BLOOM_CAPACITY: 布隆过滤器的预期容量（超出时自动扩容重建）
+- TOKEN_BLOOM_ERROR_RATE: 布隆过滤器的目标误判率
+"""
+import hashlib
+import logging
+import math
+import threading
+import time
+from datetime import datetime, timedelta
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_REFRESH_INTERVAL = 5
+DEFAULT_CATCH_UP_OVERLAP = 60
+DEFAULT_PURGE_INTERVAL = 3600
+DEFAULT_BLOOM_CAPACITY = 100000
+DEFAULT_BLOOM_ERROR_RATE = 0.001
+
+
+class BloomFilter:
+    """位数组布隆过滤器（双重哈希生成 k 个位置）"""
+
+    def __init__(self, capacity: int, error_rate: float):
+        self.capacity = max(capacity, 1)
+        self.size = max(int(-self.capacity * math.log(error_rate) / (math.log(2) ** 2)), 8)
+        self.hash_count = max(int(round(self.size / self.capacity * math.log(2))), 1)
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, key: str):
+        digest = hashlib.blake2b(key.encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hash_count)]
+
+    def add(self, key: str):
+        for position in self._positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, key: str) -> bool:
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+
+class TokenRevocationList:
+    """Token 注销列表（线程安全）"""
+
+    def __init__(self, app=None):
+        self._app = None
+        self._lock = threading.Lock()
+        self._bloom = None
+        self._revoked = {}          # {jti: 过期时间戳}
+        self._synced_at = None      # 上次同步开始时的时间（revoked_tokens.revoked_at 的水位）
+        self._last_refresh = 0.0
+        self._last_purge = 0.0
+        self._loaded = False
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('TOKEN_REVOCATION_REFRESH_INTERVAL', DEFAULT_REFRESH_INTERVAL)
+        app.config.setdefault('TOKEN_REVOCATION_CATCH_UP_OVERLAP', DEFAULT_CATCH_UP_OVERLAP)
+        app.config.setdefault('TOKEN_REVOCATION_PURGE_INTERVAL', DEFAULT_PURGE_INTERVAL)
+        app.config.setdefault('TOKEN_BLOOM_CAPACITY', DEFAULT_BLOOM_CAPACITY)
+        app.config.setdefault('TOKEN_BLOOM_ERROR_RATE', DEFAULT_BLOOM_ERROR_RATE)
+        app.extensions['token_revocations'] = self
+        self._app = app
+
+    # -------------------------- 查询 --------------------------
+    def is_revoked(self, jti) -> bool:
+        """
+        判断 Token 是否已注销（未注销时不访问数据库，仅在同步间隔到期时做一次增量同步）
+        :param jti: Token 的 jti；不含 jti 的旧 Token 视为未注销
+        """
+        if not jti:
+            return False
+        self._ensure_fresh()
+        if jti not in self._bloom:
+            return False
+        with self._lock:
+            expires_at = self._revoked.get(jti)
+        return expires_at is not None and expires_at > time.time()
+
+    # -------------------------- 注销 --------------------------
+    def revoke(self, jti: str, exp, user_id: int = None) -> bool:
+        """
+        注销 Token：写入 revoked_tokens 表并立即加入本进程的过滤器
+        :param jti: Token 的 jti
+        :param exp: Token 过期时间戳
+        :param user_id: 用户ID
+        :return: 是否写入成功（重复注销视为成功）
+        """
+        from app.models import db, RevokedToken
+        from sqlalchemy.exc import IntegrityError
+
+        if not jti or not exp:
+            return False
+        try:
+            db.session.add(RevokedToken(jti=jti, user_id=user_id, expires_at=datetime.fromtimestamp(exp)))
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"注销Token失败: {str(e)}")
+            return False
+
+        self._ensure_fresh()
+        with self._lock:
+            self._add(jti, exp)
+        return True
+
+    # -------------------------- 同步与清理 --------------------------
+    def reset(self):
+        """丢弃内存中的过滤器，下次检查时从数据库全量构建"""
+        with self._lock:
+            self._bloom = None
+            self._revoked = {}
+            self._synced_at = None
+            self._last_refresh = 0.0
+            self._last_purge = 0.0
+            self._loaded = False
+
+    def _ensure_fresh(self):
+        now = time.monotonic()
+        if self._loaded and now - self._last_refresh < self._config('TOKEN_REVOCATION_REFRESH_INTERVAL', DEFAULT_REFRESH_INTERVAL):
+            return
+        with self._lock:
+            if not self._loaded:
+                self._rebuild()
+            elif now - self._last_refresh >= self._config('TOKEN_REVOCATION_REFRESH_INTERVAL', DEFAULT_REFRESH_INTERVAL):
+                self._catch_up()
+            if time.monotonic() - self._last_purge >= self._config('TOKEN_REVOCATION_PURGE_INTERVAL', DEFAULT_PURGE_INTERVAL):
+                self._purge()
+
+    def _rebuild(self):
+        """调用方需持有 self._lock：从数据库加载全部未过期的注销记录"""
+        self._revoked = {}
+        self._synced_at = None
+        self._new_bloom(self._config('TOKEN_BLOOM_CAPACITY', DEFAULT_BLOOM_CAPACITY))
+        self._catch_up()
+        self._loaded = True
+
+    def _catch_up(self):
+        """
+        调用方需持有 self._lock：同步注销时间不早于 上次同步时间 - 重叠窗口 的注销记录
+        （重叠窗口内已同步过的记录按 jti 去重；尚未同步过时读取全部未过期记录）
+        """
+        from app.models import db, RevokedToken
+
+        self._last_refresh = time.monotonic()
+        started = datetime.now()
+        query = db.session.query(RevokedToken.jti, RevokedToken.expires_at).filter(
+            RevokedToken.expires_at > started
+        )
+        if self._synced_at is not None:
+            overlap = timedelta(seconds=self._config('TOKEN_REVOCATION_CATCH_UP_OVERLAP', DEFAULT_CATCH_UP_OVERLAP))
+            query = query.filter(RevokedToken.revoked_at >= self._synced_at - overlap)
+        try:
+            rows = query.all()
+        except Exception as e:
+            logger.error(f"同步Token注销列表失败: {str(e)}")
+            return
+        for jti, expires_at in rows:
+            self._add(jti, expires_at.timestamp())
+        self._synced_at = started
+
+    def _purge(self):
+        """
+        调用方需持有 self._lock：删除过期记录，并从数据库全量重建（布隆过滤器不支持删除；
+        同时补齐增量同步可能遗漏的记录）
+        """
+        from app.models import db, RevokedToken
+
+        self._last_purge = time.monotonic()
+        try:
+            RevokedToken.query.filter(RevokedToken.expires_at <= datetime.now()).delete(synchronize_session=False)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"清理过期注销记录失败: {str(e)}")
+
+        now = time.time()
+        revoked = {jti: exp for jti, exp in self._revoked.items() if exp > now}
+        self._revoked = {}
+        self._synced_at = None
+        self._new_bloom(max(self._config('TOKEN_BLOOM_CAPACITY', DEFAULT_BLOOM_CAPACITY), len(revoked) * 2))
+        self._catch_up()
+        # 全量读取失败时保留内存中未过期的记录
+        for jti, exp in revoked.items():
+            self._add(jti, exp)
+
+    def _add(self, jti, exp):
+        """调用方需持有 self._lock；超出布隆过滤器容量时扩容一倍重建"""
+        if jti in self._revoked:
+            return
+        self._revoked[jti] = exp
+        if self._bloom.count >= self._bloom.capacity:
+            self._new_bloom(self._bloom.capacity * 2)
+            for key in self._revoked:
+                self._bloom.add(key)
+        else:
+            self._bloom.add(jti)
+
+    def _new_bloom(self, capacity):
+        self._bloom = BloomFilter(capacity, self._config('TOKEN_BLOOM_ERROR_RATE', DEFAULT_BLOOM_ERROR_RATE))
+
+    def _config(self, key, default=None):
+        if self._app is None:
+            return default
+        return self._app.config.get(key, default)
+
+
+token_revocations = TokenRevocationList()
@@ -0,0 +1,134 @@
+"""
+商品浏览量写回缓冲
+商品详情页只在进程内累加浏览次数，由后台线程定期批量写回 items.views，
+避免每次浏览都对商品行加锁写库
+
+配置项（app.config）：
+- VIEW_FLUSH_INTERVAL: 定期写回间隔（秒），<=0 表示不缓冲、每次浏览立即写库
+- VIEW_FLUSH_MAX_PENDING: 缓冲中累计的浏览次数达到该值时提前写回
+"""
+import atexit
+import logging
+import threading
+
+from sqlalchemy import bindparam
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_FLUSH_INTERVAL = 5.0
+DEFAULT_MAX_PENDING = 1000
+
+
+class ViewCounterBuffer:
+    """浏览量缓冲区（线程安全）"""
+
+    def __init__(self, app=None):
+        self._app = None
+        self._lock = threading.Lock()
+        self._pending = {}          # {item_id: 待写回的浏览次数}
+        self._pending_total = 0
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """绑定应用，并在进程退出时写回剩余计数"""
+        app.config.setdefault('VIEW_FLUSH_INTERVAL', DEFAULT_FLUSH_INTERVAL)
+        app.config.setdefault('VIEW_FLUSH_MAX_PENDING', DEFAULT_MAX_PENDING)
+        app.extensions['view_counter'] = self
+        self._app = app
+        atexit.register(self.shutdown)
+
+    # -------------------------- 计数 --------------------------
+    def record(self, item_id: int, count: int = 1):
+        """
+        记录商品浏览
+        :param item_id: 商品ID
+        :param count: 浏览次数
+        """
+        interval = self._app.config['VIEW_FLUSH_INTERVAL'] if self._app else 0
+        with self._lock:
+            self._pending[item_id] = self._pending.get(item_id, 0) + count
+            self._pending_total += count
+            over_limit = self._pending_total >= self._app.config['VIEW_FLUSH_MAX_PENDING'] if self._app else True
+
+        if interval <= 0:
+            # 未开启缓冲：立即写回
+            self.flush()
+            return
+
+        self._ensure_worker()
+        if over_limit:
+            self._wakeup.set()
+
+    def pending(self, item_id: int) -> int:
+        """获取商品尚未写回数据库的浏览次数"""
+        with self._lock:
+            return self._pending.get(item_id, 0)
+
+    # -------------------------- 写回 --------------------------
+    def flush(self) -> int:
+        """
+        将缓冲中的浏览次数一次性批量写回数据库（executemany）
+        :return: 写回的商品数量
+        """
+        with self._lock:
+            if not self._pending:
+                return 0
+            batch, self._pending = self._pending, {}
+            self._pending_total = 0
+
+        from app.models import db, Item
+        items = Item.__table__
+        stmt = items.update().where(
+            items.c.id == bindparam('item_id')
+        ).values(views=items.c.views + bindparam('delta'))
+        params = [{'item_id': item_id, 'delta': delta} for item_id, delta in batch.items()]
+
+        try:
+            with db.engine.begin() as conn:
+                conn.execute(stmt, params)
+        except Exception as e:
+            # 写回失败：计数放回缓冲，下次重试
+            with self._lock:
+                for item_id, delta in batch.items():
+                    self._pending[item_id] = self._pending.get(item_id, 0) + delta
+                    self._pending_total += delta
+            logger.error(f"浏览量写回失败: {str(e)}")
+            return 0
+        return len(batch)
+
+    def shutdown(self):
+        """停止后台线程并写回剩余计数"""
+        self._stopped.set()
+        self._wakeup.set()
+        if self._app is None:
+            return
+        try:
+            with self._app.app_context():
+                self.flush()
+        except Exception as e:
+            logger.error(f"退出时写回浏览量失败: {str(e)}")
+
+    # -------------------------- 后台线程 --------------------------
+    def _ensure_worker(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stopped.clear()
+            self._thread = threading.Thread(target=self._run, name='view-counter-flush', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wakeup.wait(self._app.config['VIEW_FLUSH_INTERVAL'])
+            self._wakeup.clear()
+            with self._app.app_context():
+                self.flush()
+
+
+view_counter = ViewCounterBuffer()
@@ -0,0 +1,14 @@
+-- ================================================
+-- 数据库迁移脚本：购物车表新增加入时单价（cart_items.added_price）
+-- 适用场景：已执行 migration_add_cart_items.sql 的数据库，购物车行需要提示加入后的价格变动
+-- 执行前请务必备份数据库！
+-- ================================================
+
+SET NAMES utf8mb4;
+
+-- =========================================
+-- 新增加入时单价列
+-- （已有购物车行为 NULL，不提示价格变动；再次加入或新加入的商品记录当时的单价）
+-- =========================================
+ALTER TABLE cart_items
+    ADD COLUMN added_price DECIMAL(10,2) NULL COMMENT '加入时单价（用于提示价格变动）' AFTER quantity;
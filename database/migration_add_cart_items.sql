@@ -0,0 +1,26 @@
+-- ================================================
+-- 数据库迁移脚本：新增购物车表（cart_items）
+-- 适用场景：已有数据库，购物车从 Session Cookie 迁移到服务端存储
+-- 执行前请务必备份数据库！
+-- ================================================
+
+SET NAMES utf8mb4;
+
+-- =========================================
+-- 创建购物车表
+-- （原 Session 中的购物车在用户下次登录时自动合并，无需回填）
+-- =========================================
+CREATE TABLE IF NOT EXISTS cart_items (
+    id INT PRIMARY KEY AUTO_INCREMENT COMMENT '购物车项ID',
+    user_id INT NOT NULL COMMENT '用户ID',
+    item_id INT NOT NULL COMMENT '商品ID',
+    quantity INT NOT NULL DEFAULT 1 COMMENT '数量',
+    created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP COMMENT '加入时间',
+    updated_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP COMMENT '更新时间',
+
+    UNIQUE KEY uk_cart_user_item (user_id, item_id),
+    INDEX idx_item_id (item_id),
+    CONSTRAINT chk_cart_quantity_positive CHECK (quantity > 0),
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
+    FOREIGN KEY (item_id) REFERENCES items(id) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='购物车表';
@@ -0,0 +1,20 @@
+-- ================================================
+-- 数据库迁移脚本：新增订单号工作进程租约表（order_worker_leases）
+-- 适用场景：已有数据库，多进程/多机部署时为每个进程分配互不相同的 Snowflake 工作进程ID
+-- 执行前请务必备份数据库！
+-- ================================================
+
+SET NAMES utf8mb4;
+
+-- =========================================
+-- 创建订单号工作进程租约表
+-- （应用首次生成订单号时自动租用空闲ID并定期续约，进程退出时释放）
+-- =========================================
+CREATE TABLE IF NOT EXISTS order_worker_leases (
+    worker_id INT PRIMARY KEY COMMENT '工作进程ID（0~1023）',
+    owner VARCHAR(100) NOT NULL COMMENT '持有者（主机名:进程号:随机串）',
+    expires_at DATETIME NOT NULL COMMENT '租约到期时间（到期后可被其他进程接管）',
+    acquired_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP COMMENT '租用时间',
+
+    INDEX idx_worker_lease_expires_at (expires_at)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='订单号工作进程租约表';
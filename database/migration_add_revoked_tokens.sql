@@ -0,0 +1,24 @@
+-- ================================================
+-- 数据库迁移脚本：新增已注销Token表（revoked_tokens）
+-- 适用场景：已有数据库，登出后使 Token 立即失效
+-- 执行前请务必备份数据库！
+-- ================================================
+
+SET NAMES utf8mb4;
+
+-- =========================================
+-- 创建已注销Token表
+-- （升级前签发的 Token 不含 jti，无法注销，最迟 7 天后自然过期）
+-- =========================================
+CREATE TABLE IF NOT EXISTS revoked_tokens (
+    id INT PRIMARY KEY AUTO_INCREMENT COMMENT '记录ID',
+    jti VARCHAR(64) NOT NULL COMMENT 'Token唯一标识',
+    user_id INT NULL COMMENT '用户ID',
+    expires_at DATETIME NOT NULL COMMENT 'Token过期时间（之后可删除该记录）',
+    revoked_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP COMMENT '注销时间（增量同步水位）',
+
+    UNIQUE KEY uk_revoked_jti (jti),
+    INDEX idx_revoked_expires_at (expires_at),
+    INDEX idx_revoked_revoked_at (revoked_at),
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='已注销Token表';
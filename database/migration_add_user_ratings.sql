@@ -0,0 +1,45 @@
+-- ================================================
+-- 数据库迁移脚本：新增用户评分聚合表（user_ratings）
+-- 适用场景：已有数据库，需要启用评分聚合读取
+-- 执行前请务必备份数据库！
+-- ================================================
+
+SET NAMES utf8mb4;
+
+-- =========================================
+-- 步骤1：创建评分聚合表
+-- =========================================
+CREATE TABLE IF NOT EXISTS user_ratings (
+    user_id INT PRIMARY KEY COMMENT '用户ID（被评价者）',
+    rating_sum INT NOT NULL DEFAULT 0 COMMENT '评分总和',
+    rating_count INT NOT NULL DEFAULT 0 COMMENT '评价数量',
+    star_1 INT NOT NULL DEFAULT 0 COMMENT '1星评价数',
+    star_2 INT NOT NULL DEFAULT 0 COMMENT '2星评价数',
+    star_3 INT NOT NULL DEFAULT 0 COMMENT '3星评价数',
+    star_4 INT NOT NULL DEFAULT 0 COMMENT '4星评价数',
+    star_5 INT NOT NULL DEFAULT 0 COMMENT '5星评价数',
+    updated_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP COMMENT '更新时间',
+
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci COMMENT='用户评分聚合表';
+
+
+-- =========================================
+-- 步骤2：根据现有评价回填聚合数据
+-- （等价于 flask rebuild-ratings）
+-- =========================================
+DELETE FROM user_ratings;
+
+INSERT INTO user_ratings (user_id, rating_sum, rating_count, star_1, star_2, star_3, star_4, star_5, updated_at)
+SELECT
+    reviewee_id,
+    SUM(rating),
+    COUNT(*),
+    SUM(rating = 1),
+    SUM(rating = 2),
+    SUM(rating = 3),
+    SUM(rating = 4),
+    SUM(rating = 5),
+    NOW()
+FROM reviews
+GROUP BY reviewee_id;
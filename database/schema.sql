@@ -134,4 +134,56 @@ CREATE TABLE IF NOT EXISTS reviews (
   CONSTRAINT fk_reviews_reviewee FOREIGN KEY (reviewee_id) REFERENCES users(id) ON DELETE CASCADE
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
 
+-- 用户评分聚合表（随评价写入增量维护，可用 flask rebuild-ratings 重建）
+CREATE TABLE IF NOT EXISTS user_ratings (
+  user_id INT PRIMARY KEY COMMENT '用户ID（被评价者）',
+  rating_sum INT NOT NULL DEFAULT 0 COMMENT '评分总和',
+  rating_count INT NOT NULL DEFAULT 0 COMMENT '评价数量',
+  star_1 INT NOT NULL DEFAULT 0 COMMENT '1星评价数',
+  star_2 INT NOT NULL DEFAULT 0 COMMENT '2星评价数',
+  star_3 INT NOT NULL DEFAULT 0 COMMENT '3星评价数',
+  star_4 INT NOT NULL DEFAULT 0 COMMENT '4星评价数',
+  star_5 INT NOT NULL DEFAULT 0 COMMENT '5星评价数',
+  updated_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP COMMENT '更新时间',
+  CONSTRAINT fk_user_ratings_user FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- 购物车表（服务端持久化购物车，每行只保存商品ID与数量）
+CREATE TABLE IF NOT EXISTS cart_items (
+  id INT PRIMARY KEY AUTO_INCREMENT COMMENT '购物车项ID',
+  user_id INT NOT NULL COMMENT '用户ID',
+  item_id INT NOT NULL COMMENT '商品ID',
+  quantity INT NOT NULL DEFAULT 1 COMMENT '数量',
+  added_price DECIMAL(10,2) NULL COMMENT '加入时单价（用于提示价格变动）',
+  created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP COMMENT '加入时间',
+  updated_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP COMMENT '更新时间',
+  UNIQUE KEY uk_cart_user_item (user_id, item_id),
+  INDEX idx_item_id (item_id),
+  CONSTRAINT chk_cart_quantity_positive CHECK (quantity > 0),
+  CONSTRAINT fk_cart_user FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
+  CONSTRAINT fk_cart_item FOREIGN KEY (item_id) REFERENCES items(id) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- 已注销 Token（登出后 Token 立即失效；过期记录由应用定期清理）
+CREATE TABLE IF NOT EXISTS revoked_tokens (
+  id INT PRIMARY KEY AUTO_INCREMENT COMMENT '记录ID',
+  jti VARCHAR(64) NOT NULL COMMENT 'Token唯一标识',
+  user_id INT NULL COMMENT '用户ID',
+  expires_at DATETIME NOT NULL COMMENT 'Token过期时间（之后可删除该记录）',
+  revoked_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP COMMENT '注销时间（增量同步水位）',
+  UNIQUE KEY uk_revoked_jti (jti),
+  INDEX idx_revoked_expires_at (expires_at),
+  INDEX idx_revoked_revoked_at (revoked_at),
+  CONSTRAINT fk_revoked_user FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- 订单号工作进程租约（每个 Snowflake 工作进程ID同一时刻只租给一个进程）
+CREATE TABLE IF NOT EXISTS order_worker_leases (
+  worker_id INT PRIMARY KEY COMMENT '工作进程ID（0~1023）',
+  owner VARCHAR(100) NOT NULL COMMENT '持有者（主机名:进程号:随机串）',
+  expires_at DATETIME NOT NULL COMMENT '租约到期时间（到期后可被其他进程接管）',
+  acquired_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP COMMENT '租用时间',
+  INDEX idx_worker_lease_expires_at (expires_at)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
 SET FOREIGN_KEY_CHECKS = 1;
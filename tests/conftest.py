@@ -6,7 +6,9 @@ pytest 配置文件
 import pytest
 import os
 import sys
+from contextlib import contextmanager
 from datetime import datetime
+from sqlalchemy import event
 
 # 添加项目根目录到Python路径
 sys.path.insert(0, os.path.abspath(os.path.dirname(__file__)))
@@ -16,8 +18,9 @@ os.environ['DATABASE_URI'] = 'sqlite:///:memory:'
 os.environ['FLASK_ENV'] = 'testing'
 
 from app import create_app, db
-from app.models import User, Item, Order, OrderItem, Address, Review
+from app.models import User, Item, Order, OrderItem, Address, Review, UserRating, Favorite, CartItem, RevokedToken
 from app.utils.password_helper import PasswordHelper
+from app.utils.order_number import order_number_generator
 
 
 @pytest.fixture(scope='session')
@@ -33,6 +36,22 @@ def app():
     app.config['TESTING'] = True
     app.config['WTF_CSRF_ENABLED'] = False  # 测试中禁用CSRF
     app.config['JWT_SECRET_KEY'] = 'test-secret-key'
+    app.config['VIEW_FLUSH_INTERVAL'] = 0  # 测试中浏览量立即写库，不启动后台线程
+    app.config['SEARCH_INDEX_PATH'] = ''  # 测试中搜索索引不落盘
+    app.config['SEARCH_REFRESH_INTERVAL'] = 0  # 每次搜索都与数据库同步
+    app.config['COUNT_CACHE_TTL'] = 0  # 测试数据直接写库，不缓存列表总数
+    app.config['DB_RETRY_BASE_DELAY'] = 0  # 死锁重试不等待
+    app.config['RESPONSE_CACHE_BACKEND'] = 'none'  # 测试数据直接写库，不缓存接口响应（缓存测试中单独开启）
+    app.config['FEATURED_REFRESH_INTERVAL'] = 0  # 推荐快照不启动后台刷新线程
+    app.config['TRENDING_CHECKPOINT_PATH'] = ''  # 热度计数器不落盘
+    app.config['TRENDING_CHECKPOINT_INTERVAL'] = 0  # 不启动检查点线程
+    app.config['RECOMMEND_PATH'] = ''  # 不读取/写入推荐近邻文件（推荐测试中单独指定）
+    app.config['PASSWORD_POOL_WORKERS'] = 0  # 密码在测试线程中直接计算（进程池测试中单独开启）
+    app.config['BCRYPT_ROUNDS'] = 4  # 测试中降低 bcrypt 工作因子
+    app.config['RATE_LIMIT_BACKEND'] = 'none'  # 测试中频繁登录，不限流（限流测试中单独开启）
+    
+    # 测试在单进程中运行，直接指定订单号工作进程ID，不从数据库租用（租约测试中单独开启）
+    order_number_generator.set_worker_id(1)
     
     # 创建应用上下文
     with app.app_context():
@@ -68,8 +87,26 @@ def init_database(app):
     创建完整的测试数据，包括用户、商品、订单、地址等
     """
     with app.app_context():
+        # 清空搜索索引（数据库重建后商品ID会被复用）
+        from app.services.search_engine import search_engine
+        search_engine.reset()
+        from app.utils.count_cache import count_cache
+        from app.utils.favorite_cache import favorite_cache
+        from app.services.featured_ranking import featured_ranking
+        from app.services.trending_engine import trending_engine
+        from app.utils.token_revocation import token_revocations
+        count_cache.clear()
+        favorite_cache.clear()
+        featured_ranking.reset()
+        trending_engine.reset()
+        token_revocations.reset()
+
         # 清空现有数据（按依赖顺序删除）
         db.session.query(Review).delete()
+        db.session.query(UserRating).delete()
+        db.session.query(Favorite).delete()
+        db.session.query(CartItem).delete()
+        db.session.query(RevokedToken).delete()
         db.session.query(OrderItem).delete()
         db.session.query(Order).delete()
         db.session.query(Address).delete()
@@ -309,6 +346,10 @@ def init_database(app):
         
         # 清理数据库
         db.session.query(Review).delete()
+        db.session.query(UserRating).delete()
+        db.session.query(Favorite).delete()
+        db.session.query(CartItem).delete()
+        db.session.query(RevokedToken).delete()
         db.session.query(OrderItem).delete()
         db.session.query(Order).delete()
         db.session.query(Address).delete()
@@ -384,3 +425,25 @@ def auth_headers_user3(app, init_database):
         'Authorization': f'Bearer {token}',
         'Content-Type': 'application/json'
     }
+
+
+@pytest.fixture
+def count_queries(app):
+    """
+    统计代码块内执行的SQL语句
+    用法：with count_queries() as statements: ...（需在应用上下文中使用）
+    """
+    @contextmanager
+    def counter():
+        statements = []
+
+        def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+        try:
+            yield statements
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', before_cursor_execute)
+
+    return counter
@@ -0,0 +1,69 @@
+"""
+管理接口测试
+测试首页推荐快照的状态查询与强制刷新、死锁重试统计
+"""
+
+import json
+from app.utils.db_retry import retry_metrics
+
+
+class TestFeaturedAdmin:
+    """首页推荐快照管理接口测试"""
+
+    def test_requires_auth(self, client, app, init_database):
+        """测试未登录访问"""
+        response = client.get('/api/admin/featured/status')
+        assert response.status_code == 401
+
+    def test_non_admin_forbidden(self, client, app, init_database, auth_headers_user2):
+        """测试非管理员访问"""
+        app.config['ADMIN_USER_IDS'] = {init_database['users'][0].id}
+
+        response = client.post('/api/admin/featured/refresh', headers=auth_headers_user2)
+        assert response.status_code == 403
+
+    def test_status_and_refresh(self, client, app, init_database, auth_headers_user1):
+        """测试管理员查看状态并强制刷新"""
+        app.config['ADMIN_USER_IDS'] = {init_database['users'][0].id}
+
+        response = client.get('/api/admin/featured/status', headers=auth_headers_user1)
+        assert response.status_code == 200
+        assert json.loads(response.data)['data']['built'] is False
+
+        response = client.post('/api/admin/featured/refresh', headers=auth_headers_user1)
+        assert response.status_code == 200
+        data = json.loads(response.data)['data']
+        assert data['built'] is True
+        assert data['size'] > 0
+
+        response = client.get('/api/item/getFeatured?limit=3')
+        assert response.status_code == 200
+        assert len(json.loads(response.data)['data']) == 3
+
+
+class TestDbRetryAdmin:
+    """死锁重试统计接口测试"""
+
+    def test_non_admin_forbidden(self, client, app, init_database, auth_headers_user2):
+        """测试非管理员访问"""
+        app.config['ADMIN_USER_IDS'] = {init_database['users'][0].id}
+
+        response = client.get('/api/admin/db-retry/status', headers=auth_headers_user2)
+        assert response.status_code == 403
+
+    def test_status(self, client, app, init_database, auth_headers_user1):
+        """测试管理员查看重试统计"""
+        app.config['ADMIN_USER_IDS'] = {init_database['users'][0].id}
+        retry_metrics.reset()
+        retry_metrics.record('OrderService.create_order', 'calls', 3)
+        retry_metrics.record('OrderService.create_order', 'retries')
+
+        try:
+            response = client.get('/api/admin/db-retry/status', headers=auth_headers_user1)
+            assert response.status_code == 200
+            stats = json.loads(response.data)['data']['OrderService.create_order']
+            assert stats['calls'] == 3
+            assert stats['retries'] == 1
+            assert stats['exhausted'] == 0
+        finally:
+            retry_metrics.reset()
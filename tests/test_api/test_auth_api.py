@@ -533,3 +533,84 @@ class TestAuthenticationEdgeCases:
         
         # 可能返回200（成功）或429（限流）
         assert response.status_code in [200, 429]
+
+
+class TestAuthPasswordPoolBusy:
+    """密码计算进程池繁忙时的登录/注册测试"""
+
+    def test_login_returns_429_with_retry_after(self, client, app, init_database):
+        """测试排队已满时返回429与Retry-After"""
+        app.config.update(PASSWORD_POOL_WORKERS=1, PASSWORD_POOL_MAX_PENDING=0, PASSWORD_POOL_RETRY_AFTER=2)
+        try:
+            response = client.post('/api/user/login', json={
+                'username': 'testuser1',
+                'password': 'Password123'
+            })
+            assert response.status_code == 429
+            assert response.headers['Retry-After'] == '2'
+            data = json.loads(response.data)
+            assert data['code'] == 7
+            assert data['data']['retry_after'] == 2
+        finally:
+            app.config.update(PASSWORD_POOL_WORKERS=0, PASSWORD_POOL_MAX_PENDING=4)
+
+
+class TestVerifiedTokenCache:
+    """已验证 Token 缓存测试"""
+
+    def test_repeated_requests_skip_verification(self, client, app, init_database, auth_headers, monkeypatch):
+        """测试同一 Token 重复请求时只验签一次"""
+        from app.utils import jwt_helper
+
+        calls = []
+        original = jwt_helper.verify_token
+        monkeypatch.setattr(jwt_helper, 'verify_token', lambda token: calls.append(token) or original(token))
+        jwt_helper.token_cache.clear()
+
+        for _ in range(3):
+            assert client.get('/api/cart', headers=auth_headers).status_code == 200
+        assert len(calls) == 1
+        assert jwt_helper.token_cache.hits == 2
+
+        # 无效 Token 不进入缓存
+        response = client.post('/api/user/logout', headers={'Authorization': 'Bearer invalid_token'})
+        assert response.status_code == 401
+        assert len(jwt_helper.token_cache) == 1
+
+    def test_entries_expire_and_lru_bounded(self, app, monkeypatch):
+        """测试缓存项在 exp 后失效、容量超出时淘汰最久未使用的"""
+        from app.utils import jwt_helper
+
+        with app.app_context():
+            app.config['TOKEN_CACHE_SIZE'] = 2
+            jwt_helper.token_cache.clear()
+            try:
+                tokens = [jwt_helper.generate_token(user_id) for user_id in (1, 2, 3)]
+                for token in tokens:
+                    assert jwt_helper.token_cache.verify(token)['user_id'] in (1, 2, 3)
+                assert len(jwt_helper.token_cache) == 2
+
+                # 超过 exp 的缓存项不再命中
+                exp = jwt_helper.verify_token(tokens[2])['exp']
+                monkeypatch.setattr(jwt_helper.time, 'time', lambda: exp + 1)
+                misses = jwt_helper.token_cache.misses
+                jwt_helper.token_cache.verify(tokens[2])
+                assert jwt_helper.token_cache.misses == misses + 1
+            finally:
+                app.config['TOKEN_CACHE_SIZE'] = 10000
+                jwt_helper.token_cache.clear()
+
+
+class TestTokenRevocation:
+    """登出后Token注销测试"""
+
+    def test_logout_revokes_token(self, client, app, init_database, auth_headers_user1, auth_headers_user2):
+        """测试登出后同一Token立即失效，其他Token不受影响"""
+        assert client.get('/api/favorites/list', headers=auth_headers_user1).status_code == 200
+
+        response = client.post('/api/user/logout', headers=auth_headers_user1)
+        assert response.status_code == 200
+
+        assert client.get('/api/favorites/list', headers=auth_headers_user1).status_code == 401
+        assert client.post('/api/user/logout', headers=auth_headers_user1).status_code == 401
+        assert client.get('/api/favorites/list', headers=auth_headers_user2).status_code == 200
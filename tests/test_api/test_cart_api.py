@@ -6,6 +6,7 @@
 import pytest
 import json
 from app.models import Item
+from app.services.cart_service import CartService
 
 
 class TestCartBasic:
@@ -311,3 +312,69 @@ class TestCartSession:
         
         # 检查响应中是否包含提示使用sessionStorage的信息
         assert response.status_code in [200, 400]
+
+
+class TestCartServerStore:
+    """服务端购物车API测试"""
+
+    def test_logged_in_cart_roundtrip(self, client, app, init_database, auth_headers_user2):
+        """测试登录用户的购物车增删改查，写操作只返回被修改的行"""
+        item = init_database['items'][0]
+
+        response = client.post('/api/cart/add', json={'itemId': item.id, 'quantity': 2}, headers=auth_headers_user2)
+        assert response.status_code == 200
+        assert json.loads(response.data)['data'] == {'itemId': item.id, 'quantity': 2}
+
+        response = client.post(f'/api/cart/update/{item.id}', json={'quantity': 3}, headers=auth_headers_user2)
+        assert json.loads(response.data)['data'] == {'itemId': item.id, 'quantity': 3}
+
+        data = json.loads(client.get('/api/cart', headers=auth_headers_user2).data)['data']
+        assert data['total'] == 1
+        assert data['items'][0]['quantity'] == 3
+
+        stats = json.loads(client.get('/api/cart/stats', headers=auth_headers_user2).data)['data']
+        assert stats == {'count': 3, 'items': 1, 'total': 136.5, 'invalid': 0, 'valid': True}
+        assert data['summary'] == stats
+
+        response = client.post(f'/api/cart/remove/{item.id}', json={}, headers=auth_headers_user2)
+        assert response.status_code == 200
+        assert json.loads(client.get('/api/cart', headers=auth_headers_user2).data)['data']['total'] == 0
+
+    def test_add_invalid_payload(self, client, app, init_database, auth_headers_user2):
+        """测试非法商品ID或数量"""
+        response = client.post('/api/cart/add', json={'itemId': 999999, 'quantity': 1}, headers=auth_headers_user2)
+        assert json.loads(response.data)['code'] != 0
+
+        item = init_database['items'][0]
+        response = client.post('/api/cart/add', json={'itemId': item.id, 'quantity': '2'}, headers=auth_headers_user2)
+        assert response.status_code == 400
+
+    def test_anonymous_cart_merged_on_login(self, client, app, init_database):
+        """测试未登录购物车保存在 Session 中，登录后合并到服务端购物车"""
+        item = init_database['items'][0]
+
+        response = client.post('/api/cart/add', json={'itemId': item.id, 'quantity': 2})
+        assert response.status_code == 200
+        data = json.loads(client.get('/api/cart').data)['data']
+        assert data['items'][0]['title'] == '计算机导论'
+
+        response = client.post('/api/user/login', json={'username': 'testuser2', 'password': 'Password456'})
+        assert response.status_code == 200
+        token = json.loads(response.data)['data']['token']
+        headers = {'Authorization': f'Bearer {token}'}
+
+        data = json.loads(client.get('/api/cart', headers=headers).data)['data']
+        assert [(line['itemId'], line['quantity']) for line in data['items']] == [(item.id, 2)]
+        # 合并后 Session 购物车已清空
+        assert json.loads(client.get('/api/cart').data)['data']['total'] == 0
+
+    def test_anonymous_cart_kept_when_merge_fails(self, client, app, init_database, monkeypatch):
+        """测试登录时合并失败不清除 Session 购物车，下次登录仍可合并"""
+        item = init_database['items'][0]
+        client.post('/api/cart/add', json={'itemId': item.id, 'quantity': 2})
+
+        monkeypatch.setattr(CartService, 'merge_session_cart', lambda user_id, cart: (False, '合并购物车失败', 0))
+        response = client.post('/api/user/login', json={'username': 'testuser2', 'password': 'Password456'})
+        assert response.status_code == 200
+        data = json.loads(client.get('/api/cart').data)['data']
+        assert [(line['itemId'], line['quantity']) for line in data['items']] == [(item.id, 2)]
@@ -337,3 +337,95 @@ class TestItemStockCheck:
         
         # 可能返回200或404取决于端点是否实现
         assert response.status_code in [200, 404, 400]
+
+
+class TestItemFavoriteFlag:
+    """商品列表收藏状态API测试"""
+
+    def test_batch_check_favorites(self, client, app, init_database, auth_headers):
+        """测试批量检查收藏状态"""
+        items = init_database['items']
+        with app.app_context():
+            from app.services.favorite_service import FavoriteService
+            FavoriteService.add_favorite(init_database['users'][0].id, items[1].id)
+
+        response = client.post('/api/favorites/check',
+            json={'item_ids': [items[0].id, items[1].id]},
+            headers=auth_headers
+        )
+
+        assert response.status_code == 200
+        data = json.loads(response.data)
+        assert data['data']['favorites'] == {str(items[0].id): False, str(items[1].id): True}
+
+    def test_batch_check_invalid_ids(self, client, app, init_database, auth_headers):
+        """测试批量检查参数校验"""
+        response = client.post('/api/favorites/check',
+            json={'item_ids': ['abc']},
+            headers=auth_headers
+        )
+        assert response.status_code == 400
+
+        response = client.post('/api/favorites/check',
+            json={'item_ids': list(range(201))},
+            headers=auth_headers
+        )
+        assert response.status_code == 400
+
+    def test_search_marks_favorited_when_logged_in(self, client, app, init_database, auth_headers):
+        """测试登录用户搜索结果内联 is_favorited，未登录时不返回该字段"""
+        items = init_database['items']
+        with app.app_context():
+            from app.services.favorite_service import FavoriteService
+            FavoriteService.add_favorite(init_database['users'][0].id, items[0].id)
+
+        response = client.post('/api/item/search', json={'page': 1, 'limit': 50}, headers=auth_headers)
+        assert response.status_code == 200
+        result = json.loads(response.data)['data']['items']
+        assert result
+        assert all(entry['is_favorited'] == (entry['id'] == items[0].id) for entry in result)
+
+        response = client.post('/api/item/search', json={'page': 1, 'limit': 50})
+        result = json.loads(response.data)['data']['items']
+        assert all('is_favorited' not in entry for entry in result)
+
+
+class TestItemBatchStockCheck:
+    """批量库存检查API测试"""
+
+    def test_check_stock_list_and_wrapped(self, client, app, init_database):
+        """测试请求体可以是列表或 {'items': 列表}"""
+        items_data = [
+            {'itemId': init_database['items'][0].id, 'quantity': 2},
+            {'itemId': init_database['items'][1].id, 'quantity': 5}
+        ]
+
+        for body in (items_data, {'items': items_data}):
+            response = client.post('/api/item/checkStock', json=body)
+            assert response.status_code == 200
+            data = json.loads(response.data)['data']
+            assert data['valid'] is False
+            assert [entry['available'] for entry in data['items']] == [True, False]
+
+    def test_check_stock_invalid_body(self, client, app, init_database):
+        """测试非法请求体与超出数量上限"""
+        assert client.post('/api/item/checkStock', json=[1, 2]).status_code == 400
+        too_many = [{'itemId': 1, 'quantity': 1}] * 5001
+        assert client.post('/api/item/checkStock', json=too_many).status_code == 400
+
+
+class TestItemTrending:
+    """热门商品API测试"""
+
+    def test_detail_views_drive_trending(self, client, app, init_database):
+        """测试商品详情浏览计入热度"""
+        item_id = init_database['items'][2].id
+        for _ in range(3):
+            client.get(f'/api/item/getDetail/{item_id}')
+
+        response = client.get('/api/item/getTrending?limit=2&category=electronics')
+        assert response.status_code == 200
+        data = json.loads(response.data)['data']
+        assert data[0]['id'] == item_id
+        assert data[0]['trending_score'] == pytest.approx(3.0, rel=1e-3)
+        assert all(entry['category'] == 'electronics' for entry in data)
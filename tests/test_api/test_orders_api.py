@@ -396,6 +396,30 @@ class TestOrderQuery:
         assert 'completed_orders' in data['data']
         assert 'total_spent' in data['data']
 
+    def test_get_seller_statistics(self, client, app, init_database, auth_headers_user1):
+        """测试获取卖家销售统计"""
+        response = client.get('/api/orders/seller/statistics',
+            headers=auth_headers_user1
+        )
+
+        assert response.status_code == 200
+        data = json.loads(response.data)
+        assert data['code'] == 0
+        assert data['data']['total_orders'] == 2
+        assert data['data']['gmv'] == 91.0
+        assert 'average_order_value' in data['data']
+        assert 'orders_by_status' in data['data']
+
+    def test_get_seller_statistics_invalid_date(self, client, app, init_database, auth_headers_user1):
+        """测试卖家统计日期格式错误"""
+        response = client.get('/api/orders/seller/statistics?start_date=2024/01/01',
+            headers=auth_headers_user1
+        )
+
+        data = json.loads(response.data)
+        assert data['code'] != 0
+        assert 'start_date' in data['data']['errors']
+
 
 class TestOrderStatusUpdate:
     """订单状态更新API测试"""
@@ -0,0 +1,102 @@
+"""
+图片上传API测试
+重点：按文件头识别格式、分块写入与早期中止、原子重命名、大小上限
+"""
+
+import io
+import json
+import os
+import pytest
+from app.utils.image_upload import sniff_image_format
+
+PNG = b'\x89PNG\r\n\x1a\n' + b'\x00' * 200
+JPEG = b'\xff\xd8\xff\xe0' + b'\x00' * 200
+WEBP = b'RIFF\x00\x00\x00\x00WEBPVP8 ' + b'\x00' * 200
+
+
+@pytest.fixture
+def upload_folder(app, tmp_path):
+    folder = tmp_path / 'uploads'
+    original = (app.config['UPLOAD_FOLDER'], app.config['UPLOAD_CHUNK_SIZE'])
+    app.config['UPLOAD_FOLDER'] = str(folder)
+    app.config['UPLOAD_CHUNK_SIZE'] = 64
+    yield folder
+    app.config['UPLOAD_FOLDER'], app.config['UPLOAD_CHUNK_SIZE'] = original
+
+
+def _upload(client, headers, content, filename='photo.png', mimetype='image/png', **form):
+    data = dict(form, file=(io.BytesIO(content), filename, mimetype))
+    return client.post(
+        '/api/upload/image',
+        data=data,
+        content_type='multipart/form-data',
+        headers={'Authorization': headers['Authorization']}
+    )
+
+
+def _saved_files(folder):
+    return [
+        os.path.join(root, name) for root, _, names in os.walk(folder) for name in names
+    ]
+
+
+class TestSniffImageFormat:
+    """文件头识别测试"""
+
+    def test_known_formats(self):
+        assert sniff_image_format(PNG) == '.png'
+        assert sniff_image_format(JPEG) == '.jpg'
+        assert sniff_image_format(WEBP) == '.webp'
+        assert sniff_image_format(b'GIF89a......') is None
+        assert sniff_image_format(b'RIFF\x00\x00\x00\x00WAVE') is None
+
+
+class TestUploadImage:
+    """图片上传测试"""
+
+    def test_upload_saved_with_sniffed_extension(self, client, init_database, auth_headers, upload_folder):
+        """测试按文件头识别的格式保存（忽略客户端声明的扩展名与 MIME 类型）"""
+        response = _upload(client, auth_headers, JPEG, filename='photo.png', mimetype='image/png', type='avatar')
+        assert response.status_code == 200
+        url = json.loads(response.data)['data']['url']
+        assert url.startswith('/static/uploads/avatars/') and url.endswith('.jpg')
+
+        saved = _saved_files(upload_folder)
+        assert len(saved) == 1
+        assert saved[0].endswith(url.split('/')[-1])
+        with open(saved[0], 'rb') as f:
+            assert f.read() == JPEG
+        # 临时目录中不残留文件
+        assert os.listdir(upload_folder / '.tmp') == []
+
+    def test_spoofed_content_rejected(self, client, init_database, auth_headers, upload_folder):
+        """测试声明为图片但内容不是图片时拒绝，且不留下任何文件"""
+        response = _upload(client, auth_headers, b'<?php echo "hi"; ?>' * 50, filename='shell.png')
+        assert response.status_code == 400
+        assert '不是' in json.loads(response.data)['data']['errors']['file']
+        assert _saved_files(upload_folder) == []
+
+    def test_extension_and_missing_file(self, client, init_database, auth_headers, upload_folder):
+        response = _upload(client, auth_headers, PNG, filename='photo.gif', mimetype='image/gif')
+        assert response.status_code == 400
+
+        response = client.post('/api/upload/image', data={'type': 'item'}, content_type='multipart/form-data',
+                               headers={'Authorization': auth_headers['Authorization']})
+        assert response.status_code == 400
+        assert json.loads(response.data)['data']['errors']['file'] == '缺少文件'
+        assert _saved_files(upload_folder) == []
+
+    def test_invalid_type_discards_upload(self, client, init_database, auth_headers, upload_folder):
+        response = _upload(client, auth_headers, PNG, type='banner')
+        assert response.status_code == 400
+        assert _saved_files(upload_folder) == []
+
+    def test_oversized_upload_rejected(self, client, app, init_database, auth_headers, upload_folder):
+        original = app.config['MAX_CONTENT_LENGTH']
+        app.config['MAX_CONTENT_LENGTH'] = 1024
+        try:
+            response = _upload(client, auth_headers, PNG + b'\x00' * 2048)
+            assert response.status_code == 400
+            assert _saved_files(upload_folder) == []
+        finally:
+            app.config['MAX_CONTENT_LENGTH'] = original
@@ -0,0 +1,225 @@
+"""
+购物车服务层单元测试
+重点：cart_items 持久化、单行增删改、Session 购物车登录合并、购物车计价校验
+"""
+
+import pytest
+from app.services.cart_service import CartService
+from app.models import CartItem, Item, db
+
+
+class TestCartStore:
+    """购物车存储测试"""
+
+    def test_add_accumulates_quantity(self, app, init_database):
+        """测试重复加入同一商品时数量原子累加，不产生重复行"""
+        item = init_database['items'][0]
+        user = init_database['users'][1]
+
+        with app.app_context():
+            assert CartService.add_to_cart(user.id, item.id, 1) == (True, "已添加到购物车", {'itemId': item.id, 'quantity': 1})
+            assert CartService.add_to_cart(user.id, item.id, 2)[2]['quantity'] == 3
+            assert CartItem.query.filter_by(user_id=user.id).count() == 1
+
+    def test_cart_reads_current_item_info(self, app, init_database):
+        """测试购物车读取时以商品表的当前价格/标题为准"""
+        item1 = init_database['items'][0]
+        item2 = init_database['items'][1]
+        user = init_database['users'][1]
+
+        with app.app_context():
+            CartService.add_to_cart(user.id, item1.id, 2)
+            CartService.add_to_cart(user.id, item2.id, 1)
+            Item.query.filter_by(id=item1.id).update({Item.price: 40})
+            db.session.commit()
+
+            cart = CartService.get_cart(user.id)
+            assert [line['itemId'] for line in cart] == [item1.id, item2.id]
+            assert cart[0]['title'] == '计算机导论'
+            assert cart[0]['price'] == 40.0
+            assert cart[0]['image'] == 'https://example.com/item1.jpg'
+            stats = CartService.get_cart_stats(user.id)
+            assert (stats['count'], stats['items'], stats['total']) == (3, 2, 6079.99)
+
+    def test_update_remove_clear(self, app, init_database):
+        """测试修改数量、删除与清空"""
+        item1 = init_database['items'][0]
+        item2 = init_database['items'][1]
+        user = init_database['users'][1]
+
+        with app.app_context():
+            CartService.add_to_cart(user.id, item1.id, 1)
+            CartService.add_to_cart(user.id, item2.id, 1)
+
+            assert CartService.update_cart_item(user.id, item1.id, 4)[2] == {'itemId': item1.id, 'quantity': 4}
+            assert CartService.update_cart_item(user.id, 999999, 4) == (False, "商品不在购物车中", None)
+            assert CartService.remove_from_cart(user.id, item2.id) == (True, "已从购物车移除")
+            assert CartService.remove_from_cart(user.id, item2.id) == (False, "商品不在购物车中")
+            assert [line['quantity'] for line in CartService.get_cart(user.id)] == [4]
+
+            assert CartService.clear_cart(user.id)[0] is True
+            assert CartService.get_cart(user.id) == []
+            assert CartService.get_cart_stats(user.id) == {
+                'count': 0, 'items': 0, 'total': 0, 'invalid': 0, 'valid': True
+            }
+
+    def test_add_invalid_item(self, app, init_database):
+        """测试加入不存在或已下架的商品"""
+        item = init_database['items'][0]
+        user = init_database['users'][1]
+
+        with app.app_context():
+            assert CartService.add_to_cart(user.id, 999999, 1) == (False, "商品不存在", None)
+            Item.query.filter_by(id=item.id).update({Item.is_active: False})
+            db.session.commit()
+            assert CartService.add_to_cart(user.id, item.id, 1) == (False, "商品已下架", None)
+
+    def test_carts_isolated_per_user(self, app, init_database):
+        """测试不同用户的购物车互不影响"""
+        item = init_database['items'][0]
+        user2 = init_database['users'][1]
+        user3 = init_database['users'][2]
+
+        with app.app_context():
+            CartService.add_to_cart(user2.id, item.id, 1)
+            assert CartService.get_cart(user3.id) == []
+            CartService.clear_cart(user3.id)
+            assert len(CartService.get_cart(user2.id)) == 1
+
+
+class TestCartMerge:
+    """Session 购物车登录合并测试"""
+
+    def test_merge_adds_and_accumulates(self, app, init_database):
+        """测试合并时已有行累加数量、新商品插入、无效商品丢弃"""
+        item1 = init_database['items'][0]
+        item2 = init_database['items'][1]
+        user = init_database['users'][1]
+
+        with app.app_context():
+            CartService.add_to_cart(user.id, item1.id, 1)
+            success, _, merged = CartService.merge_session_cart(
+                user.id, {str(item1.id): 2, str(item2.id): 1, '999999': 3}
+            )
+
+            assert success is True
+            assert merged == 2
+            quantities = {line['itemId']: line['quantity'] for line in CartService.get_cart(user.id)}
+            assert quantities == {item1.id: 3, item2.id: 1}
+
+    def test_merge_legacy_session_format(self, app, init_database):
+        """测试兼容旧版 Session 购物车格式（含标题、价格等冗余字段）"""
+        item = init_database['items'][0]
+        user = init_database['users'][1]
+
+        with app.app_context():
+            legacy = [{'itemId': item.id, 'title': '伪造标题', 'price': 0.01, 'quantity': 2, 'image': ''}]
+            assert CartService.merge_session_cart(user.id, legacy) == (True, "购物车已合并", 1)
+            cart = CartService.get_cart(user.id)
+            assert cart[0]['quantity'] == 2
+            assert cart[0]['price'] == 45.5
+
+    def test_merge_concurrent_insert_accumulates(self, app, init_database, monkeypatch):
+        """测试并发请求已插入同一行时改为累加，不丢弃 Session 购物车中的数量"""
+        item1 = init_database['items'][0]
+        item2 = init_database['items'][1]
+        user = init_database['users'][1]
+
+        with app.app_context():
+            original = CartService._merge_quantities
+            attempts = []
+
+            def racing_merge(user_id, quantities):
+                attempts.append(1)
+                if len(attempts) == 1:
+                    # 模拟另一请求在读取已有行之后插入并提交了同一行：本次插入违反唯一约束
+                    CartService.add_to_cart(user_id, item1.id, 1)
+                    db.session.add(CartItem(user_id=user_id, item_id=item1.id, quantity=2, added_price=item1.price))
+                    db.session.flush()
+                return original(user_id, quantities)
+
+            monkeypatch.setattr(CartService, '_merge_quantities', racing_merge)
+            success, _, merged = CartService.merge_session_cart(user.id, {str(item1.id): 2, str(item2.id): 1})
+
+            assert success is True
+            assert merged == 2
+            assert len(attempts) == 2
+            quantities = {line['itemId']: line['quantity'] for line in CartService.get_cart(user.id)}
+            assert quantities == {item1.id: 3, item2.id: 1}
+
+    @pytest.mark.parametrize('session_cart', [None, [], {}, 'bad', [{'itemId': 'x'}], {'1': -2}])
+    def test_normalize_ignores_invalid(self, session_cart):
+        """测试非法 Session 购物车被忽略"""
+        assert CartService.normalize_session_cart(session_cart) == {}
+
+
+class TestCartPricing:
+    """购物车计价校验测试"""
+
+    def test_lines_flagged_against_current_items(self, app, init_database):
+        """测试按商品当前状态标记：价格变动、库存不足、已下架、自己的商品"""
+        items = init_database['items']
+        seller = init_database['users'][0]
+        buyer = init_database['users'][1]
+
+        with app.app_context():
+            item_ids = [item.id for item in items[:4]]
+            for item_id in item_ids:
+                CartService.add_to_cart(buyer.id, item_id, 1)
+            CartService.update_cart_item(buyer.id, item_ids[1], 2)       # stock=1
+            Item.query.filter_by(id=item_ids[0]).update({Item.price: 50})
+            Item.query.filter_by(id=item_ids[2]).update({Item.is_active: False})
+            db.session.commit()
+
+            lines = {line['itemId']: line for line in CartService.get_cart(buyer.id)}
+            assert lines[item_ids[0]]['flags'] == [CartService.FLAG_PRICE_CHANGED]
+            assert lines[item_ids[0]]['addedPrice'] == 45.5
+            assert lines[item_ids[0]]['price'] == 50.0
+            assert lines[item_ids[0]]['purchasable'] is True
+            assert lines[item_ids[1]]['flags'] == [CartService.FLAG_INSUFFICIENT_STOCK]
+            assert lines[item_ids[1]]['stock'] == 1
+            assert lines[item_ids[2]]['flags'] == [CartService.FLAG_UNAVAILABLE]
+            assert lines[item_ids[3]]['purchasable'] is True
+
+            stats = CartService.summarize(list(lines.values()))
+            assert stats['invalid'] == 2
+            assert stats['valid'] is False
+            assert stats['total'] == round(50.0 + float(items[3].price), 2)
+
+            # 卖家自己的商品不可结算
+            own = CartService.price_lines({item_ids[0]: 1}, buyer_id=seller.id)
+            assert own[0]['flags'] == [CartService.FLAG_OWN_ITEM]
+
+    def test_large_cart_priced_with_one_items_query(self, app, init_database, count_queries):
+        """测试 60 行购物车计价只需读取购物车行 + 一条商品 IN 查询"""
+        seller = init_database['users'][0]
+        buyer = init_database['users'][1]
+
+        with app.app_context():
+            new_items = [
+                Item(seller_id=seller.id, title=f'批量商品{i}', description='批量', category='other',
+                     price=10, stock=5, is_active=True)
+                for i in range(60)
+            ]
+            db.session.add_all(new_items)
+            db.session.commit()
+            for item in new_items:
+                CartService.add_to_cart(buyer.id, item.id, 1)
+
+            with count_queries() as statements:
+                lines = CartService.get_cart(buyer.id)
+
+            assert len(lines) == 60
+            assert all(line['purchasable'] for line in lines)
+            assert len(statements) == 2
+            assert sum('FROM items' in statement for statement in statements) == 1
+
+    def test_session_cart_priced_from_items(self, app, init_database):
+        """测试 Session 购物车同样按商品表计价，不存在的商品标记为不可用"""
+        item = init_database['items'][0]
+
+        with app.app_context():
+            lines = CartService.price_lines({item.id: 2, 999999: 1})
+            assert lines[0]['price'] == 45.5 and lines[0]['purchasable'] is True
+            assert lines[1]['flags'] == [CartService.FLAG_UNAVAILABLE]
+            assert CartService.summarize(lines)['total'] == 91.0
@@ -0,0 +1,191 @@
+"""
+收藏服务层单元测试
+重点：商品收藏计数的原子增减与校正
+"""
+
+import pytest
+from app.services.favorite_service import FavoriteService
+from app.models import Item, Favorite, db
+
+
+def _favorites_of(item_id):
+    db.session.expire_all()
+    return db.session.get(Item, item_id).favorites
+
+
+class TestFavoriteCounter:
+    """商品收藏计数测试"""
+
+    def test_add_and_remove_update_counter(self, app, init_database):
+        """测试收藏/取消收藏时收藏数原子增减"""
+        item = init_database['items'][0]
+        user2 = init_database['users'][1]
+        user3 = init_database['users'][2]
+
+        with app.app_context():
+            assert FavoriteService.add_favorite(user2.id, item.id)[0] is True
+            assert FavoriteService.add_favorite(user3.id, item.id)[0] is True
+            assert _favorites_of(item.id) == 2
+
+            assert FavoriteService.remove_favorite(user2.id, item.id) == (True, "取消收藏成功")
+            assert _favorites_of(item.id) == 1
+
+    def test_duplicate_add_rejected_by_constraint(self, app, init_database):
+        """测试重复收藏被唯一约束拦截，计数不重复增加"""
+        item = init_database['items'][0]
+        user = init_database['users'][1]
+
+        with app.app_context():
+            success, _, favorite = FavoriteService.add_favorite(user.id, item.id)
+            assert success is True and favorite.id
+
+            success, message, favorite = FavoriteService.add_favorite(user.id, item.id)
+            assert success is False
+            assert message == "已经收藏过该商品"
+            assert favorite is None
+            assert _favorites_of(item.id) == 1
+            assert Favorite.query.filter_by(user_id=user.id, item_id=item.id).count() == 1
+
+    def test_remove_not_favorited(self, app, init_database):
+        """测试取消未收藏的商品，计数不变"""
+        item = init_database['items'][0]
+        user = init_database['users'][1]
+
+        with app.app_context():
+            assert FavoriteService.remove_favorite(user.id, item.id) == (False, "未收藏该商品")
+            assert _favorites_of(item.id) == 0
+
+    def test_add_nonexistent_item(self, app, init_database):
+        """测试收藏不存在的商品"""
+        user = init_database['users'][1]
+
+        with app.app_context():
+            assert FavoriteService.add_favorite(user.id, 999999) == (False, "商品不存在", None)
+
+    def test_counter_updates_without_count_scan(self, app, init_database, count_queries):
+        """测试收藏/取消收藏不再 COUNT 整个收藏表"""
+        item = init_database['items'][0]
+        user = init_database['users'][1]
+
+        with app.app_context():
+            with count_queries() as statements:
+                FavoriteService.add_favorite(user.id, item.id)
+                FavoriteService.remove_favorite(user.id, item.id)
+
+            assert not any('COUNT(' in s.upper() for s in statements)
+            assert sum('favorites=(items.favorites' in s.replace(' ', '') for s in statements) == 2
+
+
+class TestFavoriteReconcile:
+    """收藏计数校正测试"""
+
+    def test_reconcile_repairs_drift(self, app, init_database):
+        """测试校正任务以 favorites 表为准修复计数偏差"""
+        item1 = init_database['items'][0]
+        item2 = init_database['items'][1]
+        user = init_database['users'][1]
+
+        with app.app_context():
+            FavoriteService.add_favorite(user.id, item1.id)
+            Item.query.filter_by(id=item1.id).update({Item.favorites: 7})
+            Item.query.filter_by(id=item2.id).update({Item.favorites: 3})
+            db.session.commit()
+
+            assert FavoriteService.reconcile_favorite_counts() == 2
+            assert _favorites_of(item1.id) == 1
+            assert _favorites_of(item2.id) == 0
+            # 无偏差时不修改任何商品
+            assert FavoriteService.reconcile_favorite_counts() == 0
+
+    def test_reconcile_command(self, app, init_database, runner):
+        """测试 flask reconcile-favorites 命令"""
+        item = init_database['items'][0]
+
+        with app.app_context():
+            Item.query.filter_by(id=item.id).update({Item.favorites: 5})
+            db.session.commit()
+
+            result = runner.invoke(args=['reconcile-favorites'])
+            assert result.exit_code == 0
+            assert '修复 1 件商品' in result.output
+            assert _favorites_of(item.id) == 0
+
+
+class TestFavoriteBatchCheck:
+    """批量收藏状态检查测试"""
+
+    def test_batch_check_single_query(self, app, init_database, count_queries):
+        """测试批量检查只执行一条 IN 查询"""
+        items = init_database['items']
+        user = init_database['users'][1]
+
+        with app.app_context():
+            FavoriteService.add_favorite(user.id, items[0].id)
+            FavoriteService.add_favorite(user.id, items[2].id)
+            item_ids = [item.id for item in items]
+            expected = {items[0].id, items[2].id}
+
+            with count_queries() as statements:
+                favorited = FavoriteService.get_favorited_ids(user.id, item_ids)
+
+            assert favorited == expected
+            assert len(statements) == 1
+            assert ' IN ' in statements[0].upper()
+
+    def test_mark_favorited(self, app, init_database):
+        """测试为商品字典列表标注 is_favorited"""
+        items = init_database['items']
+        user = init_database['users'][1]
+
+        with app.app_context():
+            FavoriteService.add_favorite(user.id, items[1].id)
+            result = FavoriteService.mark_favorited(user.id, [{'id': item.id} for item in items])
+
+            assert [entry['is_favorited'] for entry in result] == [item.id == items[1].id for item in items]
+            assert FavoriteService.get_favorited_ids(user.id, []) == set()
+
+    def test_favorite_set_cache(self, app, init_database, count_queries):
+        """测试开启收藏集合缓存后命中不查库，收藏/取消收藏后失效"""
+        items = init_database['items']
+        user = init_database['users'][1]
+
+        with app.app_context():
+            app.config['FAVORITE_CACHE_TTL'] = 60
+            try:
+                user_id, item1_id, item2_id = user.id, items[0].id, items[1].id
+                FavoriteService.add_favorite(user_id, item1_id)
+                assert FavoriteService.check_favorite(user_id, item1_id) is True
+
+                with count_queries() as statements:
+                    assert FavoriteService.check_favorite(user_id, item1_id) is True
+                    assert FavoriteService.check_favorite(user_id, item2_id) is False
+                assert statements == []
+
+                FavoriteService.remove_favorite(user.id, items[0].id)
+                assert FavoriteService.check_favorite(user.id, items[0].id) is False
+                FavoriteService.add_favorite(user.id, items[1].id)
+                assert FavoriteService.check_favorite(user.id, items[1].id) is True
+            finally:
+                app.config['FAVORITE_CACHE_TTL'] = 0
+
+    def test_favorite_set_cache_releases_generations(self, app):
+        """测试失效不为每个用户留下记录；加载期间失效的结果不写入缓存"""
+        from app.utils.favorite_cache import favorite_cache as cache
+
+        cache.clear()
+        app.config['FAVORITE_CACHE_TTL'] = 60
+        try:
+            for user_id in range(100):
+                cache.get_or_load(user_id, lambda: [1])
+                cache.invalidate(user_id)
+            assert len(cache._entries) == 0 and cache._loading == {}
+
+            def loader():
+                cache.invalidate(1)
+                return [1]
+
+            assert cache.get_or_load(1, loader) == {1}
+            assert cache.get_or_load(1, lambda: [2]) == {2}
+        finally:
+            app.config['FAVORITE_CACHE_TTL'] = 0
+            cache.clear()
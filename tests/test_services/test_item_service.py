@@ -0,0 +1,450 @@
+"""
+商品服务层单元测试
+直接测试 ItemService 的业务逻辑
+重点：列表查询的数据库往返次数
+"""
+
+import base64
+import json
+import pytest
+from app.services.item_service import ItemService
+from app.services.featured_ranking import featured_ranking, featured_score
+from datetime import datetime, timedelta
+from app.models import User, Item, db
+
+
+def _create_sellers_with_items(count):
+    """创建 count 个卖家，每个卖家发布一件商品"""
+    for i in range(count):
+        seller = User(
+            username=f'bulkseller{i}',
+            email=f'bulkseller{i}@seu.edu.cn',
+            password_hash='x',
+            is_active=True
+        )
+        db.session.add(seller)
+        db.session.flush()
+        db.session.add(Item(
+            seller_id=seller.id,
+            title=f'批量商品{i}',
+            description='用于查询次数测试',
+            category='other',
+            price=10 + i,
+            stock=1,
+            is_active=True
+        ))
+    db.session.commit()
+
+
+class TestItemListEnrichment:
+    """商品列表卖家信息批量补全测试"""
+
+    def test_build_item_list_fields(self, app, init_database):
+        """测试批量组装的字段与卖家信息正确"""
+        seller = init_database['users'][0]
+
+        with app.app_context():
+            items = Item.query.filter_by(seller_id=seller.id, is_active=True).all()
+            item_list = ItemService._build_item_list(items)
+
+            assert len(item_list) == len(items)
+            for item_data in item_list:
+                assert item_data['seller_name'] == seller.username
+                # 卖家1有一条5星评价
+                assert item_data['seller_rating'] == 5.0
+
+    def test_build_item_list_empty(self, app, count_queries):
+        """测试空列表不发起查询"""
+        with app.app_context():
+            with count_queries() as statements:
+                assert ItemService._build_item_list([]) == []
+            assert len(statements) == 0
+
+    def test_search_query_count_constant(self, app, init_database, count_queries):
+        """测试搜索的查询次数不随每页数量增长"""
+        with app.app_context():
+            _create_sellers_with_items(30)
+
+            with count_queries() as small_page:
+                result = ItemService.search_items(query='', search_type='title', page=1, limit=5)
+            assert len(result['data']['items']) == 5
+
+            with count_queries() as large_page:
+                result = ItemService.search_items(query='', search_type='title', page=1, limit=30)
+            assert len(result['data']['items']) == 30
+
+            assert len(large_page) == len(small_page)
+
+    def test_featured_reads_snapshot_without_queries(self, app, init_database, count_queries):
+        """测试首页推荐读取快照，构建后不再查询数据库"""
+        with app.app_context():
+            _create_sellers_with_items(30)
+            featured_ranking.refresh()
+
+            with count_queries() as small_page:
+                ItemService.get_featured_items(limit=3)
+            with count_queries() as large_page:
+                result = ItemService.get_featured_items(limit=30)
+
+            assert len(result['data']) == 30
+            assert len(small_page) == len(large_page) == 0
+
+
+class TestViewCounterBuffer:
+    """商品浏览量写回缓冲测试"""
+
+    def test_detail_does_not_write_when_buffered(self, app, init_database, count_queries):
+        """测试开启缓冲后商品详情不写库，批量写回后浏览量正确"""
+        from app.utils.view_counter import view_counter
+
+        item = init_database['items'][0]
+
+        with app.app_context():
+            app.config['VIEW_FLUSH_INTERVAL'] = 3600
+            try:
+                with count_queries() as statements:
+                    for _ in range(3):
+                        result = ItemService.get_item_detail(item.id)
+                assert result['success'] is True
+                assert not any(s.lstrip().upper().startswith('UPDATE') for s in statements)
+                assert view_counter.pending(item.id) == 3
+                # 返回的浏览量包含尚未写回的部分
+                assert ItemService.get_item_detail(item.id, count_view=False)['data']['views'] == 3
+
+                with count_queries() as statements:
+                    assert view_counter.flush() == 1
+                assert len([s for s in statements if s.lstrip().upper().startswith('UPDATE')]) == 1
+                assert view_counter.pending(item.id) == 0
+
+                db.session.expire_all()
+                assert db.session.get(Item, item.id).views == 3
+            finally:
+                app.config['VIEW_FLUSH_INTERVAL'] = 0
+                view_counter.flush()
+
+    def test_detail_write_through_when_disabled(self, app, init_database):
+        """测试关闭缓冲时浏览立即写库"""
+        item = init_database['items'][1]
+
+        with app.app_context():
+            ItemService.get_item_detail(item.id)
+            db.session.expire_all()
+            assert db.session.get(Item, item.id).views == 1
+
+
+class TestCursorPagination:
+    """商品列表游标分页测试"""
+
+    def _walk_pages(self, count_queries, sort, limit=7, **kwargs):
+        """按游标翻完所有页，返回商品ID列表和每页的查询语句"""
+        item_ids, page_statements, cursor = [], [], None
+        while True:
+            with count_queries() as statements:
+                result = ItemService.search_items(
+                    query='', search_type='title', limit=limit, sort=sort,
+                    cursor=cursor, use_cursor=True, **kwargs
+                )
+            assert result['success'] is True
+            page_statements.append(statements)
+            item_ids.extend(item['id'] for item in result['data']['items'])
+            pagination = result['data']['pagination']
+            if not pagination['has_more']:
+                assert pagination['next_cursor'] is None
+                return item_ids, page_statements
+            cursor = pagination['next_cursor']
+
+    @pytest.mark.parametrize('sort', ['latest', 'popular', 'price-asc', 'price-desc'])
+    def test_cursor_walk_matches_offset_order(self, app, init_database, count_queries, sort):
+        """测试游标翻页结果与一次性排序结果一致，无重复无遗漏"""
+        with app.app_context():
+            _create_sellers_with_items(20)
+            # 制造排序键相同的记录，验证 id 次级排序
+            Item.query.filter(Item.title.like('批量商品%')).update(
+                {Item.views: 5, Item.price: 99}, synchronize_session=False
+            )
+            db.session.commit()
+
+            expected = ItemService.search_items(
+                query='', search_type='title', limit=100, sort=sort
+            )['data']['items']
+            item_ids, _ = self._walk_pages(count_queries, sort)
+
+            assert item_ids == [item['id'] for item in expected]
+            assert len(set(item_ids)) == len(item_ids)
+
+    def test_cursor_pages_skip_offset_and_count(self, app, init_database, count_queries):
+        """测试 count=none 时游标翻页不执行 COUNT，且每页查询次数相同"""
+        with app.app_context():
+            _create_sellers_with_items(20)
+            _, page_statements = self._walk_pages(count_queries, 'latest', count_mode='none')
+
+            assert len(page_statements) > 1
+            for statements in page_statements:
+                assert not any('COUNT(' in s.upper() for s in statements)
+            # 每页的查询次数相同
+            assert len({len(statements) for statements in page_statements}) == 1
+
+    def test_invalid_cursor_rejected(self, app, init_database):
+        """测试无效游标和排序方式不匹配的游标被拒绝"""
+        with app.app_context():
+            _create_sellers_with_items(5)
+            result = ItemService.search_items(
+                query='', search_type='title', limit=2, sort='latest', use_cursor=True
+            )
+            cursor = result['data']['pagination']['next_cursor']
+
+            mismatched = ItemService.search_items(
+                query='', search_type='title', limit=2, sort='price-asc',
+                cursor=cursor, use_cursor=True
+            )
+            assert mismatched['success'] is False
+            assert '排序方式不匹配' in mismatched['message']
+
+            garbage = ItemService.search_items(
+                query='', search_type='title', limit=2, cursor='not-a-cursor', use_cursor=True
+            )
+            assert garbage['success'] is False
+
+            # 篡改的价格游标（Decimal 无法解析 / 非有限值）
+            for raw in ('abc', 'NaN', 'Infinity'):
+                tampered = base64.urlsafe_b64encode(
+                    json.dumps(['price-asc', 'dec', raw, 1]).encode('utf-8')
+                ).decode('ascii')
+                result = ItemService.search_items(
+                    query='', search_type='title', limit=2, sort='price-asc', cursor=tampered, use_cursor=True
+                )
+                assert result == {'success': False, 'message': '无效的分页游标'}
+
+    def test_offset_mode_unchanged(self, app, init_database):
+        """测试默认页码分页的返回结构保持兼容"""
+        with app.app_context():
+            result = ItemService.search_items(query='', search_type='title', page=1, limit=2)
+            pagination = result['data']['pagination']
+            assert pagination['current_page'] == 1
+            assert pagination['total_items'] >= 2
+            assert 'has_more' in pagination
+
+
+class TestItemCountCache:
+    """商品列表总数缓存测试"""
+
+    @staticmethod
+    def _count_statements(statements):
+        return [s for s in statements if 'COUNT(' in s.upper()]
+
+    def test_count_cached_until_item_write(self, app, init_database, count_queries):
+        """测试总数命中缓存，发布商品后缓存失效"""
+        seller = init_database['users'][0]
+
+        with app.app_context():
+            app.config['COUNT_CACHE_TTL'] = 60
+            try:
+                first = ItemService.search_items(query='', search_type='title', category='electronics')
+                total = first['data']['pagination']['total_items']
+                assert first['data']['pagination']['total_exact'] is True
+
+                # 过滤条件规范化后相同，直接命中缓存
+                with count_queries() as statements:
+                    cached = ItemService.search_items(query='  ', search_type='title', category=' electronics ')
+                assert not self._count_statements(statements)
+                assert cached['data']['pagination']['total_items'] == total
+
+                result = ItemService.create_item(seller.id, {
+                    'title': '新发布的耳机', 'description': '全新', 'price': 99.0,
+                    'stock': 1, 'category': 'electronics'
+                })
+                assert result['success'] is True
+
+                with count_queries() as statements:
+                    refreshed = ItemService.search_items(query='', search_type='title', category='electronics')
+                assert len(self._count_statements(statements)) == 1
+                assert refreshed['data']['pagination']['total_items'] == total + 1
+            finally:
+                app.config['COUNT_CACHE_TTL'] = 0
+
+    def test_namespace_bookkeeping_released(self, app):
+        """测试用户级命名空间的键集合与失效代数在失效/淘汰后释放；统计期间失效的结果不写入缓存"""
+        from app.utils.count_cache import count_cache as cache
+
+        class FakeQuery:
+            def __init__(self, total, on_count=None):
+                self.total, self.on_count = total, on_count
+
+            def order_by(self, *args):
+                return self
+
+            def limit(self, limit):
+                return self
+
+            def count(self):
+                if self.on_count:
+                    self.on_count()
+                return self.total
+
+        max_entries = app.config['COUNT_CACHE_MAX_ENTRIES']
+        cache.clear()
+        app.config['COUNT_CACHE_TTL'] = 60
+        try:
+            for user_id in range(100):
+                assert cache.count(f'orders:{user_id}', (), FakeQuery(user_id)) == (user_id, True)
+                cache.invalidate(f'orders:{user_id}')
+            assert cache._entries == {} and cache._keys == {} and cache._loading == {}
+
+            app.config['COUNT_CACHE_MAX_ENTRIES'] = 2
+            for user_id in range(5):
+                cache.count(f'favorites:{user_id}', (), FakeQuery(user_id))
+            assert set(cache._keys) == {'favorites:3', 'favorites:4'}
+
+            cache.count('items', (), FakeQuery(1, on_count=lambda: cache.invalidate('items')))
+            assert cache.count('items', (), FakeQuery(2)) == (2, True)
+        finally:
+            app.config['COUNT_CACHE_TTL'] = 0
+            app.config['COUNT_CACHE_MAX_ENTRIES'] = max_entries
+            cache.clear()
+
+    def test_estimated_count_above_limit(self, app, init_database):
+        """测试结果集超过精确统计上限时返回估算总数"""
+        with app.app_context():
+            _create_sellers_with_items(10)
+            limit = app.config['COUNT_EXACT_LIMIT']
+            app.config['COUNT_EXACT_LIMIT'] = 5
+            try:
+                result = ItemService.search_items(query='', search_type='title', page=1, limit=4)
+            finally:
+                app.config['COUNT_EXACT_LIMIT'] = limit
+
+            pagination = result['data']['pagination']
+            assert pagination['total_items'] == 5
+            assert pagination['total_exact'] is False
+            assert pagination['has_more'] is True
+
+
+class TestBatchStockCheck:
+    """批量库存检查测试"""
+
+    def test_semantics_preserved(self, app, init_database):
+        """测试逐条检查的结果语义保持不变"""
+        items = init_database['items']
+
+        with app.app_context():
+            Item.query.filter_by(id=items[2].id).update({Item.is_active: False})
+            db.session.commit()
+
+            result = ItemService.check_stock([
+                {'itemId': items[0].id, 'quantity': 2},     # 库存充足
+                {'itemId': items[1].id, 'quantity': 3},     # stock=1，不足
+                {'itemId': items[2].id, 'quantity': 1},     # 已下架
+                {'itemId': items[0].id, 'quantity': 0},     # 数量非法，仍返回当前库存
+                {'itemId': 999999, 'quantity': 1},          # 不存在
+                {'itemId': 'abc', 'quantity': 1},           # ID非法
+            ])
+
+            assert result['success'] is True
+            assert result['data']['valid'] is False
+            assert [(r['available'], r['stock']) for r in result['data']['items']] == [
+                (True, 5), (False, 1), (False, 0), (False, 5), (False, 0), (False, 0)
+            ]
+            assert ItemService.check_stock([{'itemId': items[0].id}])['data']['valid'] is True
+
+    def test_single_query_and_chunking(self, app, init_database, monkeypatch, count_queries):
+        """测试所有商品一次集合查询，超过分块大小时按块查询"""
+        items = init_database['items']
+
+        with app.app_context():
+            request = [{'itemId': item.id, 'quantity': 1} for item in items] * 10
+            with count_queries() as statements:
+                result = ItemService.check_stock(request)
+            assert len(statements) == 1
+            assert len(result['data']['items']) == len(request)
+
+            monkeypatch.setattr(ItemService, 'ID_CHUNK_SIZE', 2)
+            with count_queries() as statements:
+                chunked = ItemService.check_stock(request)
+            assert len(statements) == (len(items) + 1) // 2
+            assert chunked == result
+
+    def test_thousands_of_ids(self, app, init_database):
+        """测试一次检查数千个商品ID（多数不存在）"""
+        item = init_database['items'][0]
+
+        with app.app_context():
+            request = [{'itemId': item_id, 'quantity': 1} for item_id in range(item.id, item.id + 3000)]
+            result = ItemService.check_stock(request)
+            assert len(result['data']['items']) == 3000
+            assert result['data']['items'][0] == {'itemId': item.id, 'available': True, 'stock': 5}
+
+
+class TestFeaturedRanking:
+    """首页推荐排行快照测试"""
+
+    def test_score_weights_and_decay(self):
+        """测试评分随浏览量/收藏数增长，随上架时间衰减"""
+        now = datetime(2024, 6, 1)
+        weights = {'views': 1.0, 'favorites': 2.0, 'seller_rating': 0.5}
+
+        fresh = featured_score(100, 5, 4.0, now, now, weights, 14)
+        assert featured_score(1000, 5, 4.0, now, now, weights, 14) > fresh
+        assert featured_score(100, 50, 4.0, now, now, weights, 14) > fresh
+        # 上架 14 天（一个半衰期）后评分减半
+        assert featured_score(100, 5, 4.0, now - timedelta(days=14), now, weights, 14) == pytest.approx(fresh / 2)
+        # 半衰期 <=0 时不衰减
+        assert featured_score(100, 5, 4.0, now - timedelta(days=365), now, weights, 0) == pytest.approx(fresh)
+
+    def test_snapshot_ranking_and_refresh(self, app, init_database):
+        """测试快照按评分排序，商品变化在刷新后才生效"""
+        items = init_database['items']
+
+        with app.app_context():
+            Item.query.filter_by(id=items[3].id).update({Item.views: 5000, Item.favorites: 100})
+            db.session.commit()
+            featured_ranking.refresh()
+
+            first = ItemService.get_featured_items(limit=5)['data']
+            assert first[0]['id'] == items[3].id
+            # 返回副本：修改结果不影响快照
+            first[0]['title'] = '已修改'
+            assert ItemService.get_featured_items(limit=1)['data'][0]['title'] != '已修改'
+
+            Item.query.filter_by(id=items[3].id).update({Item.is_active: False})
+            db.session.commit()
+            assert ItemService.get_featured_items(limit=1)['data'][0]['id'] == items[3].id
+
+            featured_ranking.refresh()
+            ids = [entry['id'] for entry in ItemService.get_featured_items(limit=50)['data']]
+            assert items[3].id not in ids
+
+    def test_writes_patch_snapshot(self, app, init_database):
+        """测试商品更新、删除与售罄后快照立即修补，不等待整体刷新"""
+        from app.services.order_service import OrderService
+        items = init_database['items']
+        seller = init_database['users'][0]
+
+        with app.app_context():
+            featured_ranking.refresh()
+            featured = lambda: {entry['id']: entry for entry in ItemService.get_featured_items(limit=50)['data']}
+            assert {items[0].id, items[1].id, items[2].id} <= set(featured())
+
+            ItemService.update_item(items[0].id, seller.id, {'title': '计算机导论（第二版）'})
+            assert featured()[items[0].id]['title'] == '计算机导论（第二版）'
+
+            ItemService.delete_item(items[1].id, seller.id)
+            assert items[1].id not in featured()
+
+            stock = db.session.get(Item, items[2].id).stock
+            success, result = OrderService.create_order(
+                buyer_id=init_database['users'][1].id,
+                items_data=[{'item_id': items[2].id, 'quantity': stock}],
+                address_id=init_database['addresses'][0].id
+            )
+            assert success is True, result
+            assert items[2].id not in featured()
+
+    def test_status_reports_age(self, app, init_database):
+        """测试快照状态"""
+        with app.app_context():
+            assert featured_ranking.status()['built'] is False
+            featured_ranking.refresh()
+            status = featured_ranking.status()
+            assert status['built'] is True
+            assert status['size'] > 0
+            assert 0 <= status['age_seconds'] < 60
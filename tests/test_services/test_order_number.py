@@ -0,0 +1,169 @@
+"""
+订单号生成器单元测试
+测试 Snowflake ID 的组成、单调性、时钟回拨处理、多进程唯一性及工作进程ID租约
+"""
+
+import multiprocessing
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import update
+from app.services.order_service import OrderService
+from app.utils.order_number import (
+    SnowflakeGenerator, MAX_SEQUENCE, ORDER_NUMBER_PREFIX, order_number_generator
+)
+from app.models import Order, OrderWorkerLease, db
+
+IDS_PER_PROCESS = 300000
+PROCESS_COUNT = 4
+
+
+def _generate_ids(worker_id):
+    """子进程中生成ID（模块级函数，供进程池调用）"""
+    generator = SnowflakeGenerator(worker_id)
+    return [generator.next_id() for _ in range(IDS_PER_PROCESS)]
+
+
+@pytest.fixture
+def lease_generators(app, init_database):
+    """创建绑定应用、从数据库租用工作进程ID的生成器，结束后释放租约并恢复全局生成器"""
+    generators = []
+    original = (app.extensions['order_number'], app.config.get('ORDER_WORKER_ID'))
+
+    def make(worker_id=None):
+        app.config['ORDER_WORKER_ID'] = worker_id
+        generator = SnowflakeGenerator()
+        generator.init_app(app)
+        generators.append(generator)
+        return generator
+
+    yield make
+    for generator in generators:
+        generator.release()
+    app.extensions['order_number'], app.config['ORDER_WORKER_ID'] = original
+
+
+class TestSnowflakeGenerator:
+    """Snowflake 生成器测试"""
+
+    def test_id_layout(self):
+        """测试ID可解析出工作进程ID和序列号"""
+        generator = SnowflakeGenerator(37)
+        parts = SnowflakeGenerator.parse(generator.next_id())
+        assert parts['worker_id'] == 37
+        assert parts['sequence'] == 0
+
+    def test_order_number_format(self):
+        """测试订单号格式且不超过字段长度"""
+        order_number = SnowflakeGenerator(1).next_order_number()
+        assert order_number.startswith(ORDER_NUMBER_PREFIX)
+        assert order_number[len(ORDER_NUMBER_PREFIX):].isdigit()
+        assert len(order_number) <= 50
+
+    def test_invalid_worker_id(self):
+        """测试工作进程ID越界"""
+        with pytest.raises(ValueError):
+            SnowflakeGenerator(1024)
+
+    def test_monotonic_when_sequence_exhausted(self, monkeypatch):
+        """测试同一毫秒内超过序列号上限仍严格递增且不重复"""
+        generator = SnowflakeGenerator(5)
+        monkeypatch.setattr(generator, '_current_millis', lambda: 1000)
+        ids = [generator.next_id() for _ in range(MAX_SEQUENCE * 3)]
+        assert ids == sorted(set(ids))
+
+    def test_monotonic_when_clock_moves_backwards(self, monkeypatch):
+        """测试系统时钟回拨时仍严格递增"""
+        generator = SnowflakeGenerator(5)
+        monkeypatch.setattr(generator, '_current_millis', lambda: 5000)
+        before = [generator.next_id() for _ in range(10)]
+        monkeypatch.setattr(generator, '_current_millis', lambda: 4000)
+        after = [generator.next_id() for _ in range(10)]
+        ids = before + after
+        assert ids == sorted(set(ids))
+
+    @pytest.mark.slow
+    @pytest.mark.concurrent
+    def test_unique_across_processes(self):
+        """测试多进程并发生成上百万个ID无重复"""
+        ctx = multiprocessing.get_context('fork')
+        with ctx.Pool(PROCESS_COUNT) as pool:
+            results = pool.map(_generate_ids, range(PROCESS_COUNT))
+
+        for ids in results:
+            # 每个进程内严格递增
+            assert all(a < b for a, b in zip(ids, ids[1:]))
+        all_ids = [snowflake_id for ids in results for snowflake_id in ids]
+        assert len(all_ids) == IDS_PER_PROCESS * PROCESS_COUNT
+        assert len(set(all_ids)) == len(all_ids)
+
+
+
+class TestWorkerLease:
+    """工作进程ID租约测试"""
+
+    def test_unbound_generator_without_worker_id_fails(self):
+        """测试未绑定应用且未指定工作进程ID时拒绝生成，而不是猜测一个ID"""
+        with pytest.raises(RuntimeError):
+            SnowflakeGenerator().next_id()
+
+    def test_generators_lease_distinct_worker_ids(self, app, lease_generators):
+        """测试多个进程（生成器）租到互不相同的工作进程ID"""
+        generators = [lease_generators() for _ in range(3)]
+        ids = [generator.next_id() for generator in generators]
+        worker_ids = {SnowflakeGenerator.parse(snowflake_id)['worker_id'] for snowflake_id in ids}
+        assert len(worker_ids) == 3
+        with app.app_context():
+            assert db.session.query(OrderWorkerLease).count() == 3
+
+    def test_configured_worker_id_conflict_fails(self, lease_generators):
+        """测试多个进程配置了相同的 ORDER_WORKER_ID 时报错"""
+        assert lease_generators(7).ensure_worker_id() == 7
+        with pytest.raises(RuntimeError):
+            lease_generators(7).next_id()
+
+    def test_expired_lease_taken_over_and_old_holder_moves(self, app, lease_generators):
+        """测试租约过期后可被接管，原持有者续约失败后改租新的ID"""
+        first = lease_generators()
+        worker_id = first.ensure_worker_id()
+        with app.app_context():
+            db.session.execute(
+                update(OrderWorkerLease).values(expires_at=datetime.now() - timedelta(seconds=1))
+            )
+            db.session.commit()
+
+        second = lease_generators(worker_id)
+        assert second.ensure_worker_id() == worker_id
+
+        first._lease_renew_at = 0  # 到达续约时间
+        assert first.ensure_worker_id() != worker_id
+
+    def test_forked_child_leases_new_worker_id(self, lease_generators):
+        """测试 fork 后的子进程不沿用父进程的工作进程ID"""
+        generator = lease_generators()
+        parent_worker_id = generator.ensure_worker_id()
+        generator._reset_after_fork()
+        assert generator.worker_id is None
+        assert generator.ensure_worker_id() != parent_worker_id
+
+
+class TestOrderNumberIntegration:
+    """下单使用 Snowflake 订单号测试"""
+
+    def test_create_order_uses_snowflake_number(self, app, init_database):
+        """测试创建订单时生成 Snowflake 订单号"""
+        item = init_database['items'][0]
+        user = init_database['users'][1]
+        address = init_database['addresses'][0]
+
+        with app.app_context():
+            success, result = OrderService.create_order(
+                buyer_id=user.id,
+                items_data=[{'item_id': item.id, 'quantity': 1}],
+                address_id=address.id
+            )
+            assert success is True, result
+
+            order = db.session.get(Order, result['order_id'])
+            snowflake_id = int(order.order_number[len(ORDER_NUMBER_PREFIX):])
+            assert SnowflakeGenerator.parse(snowflake_id)['timestamp_ms'] > 0
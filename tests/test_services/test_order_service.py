@@ -4,13 +4,21 @@
 重点：事务处理、并发控制、业务规则验证
 """
 
+import logging
 import pytest
 import time
 import random
 import threading
+from datetime import datetime, timedelta
+from decimal import Decimal
 from concurrent.futures import ThreadPoolExecutor, as_completed
+from sqlalchemy import create_engine, insert, select
+from sqlalchemy.exc import OperationalError, IntegrityError
 from app.services.order_service import OrderService
-from app.models import Order, Item, OrderItem, db
+from app.utils.db_retry import retry_metrics, is_retryable_error
+from app.models import User, Address, Order, Item, OrderItem, db
+
+logger = logging.getLogger(__name__)
 
 
 class TestOrderServiceCreation:
@@ -451,6 +459,65 @@ class TestOrderServiceQuery:
             assert '不存在' in result or 'not found' in result.lower()
 
 
+class TestOrderServiceQueryCount:
+    """订单查询的数据库往返次数测试"""
+
+    @staticmethod
+    def _create_orders(buyer_id, address_id, item_ids, count):
+        Item.query.filter(Item.id.in_(item_ids)).update({Item.stock: 100}, synchronize_session=False)
+        db.session.commit()
+        for _ in range(count):
+            success, result = OrderService.create_order(
+                buyer_id=buyer_id,
+                items_data=[{'item_id': item_id, 'quantity': 1} for item_id in item_ids],
+                address_id=address_id
+            )
+            assert success is True, result
+
+    def test_order_list_query_count_constant(self, app, init_database, count_queries):
+        """测试订单列表的查询次数不随订单数量增长"""
+        user = init_database['users'][1]
+        address = init_database['addresses'][0]
+        item_ids = [init_database['items'][0].id, init_database['items'][3].id]
+
+        with app.app_context():
+            self._create_orders(user.id, address.id, item_ids, 2)
+            db.session.expire_all()
+            with count_queries() as small_page:
+                success, result = OrderService.get_orders(buyer_id=user.id, page=1, limit=2)
+            assert success is True
+
+            self._create_orders(user.id, address.id, item_ids, 10)
+            db.session.expire_all()
+            with count_queries() as large_page:
+                success, result = OrderService.get_orders(buyer_id=user.id, page=1, limit=12)
+            assert success is True
+
+            assert len(result['orders']) == 12
+            assert all(order['items_count'] == 2 for order in result['orders'])
+            assert len(large_page) == len(small_page) <= 3
+
+    def test_order_detail_query_count(self, app, init_database, count_queries):
+        """测试订单详情（含买家、商品、卖家）只需2条SQL"""
+        user = init_database['users'][1]
+        address = init_database['addresses'][0]
+        item_ids = [init_database['items'][0].id, init_database['items'][3].id]
+
+        with app.app_context():
+            self._create_orders(user.id, address.id, item_ids, 1)
+            order = Order.query.filter_by(buyer_id=user.id).order_by(Order.id.desc()).first()
+            order_id = order.id
+            db.session.expire_all()
+
+            with count_queries() as statements:
+                success, result = OrderService.get_order_detail(order_id=order_id, buyer_id=user.id)
+
+            assert success is True
+            assert result['buyer']['username'] == user.username
+            assert {item['seller_info']['username'] for item in result['items']} == {'testuser1', 'testuser3'}
+            assert len(statements) == 2
+
+
 class TestOrderServiceStatusUpdate:
     """订单状态更新服务测试"""
 
@@ -666,6 +733,241 @@ class TestOrderServiceConcurrency:
             assert item.stock >= 0
 
 
+class TestOrderServiceConditionalReservation:
+    """条件扣减库存（ORDER_RESERVATION_ENGINE=conditional）测试"""
+
+    @pytest.fixture
+    def conditional_engine(self, app):
+        app.config['ORDER_RESERVATION_ENGINE'] = 'conditional'
+        yield
+        app.config['ORDER_RESERVATION_ENGINE'] = 'locking'
+
+    def test_conditional_create_order(self, app, init_database, conditional_engine):
+        """测试条件扣减模式下正常下单，库存扣到0时自动下架"""
+        item = init_database['items'][1]  # stock=1
+        user = init_database['users'][1]
+        address = init_database['addresses'][0]
+
+        with app.app_context():
+            success, result = OrderService.create_order(
+                buyer_id=user.id,
+                items_data=[{'item_id': item.id, 'quantity': 1}],
+                address_id=address.id
+            )
+            assert success is True, result
+
+            db.session.expire_all()
+            item = db.session.get(Item, item.id)
+            assert item.stock == 0
+            assert item.is_active is False
+
+            success, result = OrderService.create_order(
+                buyer_id=user.id,
+                items_data=[{'item_id': item.id, 'quantity': 1}],
+                address_id=address.id
+            )
+            assert success is False
+
+    def test_conditional_insufficient_stock_rolls_back(self, app, init_database, conditional_engine, monkeypatch):
+        """测试条件扣减失败时整单回滚，其他商品库存不变"""
+        item1 = init_database['items'][0]  # stock=5
+        item2 = init_database['items'][3]  # stock=3
+        user = init_database['users'][1]
+        address = init_database['addresses'][0]
+
+        with app.app_context():
+            order_count = Order.query.count()
+            # 模拟预检查之后库存被其他请求抢光
+            original_reserve = OrderService._reserve_stock
+            monkeypatch.setattr(OrderService, '_reserve_stock', staticmethod(
+                lambda session, item_id, quantity: item_id != item2.id and original_reserve(session, item_id, quantity)
+            ))
+            success, result = OrderService.create_order(
+                buyer_id=user.id,
+                items_data=[
+                    {'item_id': item1.id, 'quantity': 1},
+                    {'item_id': item2.id, 'quantity': 1}
+                ],
+                address_id=address.id
+            )
+
+            assert success is False
+            assert '库存不足' in result
+            db.session.expire_all()
+            assert db.session.get(Item, item1.id).stock == 5
+            assert Order.query.count() == order_count
+
+    @pytest.fixture
+    def file_database(self, app, init_database, tmp_path):
+        """
+        将默认引擎临时切换为文件型 SQLite：每个应用上下文的会话从连接池取独立连接
+        （内存库在各线程间共享同一连接，无法检验并发），并复制用户/地址/商品数据
+        """
+        engine = create_engine(f"sqlite:///{tmp_path / 'orders.sqlite3'}", connect_args={'timeout': 30})
+        with app.app_context():
+            db.metadata.create_all(engine)
+            with engine.begin() as target:
+                for table in (User.__table__, Address.__table__, Item.__table__):
+                    rows = [dict(row._mapping) for row in db.session.execute(select(table))]
+                    if rows:
+                        target.execute(table.insert(), rows)
+            db.session.remove()
+
+        engines = db._app_engines[app]
+        original = engines[None]
+        engines[None] = engine
+        original_attempts = app.config['DB_RETRY_MAX_ATTEMPTS']
+        # SQLite 写锁冲突（database is locked）按死锁重试
+        app.config['DB_RETRY_MAX_ATTEMPTS'] = 50
+        try:
+            yield engine
+        finally:
+            app.config['DB_RETRY_MAX_ATTEMPTS'] = original_attempts
+            engines[None] = original
+            engine.dispose()
+
+    def test_concurrent_hammer_never_oversells(self, app, init_database, conditional_engine, file_database):
+        """测试多线程各自使用独立会话与连接并发下单同一商品，库存永不为负且成功单数等于初始库存"""
+        item_id = init_database['items'][0].id  # stock=5
+        buyer_id = init_database['users'][1].id
+        address_id = init_database['addresses'][0].id
+        initial_stock = 5
+        start = threading.Barrier(16)
+
+        def place_order():
+            with app.app_context():
+                try:
+                    start.wait(timeout=10)
+                    return OrderService.create_order(
+                        buyer_id=buyer_id,
+                        items_data=[{'item_id': item_id, 'quantity': 1}],
+                        address_id=address_id
+                    )
+                finally:
+                    db.session.remove()
+
+        with ThreadPoolExecutor(max_workers=16) as executor:
+            futures = [executor.submit(place_order) for _ in range(16)]
+            results = [f.result() for f in as_completed(futures)]
+
+        successes = [result for success, result in results if success]
+        failures = [result for success, result in results if not success]
+        assert len(successes) == initial_stock
+        # 失败只能是库存不足/已下架，不能是锁冲突等其他错误
+        assert all('库存不足' in message or '下架' in message for message in failures), failures
+
+        with app.app_context():
+            item = db.session.get(Item, item_id)
+            assert item.stock == 0
+            assert item.is_active is False
+            assert Order.query.count() == initial_stock
+            assert OrderItem.query.filter_by(item_id=item_id).count() == initial_stock
+            db.session.remove()
+
+
+class TestOrderServiceDeadlockRetry:
+    """加锁顺序与死锁重试测试"""
+
+    @staticmethod
+    def _deadlock():
+        return OperationalError(
+            'SELECT ... FOR UPDATE', {},
+            Exception(1213, 'Deadlock found when trying to get lock; try restarting transaction')
+        )
+
+    def test_items_locked_in_id_order(self, app, init_database, count_queries):
+        """测试无论请求中商品顺序如何，都按商品ID升序查询加锁"""
+        item1 = init_database['items'][0]
+        item2 = init_database['items'][3]
+        user = init_database['users'][1]
+        address = init_database['addresses'][0]
+
+        with app.app_context():
+            with count_queries() as statements:
+                success, result = OrderService.create_order(
+                    buyer_id=user.id,
+                    items_data=[
+                        {'item_id': item2.id, 'quantity': 1},
+                        {'item_id': item1.id, 'quantity': 1}
+                    ],
+                    address_id=address.id
+                )
+
+            assert success is True, result
+            lock_queries = [s for s in statements if 'FROM items' in s and ' IN ' in s]
+            assert lock_queries
+            assert all('ORDER BY items.id' in s for s in lock_queries)
+
+    def test_create_order_retries_on_deadlock(self, app, init_database, monkeypatch):
+        """测试遇到死锁后自动重试并成功"""
+        item = init_database['items'][0]
+        user = init_database['users'][1]
+        address = init_database['addresses'][0]
+        original_lock = OrderService._lock_items
+        calls = []
+
+        def flaky_lock(session, item_ids, lock=True):
+            calls.append(item_ids)
+            if len(calls) == 1:
+                raise self._deadlock()
+            return original_lock(session, item_ids, lock)
+
+        monkeypatch.setattr(OrderService, '_lock_items', staticmethod(flaky_lock))
+        retry_metrics.reset()
+
+        with app.app_context():
+            success, result = OrderService.create_order(
+                buyer_id=user.id,
+                items_data=[{'item_id': item.id, 'quantity': 1}],
+                address_id=address.id
+            )
+
+            assert success is True, result
+            assert len(calls) == 2
+            stats = retry_metrics.snapshot()['OrderService.create_order']
+            assert stats['retries'] == 1
+            assert stats['recovered'] == 1
+            assert stats['exhausted'] == 0
+
+            db.session.expire_all()
+            assert db.session.get(Item, item.id).stock == 4
+
+    def test_retry_exhausted_returns_busy(self, app, init_database, monkeypatch):
+        """测试重试耗尽后返回友好错误，库存不变"""
+        item = init_database['items'][0]
+        user = init_database['users'][1]
+        address = init_database['addresses'][0]
+
+        def always_deadlock(session, item_ids, lock=True):
+            raise self._deadlock()
+
+        monkeypatch.setattr(OrderService, '_lock_items', staticmethod(always_deadlock))
+        retry_metrics.reset()
+
+        with app.app_context():
+            success, result = OrderService.create_order(
+                buyer_id=user.id,
+                items_data=[{'item_id': item.id, 'quantity': 1}],
+                address_id=address.id
+            )
+
+            assert success is False
+            assert '系统繁忙' in result
+            stats = retry_metrics.snapshot()['OrderService.create_order']
+            assert stats['retries'] == app.config['DB_RETRY_MAX_ATTEMPTS'] - 1
+            assert stats['exhausted'] == 1
+
+            db.session.expire_all()
+            assert db.session.get(Item, item.id).stock == 5
+
+    def test_non_lock_errors_not_retried(self):
+        """测试非锁冲突的数据库错误不重试"""
+        integrity = IntegrityError('INSERT', {}, Exception(1062, 'Duplicate entry'))
+        assert is_retryable_error(self._deadlock()) is True
+        assert is_retryable_error(integrity) is False
+        assert is_retryable_error(ValueError('x')) is False
+
+
 class TestOrderServiceAddressManagement:
     """地址管理服务测试"""
 
@@ -799,6 +1101,114 @@ class TestOrderServiceStatistics:
             assert 'total_spent' in result
             assert isinstance(result['total_spent'], float)
 
+    def test_statistics_single_aggregate_query(self, app, init_database, count_queries):
+        """测试买家统计为一条 GROUP BY 查询，结果正确"""
+        user = init_database['users'][1]  # 1个已完成订单 91.00
+
+        with app.app_context():
+            db.session.expire_all()
+            with count_queries() as statements:
+                success, result = OrderService.get_statistics(user.id)
+
+            assert success is True
+            assert len(statements) == 1
+            assert 'GROUP BY' in statements[0].upper()
+            assert result['total_orders'] == 1
+            assert result['completed_orders'] == 1
+            assert result['total_spent'] == 91.0
+            assert result['orders_by_status']['completed'] == 1
+
+    def test_seller_statistics(self, app, init_database):
+        """测试卖家统计：GMV、各状态订单数、客单价"""
+        seller = init_database['users'][0]  # 已完成 91.00 + 待支付 45.50
+
+        with app.app_context():
+            success, result = OrderService.get_seller_statistics(seller.id)
+
+            assert success is True
+            assert result['total_orders'] == 2
+            assert result['paid_orders'] == 1
+            assert result['gmv'] == 91.0
+            assert result['average_order_value'] == 91.0
+            assert result['orders_by_status']['pending'] == 1
+            assert result['orders_by_status']['shipped'] == 0
+
+    def test_seller_statistics_date_range(self, app, init_database):
+        """测试卖家统计按日期范围过滤"""
+        seller = init_database['users'][0]
+        today = datetime.now().date()
+
+        with app.app_context():
+            success, result = OrderService.get_seller_statistics(seller.id, start_date=today, end_date=today)
+            assert success is True
+            assert result['total_orders'] == 2
+
+            yesterday = today - timedelta(days=1)
+            success, result = OrderService.get_seller_statistics(seller.id, end_date=yesterday)
+            assert success is True
+            assert result['total_orders'] == 0
+            assert result['average_order_value'] == 0.0
+
+    @staticmethod
+    def _bulk_insert_orders(buyer_id, seller_id, address_id, count, start):
+        statuses = [status for status, _ in Order.STATUS_CHOICES]
+        db.session.execute(insert(Order.__table__), [
+            {
+                'order_number': f'BENCH{start + i}',
+                'buyer_id': buyer_id,
+                'seller_id': seller_id,
+                'address_id': address_id,
+                'total_amount': Decimal('10.00'),
+                'status': statuses[i % len(statuses)],
+                'created_at': datetime.now(),
+                'updated_at': datetime.now()
+            }
+            for i in range(count)
+        ])
+        db.session.commit()
+
+    @pytest.mark.slow
+    def test_statistics_benchmark_flat_as_history_grows(self, app, init_database, count_queries):
+        """基准测试：订单历史增长时统计的查询数不变、不加载订单对象、耗时基本持平"""
+        buyer = init_database['users'][1]
+        seller = init_database['users'][0]
+        address = init_database['addresses'][0]
+
+        def measure(func, user_id):
+            db.session.expire_all()
+            with count_queries() as statements:
+                started = time.perf_counter()
+                for _ in range(5):
+                    success, result = func(user_id)
+                elapsed = (time.perf_counter() - started) / 5
+            assert success is True
+            loaded_orders = [obj for obj in db.session.identity_map.values() if isinstance(obj, Order)]
+            return result, len(statements) // 5, elapsed, loaded_orders
+
+        with app.app_context():
+            self._bulk_insert_orders(buyer.id, seller.id, address.id, 50, 0)
+            _, small_queries, small_time, _ = measure(OrderService.get_statistics, buyer.id)
+            _, small_seller_queries, small_seller_time, _ = measure(OrderService.get_seller_statistics, seller.id)
+
+            self._bulk_insert_orders(buyer.id, seller.id, address.id, 5000, 50)
+            db.session.expunge_all()
+            result, large_queries, large_time, loaded = measure(OrderService.get_statistics, buyer.id)
+            seller_result, large_seller_queries, large_seller_time, _ = measure(
+                OrderService.get_seller_statistics, seller.id
+            )
+
+            logger.info(f"买家统计: 51单 {small_time * 1000:.2f}ms, 5051单 {large_time * 1000:.2f}ms")
+            logger.info(f"卖家统计: 52单 {small_seller_time * 1000:.2f}ms, 5052单 {large_seller_time * 1000:.2f}ms")
+
+            assert result['total_orders'] == 5051
+            assert seller_result['total_orders'] == 5052
+            assert small_queries == large_queries == 1
+            assert small_seller_queries == large_seller_queries == 1
+            assert loaded == []
+            # 聚合在数据库中完成，耗时不随订单数线性增长（100倍数据量，耗时远小于100倍）
+            assert large_time < small_time * 20 + 0.05
+            assert large_seller_time < small_seller_time * 20 + 0.05
+
 
 class TestOrderServiceTransactions:
     """订单服务事务处理测试"""
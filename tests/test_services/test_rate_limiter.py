@@ -0,0 +1,193 @@
+"""
+接口限流测试
+重点：令牌桶补充与等待时间、memory/sqlite 后端、规则覆盖、登录/注册/下单接口在查库与 bcrypt 之前拒绝、
+登录账号只统计失败且按 (账号, IP) 计数
+"""
+
+import json
+import pytest
+from app.utils.rate_limiter import MemoryBucketBackend, SQLiteBucketBackend, rate_limiter
+from app.utils.password_helper import password_pool
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def backend(request, tmp_path):
+    if request.param == 'memory':
+        return MemoryBucketBackend(max_keys=3)
+    return SQLiteBucketBackend(str(tmp_path / 'rate_limit.sqlite3'))
+
+
+@pytest.fixture
+def limiter_enabled(app):
+    """在测试期间开启限流，并缩小登录/注册/下单规则"""
+    app.config['RATE_LIMIT_BACKEND'] = 'memory'
+    app.config['RATE_LIMITS'] = {
+        'login_ip': (5, 60),
+        'login_account': (2, 60),
+        'login_account_global': (3, 60),
+        'register_ip': (1, 60),
+        'create_order_user': (1, 60),
+    }
+    rate_limiter.clear()
+    yield rate_limiter
+    rate_limiter.clear()
+    app.config['RATE_LIMIT_BACKEND'] = 'none'
+    app.config['RATE_LIMITS'] = {}
+
+
+class TestTokenBucket:
+    """令牌桶后端测试"""
+
+    def test_burst_then_refill(self, backend):
+        # 容量3，每秒补充1个
+        assert [backend.consume('k', 3, 1.0, now=100)[0] for _ in range(3)] == [True, True, True]
+        allowed, retry_after = backend.consume('k', 3, 1.0, now=100)
+        assert allowed is False
+        assert retry_after == pytest.approx(1.0)
+
+        assert backend.consume('k', 3, 1.0, now=100.5) == (False, pytest.approx(0.5))
+        assert backend.consume('k', 3, 1.0, now=101)[0] is True
+        # 补充不超过容量
+        assert [backend.consume('k', 3, 1.0, now=1000)[0] for _ in range(4)] == [True, True, True, False]
+
+    def test_keys_are_independent(self, backend):
+        assert backend.consume('a', 1, 0.1, now=0)[0] is True
+        assert backend.consume('a', 1, 0.1, now=0)[0] is False
+        assert backend.consume('b', 1, 0.1, now=0)[0] is True
+
+    def test_memory_evicts_least_recently_used(self):
+        backend = MemoryBucketBackend(max_keys=2)
+        for key in ('a', 'b', 'c'):
+            backend.consume(key, 1, 0.1, now=0)
+        assert backend.stats() == {'keys': 2}
+        # 'a' 被淘汰，视为满桶
+        assert backend.consume('a', 1, 0.1, now=0)[0] is True
+
+    def test_peek_does_not_consume(self, backend):
+        assert backend.peek('k', 1, 0.1, now=0) == (True, 0.0)
+        assert backend.peek('k', 1, 0.1, now=0) == (True, 0.0)
+        assert backend.consume('k', 1, 0.1, now=0)[0] is True
+        allowed, retry_after = backend.peek('k', 1, 0.1, now=0)
+        assert allowed is False
+        assert retry_after == pytest.approx(10.0)
+
+    def test_refund_restores_reserved_token(self, backend):
+        assert backend.consume('k', 2, 0.1, now=0)[0] is True
+        assert backend.consume('k', 2, 0.1, now=0)[0] is True
+        backend.refund('k', 2, 0.1, now=0)
+        assert backend.peek('k', 2, 0.1, now=0) == (True, 0.0)
+        # 退还不超过容量
+        backend.refund('k', 2, 0.1, now=0)
+        backend.refund('k', 2, 0.1, now=0)
+        assert [backend.consume('k', 2, 0.1, now=0)[0] for _ in range(3)] == [True, True, False]
+
+    def test_sqlite_shared_between_instances(self, tmp_path):
+        path = str(tmp_path / 'shared.sqlite3')
+        first, second = SQLiteBucketBackend(path), SQLiteBucketBackend(path)
+        assert first.consume('k', 1, 0.1, now=0)[0] is True
+        assert second.consume('k', 1, 0.1, now=0)[0] is False
+
+
+class TestRateLimitedEndpoints:
+    """接口限流测试"""
+
+    def test_login_account_limit_skips_password_check(self, client, init_database, limiter_enabled):
+        """测试同一账号超出限制后直接返回429，不再校验密码"""
+        for _ in range(2):
+            response = client.post('/api/user/login', json={'username': 'testuser1', 'password': 'Wrong123'})
+            assert response.status_code == 401
+
+        verified = password_pool.stats()['latency']['verify']['count']
+        response = client.post('/api/user/login', json={'username': ' TestUser1 ', 'password': 'Password123'})
+        assert response.status_code == 429
+        assert int(response.headers['Retry-After']) >= 1
+        assert json.loads(response.data)['code'] == 7
+        assert password_pool.stats()['latency']['verify']['count'] == verified
+
+        # 其他账号不受影响
+        response = client.post('/api/user/login', json={'username': 'testuser2', 'password': 'Password456'})
+        assert response.status_code == 200
+        assert limiter_enabled.stats()['rejected'] == {'login_account': 1}
+
+    def test_successful_logins_not_charged(self, client, init_database, limiter_enabled):
+        """测试登录成功不消耗账号令牌"""
+        for _ in range(4):
+            response = client.post('/api/user/login', json={'username': 'testuser1', 'password': 'Password123'})
+            assert response.status_code == 200
+        assert limiter_enabled.stats()['rejected'] == {}
+
+    def test_failures_from_other_ip_do_not_lock_out(self, client, init_database, limiter_enabled):
+        """测试他人从其他IP猜错密码不会锁住账号；所有IP的失败总数超过账号规则时才拒绝"""
+        attacker = {'REMOTE_ADDR': '10.0.0.2'}
+        for _ in range(2):
+            response = client.post('/api/user/login', json={'username': 'testuser1', 'password': 'Wrong123'},
+                                   environ_base=attacker)
+            assert response.status_code == 401
+        response = client.post('/api/user/login', json={'username': 'testuser1', 'password': 'Wrong123'},
+                               environ_base=attacker)
+        assert response.status_code == 429
+
+        # 本人从自己的IP仍可登录
+        response = client.post('/api/user/login', json={'username': 'testuser1', 'password': 'Password123'})
+        assert response.status_code == 200
+
+        # 换IP继续猜：账号在所有IP上的失败次数达到上限后拒绝
+        response = client.post('/api/user/login', json={'username': 'testuser1', 'password': 'Wrong123'},
+                               environ_base={'REMOTE_ADDR': '10.0.0.3'})
+        assert response.status_code == 401
+        response = client.post('/api/user/login', json={'username': 'testuser1', 'password': 'Wrong123'},
+                               environ_base={'REMOTE_ADDR': '10.0.0.4'})
+        assert response.status_code == 429
+        assert limiter_enabled.stats()['rejected'] == {'login_account': 1, 'login_account_global': 1}
+
+    def test_failure_rule_reserves_token_before_view(self, app, limiter_enabled):
+        """测试失败计数规则在视图执行前预扣令牌：并发请求在视图返回前不能越过限制"""
+        from app.utils.rate_limiter import remote_addr_key
+        from app.utils.response import APIResponse
+
+        @limiter_enabled.limit_failures('login_account', key=remote_addr_key)
+        def view():
+            return APIResponse.auth_error(message='密码错误')
+
+        with app.test_request_context('/'):
+            results = []
+
+            @limiter_enabled.limit_failures('login_account', key=remote_addr_key)
+            def concurrent_view():
+                # 视图执行期间另外两个并发请求：只剩一个令牌，第二个被拒绝
+                results.append(app.make_response(view()).status_code)
+                results.append(app.make_response(view()).status_code)
+                return APIResponse.success()
+
+            assert concurrent_view().status_code == 200
+            assert results == [401, 429]
+
+    def test_zero_capacity_rule_rejects_with_bounded_retry_after(self, client, init_database, limiter_enabled, app):
+        """测试容量为0的规则直接拒绝，Retry-After 不超过规则周期"""
+        app.config['RATE_LIMITS'] = dict(app.config['RATE_LIMITS'], login_account_global=(0, 60))
+        response = client.post('/api/user/login', json={'username': 'testuser1', 'password': 'Password123'})
+        assert response.status_code == 429
+        assert response.headers['Retry-After'] == '60'
+
+    def test_login_ip_limit(self, client, init_database, limiter_enabled):
+        """测试同一IP轮换账号时按IP限流"""
+        statuses = [
+            client.post('/api/user/login', json={'username': f'user{i}', 'password': 'Wrong123'}).status_code
+            for i in range(6)
+        ]
+        assert statuses == [401] * 5 + [429]
+
+    def test_register_and_create_order_limits(self, client, init_database, auth_headers_user1, limiter_enabled):
+        payload = {'username': 'ratelimited', 'email': 'ratelimited@seu.edu.cn', 'password': 'Password123'}
+        assert client.post('/api/user/register', json=payload).status_code == 200
+        assert client.post('/api/user/register', json=payload).status_code == 429
+
+        order = {'items': [{'item_id': init_database['items'][0].id, 'quantity': 1}], 'address_id': 999999}
+        assert client.post('/api/orders/', json=order, headers=auth_headers_user1).status_code != 429
+        assert client.post('/api/orders/', json=order, headers=auth_headers_user1).status_code == 429
+
+    def test_disabled_backend(self, client, init_database):
+        """测试关闭限流时不限制"""
+        for _ in range(7):
+            response = client.post('/api/user/login', json={'username': 'testuser1', 'password': 'Wrong123'})
+            assert response.status_code == 401
@@ -0,0 +1,143 @@
+"""
+“经常一起购买”推荐单元测试
+测试共现矩阵、全量/增量构建、近邻文件加载及商品详情接口集成
+"""
+
+import json
+import uuid
+import pytest
+from app.services.recommender import CoOccurrenceMatrix, recommender
+from app.services.review_service import ReviewService
+from app.models import Order, OrderItem, db
+
+
+def _place_order(users, addresses, items, status='completed', order_id=None):
+    """直接写库创建一个包含多件商品的订单"""
+    order = Order(
+        id=order_id,
+        order_number=f'ORD{uuid.uuid4().hex[:16]}',
+        buyer_id=users[1].id,
+        seller_id=users[0].id,
+        total_amount=10,
+        status=status,
+        shipping_address='九龙湖校区',
+        address_id=addresses[0].id
+    )
+    db.session.add(order)
+    db.session.flush()
+    db.session.add_all([
+        OrderItem(order_id=order.id, item_id=item.id, quantity=1, unit_price=item.price) for item in items
+    ])
+    db.session.commit()
+    return order
+
+
+@pytest.fixture
+def recommend_path(app, tmp_path):
+    path = tmp_path / 'copurchase.json'
+    app.config['RECOMMEND_PATH'] = str(path)
+    recommender.reset()
+    yield path
+    app.config['RECOMMEND_PATH'] = ''
+    recommender.reset()
+
+
+class TestCoOccurrenceMatrix:
+    """共现矩阵测试"""
+
+    def test_cosine_normalized_neighbours(self):
+        matrix = CoOccurrenceMatrix()
+        matrix.add_basket([1, 2])
+        matrix.add_basket([1, 2, 3])
+        matrix.add_basket([1, 3])
+        matrix.add_basket([3, 4])
+
+        # 1-2 共现2次：2/sqrt(3*2)；1-3 共现2次：2/sqrt(3*3)
+        assert matrix.neighbours(1, 5) == [(2, pytest.approx(0.816497)), (3, pytest.approx(0.666667))]
+        assert [item_id for item_id, _ in matrix.neighbours(3, 1)] == [1]
+        assert matrix.neighbours(5, 5) == []
+
+    def test_dump_and_load(self):
+        matrix = CoOccurrenceMatrix()
+        matrix.add_basket([1, 2, 3])
+        matrix.add_basket([2, 3])
+
+        restored = CoOccurrenceMatrix.load(json.loads(json.dumps(matrix.dump())))
+        assert restored.rows == matrix.rows
+        assert restored.item_counts == matrix.item_counts
+
+
+class TestRecommenderBuild:
+    """离线构建与在线读取测试"""
+
+    def test_full_and_incremental_build(self, app, init_database, recommend_path):
+        users, addresses, items = init_database['users'], init_database['addresses'], init_database['items']
+
+        with app.app_context():
+            _place_order(users, addresses, [items[1], items[2]])
+            _place_order(users, addresses, [items[1], items[3]], status='cancelled')
+
+            stats = recommender.build(full=True)
+            assert stats['items'] == 2
+            assert [item_id for item_id, _ in recommender.related(items[1].id)] == [items[2].id]
+
+            # 增量构建只处理新订单
+            order = _place_order(users, addresses, [items[1], items[4]])
+            stats = recommender.build()
+            assert stats['orders'] == 1
+            assert stats['watermark'] == order.id
+            assert {item_id for item_id, _ in recommender.related(items[1].id)} == {items[2].id, items[4].id}
+            assert [item_id for item_id, _ in recommender.related(items[4].id)] == [items[1].id]
+
+            # 没有新订单时不做任何更新
+            assert recommender.build()['orders'] == 0
+
+    def test_incremental_build_picks_up_late_commits(self, app, init_database, recommend_path):
+        users, addresses, items = init_database['users'], init_database['addresses'], init_database['items']
+
+        with app.app_context():
+            _place_order(users, addresses, [items[1], items[2]])
+            # 较小ID的订单在较大ID的订单之后才提交
+            late = _place_order(users, addresses, [items[1], items[3]])
+            late_id = late.id
+            newer = _place_order(users, addresses, [items[2], items[4]])
+            OrderItem.query.filter_by(order_id=late_id).delete()
+            db.session.delete(late)
+            db.session.commit()
+
+            assert recommender.build(full=True)['watermark'] == newer.id
+            _place_order(users, addresses, [items[1], items[3]], order_id=late_id)
+
+            stats = recommender.build()
+            assert stats['orders'] == 1
+            assert stats['watermark'] == newer.id
+            assert {item_id for item_id, _ in recommender.related(items[1].id)} == {items[2].id, items[3].id}
+
+            # 回看窗口内已处理的订单不会重复计数
+            assert recommender.build()['orders'] == 0
+            state = json.loads((recommend_path.parent / 'copurchase.json.state').read_text(encoding='utf-8'))
+            assert state['matrix']['item_counts'][str(items[1].id)] == 2
+
+    def test_bought_together_skips_inactive(self, app, init_database, recommend_path):
+        users, addresses, items = init_database['users'], init_database['addresses'], init_database['items']
+
+        with app.app_context():
+            _place_order(users, addresses, [items[0], items[1], items[5]])
+            recommender.build(full=True)
+
+            related = ReviewService.get_bought_together(items[0].id)['data']
+            assert [entry['id'] for entry in related] == [items[1].id]
+            assert related[0]['title'] == 'MacBook Pro'
+            assert ReviewService.get_bought_together(items[4].id)['data'] == []
+
+    def test_detail_api_includes_bought_together(self, client, app, init_database, recommend_path):
+        users, addresses, items = init_database['users'], init_database['addresses'], init_database['items']
+
+        with app.app_context():
+            _place_order(users, addresses, [items[2], items[3]])
+            recommender.build(full=True)
+
+        response = client.get(f'/api/item/getDetail/{items[2].id}')
+        assert response.status_code == 200
+        data = json.loads(response.data)['data']
+        assert [entry['id'] for entry in data['bought_together']] == [items[3].id]
@@ -0,0 +1,188 @@
+"""
+接口响应缓存测试
+重点：LRU 与字节数上限、TTL、标签失效、用户作用域、sqlite 共享后端、写路径失效
+"""
+
+import json
+import time
+import pytest
+from app.utils.cache import CacheEntry, MemoryCacheBackend, SQLiteCacheBackend, response_cache
+from app.services.favorite_service import FavoriteService
+
+
+def _entry(body=b'{}', ttl=60):
+    return CacheEntry(200, 'application/json', body, time.time() + ttl)
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def backend(request, tmp_path):
+    if request.param == 'memory':
+        return MemoryCacheBackend(max_entries=3, max_bytes=1000)
+    return SQLiteCacheBackend(str(tmp_path / 'cache.sqlite3'), max_entries=3, max_bytes=1000)
+
+
+@pytest.fixture
+def cache_enabled(app, tmp_path):
+    """在测试期间开启响应缓存"""
+    app.config['RESPONSE_CACHE_BACKEND'] = 'memory'
+    response_cache.clear()
+    yield response_cache
+    response_cache.clear()
+    app.config['RESPONSE_CACHE_BACKEND'] = 'none'
+
+
+class TestCacheBackends:
+    """缓存后端测试（memory 与 sqlite 行为一致）"""
+
+    def test_lru_eviction_by_entries(self, backend):
+        """测试超过条目数上限时淘汰最久未访问的条目"""
+        for key in ('a', 'b', 'c'):
+            backend.set(key, _entry())
+        assert backend.get('a') is not None     # 访问 a，b 成为最久未访问
+        backend.set('d', _entry())
+
+        assert backend.get('b') is None
+        assert all(backend.get(key) is not None for key in ('a', 'c', 'd'))
+        assert backend.stats()['entries'] == 3
+
+    def test_eviction_by_bytes(self, backend):
+        """测试按响应体总字节数淘汰"""
+        backend.set('a', _entry(b'x' * 600))
+        backend.set('b', _entry(b'x' * 600))
+
+        assert backend.get('a') is None
+        assert backend.get('b').body == b'x' * 600
+        assert backend.stats()['bytes'] <= 1000
+
+    def test_ttl_expiry(self, backend):
+        """测试过期条目不再返回"""
+        backend.set('a', _entry(ttl=-1))
+        assert backend.get('a') is None
+
+    def test_tag_invalidation(self, backend):
+        """测试按标签失效"""
+        backend.set('a', _entry(), ['item:1', 'category:books'])
+        backend.set('b', _entry(), ['item:2', 'category:books'])
+        backend.set('c', _entry(), ['item:3'])
+
+        assert backend.invalidate_tags(['item:1']) == 1
+        assert backend.get('a') is None and backend.get('b') is not None
+        assert backend.invalidate_tags(['category:books', 'item:3']) == 2
+        assert backend.stats()['entries'] == 0
+
+    def test_sqlite_shared_between_instances(self, tmp_path):
+        """测试 sqlite 后端在多个实例（模拟多进程）间共享条目与失效"""
+        path = str(tmp_path / 'shared.sqlite3')
+        first, second = SQLiteCacheBackend(path), SQLiteCacheBackend(path)
+
+        first.set('a', _entry(b'shared'), ['item:1'])
+        assert second.get('a').body == b'shared'
+        second.invalidate_tags(['item:1'])
+        assert first.get('a') is None
+
+    def test_sqlite_hits_do_not_write(self, tmp_path):
+        """测试 sqlite 后端命中时不逐次写库，最近访问时间批量写入"""
+        backend = SQLiteCacheBackend(str(tmp_path / 'cache.sqlite3'))
+        backend.TOUCH_BATCH = 3
+        for key in ('a', 'b', 'c'):
+            backend.set(key, _entry())
+        conn = backend._conn()
+
+        changes = conn.total_changes
+        backend.get('a')
+        backend.get('a')
+        backend.get('b')
+        assert conn.total_changes == changes
+        backend.get('c')
+        assert conn.total_changes == changes + 3
+
+
+class TestResponseCacheEndpoints:
+    """接口缓存与写路径失效测试"""
+
+    def test_detail_cached_and_invalidated_on_update(self, client, app, init_database, auth_headers, cache_enabled):
+        """测试商品详情命中缓存，卖家更新商品后失效"""
+        item = init_database['items'][0]
+        url = f'/api/item/getDetail/{item.id}'
+
+        assert client.get(url).headers['X-Cache'] == 'MISS'
+        response = client.get(url)
+        assert response.headers['X-Cache'] == 'HIT'
+        assert json.loads(response.data)['data']['title'] == '计算机导论'
+
+        response = client.post(f'/api/item/update/{item.id}', json={'title': '计算机导论（第二版）'}, headers=auth_headers)
+        assert response.status_code == 200
+
+        response = client.get(url)
+        assert response.headers['X-Cache'] == 'MISS'
+        assert json.loads(response.data)['data']['title'] == '计算机导论（第二版）'
+
+    def test_detail_hit_still_counts_view(self, client, app, init_database, cache_enabled):
+        """测试命中缓存时仍记录浏览量"""
+        from app.models import Item, db
+        item = init_database['items'][0]
+
+        client.get(f'/api/item/getDetail/{item.id}')
+        client.get(f'/api/item/getDetail/{item.id}')
+
+        with app.app_context():
+            db.session.expire_all()
+            assert db.session.get(Item, item.id).views == 2
+
+    def test_category_scoped_per_user(self, client, app, init_database, auth_headers, cache_enabled):
+        """测试分类列表按用户区分缓存，收藏后该用户的缓存失效"""
+        item = init_database['items'][0]     # books
+        url = '/api/item/getByCategory/books'
+
+        anonymous = json.loads(client.post(url, json={'page': 1}).data)['data']['items']
+        assert all('is_favorited' not in entry for entry in anonymous)
+        assert client.post(url, json={'page': 1}, headers=auth_headers).headers['X-Cache'] == 'MISS'
+
+        with app.app_context():
+            FavoriteService.add_favorite(init_database['users'][0].id, item.id)
+
+        response = client.post(url, json={'page': 1}, headers=auth_headers)
+        assert response.headers['X-Cache'] == 'MISS'
+        marked = {entry['id']: entry['is_favorited'] for entry in json.loads(response.data)['data']['items']}
+        assert marked[item.id] is True
+        # 未登录用户的缓存不受影响
+        assert client.post(url, json={'page': 1}).headers['X-Cache'] == 'HIT'
+
+    def test_request_body_part_of_key(self, client, app, init_database, cache_enabled):
+        """测试请求体不同（如分页参数）时不共用缓存"""
+        url = '/api/item/getByCategory/books'
+        assert client.post(url, json={'page': 1}).headers['X-Cache'] == 'MISS'
+        assert client.post(url, json={'page': 2}).headers['X-Cache'] == 'MISS'
+        assert client.post(url, json={'page': 1}).headers['X-Cache'] == 'HIT'
+
+    def test_user_profile_invalidated_on_update(self, client, app, init_database, auth_headers_user2, cache_enabled):
+        """测试用户资料更新后公开资料缓存失效"""
+        user = init_database['users'][1]
+        url = f'/api/user/getUserProfile/{user.id}'
+
+        client.get(url)
+        assert client.get(url).headers['X-Cache'] == 'HIT'
+        client.post('/api/user/updateProfile', json={'avatar': 'https://example.com/new.jpg'}, headers=auth_headers_user2)
+        response = client.get(url)
+        assert response.headers['X-Cache'] == 'MISS'
+        assert json.loads(response.data)['data']['avatar'] == 'https://example.com/new.jpg'
+
+    def test_order_invalidates_category_and_rankings(self, client, app, init_database, auth_headers_user2, cache_enabled):
+        """测试下单后商品所在分类列表、推荐与热门榜单的缓存失效"""
+        item = init_database['items'][0]     # books
+        category_url = '/api/item/getByCategory/books'
+        client.post(category_url, json={'page': 1})
+        client.get('/api/item/getTrending')
+        assert client.post(category_url, json={'page': 1}).headers['X-Cache'] == 'HIT'
+        assert client.get('/api/item/getTrending').headers['X-Cache'] == 'HIT'
+
+        order = {'items': [{'item_id': item.id, 'quantity': 1}], 'address_id': init_database['addresses'][0].id}
+        assert client.post('/api/orders/', json=order, headers=auth_headers_user2).status_code == 200
+
+        assert client.post(category_url, json={'page': 1}).headers['X-Cache'] == 'MISS'
+        assert client.get('/api/item/getTrending').headers['X-Cache'] == 'MISS'
+
+    def test_error_responses_not_cached(self, client, app, init_database, cache_enabled):
+        """测试错误响应不缓存"""
+        assert 'X-Cache' not in client.get('/api/item/getDetail/999999').headers
+        assert cache_enabled.stats()['entries'] == 0
@@ -0,0 +1,209 @@
+"""
+商品搜索引擎单元测试
+测试分词、倒排索引、BM25 排序、持久化及与 ItemService 的集成
+"""
+
+import pytest
+from app.services.search_engine import SearchIndex, SearchEngine, search_engine, tokenize
+from app.services.item_service import ItemService
+from app.models import Item, db
+
+
+class TestTokenize:
+    """分词测试"""
+
+    def test_cjk_bigrams_and_unigrams(self):
+        """测试中文建索引输出二元组和单字"""
+        tokens = tokenize('计算机')
+        assert '计算' in tokens and '算机' in tokens
+        assert '计' in tokens
+
+    def test_query_uses_bigrams_only(self):
+        """测试查询时中文只用二元组"""
+        assert tokenize('计算机', for_query=True) == ['计算', '算机']
+        assert tokenize('书', for_query=True) == ['书']
+
+    def test_latin_words_lowercased(self):
+        """测试英文按单词切分并转小写"""
+        assert tokenize('MacBook Pro 2022款') == ['macbook', 'pro', '2022', '款']
+
+
+class TestSearchIndex:
+    """倒排索引与 BM25 测试"""
+
+    def test_all_terms_must_match(self):
+        index = SearchIndex()
+        index.add_document(1, 'Python编程', '入门书籍')
+        index.add_document(2, 'Java编程', '入门书籍')
+
+        assert [doc_id for doc_id, _ in index.search('python 编程')] == [1]
+        assert index.search('c++') == []
+
+    def test_title_match_ranks_higher(self):
+        index = SearchIndex()
+        index.add_document(1, '台灯', '附赠一本计算机导论')
+        index.add_document(2, '计算机导论', '全新未使用')
+
+        ranked = index.search('计算机')
+        assert [doc_id for doc_id, _ in ranked] == [2, 1]
+        assert ranked[0][1] > ranked[1][1]
+
+    def test_update_and_remove(self):
+        index = SearchIndex()
+        index.add_document(1, '自行车', '')
+        index.add_document(1, '山地车', '')
+        assert index.search('自行车') == []
+        assert len(index.search('山地')) == 1
+
+        index.remove_document(1)
+        assert len(index) == 0
+        assert index.search('山地') == []
+
+    def test_dump_and_load(self):
+        index = SearchIndex()
+        index.add_document(7, 'iPhone 13 Pro', '95新')
+
+        restored = SearchIndex()
+        restored.load(index.dump())
+        assert restored.search('iphone') == index.search('iphone')
+
+
+class TestSearchEngine:
+    """搜索引擎与数据库同步测试"""
+
+    def test_search_items_uses_index(self, app, init_database):
+        """测试按标题搜索命中描述关键词并支持相关度排序"""
+        with app.app_context():
+            result = ItemService.search_items(query='捷安特', search_type='title', sort='relevance')
+            titles = [item['title'] for item in result['data']['items']]
+            assert titles == ['自行车']
+
+    def test_create_update_delete_hooks(self, app, init_database):
+        """测试发布、更新、删除商品时索引增量更新"""
+        seller = init_database['users'][0]
+
+        with app.app_context():
+            # 先触发一次加载
+            search_engine.search_ids('预热')
+
+            created = ItemService.create_item(seller.id, {
+                'title': '机械键盘', 'description': '青轴', 'price': 199, 'stock': 1, 'category': 'electronics'
+            })
+            item_id = created['data']['id']
+            assert item_id in search_engine.search_ids('键盘')
+
+            ItemService.update_item(item_id, seller.id, {'title': '静电容键盘'})
+            assert item_id in search_engine.search_ids('静电容')
+
+            ItemService.delete_item(item_id, seller.id)
+            assert item_id not in search_engine.search_ids('键盘')
+
+    def test_persist_and_reload(self, app, init_database, tmp_path):
+        """测试索引保存到文件后可直接加载"""
+        path = tmp_path / 'index.json'
+
+        with app.app_context():
+            app.config['SEARCH_INDEX_PATH'] = str(path)
+            try:
+                assert search_engine.rebuild() == 5
+                assert path.exists()
+
+                engine = SearchEngine()
+                engine.init_app(app)
+                assert engine._load_file() is True
+                assert len(engine.index) == 5
+                assert engine.search_ids('macbook') == search_engine.search_ids('macbook')
+            finally:
+                app.config['SEARCH_INDEX_PATH'] = ''
+
+    def test_filters_and_sorts_apply_to_all_matches(self, app, init_database):
+        """测试候选数上限只影响相关度排名：按时间/价格排序与总数覆盖全部命中商品"""
+        with app.app_context():
+            app.config['SEARCH_MAX_CANDIDATES'] = 1
+            try:
+                latest = ItemService.search_items(query='新', search_type='title')['data']
+                assert len(latest['items']) == 4
+                assert latest['pagination']['total_items'] == 4
+
+                cheapest = ItemService.search_items(query='新', search_type='title', sort='price-asc', limit=1)
+                assert cheapest['data']['items'][0]['title'] == '计算机导论'
+
+                books = ItemService.search_items(query='新', search_type='title', category='books')['data']
+                assert {item['title'] for item in books['items']} == {'计算机导论', 'Python编程从入门到精通'}
+
+                relevance = ItemService.search_items(query='新', search_type='title', sort='relevance')['data']
+                assert len(relevance['items']) == 4
+                assert relevance['items'][0]['id'] == search_engine.search_ids('新')[0]
+            finally:
+                app.config['SEARCH_MAX_CANDIDATES'] = 1000
+
+    def test_matches_capped_by_relevance(self, app, init_database):
+        """测试命中数超过上限时只保留相关度最高的商品，总数标记为非精确"""
+        with app.app_context():
+            app.config['SEARCH_MAX_MATCHES'] = 2
+            try:
+                top_ids = set(search_engine.search_ids('新', limit=2))
+                for sort in ('latest', 'relevance'):
+                    data = ItemService.search_items(query='新', search_type='title', sort=sort)['data']
+                    assert {item['id'] for item in data['items']} == top_ids
+                    assert data['pagination']['total_items'] == 2
+                    assert data['pagination']['total_exact'] is False
+
+                data = ItemService.search_items(query='macbook', search_type='title')['data']
+                assert data['pagination']['total_exact'] is True
+            finally:
+                app.config['SEARCH_MAX_MATCHES'] = 5000
+
+    def test_catch_up_rescans_overlap_window(self, app, init_database):
+        """测试 updated_at 早于 watermark 但之后才提交的商品仍会被补齐"""
+        from datetime import timedelta
+        seller = init_database['users'][0]
+
+        with app.app_context():
+            search_engine.search_ids('预热')
+            late = Item(
+                seller_id=seller.id, title='晚提交的台灯', description='', price=10, stock=1,
+                category='electronics', is_active=True
+            )
+            db.session.add(late)
+            db.session.commit()
+            # 模拟事务在 watermark 推进之后才提交：时间戳早于 watermark
+            late.updated_at = search_engine._watermark - timedelta(seconds=5)
+            db.session.commit()
+            search_engine.index.remove_document(late.id)
+
+            assert late.id in search_engine.search_ids('台灯')
+
+    def test_concurrent_refresh_catches_up_once(self, app, init_database, monkeypatch):
+        """测试刷新间隔到期时并发请求只有一个执行补齐"""
+        import threading
+        import time
+
+        with app.app_context():
+            search_engine.search_ids('预热')
+        calls = []
+
+        def slow_catch_up():
+            calls.append(1)
+            time.sleep(0.05)
+            search_engine._last_refresh = time.monotonic()
+
+        monkeypatch.setattr(search_engine, '_catch_up', slow_catch_up)
+        monkeypatch.setitem(app.config, 'SEARCH_REFRESH_INTERVAL', 30)
+        search_engine._last_refresh = 0.0
+        threads = [threading.Thread(target=search_engine._ensure_fresh) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert len(calls) == 1
+
+    def test_save_leaves_no_temp_files(self, app, init_database, tmp_path):
+        with app.app_context():
+            app.config['SEARCH_INDEX_PATH'] = str(tmp_path / 'index.json')
+            try:
+                search_engine.rebuild()
+                search_engine.save()
+                assert [path.name for path in tmp_path.iterdir()] == ['index.json']
+            finally:
+                app.config['SEARCH_INDEX_PATH'] = ''
@@ -0,0 +1,111 @@
+"""
+Token 注销列表单元测试
+测试布隆过滤器、增量同步与过期记录清理
+"""
+
+import time
+from datetime import datetime, timedelta
+from app.utils.token_revocation import BloomFilter, TokenRevocationList, token_revocations
+from app.models import RevokedToken, db
+
+
+class TestBloomFilter:
+    """布隆过滤器测试"""
+
+    def test_no_false_negatives_and_low_false_positive_rate(self):
+        bloom = BloomFilter(capacity=1000, error_rate=0.01)
+        for i in range(1000):
+            bloom.add(f'revoked-{i}')
+
+        assert all(f'revoked-{i}' in bloom for i in range(1000))
+        false_positives = sum(f'other-{i}' in bloom for i in range(10000))
+        assert false_positives < 300
+
+
+class TestTokenRevocationList:
+    """注销列表测试"""
+
+    def test_revoke_and_check_without_queries(self, app, init_database, count_queries):
+        """测试注销后立即生效，未注销的检查不访问数据库"""
+        user_id = init_database['users'][0].id
+        with app.app_context():
+            assert token_revocations.revoke('jti-1', time.time() + 3600, user_id) is True
+            assert token_revocations.revoke('jti-1', time.time() + 3600, user_id) is True  # 重复注销
+
+            with count_queries() as statements:
+                assert token_revocations.is_revoked('jti-1') is True
+                assert token_revocations.is_revoked('jti-2') is False
+                assert token_revocations.is_revoked(None) is False
+            assert statements == []
+
+    def test_incremental_sync_from_other_process(self, app, init_database):
+        """测试其他进程写入的注销记录在同步间隔后生效"""
+        with app.app_context():
+            other = TokenRevocationList()
+            other.init_app(app)
+            assert other.is_revoked('jti-remote') is False
+
+            token_revocations.revoke('jti-remote', time.time() + 3600)
+            assert other.is_revoked('jti-remote') is False  # 尚未到同步间隔
+
+            app.config['TOKEN_REVOCATION_REFRESH_INTERVAL'] = 0
+            try:
+                assert other.is_revoked('jti-remote') is True
+            finally:
+                app.config['TOKEN_REVOCATION_REFRESH_INTERVAL'] = 5
+
+    def test_late_committed_record_synced(self, app, init_database):
+        """测试注销时间早于上次同步、但提交晚于同步的记录（延迟提交）仍会被同步"""
+        with app.app_context():
+            other = TokenRevocationList()
+            other.init_app(app)
+            app.config['TOKEN_REVOCATION_REFRESH_INTERVAL'] = 0
+            try:
+                assert other.is_revoked('jti-late') is False
+                # 事务在上次同步之前开始（注销时间更早），同步之后才提交；记录ID也晚于其他已同步的记录
+                db.session.add(RevokedToken(
+                    jti='jti-late', expires_at=datetime.now() + timedelta(hours=1),
+                    revoked_at=datetime.now() - timedelta(seconds=10)
+                ))
+                db.session.commit()
+                assert other.is_revoked('jti-late') is True
+            finally:
+                app.config['TOKEN_REVOCATION_REFRESH_INTERVAL'] = 5
+
+    def test_purge_reloads_missed_records(self, app, init_database):
+        """测试清理过期记录时从数据库全量重建，补齐增量同步窗口之外遗漏的记录"""
+        with app.app_context():
+            other = TokenRevocationList()
+            other.init_app(app)
+            assert other.is_revoked('jti-missed') is False
+            db.session.add(RevokedToken(
+                jti='jti-missed', expires_at=datetime.now() + timedelta(hours=1),
+                revoked_at=datetime.now() - timedelta(hours=1)
+            ))
+            db.session.commit()
+
+            app.config['TOKEN_REVOCATION_REFRESH_INTERVAL'] = 0
+            try:
+                # 注销时间早于重叠窗口：增量同步读不到
+                assert other.is_revoked('jti-missed') is False
+                app.config['TOKEN_REVOCATION_PURGE_INTERVAL'] = 0
+                assert other.is_revoked('jti-missed') is True
+            finally:
+                app.config['TOKEN_REVOCATION_REFRESH_INTERVAL'] = 5
+                app.config['TOKEN_REVOCATION_PURGE_INTERVAL'] = 3600
+
+    def test_expired_records_purged(self, app, init_database):
+        """测试过期记录从数据库与内存中清理"""
+        with app.app_context():
+            db.session.add(RevokedToken(jti='jti-old', expires_at=datetime.now() - timedelta(hours=1)))
+            db.session.commit()
+            token_revocations.revoke('jti-live', time.time() + 3600)
+
+            app.config['TOKEN_REVOCATION_PURGE_INTERVAL'] = 0
+            try:
+                token_revocations.reset()
+                assert token_revocations.is_revoked('jti-old') is False
+                assert token_revocations.is_revoked('jti-live') is True
+                assert [row.jti for row in RevokedToken.query.all()] == ['jti-live']
+            finally:
+                app.config['TOKEN_REVOCATION_PURGE_INTERVAL'] = 3600
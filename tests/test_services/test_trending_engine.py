@@ -0,0 +1,199 @@
+"""
+商品热度引擎单元测试
+测试衰减计数器、分类榜单维护、检查点持久化及与 ReviewService 的集成
+"""
+
+import pytest
+from app.services.trending_engine import DecayedCounters, TrendingEngine, trending_engine
+from app.services.review_service import ReviewService
+from app.services.item_service import ItemService
+from app.services.favorite_service import FavoriteService
+
+HOUR = 3600
+
+
+class TestDecayedCounters:
+    """衰减计数器测试"""
+
+    def test_score_halves_after_half_life(self):
+        counters = DecayedCounters(HOUR, top_k=10, epoch=0)
+        counters.add(1, 8.0, now=0, category='books')
+
+        assert counters.score(1, now=0) == pytest.approx(8.0)
+        assert counters.score(1, now=HOUR) == pytest.approx(4.0)
+        assert counters.score(1, now=3 * HOUR) == pytest.approx(1.0)
+
+    def test_recent_events_outrank_old_totals(self):
+        """测试大量旧事件的热度低于少量新事件"""
+        counters = DecayedCounters(HOUR, top_k=10, epoch=0)
+        counters.add(1, 100.0, now=0, category='books')
+        counters.add(2, 10.0, now=5 * HOUR, category='books')
+
+        assert [item_id for item_id, _ in counters.top(now=5 * HOUR)] == [2, 1]
+
+    def test_top_k_per_category(self):
+        counters = DecayedCounters(HOUR, top_k=3, epoch=0)
+        for item_id in range(1, 7):
+            counters.add(item_id, float(item_id), now=0, category='books' if item_id % 2 else 'sports')
+
+        assert [item_id for item_id, _ in counters.top(now=0)] == [6, 5, 4]
+        assert [item_id for item_id, _ in counters.top('books', now=0)] == [5, 3, 1]
+        assert [item_id for item_id, _ in counters.top('sports', limit=2, now=0)] == [6, 4]
+        assert counters.top('unknown', now=0) == []
+
+        # 新事件使商品进入榜单
+        counters.add(1, 10.0, now=0)
+        assert [item_id for item_id, _ in counters.top(now=0)] == [1, 6, 5]
+
+    def test_discard_and_category_change_refill(self):
+        counters = DecayedCounters(HOUR, top_k=2, epoch=0)
+        for item_id in range(1, 5):
+            counters.add(item_id, float(item_id), now=0, category='books')
+
+        counters.discard(4)
+        assert [item_id for item_id, _ in counters.top('books', now=0)] == [3, 2]
+
+        counters.set_category(3, 'sports')
+        assert [item_id for item_id, _ in counters.top('books', now=0)] == [2, 1]
+        assert [item_id for item_id, _ in counters.top('sports', now=0)] == [3]
+
+    def test_rebase_keeps_order_and_prunes(self):
+        counters = DecayedCounters(HOUR, top_k=10, epoch=0)
+        counters.add(1, 1.0, now=0, category='books')
+        counters.add(2, 1.0, now=20 * HOUR, category='books')
+
+        counters.rebase(20 * HOUR, prune=True)
+        assert 1 not in counters
+        assert counters.score(2, now=20 * HOUR) == pytest.approx(1.0)
+        assert [item_id for item_id, _ in counters.top(now=20 * HOUR)] == [2]
+
+    def test_unresolved_tracked_without_scan(self):
+        """测试分类未知的商品单独记录，补齐或移除后不再出现"""
+        counters = DecayedCounters(HOUR, top_k=10, epoch=0)
+        counters.add(1, 1.0, now=0, category='books')
+        counters.add(2, 1.0, now=0)
+        counters.add(3, 1.0, now=0)
+        assert sorted(counters.unresolved()) == [2, 3]
+
+        counters.set_category(2, 'books')
+        counters.discard(3)
+        assert counters.unresolved() == []
+        counters.add(4, 1.0, now=0)
+        restored = DecayedCounters.load(counters.dump(), HOUR, top_k=10, now=0)
+        assert restored.unresolved() == [4]
+
+    def test_merge_adds_scores(self):
+        counters = DecayedCounters(HOUR, top_k=10, epoch=0)
+        counters.add(1, 4.0, now=0, category='books')
+        other = DecayedCounters(HOUR, top_k=10, epoch=HOUR)
+        other.add(1, 1.0, now=HOUR)
+        other.add(2, 3.0, now=HOUR, category='sports')
+
+        counters.merge(other)
+        assert counters.score(1, now=HOUR) == pytest.approx(3.0)
+        assert [item_id for item_id, _ in counters.top('sports', now=HOUR)] == [2]
+
+    def test_dump_and_load(self):
+        counters = DecayedCounters(HOUR, top_k=10, epoch=0)
+        counters.add(1, 4.0, now=0, category='books')
+        counters.add(2, 2.0, now=0, category='电子产品')
+
+        restored = DecayedCounters.load(counters.dump(), HOUR, top_k=10, now=HOUR)
+        assert restored.score(1, now=HOUR) == pytest.approx(2.0)
+        assert [item_id for item_id, _ in restored.top('电子产品', now=HOUR)] == [2]
+        assert [item_id for item_id, _ in restored.top(now=HOUR)] == [1, 2]
+
+        with pytest.raises(ValueError):
+            DecayedCounters.load(counters.dump()[:-3], HOUR, top_k=10)
+
+
+class TestTrendingEngine:
+    """热度引擎与业务层集成测试"""
+
+    def test_events_drive_popular_items(self, app, init_database):
+        """测试浏览/收藏/下单事件决定热门商品顺序"""
+        items = init_database['items']
+        user = init_database['users'][2]
+
+        with app.app_context():
+            ItemService.get_item_detail(items[4].id)
+            FavoriteService.add_favorite(user.id, items[3].id)
+
+            result = ReviewService.get_popular_items(limit=3)
+            assert result['success'] is True
+            ids = [entry['id'] for entry in result['data']]
+            assert ids[:2] == [items[3].id, items[4].id]
+            assert result['data'][0]['trending_score'] > result['data'][1]['trending_score'] > 0
+            # 榜单不足时用最新上架的商品补齐
+            assert len(ids) == 3 and result['data'][2]['trending_score'] == 0
+
+            books = ReviewService.get_popular_items(limit=5, category='books')['data']
+            assert books[0]['id'] == items[3].id
+            assert all(entry['category'] == 'books' for entry in books)
+
+    def test_inactive_items_removed(self, app, init_database):
+        """测试商品下架后移出榜单"""
+        items = init_database['items']
+
+        with app.app_context():
+            item_id, seller_id = items[0].id, items[0].seller_id
+            ItemService.get_item_detail(item_id)
+            assert trending_engine.top() == [(item_id, pytest.approx(1.0))]
+
+            ItemService.delete_item(item_id, seller_id)
+            assert trending_engine.top() == []
+            ids = [entry['id'] for entry in ReviewService.get_popular_items(limit=10)['data']]
+            assert item_id not in ids
+
+    def test_unknown_category_resolved_on_read(self, app, init_database):
+        """测试只有商品ID的浏览事件在读取分类榜单前补齐分类"""
+        items = init_database['items']
+
+        with app.app_context():
+            trending_engine.record(items[1].id, 'view')
+            assert trending_engine.top('electronics') == [(items[1].id, pytest.approx(1.0))]
+
+    def test_checkpoint_and_reload(self, app, init_database, tmp_path):
+        """测试检查点写入文件后新实例可直接加载"""
+        path = tmp_path / 'trending.bin'
+
+        with app.app_context():
+            app.config['TRENDING_CHECKPOINT_PATH'] = str(path)
+            try:
+                trending_engine.record(7, 'order', count=2, category='books')
+                assert trending_engine.checkpoint() is True
+                assert path.exists()
+
+                engine = TrendingEngine()
+                engine.init_app(app)
+                assert engine.top('books') == [(7, pytest.approx(trending_engine.score(7), rel=1e-3))]
+            finally:
+                app.config['TRENDING_CHECKPOINT_PATH'] = ''
+
+    def test_processes_share_checkpoint_without_overwriting(self, app, init_database, tmp_path):
+        """测试多个进程（引擎实例）写同一检查点文件时合并各自的增量，不相互覆盖"""
+        original = app.extensions['trending_engine']
+        app.config['TRENDING_CHECKPOINT_PATH'] = str(tmp_path / 'trending.bin')
+        try:
+            first, second = TrendingEngine(), TrendingEngine()
+            first.init_app(app)
+            second.init_app(app)
+            first.record(1, 'order', category='books')
+            second.record(2, 'view', category='books')
+            second.record(3, 'view', category='books')
+            assert first.checkpoint() is True
+            second.discard(1)
+            assert second.checkpoint() is True
+
+            # 合并结果同时作为进程新的计数器
+            assert {item_id for item_id, _ in second.top('books')} == {2, 3}
+
+            first.record(4, 'view', category='books')
+            assert first.checkpoint() is True
+            reloaded = TrendingEngine()
+            reloaded.init_app(app)
+            assert {item_id for item_id, _ in reloaded.top('books')} == {2, 3, 4}
+            assert reloaded.score(2) == pytest.approx(1.0, rel=1e-3)
+        finally:
+            app.config['TRENDING_CHECKPOINT_PATH'] = ''
+            app.extensions['trending_engine'] = original
@@ -0,0 +1,187 @@
+"""
+用户服务层单元测试
+直接测试 UserService 的业务逻辑
+重点：评分聚合的增量维护与重建
+"""
+
+import pytest
+from app.services.user_service import UserService
+from app.models import Review, UserRating, db
+
+
+def _add_review(init_database, rating, order_index=1):
+    """为卖家(user1)添加一条评价"""
+    review = Review(
+        order_id=init_database['orders'][order_index].id,
+        item_id=init_database['items'][0].id,
+        reviewer_id=init_database['users'][2].id,
+        reviewee_id=init_database['users'][0].id,
+        rating=rating,
+        content='测试评价'
+    )
+    db.session.add(review)
+    db.session.commit()
+    return review
+
+
+class TestUserRatingAggregate:
+    """用户评分聚合测试"""
+
+    def test_aggregate_created_with_review(self, app, init_database):
+        """测试写入评价时同步创建聚合"""
+        seller = init_database['users'][0]
+
+        with app.app_context():
+            aggregate = db.session.get(UserRating, seller.id)
+            assert aggregate is not None
+            assert aggregate.rating_count == 1
+            assert aggregate.rating_sum == 5
+            assert aggregate.histogram == {1: 0, 2: 0, 3: 0, 4: 0, 5: 1}
+
+    def test_aggregate_incremental_update(self, app, init_database):
+        """测试新增评价后平均分增量更新"""
+        seller = init_database['users'][0]
+
+        with app.app_context():
+            _add_review(init_database, 2)
+
+            aggregate = db.session.get(UserRating, seller.id)
+            assert aggregate.rating_count == 2
+            assert aggregate.star_2 == 1
+            assert UserService._get_user_rating(seller.id) == 3.5
+
+    def test_aggregate_on_review_delete(self, app, init_database):
+        """测试删除评价后聚合回退"""
+        seller = init_database['users'][0]
+
+        with app.app_context():
+            review = _add_review(init_database, 1)
+            db.session.delete(review)
+            db.session.commit()
+
+            aggregate = db.session.get(UserRating, seller.id)
+            assert aggregate.rating_count == 1
+            assert aggregate.star_1 == 0
+            assert UserService._get_user_rating(seller.id) == 5.0
+
+    def test_concurrent_first_reviews_upsert(self, app, init_database):
+        """测试聚合行已被并发请求插入时，新增评价合并到该行而不是主键冲突"""
+        from app.models import _apply_review_rating
+        buyer = init_database['users'][1]
+
+        with app.app_context():
+            connection = db.session.connection()
+            # 两个事务都在对方提交前读到“无聚合行”，依次执行插入
+            _apply_review_rating(connection, buyer.id, 4, 1)
+            _apply_review_rating(connection, buyer.id, 2, 1)
+            db.session.commit()
+
+            aggregate = db.session.get(UserRating, buyer.id)
+            assert aggregate.rating_count == 2
+            assert aggregate.rating_sum == 6
+            assert aggregate.histogram == {1: 0, 2: 1, 3: 0, 4: 1, 5: 0}
+
+    def test_default_rating_without_reviews(self, app, init_database):
+        """测试无评价用户默认5分"""
+        buyer = init_database['users'][1]
+
+        with app.app_context():
+            assert UserService._get_user_rating(buyer.id) == 5.0
+            assert UserService._get_user_ratings([buyer.id]) == {buyer.id: 5.0}
+
+    def test_rebuild_matches_reviews(self, app, init_database):
+        """测试批量重建结果与 reviews 表一致"""
+        seller = init_database['users'][0]
+
+        with app.app_context():
+            _add_review(init_database, 3)
+            # 人为制造漂移
+            db.session.query(UserRating).update({'rating_sum': 0, 'rating_count': 99})
+            db.session.commit()
+
+            assert UserService.rebuild_rating_aggregates() == 1
+
+            aggregate = db.session.get(UserRating, seller.id)
+            assert aggregate.rating_count == 2
+            assert aggregate.rating_sum == 8
+            assert aggregate.histogram == {1: 0, 2: 0, 3: 1, 4: 0, 5: 1}
+
+    def test_rebuild_command(self, app, runner, init_database):
+        """测试 flask rebuild-ratings 命令"""
+        with app.app_context():
+            result = runner.invoke(args=['rebuild-ratings'])
+            assert result.exit_code == 0
+            assert '1' in result.output
+
+
+class TestPasswordHashing:
+    """密码计算进程池与登录时重新加密测试"""
+
+    def test_process_pool_hash_and_verify(self, app):
+        """测试进程池中加密与校验，并记录耗时"""
+        from app.utils.password_helper import PasswordHelper, password_pool
+
+        with app.app_context():
+            app.config.update(PASSWORD_POOL_WORKERS=1, PASSWORD_POOL_MAX_PENDING=4)
+            try:
+                hashed = PasswordHelper.hash_password('Password123')
+                assert hashed.startswith('$2b$04$')
+                assert PasswordHelper.verify_password('Password123', hashed) is True
+                assert PasswordHelper.verify_password('wrong', hashed) is False
+
+                stats = password_pool.stats()
+                assert stats['pending'] == 0
+                # 工作进程不从多线程的请求进程 fork
+                assert stats['start_method'] in ('forkserver', 'spawn')
+                assert password_pool._executor._mp_context.get_start_method() == stats['start_method']
+                assert stats['latency']['hash']['count'] >= 1
+                assert stats['latency']['verify']['count'] >= 2
+            finally:
+                app.config['PASSWORD_POOL_WORKERS'] = 0
+                password_pool.shutdown()
+
+    def test_default_workers_shared_by_web_workers(self, monkeypatch):
+        """测试默认进程池大小按 Web 工作进程数均分 CPU 核数"""
+        from app.utils.password_helper import default_pool_workers
+
+        monkeypatch.setattr('os.cpu_count', lambda: 8)
+        monkeypatch.setenv('WEB_CONCURRENCY', '4')
+        assert default_pool_workers() == 2
+        monkeypatch.setenv('WEB_CONCURRENCY', '16')
+        assert default_pool_workers() == 1
+        monkeypatch.delenv('WEB_CONCURRENCY')
+        assert default_pool_workers() == 8
+
+    def test_busy_pool_rejects_login(self, app, init_database):
+        """测试排队已满时登录立即返回重试建议"""
+        from app.utils.password_helper import password_pool
+
+        with app.app_context():
+            app.config.update(PASSWORD_POOL_WORKERS=1, PASSWORD_POOL_MAX_PENDING=0, PASSWORD_POOL_RETRY_AFTER=3)
+            try:
+                rejected = password_pool.stats()['rejected']
+                result = UserService.login_user('testuser1', 'Password123')
+                assert result['success'] is False
+                assert result['retry_after'] == 3
+                assert password_pool.stats()['rejected'] == rejected + 1
+            finally:
+                app.config.update(PASSWORD_POOL_WORKERS=0, PASSWORD_POOL_MAX_PENDING=4)
+
+    def test_rehash_on_login_when_rounds_change(self, app, init_database):
+        """测试工作因子变更后登录时自动重新加密"""
+        from app.models import User
+        from app.utils.password_helper import PasswordHelper
+
+        with app.app_context():
+            user_id = init_database['users'][0].id
+            assert User.query.get(user_id).password_hash.startswith('$2b$04$')
+
+            app.config['BCRYPT_ROUNDS'] = 5
+            try:
+                assert UserService.login_user('testuser1', 'Password123')['success'] is True
+                new_hash = User.query.get(user_id).password_hash
+                assert new_hash.startswith('$2b$05$')
+                assert PasswordHelper.verify_password('Password123', new_hash) is True
+                assert PasswordHelper.needs_rehash(new_hash) is False
+            finally:
+                app.config['BCRYPT_ROUNDS'] = 4